@@ -30,6 +30,12 @@ Main game executable.
 import argparse
 import sys
 import os
+import multiprocessing
+
+# Song scanning starts worker processes; in frozen Windows builds those run
+# this script too, and have to be caught before the arguments are parsed.
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
 
 # Add the directory of DLL dependencies to the PATH if we're running
 # from source on Windows so we pick them up when those bits are imported.
@@ -85,6 +91,7 @@ import pygame
 from fofix.core.VideoPlayer import VideoLayer, VideoPlayerError
 from fofix.core.GameEngine import GameEngine
 from fofix.game.MainMenu import MainMenu
+from fofix.game import Song
 from fofix.core.Language import _
 from fofix.core import Version
 from fofix.core import Log, VFS
@@ -119,6 +126,10 @@ class Main():
         if self.theme is not None:
             Config.set("coffee", "themename", self.theme)
 
+        # The song scan processes are forked here, while there are no SDL,
+        # OpenGL or audio threads yet; a restart keeps the ones it has.
+        Song.startScanPool(self.config)
+
         self.engine = GameEngine(self.config)
 
         self.init_oneshot()
@@ -243,6 +254,7 @@ if __name__ == '__main__':
             main.run()
             if not main.restartRequested:
                 break
+        Song.stopScanPool()
 
     except (KeyboardInterrupt, SystemExit):
         raise
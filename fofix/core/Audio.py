@@ -22,11 +22,10 @@
 #####################################################################
 
 import pygame
-import numpy as np
 
 from fofix.core import Log
-from fofix.core.Task import Task
-from fofix.core.MixStream import VorbisFileMixStream
+from fofix.core.MixStream import FileMixStream, MultiStemStream, PassthroughStream
+from fofix.core.PlaybackClock import PlaybackClock
 
 #stump: get around some strangeness in pygame when py2exe'd...
 if not hasattr(pygame.mixer, 'music'):
@@ -159,50 +158,43 @@ class Sound(object):
 
 
 #stump: mic passthrough
-class MicrophonePassthroughStream(Sound, Task):
-    def __init__(self, engine, mic):
-        Task.__init__(self)
+class MicrophonePassthroughStream(Sound):
+    # Input goes straight into a ring the mixer plays from, so how soon you
+    # hear yourself depends on the latency setting, not on the frame rate.
+    def __init__(self, engine, samprate):
         self.engine = engine
-        self.channel = None
-        self.mic = mic
+        latency = engine.config.get("audio", "mic_passthrough_latency") / 1000.0
+        self.stream = PassthroughStream(samprate, latency)
         self.playing = False
-        self.volume = 1.0
     def __del__(self):
         self.stop()
     def play(self):
         if not self.playing:
-            self.engine.addTask(self, synchronized=False)
+            self.stream.play()
             self.playing = True
     def stop(self):
         if self.playing:
-            self.channel.stop()
-            self.engine.removeTask(self)
+            self.stream.stop()
             self.playing = False
     def setVolume(self, vol):
-        self.volume = vol
-    def run(self, ticks):
-        chunk = ''.join(self.mic.passthroughQueue)
-        self.mic.passthroughQueue = []
-        if chunk == '':
-            return
-        data = np.frombuffer(chunk, dtype=np.float32) * 32767.0
-        playbuf = np.zeros((len(data), 2), dtype=np.int16)
-        playbuf[:, 0] = data
-        playbuf[:, 1] = data
-        snd = pygame.mixer.Sound(buffer(playbuf))
-        if self.channel is None or not self.channel.get_busy():
-            self.channel = snd.play()
-        else:
-            self.channel.queue(snd)
-        self.channel.set_volume(self.volume)
-
+        self.stream.set_gain(vol)
+    # Called from the mic's analysis thread with each chunk of float32 input.
+    def write(self, chunk):
+        self.stream.write(chunk)
+    def getUnderruns(self):
+        return self.stream.get_underruns()
+    def getOverruns(self):
+        return self.stream.get_overruns()
 
 class StreamingSound(object):
+    # The decoder is picked by the file's extension: .ogg, .wav or .flac.
     def __init__(self, channel, fileName):
-        self._mixstream = VorbisFileMixStream(fileName)
+        self._mixstream = FileMixStream(fileName)
         self._channel = channel
+        self._clock = PlaybackClock()
 
     def play(self):
+        self._clock.reset()
         self._mixstream.play(self._channel.id)
 
     def stop(self):
@@ -220,9 +212,13 @@ class StreamingSound(object):
         self.stop()
 
     def getPosition(self):
-        return self._mixstream.get_position()
+        clock = self._mixstream.get_clock()
+        if clock is None:
+            return -1.0
+        return self._clock.update(*clock)
 
     def setPosition(self, position):
+        self._clock.reset()
         return self._mixstream.seek(position)
 
     def setPitchBendSemitones(self, semitones):
@@ -230,3 +226,45 @@ class StreamingSound(object):
 
     def setSpeed(self, factor):
         self._mixstream.set_speed(factor)
+
+    # Decode-ahead buffer statistics, for spotting audio dropouts:
+    # underruns - chunks played as silence because decoding fell behind
+    # overruns - times decoding got as far ahead as it may and had to wait
+    # buffer fill - how full the decode-ahead buffer is, 0.0 to 1.0
+    # path chunks - how many chunks were decoded straight through, and how
+    #   many went through SoundTouch for speed or pitch changes
+    def getUnderruns(self):
+        return self._mixstream.get_underruns()
+
+    def getOverruns(self):
+        return self._mixstream.get_overruns()
+
+    def getBufferFill(self):
+        return self._mixstream.get_buffer_fill()
+
+    def getPathChunks(self):
+        return self._mixstream.get_path_chunks()
+
+
+class MultiStemSound(StreamingSound):
+    # Several stems of a song, decoded and mixed together into a single
+    # stream, so they stay in sync and share one time-stretch and one channel.
+    def __init__(self, channel, fileNames):
+        self._mixstream = MultiStemStream(fileNames)
+        self._channel = channel
+        self._clock = PlaybackClock()
+        self.stems = [StemSound(self, i) for i in range(len(fileNames))]
+
+
+class StemSound(object):
+    # One stem of a MultiStemSound, with its own volume and pitch. Playing,
+    # stopping, seeking and speed are done once, to the MultiStemSound.
+    def __init__(self, mix, stem):
+        self._mix = mix
+        self._stem = stem
+
+    def setVolume(self, volume):
+        self._mix._mixstream.set_stem_volume(self._stem, volume)
+
+    def setPitchBendSemitones(self, semitones):
+        self._mix._mixstream.set_stem_pitch_semitones(self._stem, semitones)
@@ -96,6 +96,7 @@ Config.define("game",   "last_theme",          str,  "")
 
 #myfingershurt: default buffersize changed from 4096 to 2048:
 Config.define("audio",  "buffersize",   int,   2048,  text = _("Buffer Size"), options = [256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536], tipText = _("Set your audio buffer size. Higher values will reduce audio popping, but increase game lag. Only change this if you are having audio quality issues, and use the lowest value that sounds right."))
+Config.define("audio",  "mic_passthrough_latency", int, 30, text = _("Passthrough Latency"), options = dict([(n, "%d ms" % n) for n in (10, 20, 30, 50, 80, 120)]), tipText = _("Set how far behind your singing the microphone passthrough plays, on top of the buffer size. Raise it if the passthrough crackles."))
 Config.define("audio",  "delay",        int,   100,   text = _("A/V Delay"), options = dict([(n, n) for n in range(-1000, 1001)]), tipText = _("Set your A/V delay. Unfortunately for now you have to use trial and error."))
 Config.define("audio",  "screwupvol", float,   0.25,  text = _("Screw-Up Sounds"), options = sortOptionsByKey({0.0: _("Off"), .25: _("Quiet"), .5: _("Loud"), 1.0: _("Painful")}), tipText = _("How loud should the sound of your screwing up be? Very."))
 
@@ -106,6 +107,10 @@ Config.define("audio",  "songvol",    float,    0.8,  text = _("Background Volum
 
 Config.define("performance", "game_priority",       int,   2,      text = _("Process Priority"), options = sortOptionsByKey({0: _("Idle"), 1: _("Low"), 2: _("Normal"), 3:_("Above Normal"), 4:_("High"), 5:_("Realtime")}), tipText = _("Change this to increase the priority of the FoFiX process. Don't change this unless you know what you're doing. DO NOT set this to Realtime. Ever."))
 Config.define("performance", "restrict_to_first_processor", bool, False, text=_("Restrict to First Core (Win32 Only)"), options={False: _("No"), True: _("Yes")}, tipText=_("Choose whether to restrict the game to running on only the first processor core on the system. Only has an effect under Windows."))  #stump
+Config.define("performance", "loader_threads",      int,   2,      text = _("Loader Threads"), options = dict([(n, n) for n in range(1, 9)]), tipText = _("Sets how many resources can be loaded in the background at once."))
+Config.define("performance", "revalidate_file_cache", bool, False, text = _("Check Files for Changes"), options = {False: _("No"), True: _("Yes")}, tipText = _("Sets whether to check folders for changes every time a file is looked up. Turn this on if you change themes or songs while the game is running; leave it off if they are on a slow drive."))
+Config.define("performance", "texture_cache_size", int, 256, text = _("Texture Cache Size"), options = sortOptionsByKey({0: _("Off"), 64: "64 MB", 128: "128 MB", 256: "256 MB", 512: "512 MB", 1024: "1024 MB"}), tipText = _("Sets how much disk space to keep decoded images in, so themes and stages load faster next time. Takes effect when the game is restarted."))
+Config.define("performance", "texture_budget", int, 512, text = _("Texture Memory Limit"), options = sortOptionsByKey({0: _("No Limit"), 128: "128 MB", 256: "256 MB", 512: "512 MB", 1024: "1024 MB", 2048: "2048 MB"}), tipText = _("Sets how much video memory textures may take before album art not on screen is unloaded. Lower it if the game slows down or images go missing after a long session. Takes effect when the game is restarted."))
 Config.define("game",   "notedisappear",      int,   1,  text = _("Missed Notes"), options = {0: _("Disappear"), 1: _("Keep on going"), 2: _("Turn Red")}, tipText = _("When you miss a note, this sets whether they disappear from the fretboard, scroll off the bottom of the screen or turn red"))
 
 #akedrou - Quickset (based on Fablaculp's Performance Autoset)
@@ -302,6 +307,8 @@ Config.define("audio",  "SFX_volume",         float, 0.7,    text = _("SFX Volum
 
 #stump: allow metadata caching to be turned off
 Config.define("performance", "cache_song_metadata", bool, True, text=_("Cache Song Metadata"), options={False: _("No"), True: _("Yes")}, tipText = _("This will allow information about the songs to be stored for quick access later at the cost of a slow first time loading."))
+Config.define("performance", "cache_compiled_charts", bool, True, text=_("Cache Compiled Charts"), options={False: _("No"), True: _("Yes")}, tipText = _("This will store each song's notes after they have been read and marked, so the song starts faster the next time it is played with the same HO/PO settings."))
+Config.define("performance", "song_scan_processes", int, 0, text=_("Song Scan Processes"), options=sortOptionsByKey({0: _("Auto"), 1: _("Off"), 2: "2", 4: "4", 8: "8"}), tipText = _("How many processes read new or changed songs while the song cache is being built. 'Auto' uses one per processor core. Takes effect the next time the game is started."))
 
 Config.define("coffee", "neckSpeed",            int,  100,      text = _("Board Speed Percent"),        options = dict([(n, n) for n in range(10, 410, 10)]), tipText = _("Sets how quickly note will scroll"))
 Config.define("coffee", "failingEnabled",       bool, True,     text = _("No Fail"),             options = {True: _("Off"), False: _("On")}, tipText = _("Sets whether or not you can fail out of a song."))
@@ -24,16 +24,19 @@
 #####################################################################
 
 import os
-import glob
 import random
 
 from fofix.core.Font import Font
 from fofix.core.Image import ImgDrawing
+from fofix.core.Texture import getMaxTextureSize
 from fofix.core.Audio import Sound
+from fofix.core.constants import OWNER_OTHER
 from fofix.core import Config
 from fofix.core import Version
 from fofix.core import Player
 from fofix.core import Log
+from fofix.core import VFS
+from fofix.core import TextureData
 
 # these constants define a few customized letters in the default font
 #MFH - with the new simplified Font.py, no more custom glyphs... let's do a simple replacement here for now...
@@ -395,46 +398,42 @@ class Data(object):
     def checkImgDrawing(self, fileName):
         return self.getImgDrawing(fileName, False)
 
-    def getImgDrawing(self, fileName, openImage=True):
-        imgDrawing = None
+    def findImageFiles(self, fileName):
+        """
+        @param fileName:  The name of the file in the data directory, with or without its extension
+        @return:          The files it could be, in the order to try them
+        """
+        files = []
         for dataPath in self.resource.dataPaths:
             fileName1 = os.path.join(dataPath, fileName)
             if self.logLoadings == 1:
-                if openImage:
-                    Log.notice("Trying to load image: %s" % fileName1)
-                else:
-                    Log.notice("Checking image: %s" % fileName1)
+                Log.notice("Checking image: %s" % fileName1)
             #check if fileName1 exists (has extension)
-            if os.path.exists(fileName1):
-                if openImage == True:
-                    try:
-                        imgDrawing = ImgDrawing(self.svg, fileName1)
-                        return imgDrawing
-                    except IOError:
-                        Log.warn("Unable to load image file: %s" % fileName1)
-                    except OverflowError:
-                        Log.warn("Unable to read image file: %s" % fileName1)
-                else:
-                    return True
+            if VFS.dirCache.exists(fileName1):
+                files.append(fileName1)
             else:
                 #find extension
-                fileName1 = os.path.splitext(fileName1)[0]
-                files = glob.glob('%s.*' % fileName1)
-                if openImage == True:
-                    for i in range(len(files)):
-                        try:
-                            imgDrawing = ImgDrawing(self.svg, files[i])
-                            return imgDrawing
-                        except IOError:
-                            Log.warn("Unable to load image file: %s" % files[i])
-                elif len(files) > 0:
-                    return True
+                files.extend(VFS.dirCache.glob('%s.*' % os.path.splitext(fileName1)[0]))
+        return files
+
+    def getImgDrawing(self, fileName, openImage=True, owner=OWNER_OTHER):
+        for fileName1 in self.findImageFiles(fileName):
+            if not openImage:
+                return True
+            if self.logLoadings == 1:
+                Log.notice("Trying to load image: %s" % fileName1)
+            try:
+                return ImgDrawing(self.svg, fileName1, owner)
+            except IOError:
+                Log.warn("Unable to load image file: %s" % fileName1)
+            except OverflowError:
+                Log.warn("Unable to read image file: %s" % fileName1)
         #image not found
         if self.logImageNotFound:
             Log.debug("Image not found: %s" % fileName)
         return False
 
-    def loadImgDrawing(self, target, name, fileName, textureSize = None):
+    def loadImgDrawing(self, target, name, fileName, textureSize = None, owner = OWNER_OTHER):
         """
         Load an SVG drawing synchronously.
 
@@ -443,9 +442,10 @@ class Data(object):
         @param fileName:    The name of the file in the data directory
         @param textureSize: Either None or (x, y), in which case the file will
                             be rendered to an x by y texture
+        @param owner:       What the texture is for (one of the OWNER_* constants)
         @return:            L{ImgDrawing} instance
         """
-        imgDrawing = self.getImgDrawing(fileName)
+        imgDrawing = self.getImgDrawing(fileName, owner = owner)
         if not imgDrawing:
             if target and name:
                 setattr(target, name, None)
@@ -459,6 +459,47 @@ class Data(object):
             drawing = imgDrawing
         return drawing
 
+    def loadImgDrawingAsync(self, target, name, fileName, owner = OWNER_OTHER, onLoad = None):
+        """
+        Load an image in a loader thread.  The file is decoded there, and
+        only the texture upload is left to the main loop.
+
+        @param target:    An object that will own the drawing, or None
+        @param name:      The name of the attribute the drawing will be assigned to
+        @param fileName:  The name of the file in the data directory
+        @param owner:     What the texture is for (one of the OWNER_* constants)
+        @param onLoad:    Called with the L{ImgDrawing}, or None if the image wasn't found
+        @return:          L{Loader} for the load
+        """
+        files = self.findImageFiles(fileName)
+        maxSize = getMaxTextureSize()
+
+        def decode():
+            for fileName1 in files:
+                try:
+                    return fileName1, TextureData.loadImageFile(fileName1, True, maxSize)
+                except IOError:
+                    Log.warn("Unable to load image file: %s" % fileName1)
+                except OverflowError:
+                    Log.warn("Unable to read image file: %s" % fileName1)
+            return None, None
+
+        def decoded(result):
+            fileName1, data = result
+            drawing = None
+            if data is not None:
+                drawing = ImgDrawing(self.svg, fileName1, owner, data = data)
+            elif self.logImageNotFound:
+                Log.debug("Image not found: %s" % fileName)
+            if target and name:
+                setattr(target, name, drawing)
+            if onLoad:
+                onLoad(drawing)
+
+        if target and name:
+            setattr(target, name, None)
+        return self.resource.load(None, None, decode, onLoad = decoded)
+
     def loadAllImages(self, target, directory, prefix = "img_", textureSize = None): #akedrou
         """
         Loads all images found in a folder to a given target.
@@ -468,21 +509,25 @@ class Data(object):
         @param textureSize: Either None or (x, y), in which case the files will
                             be rendered to an x by y texture
         """
-        if not os.path.isdir(os.path.join(self.path, directory)):
+        if not VFS.dirCache.isdir(os.path.join(self.path, directory)):
             return None
         imgDict = {}
-        for file in os.listdir(os.path.join(self.path, directory)):
+        def loaded(name, img):
+            if img and target is None:
+                imgDict[name] = img
+        #the files are decoded side by side by the loader threads
+        loaders = []
+        for file in VFS.dirCache.listdir(os.path.join(self.path, directory)):
             if file == "thumbs.db" or file == "Thumbs.db":
                 continue
             elif file[0] == ".":
                 continue
-            elif os.path.isdir(os.path.join(self.path, directory, file)):
+            elif VFS.dirCache.isdir(os.path.join(self.path, directory, file)):
                 continue
             name = os.path.splitext(file)[0]
             name = prefix+name
-            img = self.loadImgDrawing(target, name, os.path.join(directory, file), textureSize)
-            if img and target is None:
-                imgDict[name] = img
+            loaders.append(self.loadImgDrawingAsync(target, name, os.path.join(directory, file), onLoad = lambda img, name = name: loaded(name, img)))
+        self.resource.finishLoads(loaders)
         if target is None and len(imgDict) > 0:
             return imgDict
 
@@ -493,7 +538,7 @@ class Data(object):
     #myfingershurt: still need this fileexists function:
     def fileExists(self, fileName):
         fileName = self.resource.fileName(fileName)
-        return os.path.exists(fileName)
+        return VFS.dirCache.exists(fileName)
 
 
 #MFH - acceptSound and selectSound will now be merged into either 10 random sounds or just the acceptSound as a fallback:
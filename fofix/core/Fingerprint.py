@@ -0,0 +1,148 @@
+#####################################################################
+# -*- coding: iso-8859-1 -*-                                        #
+#                                                                   #
+# Frets on Fire X (FoFiX)                                           #
+# Copyright (C) 2009 Team FoFiX                                     #
+#                                                                   #
+# This program is free software; you can redistribute it and/or     #
+# modify it under the terms of the GNU General Public License       #
+# as published by the Free Software Foundation; either version 2    #
+# of the License, or (at your option) any later version.            #
+#                                                                   #
+# This program is distributed in the hope that it will be useful,   #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of    #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the     #
+# GNU General Public License for more details.                      #
+#                                                                   #
+# You should have received a copy of the GNU General Public License #
+# along with this program; if not, write to the Free Software       #
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,        #
+# MA  02110-1301, USA.                                              #
+#####################################################################
+
+'''
+Content fingerprints (SHA-1 hex digests) of files, remembered across runs.
+
+A file is only read and hashed again when its inode, size or modification
+time differ from when its fingerprint was stored, so asking for the
+fingerprint of an unchanged song is just a stat() and a database lookup.
+The digests are the same ones a plain C{hashlib.sha1()} of the whole file
+gives, so they can stand in for such hashes wherever those are stored.
+'''
+
+import os
+import hashlib
+import threading
+
+from fofix.core import VFS
+
+# How many new fingerprints to collect before committing them.
+COMMIT_INTERVAL = 100
+
+def statKey(path):
+    '''
+    Get what is compared to tell whether a file has changed.
+    @param path:  Path of the file
+    @return:      (inode, size, mtime in nanoseconds) tuple
+    '''
+    st = os.stat(path)
+    mtime = getattr(st, 'st_mtime_ns', None)
+    if mtime is None:
+        mtime = int(st.st_mtime * 1000000000)
+    return st.st_ino, st.st_size, mtime
+
+def hashFile(path, blockSize = 65536):
+    '''
+    Hash the contents of a file.
+    @param path:  Path of the file
+    @return:      SHA-1 hex digest of the file's contents
+    '''
+    h = hashlib.sha1()
+    f = open(path, 'rb')
+    try:
+        while True:
+            data = f.read(blockSize)
+            if not data:
+                break
+            h.update(data)
+    finally:
+        f.close()
+    return h.hexdigest()
+
+class FingerprintCache(object):
+    '''Fingerprints of files, stored in an SQLite database.  Safe to use from
+    several threads if the connection allows it.'''
+
+    def __init__(self, db):
+        self.db = db
+        self.lock = threading.RLock()
+        self.db.execute('CREATE TABLE IF NOT EXISTS `fingerprints` (`path` STRING UNIQUE, `inode` INT, `size` INT, `mtime` INT, `digest` STRING)')
+        self.db.commit()
+        self.pending = 0
+        self.hashed = 0
+
+    def fingerprint(self, path):
+        '''
+        Get the fingerprint of a file, hashing it only if it has changed.
+        @param path:  Path of the file
+        @return:      SHA-1 hex digest of the file's contents
+        '''
+        path = os.path.abspath(path)
+        inode, size, mtime = statKey(path)
+        with self.lock:
+            row = self.db.execute('SELECT `inode`, `size`, `mtime`, `digest` FROM `fingerprints` WHERE `path` = ?', [path]).fetchone()
+        if row is not None and tuple(row[:3]) == (inode, size, mtime):
+            return str(row[3])
+
+        digest = hashFile(path)
+        with self.lock:
+            self.hashed += 1
+            self.db.execute('INSERT OR REPLACE INTO `fingerprints` (`path`, `inode`, `size`, `mtime`, `digest`) VALUES (?, ?, ?, ?, ?)', [path, inode, size, mtime, digest])
+            self.pending += 1
+            if self.pending >= COMMIT_INTERVAL:
+                self.commit()
+        return digest
+
+    def sameContents(self, path1, path2):
+        '''
+        Check whether two files have the same contents.
+        Files of different sizes are never read.
+        @return:  True if the contents are the same
+        '''
+        if os.path.getsize(path1) != os.path.getsize(path2):
+            return False
+        return self.fingerprint(path1) == self.fingerprint(path2)
+
+    def commit(self):
+        '''Write out any fingerprints not stored yet.'''
+        with self.lock:
+            if self.pending:
+                self.db.commit()
+                self.pending = 0
+
+_cache = None
+_cacheLock = threading.Lock()
+
+def getCache():
+    '''
+    Get the game's fingerprint cache, opening it if need be.
+    @return:  L{FingerprintCache} kept in /userdata
+    '''
+    global _cache
+    with _cacheLock:
+        if _cache is None:
+            _cache = FingerprintCache(VFS.openSqlite3('/userdata/FingerprintCache.sqlite', anyThread = True))
+    return _cache
+
+def fingerprint(path):
+    '''Get the fingerprint of a file from the game's fingerprint cache.'''
+    return getCache().fingerprint(path)
+
+def sameContents(path1, path2):
+    '''Check whether two files have the same contents, using the game's fingerprint cache.'''
+    return getCache().sameContents(path1, path2)
+
+def commit():
+    '''Write out the game's fingerprint cache.'''
+    if _cache is not None:
+        _cache.commit()
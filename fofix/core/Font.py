@@ -175,7 +175,7 @@ class Font:
             t,w,h = self.stringsCache.get(text)
         except KeyError:
             s = self.font.render(text, True, (255,255,255))
-            t = Texture()
+            t = Texture(owner = OWNER_FONT)
             t.setFilter(GL_LINEAR, GL_LINEAR)
             t.setRepeat(GL_CLAMP, GL_CLAMP)
             t.loadSurface(s, alphaChannel = True)
@@ -60,6 +60,9 @@ from fofix.core import Version
 from fofix.core import Player
 from fofix.core import Log
 from fofix.core import Mod
+from fofix.core import VFS
+from fofix.core import TextureData
+from fofix.core.Texture import textureManager
 from fofix.game import Dialogs
 
 from fofix.game.World import World
@@ -263,6 +266,15 @@ class GameEngine(object):
         if self.config.get("video", "shader_use"):
             shaders.set(os.path.join(Version.dataPath(), "shaders"))
 
+        textureManager.budget = self.config.get("performance", "texture_budget") * 1024 * 1024
+
+        textureCacheSize = self.config.get("performance", "texture_cache_size")
+        if textureCacheSize:
+            try:
+                TextureData.setCacheDir(VFS.resolveWrite("/userdata/texcache"), textureCacheSize * 1024 * 1024)
+            except (IOError, OSError), e:
+                Log.warn("Unable to set up the texture cache: %s" % e)
+
         # Enable the high priority timer if configured
         if self.priority:
             Log.debug("Enabling high priority timer.")
@@ -286,6 +298,7 @@ class GameEngine(object):
         self.resizeScreen(w, h)
 
         self.resource  = Resource(Version.dataPath())
+        textureManager.loader = lambda function, onLoad: self.resource.load(None, None, function, onLoad = onLoad)
         self.mainloop  = self.loading
         self.menuMusic = False
 
@@ -456,7 +469,7 @@ class GameEngine(object):
         self.gameStarted = False
         self.view.pushLayer(self.mainMenu)
 
-    def loadImgDrawing(self, target, name, fileName, textureSize = None):
+    def loadImgDrawing(self, target, name, fileName, textureSize = None, owner = OWNER_OTHER):
         """
         Load an SVG drawing synchronously.
 
@@ -465,9 +478,10 @@ class GameEngine(object):
         @param fileName:    The name of the file in the data directory
         @param textureSize: Either None or (x, y), in which case the file will
                             be rendered to an x by y texture
+        @param owner:       What the texture is for (one of the OWNER_* constants)
         @return:            L{ImgDrawing} instance
         """
-        return self.data.loadImgDrawing(target, name, fileName, textureSize)
+        return self.data.loadImgDrawing(target, name, fileName, textureSize, owner)
 
     #volshebnyi
     def drawStarScore(self, screenwidth, screenheight, xpos, ypos, stars, scale = None, horiz_spacing = 1.2, space = 1.0, hqStar = False, align = LEFT):
@@ -607,5 +621,6 @@ class GameEngine(object):
         # Move tick and fps limiting here, the old location did not work well.
         self.tickDelta = self.clock.tick()
         rtn = self.mainloop()
+        textureManager.update()
         self.clock.delay(self.fps)
         return rtn
@@ -27,7 +27,8 @@ import numpy as np
 from PIL import Image
 from OpenGL.GL import *
 
-from fofix.core.Texture import Texture
+from fofix.core.Texture import Texture, textureCache
+from fofix.core.TextureData import TextureData
 from fofix.core.constants import *
 from fofix.core import Log
 from fofix.core import cmgl
@@ -190,7 +191,11 @@ def draw3Dtex(image, vertex, texcoord, coord = None, scale = None, rot = None, c
 class ImgDrawing(object):
     VTX_ARRAY = np.array([[0.0, 1.0], [1.0, 1.0], [1.0, 0.0], [0.0, 0.0]], dtype=np.float32) #hard-coded quad for drawing textures onto
 
-    def __init__(self, context, ImgData):
+    def __init__(self, context, ImgData, owner = OWNER_OTHER, data = None):
+        """
+        @param ImgData:  Image file name, open file, PIL image or L{TextureData}
+        @param data:     L{TextureData} already decoded from the named file
+        """
         self.ImgData = None
         self.texture = None
         self.context = context
@@ -201,10 +206,13 @@ class ImgDrawing(object):
         if isinstance(ImgData, file):
             self.ImgData = ImgData.read()
         elif isinstance(ImgData, basestring):
-            self.texture = Texture(ImgData)
+            self.texture = textureCache.get(ImgData, owner = owner, data = data)
         elif isinstance(ImgData, Image.Image): #stump: let a PIL image be passed in
-            self.texture = Texture()
+            self.texture = Texture(owner = owner)
             self.texture.loadImage(ImgData)
+        elif isinstance(ImgData, TextureData): # decoded beforehand, maybe in another thread
+            self.texture = Texture(owner = owner)
+            self.texture.loadData(ImgData)
 
         # Make sure we have a valid texture
         if not self.texture:
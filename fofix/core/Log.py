@@ -30,6 +30,7 @@ import sys
 import time
 import warnings
 import traceback
+import multiprocessing
 
 from fofix.core.Unicode import utf8
 from fofix.core import Version
@@ -38,15 +39,22 @@ from fofix.core import VFS
 # Whether to output log entries to stdout in addition to the logfile.
 quiet = True
 
+# Worker processes that import this module again (song scanning on Windows)
+# add to the game's logfile instead of starting it over.
+if multiprocessing.current_process().name == 'MainProcess':
+    _logMode = 'w'
+else:
+    _logMode = 'a'
+
 # File object representing the logfile.
 if os.name == "posix": # evilynux - logfile in ~/.fofix/ for GNU/Linux and MacOS X
     # evilynux - Under MacOS X, put the logs in ~/Library/Logs
     if os.uname()[0] == "Darwin":
-        logFile = open(os.path.expanduser('~/Library/Logs/%s.log' % Version.PROGRAM_UNIXSTYLE_NAME), 'w')
+        logFile = open(os.path.expanduser('~/Library/Logs/%s.log' % Version.PROGRAM_UNIXSTYLE_NAME), _logMode)
     else: # GNU/Linux et al.
-        logFile = VFS.open('/userdata/%s.log' % Version.PROGRAM_UNIXSTYLE_NAME, 'w')
+        logFile = VFS.open('/userdata/%s.log' % Version.PROGRAM_UNIXSTYLE_NAME, _logMode)
 else:
-    logFile = VFS.open('/userdata/%s.log' % Version.PROGRAM_UNIXSTYLE_NAME, 'w')
+    logFile = VFS.open('/userdata/%s.log' % Version.PROGRAM_UNIXSTYLE_NAME, _logMode)
 
 if "-v" in sys.argv or "--verbose" in sys.argv:
     quiet = False
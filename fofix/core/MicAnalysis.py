@@ -0,0 +1,219 @@
+#####################################################################
+# -*- coding: iso-8859-1 -*-                                        #
+#                                                                   #
+# Frets on Fire X (FoFiX)                                           #
+# Copyright (C) 2012 FoFiX Team                                     #
+#                                                                   #
+# This program is free software; you can redistribute it and/or     #
+# modify it under the terms of the GNU General Public License       #
+# as published by the Free Software Foundation; either version 2    #
+# of the License, or (at your option) any later version.            #
+#                                                                   #
+# This program is distributed in the hope that it will be useful,   #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of    #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the     #
+# GNU General Public License for more details.                      #
+#                                                                   #
+# You should have received a copy of the GNU General Public License #
+# along with this program; if not, write to the Free Software       #
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,        #
+# MA  02110-1301, USA.                                              #
+#####################################################################
+
+'''
+Pitch analysis of microphone input, in a thread of its own.
+
+The thread reads the input a chunk at a time and runs it through a pypitch
+analyzer.  Each chunk becomes a L{PitchFrame}, stamped with the time its
+last sample was captured.  The frames are put on a deque; appending to one
+end and popping from the other are atomic, so the game takes frames off
+without any locking.  It can then score each one at the song position it
+was sung at, however often the game gets around to looking.
+'''
+
+import math
+import wave
+import threading
+import collections
+
+import numpy as np
+
+from fofix.core import Log
+from fofix.core.timer import timeFunc
+
+# Samples analyzed at a time.
+CHUNK_SIZE = 1024
+
+# Most frames kept waiting for the game; older ones are dropped.  This is
+# about ten seconds' worth at 44.1 kHz.
+QUEUE_LENGTH = 512
+
+# If a chunk's estimated capture time falls this far (in seconds) behind the
+# clock, input was lost (e.g. an overflow) and the estimate starts over.
+RESYNC_TIME = 0.1
+
+# Precompute these in the interest of saving CPU time in the note analysis loop
+LN_2 = math.log(2.0)
+LN_440 = math.log(440.0)
+
+# time:      When the last sample of the chunk was captured, in seconds of timeFunc()
+# pitch:     Frequency of the note being sung, or None if there isn't one
+# peak:      Amplitude (in dB) of the peak of the chunk
+# formants:  List of the formant frequencies, with None for any not found
+PitchFrame = collections.namedtuple('PitchFrame', 'time pitch peak formants')
+
+# Turn a frequency into a number of semitones above A-440.
+def semitonesFromA440(freq):
+    return (math.log(freq) - LN_440) * 12.0 / LN_2
+
+# Work out how accurately the note (passed in as a MIDI note number) is being
+# sung.  Return a float in the range [-6.0, 6.0] representing the number of
+# semitones difference there is from the nearest occurrence of the note.  The
+# octave doesn't matter.  Or return None if there's no note being sung.
+def getDeviation(pitch, midiNote):
+    if pitch is None:
+        return None
+    # midiNote % 12 = semitones above C, which is 3 semitones above A
+    semitoneDifference = (semitonesFromA440(pitch) - 3.0) - float(midiNote % 12)
+    # Adjust to the proper range.
+    acc = math.fmod(semitoneDifference, 12.0)
+    if acc > 6.0:
+        acc -= 12.0
+    elif acc < -6.0:
+        acc += 12.0
+    return acc
+
+class WavSource(object):
+    '''
+    Reads a WAV file as if it were microphone input, for testing the
+    analysis without a sound card.  Multi-channel files are mixed to mono.
+    '''
+    def __init__(self, fileName):
+        self.wav = wave.open(fileName, 'rb')
+        self.samprate = self.wav.getframerate()
+        self.channels = self.wav.getnchannels()
+        if self.wav.getsampwidth() != 2:
+            raise ValueError('%s: only 16-bit WAV files are supported' % fileName)
+
+    def read(self, frames):
+        '''@return:  Up to that many frames of float32 samples, '' at the end'''
+        data = self.wav.readframes(frames)
+        if not data:
+            return ''
+        samples = np.frombuffer(data, dtype='<i2').astype(np.float32) / 32768.0
+        if self.channels > 1:
+            samples = samples.reshape(-1, self.channels).mean(axis = 1).astype(np.float32)
+        return samples.tostring()
+
+    def close(self):
+        self.wav.close()
+
+class MicAnalyzer(object):
+    def __init__(self, read, analyzer, samprate, chunkSize = CHUNK_SIZE, onChunk = None, clock = timeFunc):
+        '''
+        @param read:       Function reading a number of frames of float32
+                           input, blocking until they are there; returns ''
+                           when the input has ended
+        @param analyzer:   pypitch.Analyzer for the input's sample rate
+        @param samprate:   Sample rate of the input
+        @param chunkSize:  Frames to analyze at a time
+        @param onChunk:    Function to also pass each chunk read to, from
+                           the analysis thread, e.g. for passthrough
+        @param clock:      Function giving the time, in seconds
+        '''
+        self.read      = read
+        self.analyzer  = analyzer
+        self.samprate  = float(samprate)
+        self.chunkSize = chunkSize
+        self.onChunk   = onChunk
+        self.clock     = clock
+
+        self.frames = collections.deque(maxlen = QUEUE_LENGTH)
+        self.latest = None
+        self.thread = None
+        self.running = False
+
+        self.lastPeak     = 0
+        self.detectTaps   = True
+        self.tapStatus    = False
+        self.tapThreshold = 0.0
+
+    def start(self):
+        if self.thread is None:
+            self.running = True
+            self.thread = threading.Thread(target = self.run, name = 'MicAnalyzer')
+            self.thread.daemon = True
+            self.thread.start()
+
+    def stop(self):
+        '''Stop analyzing, once the chunk being read is done.'''
+        if self.thread is not None:
+            self.running = False
+            self.thread.join()
+            self.thread = None
+
+    def isRunning(self):
+        return self.thread is not None and self.thread.isAlive()
+
+    def getFrames(self):
+        '''Take all the frames analyzed since the last call, oldest first.'''
+        frames = []
+        try:
+            while True:
+                frames.append(self.frames.popleft())
+        except IndexError:
+            pass
+        return frames
+
+    # Get the microphone tap status.
+    # When a tap occurs, it is remembered until this function is called.
+    def getTap(self):
+        retval = self.tapStatus
+        self.tapStatus = False
+        return retval
+
+    def run(self):
+        try:
+            self.analyze()
+        except Exception, e:
+            Log.error('Microphone analysis stopped: %s' % e)
+        self.running = False
+
+    def analyze(self):
+        start = None
+        samples = 0
+        while self.running:
+            chunk = self.read(self.chunkSize)
+            if not chunk:
+                break
+            now = self.clock()
+            samples += len(chunk) // 4
+
+            # Time the chunk by samples rather than by when read() returned, which
+            # comes in bursts; only fall back on the clock if input went missing.
+            captured = None
+            if start is not None:
+                captured = start + samples / self.samprate
+            if captured is None or now - captured > RESYNC_TIME:
+                start = now - samples / self.samprate
+                captured = now
+
+            if self.onChunk is not None:
+                self.onChunk(chunk)
+
+            self.analyzer.input(chunk)
+            self.analyzer.process()
+            peak = self.analyzer.getPeak()
+            tone = self.analyzer.findTone()
+            pitch = None
+            if tone is not None:
+                pitch = tone.freq
+            frame = PitchFrame(captured, pitch, peak, self.analyzer.getFormants())
+
+            if self.detectTaps:
+                if peak > self.tapThreshold and peak > self.lastPeak + 5.0:
+                    self.tapStatus = True
+            self.lastPeak = peak
+
+            self.latest = frame
+            self.frames.append(frame)
@@ -21,13 +21,10 @@
 # MA  02110-1301, USA.                                              #
 #####################################################################
 
-import math
-import numpy as np
-
 from fofix.core import Log
 from fofix.core import Audio
-from fofix.core.Task import Task
 from fofix.core.Language import _
+from fofix.core.MicAnalysis import MicAnalyzer, semitonesFromA440, getDeviation
 
 try:
     import pyaudio
@@ -40,10 +37,6 @@ except ImportError:
 if supported:
     pa = pyaudio.PyAudio()
 
-    # Precompute these in the interest of saving CPU time in the note analysis loop
-    LN_2 = math.log(2.0)
-    LN_440 = math.log(440.0)
-
     #stump: return dictionary mapping indices to device names
     # -1 is magic for the default device and will be replaced by None when actually opening the mic.
     def getAvailableMics():
@@ -54,9 +47,8 @@ if supported:
                 result[devnum] = devinfo['name']
         return result
 
-    class Microphone(Task):
+    class Microphone(object):
         def __init__(self, engine, controlnum, samprate=44100):
-            Task.__init__(self)
             self.engine = engine
             self.controlnum = controlnum
             devnum = self.engine.input.controls.micDevice[controlnum]
@@ -66,21 +58,20 @@ if supported:
             else:
                 self.devname = pa.get_device_info_by_index(devnum)['name']
             self.mic = pa.open(samprate, 1, pyaudio.paFloat32, input=True, input_device_index=devnum, start=False)
-            self.analyzer = pypitch.Analyzer(samprate)
             self.mic_started = False
-            self.lastPeak    = 0
-            self.detectTaps  = True
-            self.tapStatus   = False
-            self.tapThreshold = -self.engine.input.controls.micTapSensitivity[controlnum]
-            self.passthroughQueue = []
             passthroughVolume = self.engine.input.controls.micPassthroughVolume[controlnum]
             if passthroughVolume > 0.0:
                 Log.debug('Microphone: creating passthrough stream at %d%% volume' % round(passthroughVolume * 100))
-                self.passthroughStream = Audio.MicrophonePassthroughStream(engine, self)
+                self.passthroughStream = Audio.MicrophonePassthroughStream(engine, samprate)
                 self.passthroughStream.setVolume(passthroughVolume)
+                onChunk = self.passthroughStream.write
             else:
                 Log.debug('Microphone: not creating passthrough stream')
                 self.passthroughStream = None
+                onChunk = None
+            # Capture and pitch analysis happen in a thread of their own.
+            self.analysis = MicAnalyzer(self.read, pypitch.Analyzer(samprate), samprate, onChunk=onChunk)
+            self.analysis.tapThreshold = -self.engine.input.controls.micTapSensitivity[controlnum]
 
         def __del__(self):
             self.stop()
@@ -90,7 +81,7 @@ if supported:
             if not self.mic_started:
                 self.mic_started = True
                 self.mic.start_stream()
-                self.engine.addTask(self, synchronized=False)
+                self.analysis.start()
                 Log.debug('Microphone: started %s' % self.devname)
                 if self.passthroughStream is not None:
                     Log.debug('Microphone: starting passthrough stream')
@@ -101,80 +92,70 @@ if supported:
                 if self.passthroughStream is not None:
                     Log.debug('Microphone: stopping passthrough stream')
                     self.passthroughStream.stop()
-                self.engine.removeTask(self)
+                self.analysis.stop()
                 self.mic.stop_stream()
                 self.mic_started = False
                 Log.debug('Microphone: stopped %s' % self.devname)
 
-        # Called by the Task machinery: pump the mic and shove the data through the analyzer.
-        def run(self, ticks):
-            while self.mic.get_read_available() > 1024:
-                try:
-                    chunk = self.mic.read(1024)
-                except IOError, e:
-                    if e.args[1] == pyaudio.paInputOverflowed:
-                        Log.notice('Microphone: ignoring input buffer overflow')
-                        chunk = '\x00' * 4096
-                    else:
-                        raise
-                if self.passthroughStream is not None:
-                    self.passthroughQueue.append(chunk)
-                self.analyzer.input(np.frombuffer(chunk, dtype=np.float32))
-                self.analyzer.process()
-                pk = self.analyzer.getPeak()
-                if self.detectTaps:
-                    if pk > self.tapThreshold and pk > self.lastPeak + 5.0:
-                        self.tapStatus = True
-                self.lastPeak = pk
+        # Called from the analysis thread: block until the next chunk is in.
+        def read(self, frames):
+            try:
+                return self.mic.read(frames)
+            except IOError, e:
+                if e.args[1] == pyaudio.paInputOverflowed:
+                    Log.notice('Microphone: ignoring input buffer overflow')
+                    return '\x00' * (4 * frames)
+                raise
+
+        def _getDetectTaps(self):
+            return self.analysis.detectTaps
+        def _setDetectTaps(self, value):
+            self.analysis.detectTaps = value
+        detectTaps = property(_getDetectTaps, _setDetectTaps)
+
+        # Take the pitch frames analyzed since the last call, oldest first.
+        # See MicAnalysis.PitchFrame.
+        def getFrames(self):
+            return self.analysis.getFrames()
 
         # Get the amplitude (in dB) of the peak of the most recent input window.
         def getPeak(self):
-            return self.analyzer.getPeak()
+            frame = self.analysis.latest
+            if frame is None:
+                return -100.0
+            return frame.peak
 
         # Get the microphone tap status.
         # When a tap occurs, it is remembered until this function is called.
         def getTap(self):
-            retval = self.tapStatus
-            self.tapStatus = False
-            return retval
+            return self.analysis.getTap()
 
         def getFormants(self):
-            return self.analyzer.getFormants()
-
-        # Get the note currently being sung.
-        # Returns None if there isn't one or a pypitch.Tone object if there is.
-        def getTone(self):
-            return self.analyzer.findTone()
+            frame = self.analysis.latest
+            if frame is None:
+                return [None, None]
+            return frame.formants
+
+        # Get the frequency of the note currently being sung, or None if there isn't one.
+        def getPitch(self):
+            frame = self.analysis.latest
+            if frame is None:
+                return None
+            return frame.pitch
 
         # Get the note currently being sung, as an integer number of semitones above A.
         # The frequency is rounded to the nearest semitone, then shifted by octaves until
         # the result is between 0 and 11 (inclusive).  Returns None is no note is being sung.
         def getSemitones(self):
-            tone = self.analyzer.findTone()
-            if tone is None:
-                return tone
-            return int(round((math.log(tone.freq) - LN_440) * 12.0 / LN_2) % 12)
+            pitch = self.getPitch()
+            if pitch is None:
+                return None
+            return int(round(semitonesFromA440(pitch)) % 12)
 
         # Work out how accurately the note (passed in as a MIDI note number) is being
-        # sung.  Return a float in the range [-6.0, 6.0] representing the number of
-        # semitones difference there is from the nearest occurrence of the note.  The
-        # octave doesn't matter.  Or return None if there's no note being sung.
+        # sung, from the most recent input window.  See MicAnalysis.getDeviation.
         def getDeviation(self, midiNote):
-            tone = self.analyzer.findTone()
-            if tone is None:
-                return tone
-
-            # Convert to semitones from A-440.
-            semitonesFromA440 = (math.log(tone.freq) - LN_440) * 12.0 / LN_2
-            # midiNote % 12 = semitones above C, which is 3 semitones above A
-            semitoneDifference = (semitonesFromA440 - 3.0) - float(midiNote % 12)
-            # Adjust to the proper range.
-            acc = math.fmod(semitoneDifference, 12.0)
-            if acc > 6.0:
-                acc -= 12.0
-            elif acc < -6.0:
-                acc += 12.0
-            return acc
+            return getDeviation(self.getPitch(), midiNote)
 
 
 else:
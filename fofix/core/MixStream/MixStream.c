@@ -20,12 +20,31 @@
 
 #include "MixStream.h"
 
-#include "soundtouch-c.h"
+#include "stretch.h"
 #include <SDL_mixer.h>
 #include <SDL.h>
 
+#ifdef G_OS_WIN32
+#include <windows.h>
+#else
+#include <time.h>
+#endif
+
 #define FRAMES_PER_CHUNK 4096
 
+/* How many chunks the decoder thread may get ahead of playback, at most
+ * and by default. Pitch and speed changes are heard once the chunks
+ * decoded before them have played.
+ */
+#define RING_CHUNKS 8
+
+typedef struct {
+  guint8* buf;
+  double start_time;
+  double end_time;
+  double speed;
+} MixStreamSlot;
+
 struct _MixStream {
   int samprate;
   int channels;
@@ -35,27 +54,63 @@ struct _MixStream {
   mix_stream_free_cb free_cb;
   void* cb_data;
   int channel;
-  SoundTouch* soundtouch;
+  MixStreamStretch* stretch;
   Mix_Chunk chunk;
-  gboolean input_eof;
   gboolean eof;
-  int out_freq;
-  Uint16 out_format;
-  int out_channels;
-  int out_sample_size;
-  gboolean out_samples_signed;
-  gboolean byteswap_needed;
+  MixStreamFormat out;
   GMutex* st_mutex;
   double next_read_time;
   double out_speed;
   double chunk_start_time;
-  Uint32 chunk_start_ticks;
+  double chunk_end_time;
+  double chunk_speed;
+  gboolean chunk_silent;
+  gint64 chunk_start_usec;
+
+  /* Chunks are decoded and converted ahead of time by a thread of the
+   * stream's own into this ring, so all the channel-finished callback has
+   * to do is copy the next one out. There is only ever one writer (the
+   * decoder thread) and one reader (the callback), so the read and write
+   * counts are just updated atomically.
+   *
+   * A seek doesn't touch the read count itself: it notes where the chunks
+   * from after the seek will start and bumps seek_serial, and the reader
+   * skips ahead to there when it next looks at the ring. Until it has, the
+   * decoder thread leaves the ring alone, so no slot the reader might still
+   * be copying out gets overwritten.
+   */
+  gsize chunk_size;
+  MixStreamSlot ring[RING_CHUNKS];
+  guint decode_ahead;
+  volatile gint ring_read;
+  volatile gint ring_write;
+  volatile gint ring_flush;
+  volatile gint seek_serial;
+  volatile gint seen_serial;
+  double flush_time;
+  volatile gint producer_eof;
+  volatile gint underruns;
+  volatile gint overruns;
+  volatile gint direct_chunks;
+  volatile gint soundtouch_chunks;
+  double next_play_time;
+  guint8* silence;
+  GThread* producer;
+  gboolean producer_quit;
+  /* Held while decoding a chunk or seeking. */
+  GMutex* decode_mutex;
+  /* Only ever held for a moment, to wait on or signal the conditions, so
+   * the callback can take it to wake the decoder thread.
+   */
+  GMutex* producer_mutex;
+  GCond* space_cond;
+  GCond* data_cond;
 };
 
 static GHashTable* chan_table = NULL;
 static GStaticMutex chan_table_mutex = G_STATIC_MUTEX_INIT;
 
-static void _mix_stream_soundtouchify(MixStream* stream);
+static gint64 _mix_stream_clock_usec(void);
 
 
 /* Create a stream that will play data returned by read_cb.
@@ -70,6 +125,8 @@ MixStream* mix_stream_new(int samprate, int channels, mix_stream_read_cb read_cb
   mix_stream_free_cb free_cb, void* data, GError** err)
 {
   MixStream* stream;
+  float* zeros;
+  int i;
 
   if (!g_thread_supported())
     g_thread_init(NULL);
@@ -86,36 +143,34 @@ MixStream* mix_stream_new(int samprate, int channels, mix_stream_read_cb read_cb
   stream->chunk.volume = MIX_MAX_VOLUME;
   stream->out_speed = 1.0;
 
-  if (!Mix_QuerySpec(&stream->out_freq, &stream->out_format, &stream->out_channels)) {
-    g_set_error(err, MIX_STREAM_ERROR, MIX_STREAM_MIXER_UNINIT,
-      "SDL_mixer is not initialized");
+  if (!mix_stream_format_query(&stream->out, err)) {
     g_free(stream);
     return NULL;
   }
 
-  switch (stream->out_format) {
-    case AUDIO_S8:     stream->out_sample_size = 1; stream->out_samples_signed = TRUE ; stream->byteswap_needed = FALSE; break;
-    case AUDIO_U8:     stream->out_sample_size = 1; stream->out_samples_signed = FALSE; stream->byteswap_needed = FALSE; break;
-#if G_BYTE_ORDER == G_LITTLE_ENDIAN
-    case AUDIO_S16LSB: stream->out_sample_size = 2; stream->out_samples_signed = TRUE ; stream->byteswap_needed = FALSE; break;
-    case AUDIO_U16LSB: stream->out_sample_size = 2; stream->out_samples_signed = FALSE; stream->byteswap_needed = FALSE; break;
-    case AUDIO_S16MSB: stream->out_sample_size = 2; stream->out_samples_signed = TRUE ; stream->byteswap_needed = TRUE ; break;
-    case AUDIO_U16MSB: stream->out_sample_size = 2; stream->out_samples_signed = FALSE; stream->byteswap_needed = TRUE ; break;
-#else
-    case AUDIO_S16LSB: stream->out_sample_size = 2; stream->out_samples_signed = TRUE ; stream->byteswap_needed = TRUE ; break;
-    case AUDIO_U16LSB: stream->out_sample_size = 2; stream->out_samples_signed = FALSE; stream->byteswap_needed = TRUE ; break;
-    case AUDIO_S16MSB: stream->out_sample_size = 2; stream->out_samples_signed = TRUE ; stream->byteswap_needed = FALSE; break;
-    case AUDIO_U16MSB: stream->out_sample_size = 2; stream->out_samples_signed = FALSE; stream->byteswap_needed = FALSE; break;
-#endif
-    default: g_assert_not_reached(); break;
-  }
-
   stream->st_mutex = g_mutex_new();
 
-  if (stream->samprate != stream->out_freq) {
-    _mix_stream_soundtouchify(stream);
-    soundtouch_set_rate(stream->soundtouch, (float)stream->samprate/(float)stream->out_freq);
-  }
+  stream->stretch = mix_stream_stretch_new(stream->samprate, stream->channels, read_cb, data);
+  if (stream->samprate != stream->out.freq)
+    mix_stream_stretch_set_rate(stream->stretch, (float)stream->samprate/(float)stream->out.freq);
+
+  stream->chunk_size = FRAMES_PER_CHUNK;
+  stream->decode_ahead = RING_CHUNKS;
+  stream->chunk.abuf = g_malloc0(stream->chunk_size);
+  stream->chunk.alen = stream->chunk_size;
+  for (i = 0; i < RING_CHUNKS; i++)
+    stream->ring[i].buf = g_malloc(stream->chunk_size);
+
+  /* What to play if the decoder ever falls behind. */
+  stream->silence = g_malloc(stream->chunk_size);
+  zeros = g_new0(float, stream->chunk_size * stream->channels);
+  mix_stream_format_convert(&stream->out, stream->channels, zeros, stream->silence, stream->chunk_size);
+  g_free(zeros);
+
+  stream->decode_mutex = g_mutex_new();
+  stream->producer_mutex = g_mutex_new();
+  stream->space_cond = g_cond_new();
+  stream->data_cond = g_cond_new();
 
   return stream;
 }
@@ -124,128 +179,125 @@ MixStream* mix_stream_new(int samprate, int channels, mix_stream_read_cb read_cb
 /* Free a MixStream. */
 void mix_stream_destroy(MixStream* stream)
 {
+  int i;
+
   if (stream->channel != -1)
     mix_stream_stop(stream);
+
+  if (stream->producer != NULL) {
+    g_mutex_lock(stream->producer_mutex);
+    stream->producer_quit = TRUE;
+    g_cond_broadcast(stream->space_cond);
+    g_mutex_unlock(stream->producer_mutex);
+    g_thread_join(stream->producer);
+  }
+  g_cond_free(stream->data_cond);
+  g_cond_free(stream->space_cond);
+  g_mutex_free(stream->producer_mutex);
+  g_mutex_free(stream->decode_mutex);
+  for (i = 0; i < RING_CHUNKS; i++)
+    g_free(stream->ring[i].buf);
+  g_free(stream->silence);
+  g_free(stream->chunk.abuf);
+
   g_mutex_free(stream->st_mutex);
-  if (stream->soundtouch != NULL)
-    soundtouch_delete(stream->soundtouch);
+  mix_stream_stretch_destroy(stream->stretch);
   if (stream->free_cb != NULL)
     stream->free_cb(stream->cb_data);
   g_free(stream);
 }
 
 
-/* Ensure the stream is using a soundtouch object. */
-static void _mix_stream_soundtouchify(MixStream* stream)
-{
-  g_mutex_lock(stream->st_mutex);
-  if (stream->soundtouch == NULL) {
-    stream->soundtouch = soundtouch_new();
-    soundtouch_set_sample_rate(stream->soundtouch, stream->samprate);
-    soundtouch_set_channels(stream->soundtouch, stream->channels);
-  }
-  g_mutex_unlock(stream->st_mutex);
-}
-
-
-/* Fill a float buffer using a read callback and possibly a SoundTouch object. */
+/* Fill a float buffer using a read callback, through SoundTouch while
+ * there is any rate, tempo or pitch change to do.
+ */
 static gsize _mix_stream_fill_floatbuf(MixStream* stream, float* buf, gsize numframes, guint channels)
 {
   const gsize frame_size = sizeof(float) * channels;
-  gsize frames_obtained = 0;
-  gsize frames_read;
-  while (numframes > 0) {
+  gsize frames_obtained;
 
-    g_mutex_lock(stream->st_mutex);
-    if (stream->soundtouch == NULL) {
-      frames_read = stream->read_cb(buf, numframes * frame_size, stream->cb_data) / frame_size;
-    } else {
-      while (!stream->input_eof && soundtouch_num_samples(stream->soundtouch) < numframes) {
-        frames_read = stream->read_cb(buf, numframes * frame_size, stream->cb_data) / frame_size;
-        if (frames_read == 0) {
-          stream->input_eof = TRUE;
-          soundtouch_flush(stream->soundtouch);
-          break;
-        }
-        soundtouch_put_samples(stream->soundtouch, buf, frames_read);
-      }
-      frames_read = soundtouch_receive_samples(stream->soundtouch, buf, numframes);
-    }
-    g_mutex_unlock(stream->st_mutex);
+  g_mutex_lock(stream->st_mutex);
+  frames_obtained = mix_stream_stretch_read(stream->stretch, buf, numframes);
+  if (frames_obtained != 0) {
+    if (mix_stream_stretch_was_engaged(stream->stretch))
+      g_atomic_int_inc(&stream->soundtouch_chunks);
+    else
+      g_atomic_int_inc(&stream->direct_chunks);
+  }
+  g_mutex_unlock(stream->st_mutex);
 
-    if (frames_read == 0) {
-      if (frames_obtained != 0) {
-        /* Fill up the rest of the buffer with silence. */
-        memset(buf, 0, numframes * frame_size);
-        frames_obtained += numframes;
-      }
-      stream->eof = TRUE;
-      break;
+  if (frames_obtained < numframes) {
+    if (frames_obtained != 0) {
+      /* Fill up the rest of the buffer with silence. */
+      memset(buf + frames_obtained * channels, 0, (numframes - frames_obtained) * frame_size);
+      frames_obtained = numframes;
     }
-
-    frames_obtained += frames_read;
-    buf += frames_read * channels;
-    numframes -= frames_read;
+    stream->eof = TRUE;
   }
   return frames_obtained;
 }
 
 
-/* Set the stream's audio chunk be the next size bytes of audio. */
-static gboolean _mix_stream_nextchunk(MixStream* stream, gsize size)
+/* Find out what format SDL_mixer wants samples in. */
+gboolean mix_stream_format_query(MixStreamFormat* fmt, GError** err)
 {
-  // compute necessary number of samples
-  // if there's an active soundtouch object:
-  //   while not enough samples in soundtouch output:
-  //     call callback to get more samples
-  //     feed new samples to soundtouch
-  // else:
-  //   call callback to get samples
-  // perform any necessary conversions
-  int needed_frames;
-  int obtained_frames;
-  float* floatbuf;
-  guint8* out_buf;
+  Uint16 format;
 
-  if (stream->eof)
+  if (!Mix_QuerySpec(&fmt->freq, &format, &fmt->channels)) {
+    g_set_error(err, MIX_STREAM_ERROR, MIX_STREAM_MIXER_UNINIT,
+      "SDL_mixer is not initialized");
     return FALSE;
-
-  if (stream->chunk.alen < size) {
-    stream->chunk.abuf = g_realloc(stream->chunk.abuf, size);
-    stream->chunk.alen = size;
   }
-  out_buf = stream->chunk.abuf;
+  fmt->format = format;
 
-  needed_frames = size / (stream->out_channels * stream->out_sample_size);
+  switch (format) {
+    case AUDIO_S8:     fmt->sample_size = 1; fmt->samples_signed = TRUE ; fmt->byteswap_needed = FALSE; break;
+    case AUDIO_U8:     fmt->sample_size = 1; fmt->samples_signed = FALSE; fmt->byteswap_needed = FALSE; break;
+#if G_BYTE_ORDER == G_LITTLE_ENDIAN
+    case AUDIO_S16LSB: fmt->sample_size = 2; fmt->samples_signed = TRUE ; fmt->byteswap_needed = FALSE; break;
+    case AUDIO_U16LSB: fmt->sample_size = 2; fmt->samples_signed = FALSE; fmt->byteswap_needed = FALSE; break;
+    case AUDIO_S16MSB: fmt->sample_size = 2; fmt->samples_signed = TRUE ; fmt->byteswap_needed = TRUE ; break;
+    case AUDIO_U16MSB: fmt->sample_size = 2; fmt->samples_signed = FALSE; fmt->byteswap_needed = TRUE ; break;
+#else
+    case AUDIO_S16LSB: fmt->sample_size = 2; fmt->samples_signed = TRUE ; fmt->byteswap_needed = TRUE ; break;
+    case AUDIO_U16LSB: fmt->sample_size = 2; fmt->samples_signed = FALSE; fmt->byteswap_needed = TRUE ; break;
+    case AUDIO_S16MSB: fmt->sample_size = 2; fmt->samples_signed = TRUE ; fmt->byteswap_needed = FALSE; break;
+    case AUDIO_U16MSB: fmt->sample_size = 2; fmt->samples_signed = FALSE; fmt->byteswap_needed = FALSE; break;
+#endif
+    default: g_assert_not_reached(); break;
+  }
+  return TRUE;
+}
 
-  floatbuf = g_newa(float, needed_frames * stream->channels);
-  obtained_frames = _mix_stream_fill_floatbuf(stream, floatbuf, needed_frames, stream->channels);
-  if (obtained_frames == 0)
-    return FALSE;
 
+/* Convert size bytes worth of float samples with the given number of
+ * channels into the mixer's format.
+ */
+void mix_stream_format_convert(const MixStreamFormat* fmt, int channels, const float* floatbuf, guint8* out_buf, gsize size)
+{
   while (size > 0) {
     float current_sample = *(floatbuf++);
     /* If we're converting stereo to mono, average this sample with the other channel's. */
-    if (stream->channels == 2 && stream->out_channels == 1)
+    if (channels == 2 && fmt->channels == 1)
       current_sample = (float)(0.5 * (current_sample + *(floatbuf++)));
     current_sample = CLAMP(current_sample, -1.0, 1.0);
 
 #define OUTPUT_SAMPLE(type, value) { *(type*)out_buf = (type)(value); out_buf += sizeof(type); size -= sizeof(type); }
 
     /* Convert and output the sample. */
-    if (stream->out_samples_signed) {
-      if (stream->out_sample_size == 1) {
+    if (fmt->samples_signed) {
+      if (fmt->sample_size == 1) {
         OUTPUT_SAMPLE(gint8, current_sample * G_MAXINT8);
-      } else if (!stream->byteswap_needed) {
+      } else if (!fmt->byteswap_needed) {
         OUTPUT_SAMPLE(gint16, current_sample * G_MAXINT16);
       } else {
         OUTPUT_SAMPLE(guint16, GUINT16_SWAP_LE_BE((guint16)(gint16)(current_sample * G_MAXINT16)));
       }
     } else {
       current_sample = (float)(current_sample * 0.5 + 0.5);
-      if (stream->out_sample_size == 1) {
+      if (fmt->sample_size == 1) {
         OUTPUT_SAMPLE(guint8, current_sample * G_MAXUINT8);
-      } else if (!stream->byteswap_needed) {
+      } else if (!fmt->byteswap_needed) {
         OUTPUT_SAMPLE(guint16, current_sample * G_MAXUINT16);
       } else {
         OUTPUT_SAMPLE(guint16, GUINT16_SWAP_LE_BE((guint16)(current_sample * G_MAXUINT16)));
@@ -253,8 +305,8 @@ static gboolean _mix_stream_nextchunk(MixStream* stream, gsize size)
     }
 
     /* If we're converting mono to stereo, duplicate the sample. */
-    if (stream->channels == 1 && stream->out_channels == 2) {
-      if (stream->out_sample_size == 1) {
+    if (channels == 1 && fmt->channels == 2) {
+      if (fmt->sample_size == 1) {
         OUTPUT_SAMPLE(guint8, *(guint8*)(out_buf - sizeof(guint8)));
       } else {
         OUTPUT_SAMPLE(guint16, *(guint16*)(out_buf - sizeof(guint16)));
@@ -264,9 +316,180 @@ static gboolean _mix_stream_nextchunk(MixStream* stream, gsize size)
 #undef OUTPUT_SAMPLE
 
   }
+}
+
+
+/* Decode the next chunk of audio into a ring slot. Called with the
+ * decode mutex held. Returns FALSE at the end of the stream.
+ */
+static gboolean _mix_stream_decode_chunk(MixStream* stream, MixStreamSlot* slot)
+{
+  // compute necessary number of samples
+  // if rate, tempo or pitch are changed (crossfading in or out as they change):
+  //   while not enough samples in soundtouch output:
+  //     call callback to get more samples
+  //     feed new samples to soundtouch
+  // else:
+  //   call callback to get samples
+  // perform any necessary conversions
+  int needed_frames;
+  int obtained_frames;
+  float* floatbuf;
+
+  if (stream->eof)
+    return FALSE;
+
+  needed_frames = stream->chunk_size / (stream->out.channels * stream->out.sample_size);
+
+  floatbuf = g_newa(float, needed_frames * stream->channels);
+  obtained_frames = _mix_stream_fill_floatbuf(stream, floatbuf, needed_frames, stream->channels);
+  if (obtained_frames == 0)
+    return FALSE;
+
+  mix_stream_format_convert(&stream->out, stream->channels, floatbuf, slot->buf, stream->chunk_size);
+
+  g_mutex_lock(stream->st_mutex);
+  slot->speed = stream->out_speed;
+  g_mutex_unlock(stream->st_mutex);
+  slot->start_time = stream->next_read_time;
+  stream->next_read_time += (slot->speed * obtained_frames) / stream->out.freq;
+  slot->end_time = stream->next_read_time;
+
+  return TRUE;
+}
+
+
+static guint _mix_stream_ring_fill(MixStream* stream)
+{
+  return (guint)g_atomic_int_get(&stream->ring_write) - (guint)g_atomic_int_get(&stream->ring_read);
+}
+
+
+/* Whether a seek has happened that the reader hasn't skipped ahead for yet. */
+static gboolean _mix_stream_flush_pending(MixStream* stream)
+{
+  return g_atomic_int_get(&stream->seen_serial) != g_atomic_int_get(&stream->seek_serial);
+}
+
+
+/* Whether the decoder thread has nothing to do for now. Called with the
+ * producer mutex held.
+ */
+static gboolean _mix_stream_producer_idle(MixStream* stream)
+{
+  return g_atomic_int_get(&stream->producer_eof) || _mix_stream_flush_pending(stream) ||
+    _mix_stream_ring_fill(stream) >= stream->decode_ahead;
+}
+
+
+/* Wake up the decoder thread if it is waiting for room in the ring. */
+static void _mix_stream_wake_producer(MixStream* stream)
+{
+  g_mutex_lock(stream->producer_mutex);
+  g_cond_signal(stream->space_cond);
+  g_mutex_unlock(stream->producer_mutex);
+}
+
+
+/* Decode one more chunk into the ring. Called with the decode mutex held
+ * and room in the ring.
+ */
+static void _mix_stream_produce(MixStream* stream)
+{
+  guint write = (guint)g_atomic_int_get(&stream->ring_write);
+
+  if (!_mix_stream_decode_chunk(stream, &stream->ring[write % RING_CHUNKS])) {
+    g_atomic_int_set(&stream->producer_eof, TRUE);
+  } else {
+    g_atomic_int_set(&stream->ring_write, (gint)(write + 1));
+    if (_mix_stream_ring_fill(stream) == stream->decode_ahead)
+      g_atomic_int_inc(&stream->overruns);
+  }
+  g_mutex_lock(stream->producer_mutex);
+  g_cond_broadcast(stream->data_cond);
+  g_mutex_unlock(stream->producer_mutex);
+}
+
+
+/* The decoder thread: keep the ring full until told to quit. */
+static gpointer _mix_stream_producer(gpointer data)
+{
+  MixStream* stream = data;
+
+  for (;;) {
+    g_mutex_lock(stream->producer_mutex);
+    while (!stream->producer_quit && _mix_stream_producer_idle(stream))
+      g_cond_wait(stream->space_cond, stream->producer_mutex);
+    if (stream->producer_quit) {
+      g_mutex_unlock(stream->producer_mutex);
+      break;
+    }
+    g_mutex_unlock(stream->producer_mutex);
+
+    /* A seek may have come in meanwhile; it leaves the ring to the reader. */
+    g_mutex_lock(stream->decode_mutex);
+    if (!g_atomic_int_get(&stream->producer_eof) && !_mix_stream_flush_pending(stream))
+      _mix_stream_produce(stream);
+    g_mutex_unlock(stream->decode_mutex);
+  }
+  return NULL;
+}
+
+
+/* Skip the reader past what was decoded from before the last seek, if it
+ * hasn't already. Only called by the reader: the callback, or whoever is
+ * starting the stream. Returns TRUE if it skipped.
+ */
+static gboolean _mix_stream_take_flush(MixStream* stream, gint serial)
+{
+  if (g_atomic_int_get(&stream->seen_serial) == serial)
+    return FALSE;
+  g_atomic_int_set(&stream->ring_read, g_atomic_int_get(&stream->ring_flush));
+  stream->next_play_time = stream->flush_time;
+  g_atomic_int_set(&stream->seen_serial, serial);
+  return TRUE;
+}
+
+
+/* Set the stream's audio chunk to the next decoded one, or to silence if the
+ * decoder has fallen behind or is still catching up with a seek. Returns
+ * FALSE once the stream has ended.
+ */
+static gboolean _mix_stream_nextchunk(MixStream* stream)
+{
+  /* Check for the end before looking at the ring, as the last chunk is
+   * written before the end is flagged.
+   */
+  gint serial = g_atomic_int_get(&stream->seek_serial);
+  gboolean flushed = _mix_stream_take_flush(stream, serial);
+  gboolean eof = g_atomic_int_get(&stream->producer_eof);
+  guint read = (guint)g_atomic_int_get(&stream->ring_read);
+  MixStreamSlot* slot;
+
+  if ((guint)g_atomic_int_get(&stream->ring_write) == read) {
+    /* A seek since we looked means there is more to come after all. */
+    if (eof && g_atomic_int_get(&stream->seek_serial) == serial)
+      return FALSE;
+    if (flushed)
+      _mix_stream_wake_producer(stream);
+    else
+      g_atomic_int_inc(&stream->underruns);
+    memcpy(stream->chunk.abuf, stream->silence, stream->chunk_size);
+    stream->chunk_start_time = stream->next_play_time;
+    stream->chunk_end_time = stream->next_play_time;
+    stream->chunk_silent = TRUE;
+    return TRUE;
+  }
 
-  stream->chunk_start_time = stream->next_read_time;
-  stream->next_read_time += (stream->out_speed * obtained_frames) / stream->out_freq;
+  slot = &stream->ring[read % RING_CHUNKS];
+  memcpy(stream->chunk.abuf, slot->buf, stream->chunk_size);
+  stream->chunk_start_time = slot->start_time;
+  stream->chunk_end_time = slot->end_time;
+  stream->chunk_speed = slot->speed;
+  stream->chunk_silent = FALSE;
+  stream->next_play_time = slot->end_time;
+  g_atomic_int_set(&stream->ring_read, (gint)(read + 1));
+  _mix_stream_wake_producer(stream);
 
   return TRUE;
 }
@@ -283,7 +506,7 @@ static void _mix_stream_channel_finished(int channel)
   if (stream == NULL)
     return;
 
-  if (!_mix_stream_nextchunk(stream, FRAMES_PER_CHUNK)) {
+  if (!_mix_stream_nextchunk(stream)) {
     g_static_mutex_lock(&chan_table_mutex);
     g_hash_table_remove(chan_table, &stream->channel);
     stream->channel = -1;
@@ -292,7 +515,7 @@ static void _mix_stream_channel_finished(int channel)
   }
 
   Mix_PlayChannel(channel, &stream->chunk, 0);
-  stream->chunk_start_ticks = SDL_GetTicks();
+  stream->chunk_start_usec = _mix_stream_clock_usec();
 }
 
 
@@ -309,7 +532,25 @@ int mix_stream_play(MixStream* stream, int requested_channel)
     chan_table = g_hash_table_new_full(g_int_hash, g_int_equal, g_free, NULL);
   g_static_mutex_unlock(&chan_table_mutex);
 
-  _mix_stream_nextchunk(stream, FRAMES_PER_CHUNK);
+  /* Start decoding, and wait for the first chunk. Nothing is reading the
+   * ring yet, so catch up with any seek here.
+   */
+  _mix_stream_take_flush(stream, g_atomic_int_get(&stream->seek_serial));
+  g_mutex_lock(stream->producer_mutex);
+  if (stream->producer == NULL) {
+    stream->producer = g_thread_create(_mix_stream_producer, stream, TRUE, NULL);
+    if (stream->producer == NULL) {
+      g_mutex_unlock(stream->producer_mutex);
+      return -1;
+    }
+  }
+  g_cond_signal(stream->space_cond);
+  while (_mix_stream_ring_fill(stream) == 0 && !g_atomic_int_get(&stream->producer_eof))
+    g_cond_wait(stream->data_cond, stream->producer_mutex);
+  g_mutex_unlock(stream->producer_mutex);
+
+  if (!_mix_stream_nextchunk(stream))
+    return -1;
 
   /* Sadly we can't call Mix_PlayChannel with the channel table lock held, as
    * we have to take it in the channel-finished callback, which runs with
@@ -335,7 +576,7 @@ int mix_stream_play(MixStream* stream, int requested_channel)
   g_hash_table_insert(chan_table, g_memdup(&stream->channel, sizeof(int)), stream);
   g_static_mutex_unlock(&chan_table_mutex);
 
-  stream->chunk_start_ticks = SDL_GetTicks();
+  stream->chunk_start_usec = _mix_stream_clock_usec();
   if (requested_channel == -1)
     return real_channel;
   else
@@ -385,9 +626,8 @@ void mix_stream_stop(MixStream* stream)
 /* Set pitch of a MixStream. */
 void mix_stream_set_pitch_semitones(MixStream* stream, float semitones)
 {
-  _mix_stream_soundtouchify(stream);
   g_mutex_lock(stream->st_mutex);
-  soundtouch_set_pitch_semitones(stream->soundtouch, semitones);
+  mix_stream_stretch_set_pitch_semitones(stream->stretch, semitones);
   g_mutex_unlock(stream->st_mutex);
 }
 
@@ -395,33 +635,54 @@ void mix_stream_set_pitch_semitones(MixStream* stream, float semitones)
 /* Set speed of a MixStream without affecting pitch. */
 void mix_stream_set_speed(MixStream* stream, float speed)
 {
-  _mix_stream_soundtouchify(stream);
   g_mutex_lock(stream->st_mutex);
-  soundtouch_set_tempo(stream->soundtouch, speed);
+  mix_stream_stretch_set_tempo(stream->stretch, speed);
   stream->out_speed = speed;
   g_mutex_unlock(stream->st_mutex);
 }
 
 
+/* Set how many chunks (from 1 to 8) the stream may decode ahead of what is
+ * playing. Fewer chunks make changes done while decoding, like pitch, speed
+ * and stem volumes, heard sooner, at more risk of running dry.
+ */
+void mix_stream_set_decode_ahead(MixStream* stream, int chunks)
+{
+  g_mutex_lock(stream->producer_mutex);
+  stream->decode_ahead = CLAMP(chunks, 1, RING_CHUNKS);
+  g_cond_signal(stream->space_cond);
+  g_mutex_unlock(stream->producer_mutex);
+}
+
+
 /* Seek to time (in seconds) from the beginning of a MixStream's
  * underlying content and return the new time. Returns a negative
  * value on error or if the content is unseekable.
+ *
+ * This doesn't hold up the audio thread: a playing stream plays silence
+ * from its next chunk on until the decoder thread has caught up.
  */
 double mix_stream_seek(MixStream* stream, double time)
 {
   double new_time;
   if (stream->seek_cb == NULL)
     return -1.0;
-  SDL_LockAudio();
+  g_mutex_lock(stream->decode_mutex);
   new_time = stream->seek_cb(time, stream->cb_data);
   g_mutex_lock(stream->st_mutex);
-  if (stream->soundtouch != NULL)
-    soundtouch_clear(stream->soundtouch);
+  mix_stream_stretch_clear(stream->stretch);
   stream->eof = FALSE;
-  stream->input_eof = FALSE;
   stream->next_read_time = new_time;
   g_mutex_unlock(stream->st_mutex);
-  SDL_UnlockAudio();
+
+  /* Have the reader throw away what was decoded from before the seek. */
+  stream->flush_time = new_time;
+  g_atomic_int_set(&stream->ring_flush, g_atomic_int_get(&stream->ring_write));
+  g_atomic_int_set(&stream->producer_eof, FALSE);
+  g_atomic_int_inc(&stream->seek_serial);
+  g_mutex_unlock(stream->decode_mutex);
+
+  _mix_stream_wake_producer(stream);
   return new_time;
 }
 
@@ -435,19 +696,54 @@ double mix_stream_get_position(MixStream* stream)
   /* This is one of the more critical functions to be sure we get right, as the
    * notes on screen will be positioned based on whatever this function says.
    */
-  double chunk_time;
-  double time_since_chunk_start;
-  double position;
+  double anchor_time, end_time, speed, started, now;
 
-  if (!mix_stream_is_playing(stream))
+  if (!mix_stream_get_clock(stream, &anchor_time, &end_time, &speed, &started, &now))
     return -1.0;
+  return MIN(anchor_time + speed * MAX(now - started, 0.0), end_time);
+}
+
+
+/* Get what the playback position is worked out from, without any smoothing:
+ * the position (in seconds of content) of the first sample of the chunk the
+ * mixer is on, the position just past its last sample, the playback speed,
+ * when the mixer started on the chunk and what time it is now. The
+ * positions count the samples actually handed to the mixer, and the times
+ * are seconds on a monotonic high-resolution clock. Returns FALSE if the
+ * stream isn't playing.
+ */
+gboolean mix_stream_get_clock(MixStream* stream, double* anchor_time, double* end_time,
+  double* speed, double* started, double* now)
+{
+  if (!mix_stream_is_playing(stream))
+    return FALSE;
 
   SDL_LockAudio();
-  chunk_time = (double)FRAMES_PER_CHUNK/(double)stream->out_freq;
-  time_since_chunk_start = CLAMP((SDL_GetTicks() - stream->chunk_start_ticks) / 1000.0, 0.0, chunk_time);
-  position = stream->chunk_start_time + stream->out_speed * time_since_chunk_start;
+  *anchor_time = stream->chunk_start_time;
+  *end_time = stream->chunk_end_time;
+  *speed = stream->chunk_silent ? 0.0 : stream->chunk_speed;
+  *started = stream->chunk_start_usec / (double)G_USEC_PER_SEC;
+  *now = _mix_stream_clock_usec() / (double)G_USEC_PER_SEC;
   SDL_UnlockAudio();
-  return position;
+  return TRUE;
+}
+
+
+/* Read a monotonic clock, in microseconds. */
+static gint64 _mix_stream_clock_usec(void)
+{
+#ifdef G_OS_WIN32
+  static LARGE_INTEGER frequency;
+  LARGE_INTEGER counter;
+  if (frequency.QuadPart == 0)
+    QueryPerformanceFrequency(&frequency);
+  QueryPerformanceCounter(&counter);
+  return (gint64)(counter.QuadPart / (double)frequency.QuadPart * G_USEC_PER_SEC);
+#else
+  struct timespec ts;
+  clock_gettime(CLOCK_MONOTONIC, &ts);
+  return (gint64)ts.tv_sec * G_USEC_PER_SEC + ts.tv_nsec / 1000;
+#endif
 }
 
 
@@ -466,6 +762,41 @@ double mix_stream_get_length(MixStream* stream)
 }
 
 
+/* Get how many times playback found no decoded audio ready and had to
+ * play silence instead.
+ */
+int mix_stream_get_underruns(MixStream* stream)
+{
+  return g_atomic_int_get(&stream->underruns);
+}
+
+
+/* Get how many times the decoder got as far ahead of playback as it may
+ * and had to wait.
+ */
+int mix_stream_get_overruns(MixStream* stream)
+{
+  return g_atomic_int_get(&stream->overruns);
+}
+
+
+/* Get how many chunks have been decoded straight from the source, and how
+ * many went through SoundTouch for rate, tempo or pitch changes.
+ */
+void mix_stream_get_path_chunks(MixStream* stream, int* direct, int* soundtouch)
+{
+  *direct = g_atomic_int_get(&stream->direct_chunks);
+  *soundtouch = g_atomic_int_get(&stream->soundtouch_chunks);
+}
+
+
+/* Get how full the decode-ahead buffer is, from 0.0 to 1.0. */
+double mix_stream_get_buffer_fill(MixStream* stream)
+{
+  return MIN((double)_mix_stream_ring_fill(stream) / stream->decode_ahead, 1.0);
+}
+
+
 /* For GErrors we might return. */
 GQuark mix_stream_error_quark(void)
 {
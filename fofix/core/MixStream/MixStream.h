@@ -33,17 +33,61 @@ MixStream* mix_stream_new(int samprate, int channels, mix_stream_read_cb read_cb
   mix_stream_seek_cb seek_cb, mix_stream_length_cb length_cb,
   mix_stream_free_cb free_cb, void* data, GError** err);
 MixStream* mix_stream_new_vorbisfile(const char* filename, GError** err);
+MixStream* mix_stream_new_file(const char* filename, GError** err);
 void mix_stream_destroy(MixStream* stream);
 
+/* A decoder for one kind of audio file: open gives the data to pass to the
+ * callbacks, and the file's sample rate and number of channels.
+ */
+typedef void*(*mix_stream_open_cb)(const char* filename, int* samprate, int* channels, GError** err);
+typedef struct {
+  const char* name;
+  const char* extension;
+  mix_stream_open_cb open_cb;
+  mix_stream_read_cb read_cb;
+  mix_stream_seek_cb seek_cb;
+  mix_stream_length_cb length_cb;
+  mix_stream_free_cb free_cb;
+} MixStreamDecoder;
+
+extern const MixStreamDecoder mix_stream_vorbisfile_decoder;
+extern const MixStreamDecoder mix_stream_wav_decoder;
+extern const MixStreamDecoder mix_stream_flac_decoder;
+
+const MixStreamDecoder* mix_stream_find_decoder(const char* filename, GError** err);
+MixStream* mix_stream_new_decoder(const MixStreamDecoder* decoder, const char* filename, GError** err);
+
 int mix_stream_play(MixStream* stream, int channel);
 gboolean mix_stream_is_playing(const MixStream* stream);
 void mix_stream_stop(MixStream* stream);
 double mix_stream_seek(MixStream* stream, double time);
 double mix_stream_get_position(MixStream* stream);
+gboolean mix_stream_get_clock(MixStream* stream, double* anchor_time, double* end_time,
+  double* speed, double* started, double* now);
 double mix_stream_get_length(MixStream* stream);
 
 void mix_stream_set_pitch_semitones(MixStream* stream, float semitones);
 void mix_stream_set_speed(MixStream* stream, float speed);
+void mix_stream_set_decode_ahead(MixStream* stream, int chunks);
+
+int mix_stream_get_underruns(MixStream* stream);
+int mix_stream_get_overruns(MixStream* stream);
+void mix_stream_get_path_chunks(MixStream* stream, int* direct, int* soundtouch);
+double mix_stream_get_buffer_fill(MixStream* stream);
+
+/* The format SDL_mixer wants samples in. */
+typedef struct {
+  int freq;
+  guint16 format;
+  int channels;
+  int sample_size;
+  gboolean samples_signed;
+  gboolean byteswap_needed;
+} MixStreamFormat;
+
+gboolean mix_stream_format_query(MixStreamFormat* fmt, GError** err);
+void mix_stream_format_convert(const MixStreamFormat* fmt, int channels, const float* floatbuf,
+  guint8* out_buf, gsize size);
 
 GQuark mix_stream_error_quark(void);
 #define MIX_STREAM_ERROR mix_stream_error_quark()
@@ -51,7 +95,10 @@ GQuark mix_stream_ov_error_quark(void);
 #define MIX_STREAM_OV_ERROR mix_stream_ov_error_quark()
 
 typedef enum {
-  MIX_STREAM_MIXER_UNINIT
+  MIX_STREAM_MIXER_UNINIT,
+  MIX_STREAM_STEM_FORMAT,
+  MIX_STREAM_UNKNOWN_FORMAT,
+  MIX_STREAM_BAD_FILE
 } MixStreamError;
 
 #endif
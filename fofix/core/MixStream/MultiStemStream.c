@@ -0,0 +1,299 @@
+/* Frets on Fire X (FoFiX)
+ * Copyright (C) 2012 FoFiX Team
+ *
+ * This program is free software; you can redistribute it and/or
+ * modify it under the terms of the GNU General Public License
+ * as published by the Free Software Foundation; either version 2
+ * of the License, or (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+ * MA  02110-1301, USA.
+ */
+
+/* A song's stems (song, guitar, rhythm, drums, crowd...), decoded together
+ * and mixed down before they reach a MixStream. The stems stay sample-locked
+ * to each other, and the whole mix gets a single SoundTouch pass and a
+ * single mixer channel, however many stems there are.
+ */
+
+#include "MultiStemStream.h"
+
+#include "stretch.h"
+#include <string.h>
+
+/* Volume changes are ramped over this long (in seconds), so that muting a
+ * stem for a missed note doesn't click.
+ */
+#define GAIN_RAMP_TIME 0.01
+
+/* Stem volumes follow the player's hits and misses, so don't let those
+ * changes wait behind as much decoded audio as a lone stream would.
+ */
+#define MULTI_STEM_DECODE_AHEAD 3
+
+typedef struct {
+  const MixStreamDecoder* decoder;
+  void* data;
+  int channels;
+  float* buf;
+  gsize buf_frames;
+  gboolean eof;
+  float gain;
+
+  /* For pitch bends; only ever touched by whoever is decoding. */
+  MixStreamStretch* stretch;
+
+  /* Set from outside, under the stream's mutex. */
+  float target_gain;
+  float pitch;
+  gboolean pitch_changed;
+} Stem;
+
+struct _MultiStemStream {
+  Stem* stems;
+  int count;
+  int samprate;
+  int channels;
+  float gain_step;
+  GMutex* mutex;
+};
+
+
+/* Decode the next numframes frames of a stem into its buffer, padding it
+ * with silence past the end. Returns how many frames were decoded.
+ */
+static gsize _multi_stem_read_stem(Stem* stem, gsize numframes)
+{
+  const gsize frame_size = sizeof(float) * stem->channels;
+  gsize frames_obtained = 0;
+
+  if (stem->buf_frames < numframes) {
+    stem->buf = g_renew(float, stem->buf, numframes * stem->channels);
+    stem->buf_frames = numframes;
+  }
+
+  if (!stem->eof) {
+    frames_obtained = mix_stream_stretch_read(stem->stretch, stem->buf, numframes);
+    if (frames_obtained < numframes)
+      stem->eof = TRUE;
+  }
+
+  if (frames_obtained < numframes)
+    memset(stem->buf + frames_obtained * stem->channels, 0, (numframes - frames_obtained) * frame_size);
+  return frames_obtained;
+}
+
+
+/* Read callback: decode every stem and mix them down. */
+static gsize _multi_stem_read_cb(float* buf, gsize bufsize, void* data)
+{
+  MultiStemStream* ms = data;
+  gsize numframes = bufsize / (sizeof(float) * ms->channels);
+  gsize frames = 0;
+  gsize frames_read;
+  float* targets = g_newa(float, ms->count);
+  float* pitches = g_newa(float, ms->count);
+  gboolean* pitch_changed = g_newa(gboolean, ms->count);
+  Stem* stem;
+  float* src;
+  float* dest;
+  float gain;
+  gsize i;
+  int s;
+
+  g_mutex_lock(ms->mutex);
+  for (s = 0; s < ms->count; s++) {
+    targets[s] = ms->stems[s].target_gain;
+    pitches[s] = ms->stems[s].pitch;
+    pitch_changed[s] = ms->stems[s].pitch_changed;
+    ms->stems[s].pitch_changed = FALSE;
+  }
+  g_mutex_unlock(ms->mutex);
+
+  memset(buf, 0, numframes * ms->channels * sizeof(float));
+
+  for (s = 0; s < ms->count; s++) {
+    stem = &ms->stems[s];
+    if (pitch_changed[s])
+      mix_stream_stretch_set_pitch_semitones(stem->stretch, pitches[s]);
+
+    /* Always decode, even when muted, to stay in step with the other stems. */
+    frames_read = _multi_stem_read_stem(stem, numframes);
+    frames = MAX(frames, frames_read);
+    if (frames_read == 0 || (stem->gain == 0.0 && targets[s] == 0.0))
+      continue;
+
+    src = stem->buf;
+    dest = buf;
+    for (i = 0; i < frames_read; i++) {
+      if (stem->gain != targets[s])
+        stem->gain += CLAMP(targets[s] - stem->gain, -ms->gain_step, ms->gain_step);
+      gain = stem->gain;
+      if (stem->channels == ms->channels) {
+        *(dest++) += gain * *(src++);
+        if (ms->channels == 2)
+          *(dest++) += gain * *(src++);
+      } else {
+        /* A mono stem in a stereo mix. */
+        *(dest++) += gain * *src;
+        *(dest++) += gain * *(src++);
+      }
+    }
+  }
+
+  return frames * ms->channels * sizeof(float);
+}
+
+
+/* Seek callback: seek every stem. */
+static double _multi_stem_seek_cb(double time, void* data)
+{
+  MultiStemStream* ms = data;
+  double new_time = time;
+  int s;
+
+  for (s = 0; s < ms->count; s++) {
+    Stem* stem = &ms->stems[s];
+    if (stem->decoder->seek_cb(time, stem->data) < 0.0)
+      new_time = -1.0;
+    mix_stream_stretch_clear(stem->stretch);
+    stem->eof = FALSE;
+  }
+  return new_time;
+}
+
+
+/* Length callback: the length of the longest stem. */
+static double _multi_stem_length_cb(void* data)
+{
+  MultiStemStream* ms = data;
+  double length = -1.0;
+  int s;
+
+  for (s = 0; s < ms->count; s++)
+    length = MAX(length, ms->stems[s].decoder->length_cb(ms->stems[s].data));
+  return length;
+}
+
+
+static void _multi_stem_free_cb(void* data)
+{
+  MultiStemStream* ms = data;
+  int s;
+
+  for (s = 0; s < ms->count; s++) {
+    Stem* stem = &ms->stems[s];
+    if (stem->data != NULL)
+      stem->decoder->free_cb(stem->data);
+    if (stem->stretch != NULL)
+      mix_stream_stretch_destroy(stem->stretch);
+    g_free(stem->buf);
+  }
+  g_mutex_free(ms->mutex);
+  g_free(ms->stems);
+  g_free(ms);
+}
+
+
+/* Create a MixStream that plays the mix of several audio files, each
+ * decoded by whatever decoder its extension calls for. They must all have
+ * the same sample rate and no more than two channels. The
+ * stems are numbered in the order given; stems (if not NULL) is set to
+ * what to pass to multi_stem_stream_* to control them. That belongs to the
+ * returned stream and goes away with it.
+ */
+MixStream* mix_stream_new_multi_stem(char* const* filenames, int count,
+  MultiStemStream** stems, GError** err)
+{
+  MultiStemStream* ms;
+  MixStream* stream;
+  Stem* stem;
+  int samprate, channels;
+  int s;
+
+  if (!g_thread_supported())
+    g_thread_init(NULL);
+
+  if (count < 1) {
+    g_set_error(err, MIX_STREAM_ERROR, MIX_STREAM_STEM_FORMAT, "No stems to play");
+    return NULL;
+  }
+
+  ms = g_new0(MultiStemStream, 1);
+  ms->stems = g_new0(Stem, count);
+  ms->mutex = g_mutex_new();
+
+  for (s = 0; s < count; s++) {
+    stem = &ms->stems[s];
+    stem->decoder = mix_stream_find_decoder(filenames[s], err);
+    if (stem->decoder == NULL)
+      goto fail;
+    stem->data = stem->decoder->open_cb(filenames[s], &samprate, &channels, err);
+    if (stem->data == NULL)
+      goto fail;
+    ms->count = s + 1;
+
+    if (channels > 2 || (s > 0 && samprate != ms->samprate)) {
+      g_set_error(err, MIX_STREAM_ERROR, MIX_STREAM_STEM_FORMAT,
+        "%s: stems must share a sample rate and have at most two channels", filenames[s]);
+      goto fail;
+    }
+
+    stem->channels = channels;
+    stem->stretch = mix_stream_stretch_new(samprate, channels, stem->decoder->read_cb, stem->data);
+    stem->gain = 1.0;
+    stem->target_gain = 1.0;
+    ms->samprate = samprate;
+    ms->channels = MAX(ms->channels, channels);
+  }
+  ms->gain_step = (float)(1.0 / (GAIN_RAMP_TIME * ms->samprate));
+
+  stream = mix_stream_new(ms->samprate, ms->channels, _multi_stem_read_cb, _multi_stem_seek_cb,
+    _multi_stem_length_cb, _multi_stem_free_cb, ms, err);
+  if (stream == NULL)
+    goto fail;
+  mix_stream_set_decode_ahead(stream, MULTI_STEM_DECODE_AHEAD);
+
+  if (stems != NULL)
+    *stems = ms;
+  return stream;
+
+fail:
+  _multi_stem_free_cb(ms);
+  return NULL;
+}
+
+
+/* Get how many stems there are. */
+int multi_stem_stream_get_count(MultiStemStream* ms)
+{
+  return ms->count;
+}
+
+
+/* Set the volume (0.0 to 1.0) of a stem. The change is ramped in. */
+void multi_stem_stream_set_volume(MultiStemStream* ms, int stem, float volume)
+{
+  g_return_if_fail(stem >= 0 && stem < ms->count);
+  g_mutex_lock(ms->mutex);
+  ms->stems[stem].target_gain = CLAMP(volume, 0.0, 1.0);
+  g_mutex_unlock(ms->mutex);
+}
+
+
+/* Bend the pitch of one stem. */
+void multi_stem_stream_set_pitch_semitones(MultiStemStream* ms, int stem, float semitones)
+{
+  g_return_if_fail(stem >= 0 && stem < ms->count);
+  g_mutex_lock(ms->mutex);
+  ms->stems[stem].pitch = semitones;
+  ms->stems[stem].pitch_changed = TRUE;
+  g_mutex_unlock(ms->mutex);
+}
@@ -0,0 +1,34 @@
+/* Frets on Fire X (FoFiX)
+ * Copyright (C) 2012 FoFiX Team
+ *
+ * This program is free software; you can redistribute it and/or
+ * modify it under the terms of the GNU General Public License
+ * as published by the Free Software Foundation; either version 2
+ * of the License, or (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+ * MA  02110-1301, USA.
+ */
+
+#ifndef MULTISTEMSTREAM_H
+#define MULTISTEMSTREAM_H
+
+#include "MixStream.h"
+
+typedef struct _MultiStemStream MultiStemStream;
+
+MixStream* mix_stream_new_multi_stem(char* const* filenames, int count,
+  MultiStemStream** stems, GError** err);
+
+int multi_stem_stream_get_count(MultiStemStream* stems);
+void multi_stem_stream_set_volume(MultiStemStream* stems, int stem, float volume);
+void multi_stem_stream_set_pitch_semitones(MultiStemStream* stems, int stem, float semitones);
+
+#endif
@@ -0,0 +1,311 @@
+/* Frets on Fire X (FoFiX)
+ * Copyright (C) 2012 FoFiX Team
+ *
+ * This program is free software; you can redistribute it and/or
+ * modify it under the terms of the GNU General Public License
+ * as published by the Free Software Foundation; either version 2
+ * of the License, or (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+ * MA  02110-1301, USA.
+ */
+
+/* Microphone passthrough: mono float input, written a chunk at a time by
+ * whoever is capturing it, played back on a mixer channel of its own with
+ * as little delay as we can get away with.
+ *
+ * Input goes into a ring allocated up front. The channel plays a silent
+ * looping chunk, and an effect registered on it overwrites each block the
+ * mixer asks for with what is in the ring, so samples go from the ring to
+ * the mixer as soon as it wants them, not at the pace of the game loop.
+ * There is only ever one writer and one reader (the mixer), so the read
+ * and write counts are just updated atomically.
+ */
+
+#include "PassthroughStream.h"
+
+#include <SDL_mixer.h>
+#include <SDL.h>
+
+/* How many frames the effect renders at a time before converting. */
+#define RENDER_FRAMES 1024
+
+/* Size of the silent chunk the channel loops, in bytes. */
+#define SILENCE_BYTES 4096
+
+struct _PassthroughStream {
+  int samprate;
+  MixStreamFormat out;
+  double ratio;
+
+  float* ring;
+  guint ring_frames;
+  volatile gint ring_read;
+  volatile gint ring_write;
+
+  /* Only touched by the reader, or with the audio locked. */
+  guint target_frames;
+  float gain;
+  gboolean primed;
+  double phase;
+  float* scratch;
+
+  Mix_Chunk chunk;
+  int channel;
+
+  volatile gint underruns;
+  volatile gint overruns;
+};
+
+
+/* Create a passthrough stream for input at the given sample rate, aiming to
+ * keep latency (in seconds) of input buffered ahead of the mixer.
+ */
+PassthroughStream* passthrough_stream_new(int samprate, double latency, GError** err)
+{
+  PassthroughStream* stream = g_new0(PassthroughStream, 1);
+
+  if (!mix_stream_format_query(&stream->out, err)) {
+    g_free(stream);
+    return NULL;
+  }
+
+  stream->samprate = samprate;
+  stream->ratio = (double)samprate / stream->out.freq;
+  stream->gain = 1.0f;
+  stream->channel = -1;
+
+  /* A second of input, rounded up so the counts can wrap. */
+  stream->ring_frames = 1;
+  while (stream->ring_frames < (guint)samprate)
+    stream->ring_frames <<= 1;
+  stream->ring = g_new0(float, stream->ring_frames);
+  stream->scratch = g_new0(float, RENDER_FRAMES);
+  passthrough_stream_set_latency(stream, latency);
+
+  stream->chunk.abuf = g_malloc0(SILENCE_BYTES);
+  stream->chunk.alen = SILENCE_BYTES;
+  stream->chunk.volume = MIX_MAX_VOLUME;
+
+  return stream;
+}
+
+
+/* Free a PassthroughStream. */
+void passthrough_stream_destroy(PassthroughStream* stream)
+{
+  passthrough_stream_stop(stream);
+  g_free(stream->chunk.abuf);
+  g_free(stream->scratch);
+  g_free(stream->ring);
+  g_free(stream);
+}
+
+
+static guint _passthrough_stream_fill(PassthroughStream* stream)
+{
+  return (guint)g_atomic_int_get(&stream->ring_write) - (guint)g_atomic_int_get(&stream->ring_read);
+}
+
+
+/* Add input to the ring. Returns how many frames fit; the rest are dropped
+ * and counted as an overrun.
+ */
+gsize passthrough_stream_write(PassthroughStream* stream, const float* samples, gsize frames)
+{
+  guint write = (guint)g_atomic_int_get(&stream->ring_write);
+  guint room = stream->ring_frames - _passthrough_stream_fill(stream);
+  guint start = write & (stream->ring_frames - 1);
+  gsize first;
+
+  if (frames > room) {
+    g_atomic_int_inc(&stream->overruns);
+    frames = room;
+  }
+
+  first = MIN(frames, stream->ring_frames - start);
+  memcpy(stream->ring + start, samples, first * sizeof(float));
+  memcpy(stream->ring, samples + first, (frames - first) * sizeof(float));
+  g_atomic_int_set(&stream->ring_write, (gint)(write + frames));
+  return frames;
+}
+
+
+/* Produce the given number of frames of output (mono, at the mixer's rate,
+ * with the gain applied) from the ring. Plays silence until the target
+ * latency's worth of input has come in, and again after running dry; drops
+ * input if it gets too far ahead. Only to be called by whoever reads the
+ * stream: the mixer while it's playing.
+ */
+void passthrough_stream_render(PassthroughStream* stream, float* out, gsize frames)
+{
+  const guint mask = stream->ring_frames - 1;
+  guint read = (guint)g_atomic_int_get(&stream->ring_read);
+  guint fill = (guint)g_atomic_int_get(&stream->ring_write) - read;
+  double pos;
+  guint needed, consumed, index;
+  float a, b, frac;
+  gsize i;
+
+  if (frames == 0)
+    return;
+
+  /* Input frames the output takes, counting the one after the last for
+   * interpolating.
+   */
+  needed = (guint)(stream->phase + (frames - 1) * stream->ratio) + 2;
+
+  if (!stream->primed && fill >= stream->target_frames + needed)
+    stream->primed = TRUE;
+  if (stream->primed && fill < needed) {
+    g_atomic_int_inc(&stream->underruns);
+    stream->primed = FALSE;
+  }
+  if (!stream->primed) {
+    memset(out, 0, frames * sizeof(float));
+    return;
+  }
+
+  /* Input comes in a bit faster than we play it, or a burst came late: skip
+   * ahead to keep the delay down.
+   */
+  if (fill > 2 * stream->target_frames + needed) {
+    read += fill - (stream->target_frames + needed);
+    stream->phase = 0.0;
+    g_atomic_int_inc(&stream->overruns);
+  }
+
+  for (i = 0; i < frames; i++) {
+    pos = stream->phase + i * stream->ratio;
+    index = (guint)pos;
+    frac = (float)(pos - index);
+    a = stream->ring[(read + index) & mask];
+    b = stream->ring[(read + index + 1) & mask];
+    out[i] = stream->gain * (a + (b - a) * frac);
+  }
+
+  pos = stream->phase + frames * stream->ratio;
+  consumed = (guint)pos;
+  stream->phase = pos - consumed;
+  g_atomic_int_set(&stream->ring_read, (gint)(read + consumed));
+}
+
+
+/* The channel's effect: replace the silence it is playing with the input. */
+static void _passthrough_stream_effect(int channel, void* buf, int len, void* data)
+{
+  PassthroughStream* stream = data;
+  const int frame_size = stream->out.channels * stream->out.sample_size;
+  guint8* p = buf;
+  int frames;
+
+  while (len >= frame_size) {
+    frames = MIN(len / frame_size, RENDER_FRAMES);
+    passthrough_stream_render(stream, stream->scratch, frames);
+    mix_stream_format_convert(&stream->out, 1, stream->scratch, p, frames * frame_size);
+    p += frames * frame_size;
+    len -= frames * frame_size;
+  }
+}
+
+
+/* Start playing on the given channel, or any free one if it is -1. Input
+ * written before now is thrown away. Returns the channel, or -1 on failure.
+ */
+int passthrough_stream_play(PassthroughStream* stream, int channel)
+{
+  if (stream->channel != -1)
+    return -1;
+
+  stream->primed = FALSE;
+  stream->phase = 0.0;
+  g_atomic_int_set(&stream->ring_read, g_atomic_int_get(&stream->ring_write));
+
+  channel = Mix_PlayChannel(channel, &stream->chunk, -1);
+  if (channel == -1)
+    return -1;
+  if (!Mix_RegisterEffect(channel, _passthrough_stream_effect, NULL, stream)) {
+    Mix_HaltChannel(channel);
+    return -1;
+  }
+  stream->channel = channel;
+  return channel;
+}
+
+
+/* Check whether a PassthroughStream is playing. */
+gboolean passthrough_stream_is_playing(const PassthroughStream* stream)
+{
+  return stream->channel != -1;
+}
+
+
+/* Stop playing a PassthroughStream. */
+void passthrough_stream_stop(PassthroughStream* stream)
+{
+  if (stream->channel != -1) {
+    Mix_UnregisterEffect(stream->channel, _passthrough_stream_effect);
+    Mix_HaltChannel(stream->channel);
+    stream->channel = -1;
+  }
+}
+
+
+/* Set the volume the input is played back at. */
+void passthrough_stream_set_gain(PassthroughStream* stream, float gain)
+{
+  SDL_LockAudio();
+  stream->gain = MAX(gain, 0.0f);
+  SDL_UnlockAudio();
+}
+
+
+/* Set how much input (in seconds) to keep buffered ahead of the mixer, on
+ * top of the mixer's own buffer. Less is heard sooner; more copes with input
+ * coming in bigger or less regular chunks.
+ */
+void passthrough_stream_set_latency(PassthroughStream* stream, double latency)
+{
+  SDL_LockAudio();
+  stream->target_frames = (guint)CLAMP(latency * stream->samprate, 0.0, stream->ring_frames / 4.0);
+  SDL_UnlockAudio();
+}
+
+
+/* Get the target latency, in seconds. */
+double passthrough_stream_get_latency(PassthroughStream* stream)
+{
+  return (double)stream->target_frames / stream->samprate;
+}
+
+
+/* Get how much input (in seconds) is waiting to be played right now. */
+double passthrough_stream_get_buffered(PassthroughStream* stream)
+{
+  return (double)_passthrough_stream_fill(stream) / stream->samprate;
+}
+
+
+/* Get how many times the mixer found too little input and had to play
+ * silence until enough came in.
+ */
+int passthrough_stream_get_underruns(PassthroughStream* stream)
+{
+  return g_atomic_int_get(&stream->underruns);
+}
+
+
+/* Get how many times input was thrown away, because it got further ahead
+ * of the mixer than it should or there was no room for it.
+ */
+int passthrough_stream_get_overruns(PassthroughStream* stream)
+{
+  return g_atomic_int_get(&stream->overruns);
+}
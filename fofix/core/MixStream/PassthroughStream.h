@@ -0,0 +1,44 @@
+/* Frets on Fire X (FoFiX)
+ * Copyright (C) 2012 FoFiX Team
+ *
+ * This program is free software; you can redistribute it and/or
+ * modify it under the terms of the GNU General Public License
+ * as published by the Free Software Foundation; either version 2
+ * of the License, or (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+ * MA  02110-1301, USA.
+ */
+
+#ifndef PASSTHROUGHSTREAM_H
+#define PASSTHROUGHSTREAM_H
+
+#include "MixStream.h"
+
+typedef struct _PassthroughStream PassthroughStream;
+
+PassthroughStream* passthrough_stream_new(int samprate, double latency, GError** err);
+void passthrough_stream_destroy(PassthroughStream* stream);
+
+gsize passthrough_stream_write(PassthroughStream* stream, const float* samples, gsize frames);
+void passthrough_stream_render(PassthroughStream* stream, float* out, gsize frames);
+
+int passthrough_stream_play(PassthroughStream* stream, int channel);
+gboolean passthrough_stream_is_playing(const PassthroughStream* stream);
+void passthrough_stream_stop(PassthroughStream* stream);
+
+void passthrough_stream_set_gain(PassthroughStream* stream, float gain);
+void passthrough_stream_set_latency(PassthroughStream* stream, double latency);
+double passthrough_stream_get_latency(PassthroughStream* stream);
+double passthrough_stream_get_buffered(PassthroughStream* stream);
+int passthrough_stream_get_underruns(PassthroughStream* stream);
+int passthrough_stream_get_overruns(PassthroughStream* stream);
+
+#endif
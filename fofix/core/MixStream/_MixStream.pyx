@@ -21,6 +21,8 @@
 # MA  02110-1301, USA.                                              #
 #####################################################################
 
+from libc.stdlib cimport malloc, free
+
 cdef extern from "MixStream.h":
     ctypedef struct CMixStream "MixStream":
         pass
@@ -35,15 +37,57 @@ cdef extern from "MixStream.h":
     void g_error_free(GError*)
 
     CMixStream* mix_stream_new_vorbisfile(char*, GError**)
+    CMixStream* mix_stream_new_file(char*, GError**)
     void mix_stream_destroy(CMixStream*)
     int mix_stream_play(CMixStream*, int)
     bint mix_stream_is_playing(CMixStream*)
     void mix_stream_stop(CMixStream*)
     double mix_stream_seek(CMixStream*, double)
     double mix_stream_get_position(CMixStream*)
+    bint mix_stream_get_clock(CMixStream*, double*, double*, double*, double*, double*)
     double mix_stream_get_length(CMixStream*)
     void mix_stream_set_pitch_semitones(CMixStream*, float)
     void mix_stream_set_speed(CMixStream*, float)
+    int mix_stream_get_underruns(CMixStream*)
+    int mix_stream_get_overruns(CMixStream*)
+    void mix_stream_get_path_chunks(CMixStream*, int*, int*)
+    double mix_stream_get_buffer_fill(CMixStream*)
+
+    ctypedef struct MixStreamDecoder:
+        char* name
+        void* (*open_cb)(char*, int*, int*, GError**)
+        size_t (*read_cb)(float*, size_t, void*)
+        double (*seek_cb)(double, void*)
+        double (*length_cb)(void*)
+        void (*free_cb)(void*)
+    MixStreamDecoder* mix_stream_find_decoder(char*, GError**)
+
+cdef extern from "MultiStemStream.h":
+    ctypedef struct CMultiStemStream "MultiStemStream":
+        pass
+
+    CMixStream* mix_stream_new_multi_stem(char**, int, CMultiStemStream**, GError**)
+    int multi_stem_stream_get_count(CMultiStemStream*)
+    void multi_stem_stream_set_volume(CMultiStemStream*, int, float)
+    void multi_stem_stream_set_pitch_semitones(CMultiStemStream*, int, float)
+
+cdef extern from "PassthroughStream.h":
+    ctypedef struct CPassthroughStream "PassthroughStream":
+        pass
+
+    CPassthroughStream* passthrough_stream_new(int, double, GError**)
+    void passthrough_stream_destroy(CPassthroughStream*)
+    size_t passthrough_stream_write(CPassthroughStream*, float*, size_t) nogil
+    void passthrough_stream_render(CPassthroughStream*, float*, size_t)
+    int passthrough_stream_play(CPassthroughStream*, int)
+    bint passthrough_stream_is_playing(CPassthroughStream*)
+    void passthrough_stream_stop(CPassthroughStream*)
+    void passthrough_stream_set_gain(CPassthroughStream*, float)
+    void passthrough_stream_set_latency(CPassthroughStream*, double)
+    double passthrough_stream_get_latency(CPassthroughStream*)
+    double passthrough_stream_get_buffered(CPassthroughStream*)
+    int passthrough_stream_get_underruns(CPassthroughStream*)
+    int passthrough_stream_get_overruns(CPassthroughStream*)
 
 
 class MixStreamError(Exception):
@@ -65,15 +109,9 @@ cdef object raise_from_gerror(GError* err):
     g_error_free(err)
     raise exc
 
-cdef class VorbisFileMixStream(object):
+cdef class MixStream(object):
     cdef CMixStream* stream
 
-    def __cinit__(self, char* filename):
-        cdef GError* err = NULL
-        self.stream = mix_stream_new_vorbisfile(filename, &err)
-        if self.stream is NULL:
-            raise_from_gerror(err)
-
     def __dealloc__(self):
         if self.stream is not NULL:
             mix_stream_destroy(self.stream)
@@ -93,6 +131,12 @@ cdef class VorbisFileMixStream(object):
     def get_position(self):
         return mix_stream_get_position(self.stream)
 
+    def get_clock(self):
+        cdef double anchor_time, end_time, speed, started, now
+        if not mix_stream_get_clock(self.stream, &anchor_time, &end_time, &speed, &started, &now):
+            return None
+        return anchor_time, end_time, speed, started, now
+
     def get_length(self):
         return mix_stream_get_length(self.stream)
 
@@ -101,3 +145,166 @@ cdef class VorbisFileMixStream(object):
 
     def set_speed(self, float speed):
         mix_stream_set_speed(self.stream, speed)
+
+    def get_underruns(self):
+        return mix_stream_get_underruns(self.stream)
+
+    def get_overruns(self):
+        return mix_stream_get_overruns(self.stream)
+
+    def get_buffer_fill(self):
+        return mix_stream_get_buffer_fill(self.stream)
+
+    def get_path_chunks(self):
+        cdef int direct, soundtouch
+        mix_stream_get_path_chunks(self.stream, &direct, &soundtouch)
+        return direct, soundtouch
+
+cdef class VorbisFileMixStream(MixStream):
+    def __cinit__(self, char* filename):
+        cdef GError* err = NULL
+        self.stream = mix_stream_new_vorbisfile(filename, &err)
+        if self.stream is NULL:
+            raise_from_gerror(err)
+
+cdef class FileMixStream(MixStream):
+    def __cinit__(self, char* filename):
+        cdef GError* err = NULL
+        self.stream = mix_stream_new_file(filename, &err)
+        if self.stream is NULL:
+            raise_from_gerror(err)
+
+cdef class MultiStemStream(MixStream):
+    cdef CMultiStemStream* stems
+
+    def __cinit__(self, filenames):
+        cdef GError* err = NULL
+        cdef int count = len(filenames)
+        cdef char** c_filenames = <char**>malloc(count * sizeof(char*))
+        if c_filenames is NULL:
+            raise MemoryError()
+        try:
+            for i, filename in enumerate(filenames):
+                c_filenames[i] = filename
+            self.stream = mix_stream_new_multi_stem(c_filenames, count, &self.stems, &err)
+        finally:
+            free(c_filenames)
+        if self.stream is NULL:
+            raise_from_gerror(err)
+
+    def get_stem_count(self):
+        return multi_stem_stream_get_count(self.stems)
+
+    def set_stem_volume(self, int stem, float volume):
+        if not 0 <= stem < multi_stem_stream_get_count(self.stems):
+            raise IndexError('stem %d out of range' % stem)
+        multi_stem_stream_set_volume(self.stems, stem, volume)
+
+    def set_stem_pitch_semitones(self, int stem, float semitones):
+        if not 0 <= stem < multi_stem_stream_get_count(self.stems):
+            raise IndexError('stem %d out of range' % stem)
+        multi_stem_stream_set_pitch_semitones(self.stems, stem, semitones)
+
+cdef class AudioFileReader(object):
+    # Decodes a file, with the same decoder a stream of it would use, without
+    # playing it; for offline work such as converting stems.
+    cdef MixStreamDecoder* decoder
+    cdef void* data
+    cdef readonly int samprate, channels
+
+    def __cinit__(self, char* filename):
+        cdef GError* err = NULL
+        self.decoder = mix_stream_find_decoder(filename, &err)
+        if self.decoder is NULL:
+            raise_from_gerror(err)
+        self.data = self.decoder.open_cb(filename, &self.samprate, &self.channels, &err)
+        if self.data is NULL:
+            raise_from_gerror(err)
+
+    def __dealloc__(self):
+        if self.data is not NULL:
+            self.decoder.free_cb(self.data)
+
+    def read(self, int frames):
+        # Returns up to that many frames of interleaved native float32
+        # samples, or an empty string at the end of the file.
+        cdef size_t bufsize = frames * self.channels * sizeof(float)
+        cdef float* buf = <float*>malloc(bufsize)
+        cdef size_t got
+        if buf is NULL:
+            raise MemoryError()
+        try:
+            got = self.decoder.read_cb(buf, bufsize, self.data)
+            return (<char*>buf)[:got]
+        finally:
+            free(buf)
+
+    def seek(self, double time):
+        return self.decoder.seek_cb(time, self.data)
+
+    def get_length(self):
+        return self.decoder.length_cb(self.data)
+
+cdef class PassthroughStream(object):
+    # Plays mono float32 input (e.g. from a microphone) back as it comes in.
+    cdef CPassthroughStream* stream
+
+    def __cinit__(self, int samprate, double latency=0.03):
+        cdef GError* err = NULL
+        self.stream = passthrough_stream_new(samprate, latency, &err)
+        if self.stream is NULL:
+            raise_from_gerror(err)
+
+    def __dealloc__(self):
+        if self.stream is not NULL:
+            passthrough_stream_destroy(self.stream)
+
+    def write(self, bytes data):
+        # Takes native float32 samples; returns how many frames fit.
+        cdef char* buf = data
+        cdef size_t frames = len(data) // sizeof(float)
+        with nogil:
+            frames = passthrough_stream_write(self.stream, <float*>buf, frames)
+        return frames
+
+    def render(self, int frames):
+        # What the mixer would get next, as native float32 samples at its
+        # rate; only for when the stream isn't playing.
+        cdef float* buf
+        if passthrough_stream_is_playing(self.stream):
+            raise MixStreamError('cannot render a passthrough stream that is playing')
+        buf = <float*>malloc(frames * sizeof(float))
+        if buf is NULL:
+            raise MemoryError()
+        try:
+            passthrough_stream_render(self.stream, buf, frames)
+            return (<char*>buf)[:frames * sizeof(float)]
+        finally:
+            free(buf)
+
+    def play(self, int channel=-1):
+        return passthrough_stream_play(self.stream, channel)
+
+    def is_playing(self):
+        return passthrough_stream_is_playing(self.stream)
+
+    def stop(self):
+        passthrough_stream_stop(self.stream)
+
+    def set_gain(self, float gain):
+        passthrough_stream_set_gain(self.stream, gain)
+
+    def set_latency(self, double latency):
+        passthrough_stream_set_latency(self.stream, latency)
+
+    def get_latency(self):
+        return passthrough_stream_get_latency(self.stream)
+
+    def get_buffered(self):
+        return passthrough_stream_get_buffered(self.stream)
+
+    def get_underruns(self):
+        return passthrough_stream_get_underruns(self.stream)
+
+    def get_overruns(self):
+        return passthrough_stream_get_overruns(self.stream)
@@ -0,0 +1,85 @@
+/* Frets on Fire X (FoFiX)
+ * Copyright (C) 2012 FoFiX Team
+ *
+ * This program is free software; you can redistribute it and/or
+ * modify it under the terms of the GNU General Public License
+ * as published by the Free Software Foundation; either version 2
+ * of the License, or (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+ * MA  02110-1301, USA.
+ */
+
+/* Picking a decoder for a file. Ogg Vorbis costs the most CPU to decode;
+ * PCM WAV costs next to nothing but takes ten times the disk space, and
+ * FLAC sits in between.
+ */
+
+#include "MixStream.h"
+
+#include <string.h>
+
+static const MixStreamDecoder* const decoders[] = {
+  &mix_stream_vorbisfile_decoder,
+  &mix_stream_wav_decoder,
+  &mix_stream_flac_decoder,
+  NULL
+};
+
+
+/* Find the decoder for a file, by its extension. */
+const MixStreamDecoder* mix_stream_find_decoder(const char* filename, GError** err)
+{
+  const MixStreamDecoder* const* decoder;
+  const char* extension = strrchr(filename, '.');
+
+  if (extension != NULL) {
+    for (decoder = decoders; *decoder != NULL; decoder++)
+      if (g_ascii_strcasecmp(extension, (*decoder)->extension) == 0)
+        return *decoder;
+  }
+
+  g_set_error(err, MIX_STREAM_ERROR, MIX_STREAM_UNKNOWN_FORMAT,
+    "%s: no decoder for this kind of file", filename);
+  return NULL;
+}
+
+
+/* Create a MixStream that plays the given file with the given decoder. */
+MixStream* mix_stream_new_decoder(const MixStreamDecoder* decoder, const char* filename, GError** err)
+{
+  MixStream* stream;
+  void* data;
+  int samprate, channels;
+
+  data = decoder->open_cb(filename, &samprate, &channels, err);
+  if (data == NULL)
+    return NULL;
+
+  stream = mix_stream_new(samprate, channels, decoder->read_cb, decoder->seek_cb,
+    decoder->length_cb, decoder->free_cb, data, err);
+  if (stream == NULL) {
+    decoder->free_cb(data);
+    return NULL;
+  }
+  return stream;
+}
+
+
+/* Create a MixStream that plays the given file, with the decoder its
+ * extension calls for.
+ */
+MixStream* mix_stream_new_file(const char* filename, GError** err)
+{
+  const MixStreamDecoder* decoder = mix_stream_find_decoder(filename, err);
+  if (decoder == NULL)
+    return NULL;
+  return mix_stream_new_decoder(decoder, filename, err);
+}
@@ -0,0 +1,221 @@
+/* Frets on Fire X (FoFiX)
+ * Copyright (C) 2012 FoFiX Team
+ *
+ * This program is free software; you can redistribute it and/or
+ * modify it under the terms of the GNU General Public License
+ * as published by the Free Software Foundation; either version 2
+ * of the License, or (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+ * MA  02110-1301, USA.
+ */
+
+/* FLAC decoder, through libFLAC. Decoding FLAC is a good deal cheaper than
+ * decoding Vorbis, at about half the size of the same audio as WAV.
+ */
+
+#include "MixStream.h"
+
+#include <FLAC/stream_decoder.h>
+#include <string.h>
+
+typedef struct {
+  FLAC__StreamDecoder* decoder;
+  int samprate;
+  int channels;
+  int bits;
+  FLAC__uint64 total_frames;
+
+  /* Set by seeking to the very end, which libFLAC can't seek to; reads
+   * then come back empty until the next seek.
+   */
+  gboolean at_end;
+
+  /* The last block the decoder gave us, and how much of it has been read. */
+  float* block;
+  gsize block_capacity;
+  gsize block_frames;
+  gsize block_pos;
+} FlacFile;
+
+
+static FLAC__StreamDecoderWriteStatus _flac_write_cb(const FLAC__StreamDecoder* decoder,
+  const FLAC__Frame* frame, const FLAC__int32* const buffer[], void* data)
+{
+  FlacFile* flac = data;
+  const unsigned int blocksize = frame->header.blocksize;
+  /* Done in 64 bits, as 1 << 31 overflows an int for 32-bit samples. */
+  const float scale = (float)(1.0 / (double)((FLAC__uint64)1 << (frame->header.bits_per_sample - 1)));
+  float* dest;
+  unsigned int i;
+  int j;
+
+  if ((int)frame->header.channels != flac->channels)
+    return FLAC__STREAM_DECODER_WRITE_STATUS_ABORT;
+
+  if (flac->block_capacity < blocksize) {
+    flac->block = g_renew(float, flac->block, blocksize * flac->channels);
+    flac->block_capacity = blocksize;
+  }
+
+  dest = flac->block;
+  for (i = 0; i < blocksize; i++)
+    for (j = 0; j < flac->channels; j++)
+      *(dest++) = buffer[j][i] * scale;
+
+  flac->block_frames = blocksize;
+  flac->block_pos = 0;
+  return FLAC__STREAM_DECODER_WRITE_STATUS_CONTINUE;
+}
+
+
+static void _flac_metadata_cb(const FLAC__StreamDecoder* decoder,
+  const FLAC__StreamMetadata* metadata, void* data)
+{
+  FlacFile* flac = data;
+
+  if (metadata->type != FLAC__METADATA_TYPE_STREAMINFO)
+    return;
+  flac->samprate = metadata->data.stream_info.sample_rate;
+  flac->channels = metadata->data.stream_info.channels;
+  flac->bits = metadata->data.stream_info.bits_per_sample;
+  flac->total_frames = metadata->data.stream_info.total_samples;
+}
+
+
+static void _flac_error_cb(const FLAC__StreamDecoder* decoder,
+  FLAC__StreamDecoderErrorStatus status, void* data)
+{
+  g_warning("Error in FLAC decoder: %s", FLAC__StreamDecoderErrorStatusString[status]);
+}
+
+
+/* Read callback for a FLAC-backed stream. */
+static gsize _flac_read(float* buf, gsize bufsize, void* data)
+{
+  FlacFile* flac = data;
+  gsize numframes = bufsize / (sizeof(float) * flac->channels);
+  gsize frames_read = 0;
+  gsize frames;
+
+  if (flac->at_end)
+    return 0;
+
+  while (frames_read < numframes) {
+    if (flac->block_pos == flac->block_frames) {
+      if (FLAC__stream_decoder_get_state(flac->decoder) == FLAC__STREAM_DECODER_END_OF_STREAM)
+        break;
+      flac->block_frames = flac->block_pos = 0;
+      if (!FLAC__stream_decoder_process_single(flac->decoder)) {
+        g_warning("Error in FLAC read callback: %s",
+          FLAC__stream_decoder_get_resolved_state_string(flac->decoder));
+        break;
+      }
+      continue;
+    }
+
+    frames = MIN(numframes - frames_read, flac->block_frames - flac->block_pos);
+    memcpy(buf + frames_read * flac->channels, flac->block + flac->block_pos * flac->channels,
+      frames * flac->channels * sizeof(float));
+    flac->block_pos += frames;
+    frames_read += frames;
+  }
+
+  return frames_read * flac->channels * sizeof(float);
+}
+
+
+/* Seek callback for a FLAC-backed stream. */
+static double _flac_seek(double time, void* data)
+{
+  FlacFile* flac = data;
+  FLAC__uint64 frame = (FLAC__uint64)(MAX(time, 0.0) * flac->samprate);
+
+  /* The decoder hands over the block it lands in through the write callback. */
+  flac->block_frames = flac->block_pos = 0;
+  flac->at_end = FALSE;
+  if (flac->total_frames > 0 && frame >= flac->total_frames) {
+    flac->at_end = TRUE;
+    return (double)flac->total_frames / flac->samprate;
+  }
+  if (!FLAC__stream_decoder_seek_absolute(flac->decoder, frame)) {
+    if (FLAC__stream_decoder_get_state(flac->decoder) == FLAC__STREAM_DECODER_SEEK_ERROR)
+      FLAC__stream_decoder_flush(flac->decoder);
+    return -1.0;
+  }
+  return (double)frame / flac->samprate;
+}
+
+
+/* Length callback for a FLAC-backed stream. */
+static double _flac_length(void* data)
+{
+  FlacFile* flac = data;
+  if (flac->total_frames == 0)
+    return -1.0;
+  return (double)flac->total_frames / flac->samprate;
+}
+
+
+/* Free callback for a FLAC-backed stream. */
+static void _flac_free(void* data)
+{
+  FlacFile* flac = data;
+  FLAC__stream_decoder_delete(flac->decoder);
+  g_free(flac->block);
+  g_free(flac);
+}
+
+
+/* Open callback for a FLAC-backed stream. */
+static void* _flac_open(const char* filename, int* samprate, int* channels, GError** err)
+{
+  FlacFile* flac = g_new0(FlacFile, 1);
+  FLAC__StreamDecoderInitStatus status;
+
+  flac->decoder = FLAC__stream_decoder_new();
+  if (flac->decoder == NULL) {
+    g_set_error(err, MIX_STREAM_ERROR, MIX_STREAM_BAD_FILE,
+      "%s: failed to create FLAC decoder", filename);
+    g_free(flac);
+    return NULL;
+  }
+
+  status = FLAC__stream_decoder_init_file(flac->decoder, filename,
+    _flac_write_cb, _flac_metadata_cb, _flac_error_cb, flac);
+  if (status != FLAC__STREAM_DECODER_INIT_STATUS_OK) {
+    g_set_error(err, MIX_STREAM_ERROR, MIX_STREAM_BAD_FILE,
+      "%s: failed to initialize decoder: %s", filename, FLAC__StreamDecoderInitStatusString[status]);
+    _flac_free(flac);
+    return NULL;
+  }
+
+  if (!FLAC__stream_decoder_process_until_end_of_metadata(flac->decoder) || flac->samprate <= 0) {
+    g_set_error(err, MIX_STREAM_ERROR, MIX_STREAM_BAD_FILE, "%s: not a FLAC file", filename);
+    _flac_free(flac);
+    return NULL;
+  }
+  if (flac->channels < 1 || flac->channels > 2) {
+    g_set_error(err, MIX_STREAM_ERROR, MIX_STREAM_BAD_FILE,
+      "%s: FLAC files must have one or two channels", filename);
+    _flac_free(flac);
+    return NULL;
+  }
+
+  *samprate = flac->samprate;
+  *channels = flac->channels;
+  return flac;
+}
+
+
+const MixStreamDecoder mix_stream_flac_decoder = {
+  "FLAC", ".flac",
+  _flac_open, _flac_read, _flac_seek, _flac_length, _flac_free
+};
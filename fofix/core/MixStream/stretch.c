@@ -0,0 +1,371 @@
+/* Frets on Fire X (FoFiX)
+ * Copyright (C) 2012 FoFiX Team
+ *
+ * This program is free software; you can redistribute it and/or
+ * modify it under the terms of the GNU General Public License
+ * as published by the Free Software Foundation; either version 2
+ * of the License, or (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+ * MA  02110-1301, USA.
+ */
+
+/* Rate, tempo and pitch changes for a read callback's audio, by way of
+ * SoundTouch, but only while they are actually needed: audio with
+ * everything at neutral is read straight through. Going in and out of
+ * SoundTouch is crossfaded over the same stretch of audio both ways, so
+ * it doesn't click, and no audio is skipped or repeated.
+ *
+ * Nothing here locks; callers make sure only one thread at a time uses a
+ * MixStreamStretch.
+ */
+
+#include "stretch.h"
+
+#include "soundtouch-c.h"
+#include <string.h>
+
+/* How long (in frames) the crossfades in and out of SoundTouch are. */
+#define XFADE_FRAMES 256
+
+struct _MixStreamStretch {
+  int samprate;
+  int channels;
+  mix_stream_read_cb read_cb;
+  void* cb_data;
+
+  /* Made the first time it is needed, and kept for next time. */
+  SoundTouch* soundtouch;
+  float rate;
+  float tempo;
+  float pitch;
+
+  gboolean engaged;     /* reading through SoundTouch */
+  gboolean was_engaged; /* ...during the last read */
+  gboolean fresh;       /* nothing read since creation or the last clear */
+  gboolean input_eof;
+
+  /* Input fed to SoundTouch that has not come out yet, in input frames. */
+  double pending;
+
+  /* The last frames fed to SoundTouch, to crossfade out of it with. */
+  float* history;
+  gsize history_frames;
+
+  /* Audio left over from switching paths, to be read before anything else. */
+  float* carry;
+  gsize carry_frames;
+  gsize carry_size;
+
+  float* scratch;
+  gsize scratch_frames;
+};
+
+
+/* Create a stretcher for the audio returned by read_cb, which is of the
+ * given sample rate and number of channels.
+ */
+MixStreamStretch* mix_stream_stretch_new(int samprate, int channels,
+  mix_stream_read_cb read_cb, void* data)
+{
+  MixStreamStretch* stretch = g_new0(MixStreamStretch, 1);
+  stretch->samprate = samprate;
+  stretch->channels = channels;
+  stretch->read_cb = read_cb;
+  stretch->cb_data = data;
+  stretch->rate = 1.0;
+  stretch->tempo = 1.0;
+  stretch->pitch = 0.0;
+  stretch->fresh = TRUE;
+  stretch->history = g_new(float, XFADE_FRAMES * channels);
+  return stretch;
+}
+
+
+void mix_stream_stretch_destroy(MixStreamStretch* stretch)
+{
+  if (stretch->soundtouch != NULL)
+    soundtouch_delete(stretch->soundtouch);
+  g_free(stretch->history);
+  g_free(stretch->carry);
+  g_free(stretch->scratch);
+  g_free(stretch);
+}
+
+
+static gboolean _stretch_is_neutral(const MixStreamStretch* stretch)
+{
+  return stretch->rate == 1.0 && stretch->tempo == 1.0 && stretch->pitch == 0.0;
+}
+
+
+/* Mix from the audio in out to the audio in in over frames frames. */
+static void _stretch_crossfade(float* out, const float* in, gsize frames, int channels)
+{
+  gsize i;
+  int c;
+  float w;
+
+  for (i = 0; i < frames; i++) {
+    w = (float)((i + 0.5) / frames);
+    for (c = 0; c < channels; c++, out++, in++)
+      *out = *out * (1.0f - w) + *in * w;
+  }
+}
+
+
+static float* _stretch_scratch(MixStreamStretch* stretch, gsize frames)
+{
+  if (stretch->scratch_frames < frames) {
+    stretch->scratch = g_renew(float, stretch->scratch, frames * stretch->channels);
+    stretch->scratch_frames = frames;
+  }
+  return stretch->scratch;
+}
+
+
+/* Read up to frames frames straight from the read callback. */
+static gsize _stretch_read_direct(MixStreamStretch* stretch, float* buf, gsize frames)
+{
+  const gsize frame_size = sizeof(float) * stretch->channels;
+  gsize frames_read;
+
+  if (stretch->input_eof)
+    return 0;
+  frames_read = stretch->read_cb(buf, frames * frame_size, stretch->cb_data) / frame_size;
+  if (frames_read == 0)
+    stretch->input_eof = TRUE;
+  else
+    stretch->fresh = FALSE;
+  return frames_read;
+}
+
+
+static void _stretch_put(MixStreamStretch* stretch, const float* buf, gsize frames)
+{
+  const int channels = stretch->channels;
+  gsize keep;
+
+  soundtouch_put_samples(stretch->soundtouch, buf, frames);
+  stretch->pending += frames;
+
+  if (frames >= XFADE_FRAMES) {
+    memcpy(stretch->history, buf + (frames - XFADE_FRAMES) * channels, XFADE_FRAMES * channels * sizeof(float));
+    stretch->history_frames = XFADE_FRAMES;
+  } else {
+    keep = MIN(stretch->history_frames, XFADE_FRAMES - frames);
+    memmove(stretch->history, stretch->history + (stretch->history_frames - keep) * channels, keep * channels * sizeof(float));
+    memcpy(stretch->history + keep * channels, buf, frames * channels * sizeof(float));
+    stretch->history_frames = keep + frames;
+  }
+}
+
+
+/* Feed SoundTouch until it has frames frames ready or the input runs out. */
+static void _stretch_feed(MixStreamStretch* stretch, gsize frames)
+{
+  float* scratch = _stretch_scratch(stretch, frames);
+  gsize frames_read;
+
+  while (!stretch->input_eof && soundtouch_num_samples(stretch->soundtouch) < frames) {
+    frames_read = _stretch_read_direct(stretch, scratch, frames);
+    if (frames_read == 0) {
+      soundtouch_flush(stretch->soundtouch);
+      break;
+    }
+    _stretch_put(stretch, scratch, frames_read);
+  }
+}
+
+
+static gsize _stretch_receive(MixStreamStretch* stretch, float* buf, gsize frames)
+{
+  gsize received = soundtouch_receive_samples(stretch->soundtouch, buf, frames);
+  stretch->pending = MAX(stretch->pending - received * stretch->tempo * stretch->rate, 0.0);
+  return received;
+}
+
+
+static void _stretch_carry(MixStreamStretch* stretch, const float* buf, gsize frames)
+{
+  const int channels = stretch->channels;
+
+  if (stretch->carry_size < stretch->carry_frames + frames) {
+    stretch->carry_size = stretch->carry_frames + frames;
+    stretch->carry = g_renew(float, stretch->carry, stretch->carry_size * channels);
+  }
+  memcpy(stretch->carry + stretch->carry_frames * channels, buf, frames * channels * sizeof(float));
+  stretch->carry_frames += frames;
+}
+
+
+static gsize _stretch_take_carry(MixStreamStretch* stretch, float* buf, gsize frames)
+{
+  const int channels = stretch->channels;
+
+  frames = MIN(frames, stretch->carry_frames);
+  memcpy(buf, stretch->carry, frames * channels * sizeof(float));
+  stretch->carry_frames -= frames;
+  memmove(stretch->carry, stretch->carry + frames * channels, stretch->carry_frames * channels * sizeof(float));
+  return frames;
+}
+
+
+/* Start reading through SoundTouch. Unless we're at the very start, the
+ * next bit of audio is read both ways and crossfaded.
+ */
+static void _stretch_engage(MixStreamStretch* stretch)
+{
+  float* direct;
+  float* stretched;
+  gsize frames, frames_read;
+
+  if (stretch->soundtouch == NULL) {
+    stretch->soundtouch = soundtouch_new();
+    soundtouch_set_sample_rate(stretch->soundtouch, stretch->samprate);
+    soundtouch_set_channels(stretch->soundtouch, stretch->channels);
+    soundtouch_set_rate(stretch->soundtouch, stretch->rate);
+    soundtouch_set_tempo(stretch->soundtouch, stretch->tempo);
+    soundtouch_set_pitch_semitones(stretch->soundtouch, stretch->pitch);
+  }
+  stretch->engaged = TRUE;
+  if (stretch->fresh)
+    return;
+
+  direct = g_newa(float, XFADE_FRAMES * stretch->channels);
+  stretched = g_newa(float, XFADE_FRAMES * stretch->channels);
+  frames = 0;
+  while (frames < XFADE_FRAMES) {
+    frames_read = _stretch_read_direct(stretch, direct + frames * stretch->channels, XFADE_FRAMES - frames);
+    if (frames_read == 0)
+      break;
+    frames += frames_read;
+  }
+  if (frames == 0)
+    return;
+
+  _stretch_put(stretch, direct, frames);
+  if (stretch->input_eof)
+    soundtouch_flush(stretch->soundtouch);
+  _stretch_feed(stretch, frames);
+  frames = _stretch_receive(stretch, stretched, frames);
+  _stretch_crossfade(direct, stretched, frames, stretch->channels);
+  _stretch_carry(stretch, direct, frames);
+}
+
+
+/* Go back to reading straight from the callback. What SoundTouch still
+ * holds is drained first, and its end crossfaded with the same audio as it
+ * went in.
+ */
+static void _stretch_disengage(MixStreamStretch* stretch)
+{
+  const int channels = stretch->channels;
+  gsize pending = (gsize)(stretch->pending + 0.5);
+  gsize frames, xfade;
+  float* tail;
+
+  if (pending > 0) {
+    soundtouch_flush(stretch->soundtouch);
+    tail = g_new(float, pending * channels);
+    frames = soundtouch_receive_samples(stretch->soundtouch, tail, pending);
+    xfade = MIN(MIN(frames, stretch->history_frames), XFADE_FRAMES);
+    _stretch_crossfade(tail + (frames - xfade) * channels,
+      stretch->history + (stretch->history_frames - xfade) * channels, xfade, channels);
+    _stretch_carry(stretch, tail, frames);
+    g_free(tail);
+  }
+
+  soundtouch_clear(stretch->soundtouch);
+  stretch->pending = 0.0;
+  stretch->history_frames = 0;
+  stretch->engaged = FALSE;
+}
+
+
+/* Read up to numframes frames of processed audio into buf. Returns fewer
+ * only at the end of the input.
+ */
+gsize mix_stream_stretch_read(MixStreamStretch* stretch, float* buf, gsize numframes)
+{
+  gsize frames_obtained = 0;
+  gsize frames_read;
+  gboolean neutral = _stretch_is_neutral(stretch);
+
+  if (!stretch->input_eof) {
+    if (stretch->engaged && neutral)
+      _stretch_disengage(stretch);
+    else if (!stretch->engaged && !neutral)
+      _stretch_engage(stretch);
+  }
+  stretch->was_engaged = stretch->engaged;
+
+  while (frames_obtained < numframes) {
+    float* dest = buf + frames_obtained * stretch->channels;
+    gsize wanted = numframes - frames_obtained;
+
+    if (stretch->carry_frames > 0) {
+      frames_read = _stretch_take_carry(stretch, dest, wanted);
+    } else if (!stretch->engaged) {
+      frames_read = _stretch_read_direct(stretch, dest, wanted);
+    } else {
+      _stretch_feed(stretch, wanted);
+      frames_read = _stretch_receive(stretch, dest, wanted);
+    }
+    if (frames_read == 0)
+      break;
+    frames_obtained += frames_read;
+  }
+  return frames_obtained;
+}
+
+
+/* Check whether the last read went through SoundTouch. */
+gboolean mix_stream_stretch_was_engaged(const MixStreamStretch* stretch)
+{
+  return stretch->was_engaged;
+}
+
+
+/* Forget everything buffered, after the input has been seeked. */
+void mix_stream_stretch_clear(MixStreamStretch* stretch)
+{
+  if (stretch->soundtouch != NULL)
+    soundtouch_clear(stretch->soundtouch);
+  stretch->pending = 0.0;
+  stretch->history_frames = 0;
+  stretch->carry_frames = 0;
+  stretch->input_eof = FALSE;
+  stretch->fresh = TRUE;
+}
+
+
+void mix_stream_stretch_set_rate(MixStreamStretch* stretch, float rate)
+{
+  stretch->rate = rate;
+  if (stretch->soundtouch != NULL)
+    soundtouch_set_rate(stretch->soundtouch, rate);
+}
+
+
+void mix_stream_stretch_set_tempo(MixStreamStretch* stretch, float tempo)
+{
+  stretch->tempo = tempo;
+  if (stretch->soundtouch != NULL)
+    soundtouch_set_tempo(stretch->soundtouch, tempo);
+}
+
+
+void mix_stream_stretch_set_pitch_semitones(MixStreamStretch* stretch, float semitones)
+{
+  stretch->pitch = semitones;
+  if (stretch->soundtouch != NULL)
+    soundtouch_set_pitch_semitones(stretch->soundtouch, semitones);
+}
@@ -0,0 +1,39 @@
+/* Frets on Fire X (FoFiX)
+ * Copyright (C) 2012 FoFiX Team
+ *
+ * This program is free software; you can redistribute it and/or
+ * modify it under the terms of the GNU General Public License
+ * as published by the Free Software Foundation; either version 2
+ * of the License, or (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+ * MA  02110-1301, USA.
+ */
+
+#ifndef STRETCH_H
+#define STRETCH_H
+
+#include "MixStream.h"
+
+typedef struct _MixStreamStretch MixStreamStretch;
+
+MixStreamStretch* mix_stream_stretch_new(int samprate, int channels,
+  mix_stream_read_cb read_cb, void* data);
+void mix_stream_stretch_destroy(MixStreamStretch* stretch);
+
+gsize mix_stream_stretch_read(MixStreamStretch* stretch, float* buf, gsize numframes);
+gboolean mix_stream_stretch_was_engaged(const MixStreamStretch* stretch);
+void mix_stream_stretch_clear(MixStreamStretch* stretch);
+
+void mix_stream_stretch_set_rate(MixStreamStretch* stretch, float rate);
+void mix_stream_stretch_set_tempo(MixStreamStretch* stretch, float tempo);
+void mix_stream_stretch_set_pitch_semitones(MixStreamStretch* stretch, float semitones);
+
+#endif
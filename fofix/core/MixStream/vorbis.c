@@ -45,7 +45,7 @@ static const char* vf_strerror(int vf_err)
 
 
 /* Read callback for a libvorbisfile-backed stream. */
-static gsize vf_read_cb(float* buf, gsize bufsize, void* data)
+static gsize mix_stream_vorbisfile_read(float* buf, gsize bufsize, void* data)
 {
   OggVorbis_File* vf = data;
   int channels = ov_info(vf, -1)->channels;
@@ -71,7 +71,7 @@ static gsize vf_read_cb(float* buf, gsize bufsize, void* data)
 
 
 /* Seek callback for a libvorbisfile-backed stream. */
-static double vf_seek_cb(double time, void* data)
+static double mix_stream_vorbisfile_seek(double time, void* data)
 {
   int result = ov_time_seek((OggVorbis_File*)data, time);
   if (result == 0)
@@ -82,24 +82,23 @@ static double vf_seek_cb(double time, void* data)
 
 
 /* Length callback for a libvorbisfile-backed stream. */
-static double vf_length_cb(void* data)
+static double mix_stream_vorbisfile_length(void* data)
 {
   return ov_time_total((OggVorbis_File*)data, -1);
 }
 
 
 /* Free callback for a libvorbisfile-backed stream. */
-static void vf_free_cb(void* data)
+static void mix_stream_vorbisfile_free(void* data)
 {
   ov_clear((OggVorbis_File*)data);
   g_free(data);
 }
 
 
-/* Create a MixStream that plays Ogg Vorbis audio from the given file name. */
-MixStream* mix_stream_new_vorbisfile(const char* filename, GError** err)
+/* Open callback for a libvorbisfile-backed stream. */
+static void* mix_stream_vorbisfile_open(const char* filename, int* samprate, int* channels, GError** err)
 {
-  MixStream* stream;
   OggVorbis_File* vf = g_new(OggVorbis_File, 1);
   int vf_err;
   vorbis_info* vi;
@@ -117,14 +116,23 @@ MixStream* mix_stream_new_vorbisfile(const char* filename, GError** err)
   }
 
   vi = ov_info(vf, -1);
+  *samprate = vi->rate;
+  *channels = vi->channels;
+  return vf;
+}
 
-  stream = mix_stream_new(vi->rate, vi->channels, vf_read_cb, vf_seek_cb, vf_length_cb, vf_free_cb, vf, err);
-  if (stream == NULL) {
-    ov_clear(vf);
-    g_free(vf);
-    return NULL;
-  }
-  return stream;
+
+const MixStreamDecoder mix_stream_vorbisfile_decoder = {
+  "Ogg Vorbis", ".ogg",
+  mix_stream_vorbisfile_open, mix_stream_vorbisfile_read, mix_stream_vorbisfile_seek,
+  mix_stream_vorbisfile_length, mix_stream_vorbisfile_free
+};
+
+
+/* Create a MixStream that plays Ogg Vorbis audio from the given file name. */
+MixStream* mix_stream_new_vorbisfile(const char* filename, GError** err)
+{
+  return mix_stream_new_decoder(&mix_stream_vorbisfile_decoder, filename, err);
 }
 
 
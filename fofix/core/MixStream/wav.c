@@ -0,0 +1,211 @@
+/* Frets on Fire X (FoFiX)
+ * Copyright (C) 2012 FoFiX Team
+ *
+ * This program is free software; you can redistribute it and/or
+ * modify it under the terms of the GNU General Public License
+ * as published by the Free Software Foundation; either version 2
+ * of the License, or (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program; if not, write to the Free Software
+ * Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,
+ * MA  02110-1301, USA.
+ */
+
+/* PCM WAV decoder. The file is memory-mapped, so "decoding" is just
+ * converting samples to floats straight out of the page cache.
+ */
+
+#include "MixStream.h"
+
+#include <string.h>
+
+#define WAVE_FORMAT_PCM 0x0001
+#define WAVE_FORMAT_IEEE_FLOAT 0x0003
+#define WAVE_FORMAT_EXTENSIBLE 0xFFFE
+
+typedef struct {
+  GMappedFile* file;
+  const guint8* samples;
+  gsize frames;
+  gsize position;
+  int samprate;
+  int channels;
+  int format;
+  int sample_size;
+} WavFile;
+
+
+static guint16 _wav_u16(const guint8* p)
+{
+  return p[0] | (p[1] << 8);
+}
+
+
+static guint32 _wav_u32(const guint8* p)
+{
+  return p[0] | (p[1] << 8) | (p[2] << 16) | ((guint32)p[3] << 24);
+}
+
+
+/* Convert one sample to a float. */
+static float _wav_sample(const WavFile* wav, const guint8* p)
+{
+  union { guint32 i; float f; } u;
+
+  switch (wav->sample_size) {
+    case 1:
+      return (p[0] - 128) / 128.0f;
+    case 2:
+      return (gint16)_wav_u16(p) / 32768.0f;
+    case 3:
+      return ((gint32)((p[0] << 8) | (p[1] << 16) | ((guint32)p[2] << 24)) >> 8) / 8388608.0f;
+    default:
+      u.i = _wav_u32(p);
+      if (wav->format == WAVE_FORMAT_IEEE_FLOAT)
+        return u.f;
+      return (gint32)u.i / 2147483648.0f;
+  }
+}
+
+
+/* Read callback for a WAV-backed stream. */
+static gsize _wav_read(float* buf, gsize bufsize, void* data)
+{
+  WavFile* wav = data;
+  const gsize frame_size = wav->sample_size * wav->channels;
+  gsize frames = MIN(bufsize / (sizeof(float) * wav->channels), wav->frames - wav->position);
+  const guint8* p = wav->samples + wav->position * frame_size;
+  const guint8* end = p + frames * frame_size;
+
+  if (wav->format == WAVE_FORMAT_PCM && wav->sample_size == 2) {
+    /* The usual case, kept tight. */
+    for (; p < end; p += 2)
+      *(buf++) = (gint16)_wav_u16(p) / 32768.0f;
+  } else {
+    for (; p < end; p += wav->sample_size)
+      *(buf++) = _wav_sample(wav, p);
+  }
+
+  wav->position += frames;
+  return frames * wav->channels * sizeof(float);
+}
+
+
+/* Seek callback for a WAV-backed stream. */
+static double _wav_seek(double time, void* data)
+{
+  WavFile* wav = data;
+  if (time < 0.0)
+    return -1.0;
+  wav->position = MIN((gsize)(time * wav->samprate), wav->frames);
+  return (double)wav->position / wav->samprate;
+}
+
+
+/* Length callback for a WAV-backed stream. */
+static double _wav_length(void* data)
+{
+  WavFile* wav = data;
+  return (double)wav->frames / wav->samprate;
+}
+
+
+/* Free callback for a WAV-backed stream. */
+static void _wav_free(void* data)
+{
+  WavFile* wav = data;
+  g_mapped_file_unref(wav->file);
+  g_free(wav);
+}
+
+
+/* Open callback for a WAV-backed stream: map the file and find the format
+ * and data chunks.
+ */
+static void* _wav_open(const char* filename, int* samprate, int* channels, GError** err)
+{
+  GMappedFile* file;
+  const guint8* p;
+  const guint8* end;
+  const guint8* fmt = NULL;
+  const guint8* samples = NULL;
+  guint32 chunk_size;
+  gsize samples_size = 0;
+  WavFile* wav;
+  int bits;
+
+  file = g_mapped_file_new(filename, FALSE, err);
+  if (file == NULL)
+    return NULL;
+  p = (const guint8*)g_mapped_file_get_contents(file);
+  end = p + g_mapped_file_get_length(file);
+
+  if (end - p < 12 || memcmp(p, "RIFF", 4) != 0 || memcmp(p + 8, "WAVE", 4) != 0)
+    goto bad_file;
+
+  for (p += 12; end - p >= 8; p += 8 + chunk_size + (chunk_size & 1)) {
+    chunk_size = _wav_u32(p + 4);
+    if (memcmp(p, "fmt ", 4) == 0 && chunk_size >= 16 && (gsize)(end - p - 8) >= chunk_size) {
+      fmt = p + 8;
+    } else if (memcmp(p, "data", 4) == 0) {
+      /* Writers that couldn't seek back leave the size unset; take the rest. */
+      samples = p + 8;
+      samples_size = MIN((gsize)chunk_size, (gsize)(end - samples));
+      if (fmt != NULL)
+        break;
+    }
+    if ((gsize)(end - p - 8) < chunk_size)
+      break;
+  }
+  if (fmt == NULL || samples == NULL)
+    goto bad_file;
+
+  wav = g_new0(WavFile, 1);
+  wav->file = file;
+  wav->samples = samples;
+  wav->format = _wav_u16(fmt);
+  wav->channels = _wav_u16(fmt + 2);
+  wav->samprate = _wav_u32(fmt + 4);
+  bits = _wav_u16(fmt + 14);
+  if (wav->format == WAVE_FORMAT_EXTENSIBLE && _wav_u32(fmt - 4) >= 26)
+    wav->format = _wav_u16(fmt + 24);
+  wav->sample_size = (bits + 7) / 8;
+
+  if (!(wav->format == WAVE_FORMAT_PCM && wav->sample_size >= 1 && wav->sample_size <= 4) &&
+      !(wav->format == WAVE_FORMAT_IEEE_FLOAT && bits == 32)) {
+    g_set_error(err, MIX_STREAM_ERROR, MIX_STREAM_BAD_FILE,
+      "%s: unsupported WAV sample format", filename);
+    g_free(wav);
+    g_mapped_file_unref(file);
+    return NULL;
+  }
+  if (wav->channels < 1 || wav->channels > 2 || wav->samprate <= 0) {
+    g_set_error(err, MIX_STREAM_ERROR, MIX_STREAM_BAD_FILE,
+      "%s: WAV files must have one or two channels", filename);
+    g_free(wav);
+    g_mapped_file_unref(file);
+    return NULL;
+  }
+
+  wav->frames = samples_size / (wav->sample_size * wav->channels);
+  *samprate = wav->samprate;
+  *channels = wav->channels;
+  return wav;
+
+bad_file:
+  g_set_error(err, MIX_STREAM_ERROR, MIX_STREAM_BAD_FILE, "%s: not a WAV file", filename);
+  g_mapped_file_unref(file);
+  return NULL;
+}
+
+
+const MixStreamDecoder mix_stream_wav_decoder = {
+  "PCM WAV", ".wav",
+  _wav_open, _wav_read, _wav_seek, _wav_length, _wav_free
+};
@@ -0,0 +1,92 @@
+#####################################################################
+# -*- coding: iso-8859-1 -*-                                        #
+#                                                                   #
+# Frets on Fire X (FoFiX)                                           #
+# Copyright (C) 2012 FoFiX Team                                     #
+#                                                                   #
+# This program is free software; you can redistribute it and/or     #
+# modify it under the terms of the GNU General Public License       #
+# as published by the Free Software Foundation; either version 2    #
+# of the License, or (at your option) any later version.            #
+#                                                                   #
+# This program is distributed in the hope that it will be useful,   #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of    #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the     #
+# GNU General Public License for more details.                      #
+#                                                                   #
+# You should have received a copy of the GNU General Public License #
+# along with this program; if not, write to the Free Software       #
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,        #
+# MA  02110-1301, USA.                                              #
+#####################################################################
+
+'''
+Smooth playback position for streamed audio.
+
+A stream only learns where playback is when the mixer moves on to its next
+chunk, and the mixer doesn't do that at perfectly even times.  Reading the
+position straight off the last chunk therefore jumps back and forth by a
+few milliseconds every chunk.  Over a long song it also drifts, whenever
+the sound card's clock and the system clock disagree.  PlaybackClock
+keeps its own position running at the playback speed instead.  It nudges
+the rate up or down a little (slewing) so that it follows the chunk
+readings, and it never runs backwards.
+'''
+
+class PlaybackClock(object):
+    def __init__(self, slewTime = 0.5, maxSlew = 0.05, snapError = 0.1):
+        '''
+        @param slewTime:   Time (in seconds) over which to correct an error
+        @param maxSlew:    Fraction by which the clock may run fast or slow
+                           while correcting an error
+        @param snapError:  Errors bigger than this (in seconds) are jumped
+                           over instead of slewed away, e.g. after a seek
+        '''
+        self.slewTime  = slewTime
+        self.maxSlew   = maxSlew
+        self.snapError = snapError
+        self.reset()
+
+    def reset(self):
+        '''Forget the current position, e.g. when the stream is seeked or restarted.'''
+        self.position = None
+        self.time     = None
+        self.rate     = 0.0
+
+    def update(self, anchorPosition, endPosition, speed, started, now):
+        '''
+        Get the playback position from a reading of the stream's clock.
+        The readings are those of MixStream.get_clock().
+        @param anchorPosition:  Position of the chunk the mixer is on
+        @param endPosition:     Position just past the end of that chunk
+        @param speed:           Playback speed
+        @param started:         Time the mixer started on the chunk
+        @param now:             Current time, on the same clock
+        @return:                Smoothed position, in seconds
+        '''
+        raw = min(anchorPosition + speed * max(now - started, 0.0), endPosition)
+        if self.position is None:
+            return self._snap(raw, speed, now)
+
+        # Where the clock would be by now.  Chunks often start a little late,
+        # so let it run up to a chunk past what the mixer has before deciding
+        # playback has stopped; and never let it run backwards.
+        predicted = self.position + self.rate * (now - self.time)
+        predicted = min(predicted, endPosition + (endPosition - anchorPosition))
+        predicted = max(predicted, self.position)
+
+        error = raw - predicted
+        if abs(error) > self.snapError:
+            return self._snap(raw, speed, now)
+
+        slew = max(-self.maxSlew, min(self.maxSlew, error / self.slewTime))
+        self.rate     = speed * (1.0 + slew)
+        self.position = predicted
+        self.time     = now
+        return predicted
+
+    def _snap(self, position, speed, now):
+        self.position = position
+        self.time     = now
+        self.rate     = speed
+        return position
@@ -27,19 +27,33 @@ import sys
 import time
 import shutil
 import stat
-from Queue import Queue, Empty
-from threading import Thread, BoundedSemaphore
+import itertools
+from Queue import Queue, PriorityQueue, Empty
+from threading import Thread, Event
 
 from fofix.core.Task import Task
-from fofix.core.VFS import getWritableResourcePath
+from fofix.core.VFS import getWritableResourcePath, dirCache
 from fofix.core import Version
 from fofix.core import Config
 from fofix.core import Log
 
-class Loader(Thread):
-    def __init__(self, target, name, function, resultQueue, loaderSemaphore, onLoad = None, onCancel = None):
-        Thread.__init__(self)
-        self.semaphore   = loaderSemaphore
+# Load priorities: queued loads are started highest priority first, then in
+# the order they were asked for.
+PRIORITY_HIGH   = 0     # e.g. the preview of the song the player is on
+PRIORITY_NORMAL = 1
+PRIORITY_LOW    = 2     # e.g. artwork for songs further down the list
+
+# How long (in seconds) Resource.run may spend handing out finished loads
+# each tick.  At least one is always handed out.
+DELIVERY_BUDGET = 0.004
+
+class Loader(object):
+    """
+    Handle for a load: it is queued until one of the resource's workers
+    gets to it, then finished (assigned, and onLoad called) from the main
+    loop.  A load canceled before it is finished gets onCancel instead.
+    """
+    def __init__(self, target, name, function, resultQueue, onLoad = None, onCancel = None, priority = PRIORITY_NORMAL):
         self.target      = target
         self.name        = name
         self.function    = function
@@ -47,9 +61,11 @@ class Loader(Thread):
         self.result      = None
         self.onLoad      = onLoad
         self.onCancel    = onCancel
+        self.priority    = priority
         self.exception   = None
         self.time        = 0.0
         self.canceled    = False
+        self.done        = Event()
 
         #myfingershurt: the following should be global and done ONCE:
         self.logLoadings = Config.get("game", "log_loadings")
@@ -58,7 +74,62 @@ class Loader(Thread):
             setattr(target, name, None)
 
     def run(self):
-        self.semaphore.acquire()
+        # Called by a worker.  Canceled loads are skipped, but still go
+        # back to the main loop to have onCancel called.
+        if not self.canceled:
+            self.load()
+        self.resultQueue.put(self)
+        self.done.set()
+
+    def __str__(self):
+        return "%s(%s) %s" % (self.function.__name__, self.name, self.canceled and "(canceled)" or "")
+
+    def cancel(self):
+        self.canceled = True
+
+    def isAlive(self):
+        return not self.done.isSet()
+
+    def join(self, timeout = None):
+        self.done.wait(timeout)
+
+    def load(self):
+        try:
+            start = time.time()
+            self.result = self.function()
+            self.time = time.time() - start
+        except:
+            self.exception = sys.exc_info()
+
+    def finish(self):
+        if self.canceled:
+            if self.onCancel:
+                self.onCancel()
+            return
+
+        if self.logLoadings == 1:
+            Log.notice("Loaded %s.%s in %.3f seconds" % (self.target.__class__.__name__, self.name, self.time))
+
+        if self.exception:
+            raise self.exception[0], self.exception[1], self.exception[2]
+        if self.target and self.name:
+            setattr(self.target, self.name, self.result)
+        if self.onLoad:
+            self.onLoad(self.result)
+        return self.result
+
+    def __call__(self):
+        self.join()
+        return self.result
+
+class LoaderWorker(Thread):
+    """One of a resource's loading threads: runs queued loads until it gets None."""
+    def __init__(self, loadQueue):
+        Thread.__init__(self, name = "LoaderWorker")
+        self.daemon    = True
+        self.loadQueue = loadQueue
+
+    def run(self):
         game_priority = Config.get("performance", "game_priority")
         # Reduce priority on posix
         if os.name == "posix":
@@ -66,12 +137,11 @@ class Loader(Thread):
             os.nice(5 - game_priority)
         elif os.name == "nt":
             self.setPriority(priority = game_priority)
-        self.load()
-        self.semaphore.release()
-        self.resultQueue.put(self)
-
-    def __str__(self):
-        return "%s(%s) %s" % (self.function.__name__, self.name, self.canceled and "(canceled)" or "")
+        while True:
+            priority, order, loader = self.loadQueue.get()
+            if loader is None:
+                break
+            loader.run()
 
     def setPriority(self, pid = None, priority = 2):
         """ Set The Priority of a Windows Process.  Priority is a value between 0-5 where
@@ -104,45 +174,17 @@ class Loader(Thread):
         if Config.get('performance', 'restrict_to_first_processor'):
             win32process.SetProcessAffinityMask(handle, 1)
 
-    def cancel(self):
-        self.canceled = True
-
-    def load(self):
-        try:
-            start = time.time()
-            self.result = self.function()
-            self.time = time.time() - start
-        except:
-            self.exception = sys.exc_info()
-
-    def finish(self):
-        if self.canceled:
-            if self.onCancel:
-                self.onCancel()
-            return
-
-        if self.logLoadings == 1:
-            Log.notice("Loaded %s.%s in %.3f seconds" % (self.target.__class__.__name__, self.name, self.time))
-
-        if self.exception:
-            raise self.exception[0], self.exception[1], self.exception[2]
-        if self.target and self.name:
-            setattr(self.target, self.name, self.result)
-        if self.onLoad:
-            self.onLoad(self.result)
-        return self.result
-
-    def __call__(self):
-        self.join()
-        return self.result
-
 #stump: The VFS is probably going to render a lot of this obsolete.
 class Resource(Task):
-    def __init__(self, dataPath = os.path.join("..", "data")):
+    def __init__(self, dataPath = os.path.join("..", "data"), workers = None):
         self.resultQueue = Queue()
+        self.loadQueue = PriorityQueue()
+        self.loadOrder = itertools.count()
         self.dataPaths = [dataPath]
-        self.loaderSemaphore = BoundedSemaphore(value = 1)
         self.loaders = []
+        self.workers = []
+        self.workerCount = workers or Config.get("performance", "loader_threads")
+        self.deliveryBudget = DELIVERY_BUDGET
 
         #myfingershurt: the following should be global, and only done at startup.  Not every damn time a file is loaded.
         self.songPath = []
@@ -158,9 +200,18 @@ class Resource(Task):
             self.songPath = [self.baseLibrary]
 
         self.logLoadings = Config.get("game", "log_loadings")
+        self.setFileCacheRevalidation()
+
+    def setFileCacheRevalidation(self):
+        #the folders may have changed while they weren't being checked
+        revalidate = Config.get("performance", "revalidate_file_cache")
+        if revalidate and not dirCache.revalidate:
+            dirCache.invalidate()
+        dirCache.revalidate = revalidate
 
     #myfingershurt: Need a function to refresh the base library after a new one is selected:
     def refreshBaseLib(self):
+        dirCache.invalidate()
         self.baseLibrary = Config.get("setlist", "base_library")
         if self.baseLibrary and os.path.isdir(self.baseLibrary):
             self.songPath = [self.baseLibrary]
@@ -181,22 +232,21 @@ class Resource(Task):
         songPath = self.songPath
 
         if not args.get("writable", False):
+            writablePath = getWritableResourcePath()
             for dataPath in self.dataPaths + songPath:
                 readOnlyPath = os.path.join(dataPath, *name)
                 # If the requested file is in the read-write path and not in the
                 # read-only path, use the existing read-write one.
-                if os.path.isfile(readOnlyPath):
-                    return readOnlyPath
-                elif os.path.isdir(readOnlyPath):
+                if dirCache.exists(readOnlyPath):
                     return readOnlyPath
-                readWritePath = os.path.join(getWritableResourcePath(), *name)
-                if os.path.isfile(readWritePath):
+                readWritePath = os.path.join(writablePath, *name)
+                if dirCache.isfile(readWritePath):
                     return readWritePath
             return readOnlyPath
         else:
             for dataPath in [self.dataPaths[-1]] + songPath:
                 readOnlyPath = os.path.join(dataPath, *name)
-                if not (os.path.isfile(readOnlyPath) or os.path.isdir(readOnlyPath)):
+                if not dirCache.exists(readOnlyPath):
                     continue
                 try:
                     # First see if we can write to the original file
@@ -218,35 +268,65 @@ class Resource(Task):
                         pass
                     shutil.copy(readOnlyPath, readWritePath)
                     self.makeWritable(readWritePath)
+                    dirCache.invalidate(readWritePath)
                 # Create directories if needed
                 if not os.path.isdir(readWritePath) and os.path.isdir(readOnlyPath):
                     Log.notice("Creating writable directory '%s'." % "/".join(name))
                     os.makedirs(readWritePath)
                     self.makeWritable(readWritePath)
+                    dirCache.invalidate(readWritePath)
                 return readWritePath
             return readOnlyPath
 
     def makeWritable(self, path):
         os.chmod(path, stat.S_IWRITE | stat.S_IREAD | stat.S_IEXEC)
 
-    def load(self, target = None, name = None, function = lambda: None, synch = False, onLoad = None, onCancel = None):
+    def load(self, target = None, name = None, function = lambda: None, synch = False, onLoad = None, onCancel = None, priority = PRIORITY_NORMAL):
 
         if self.logLoadings == 1:
             Log.notice("Loading %s.%s %s" % (target.__class__.__name__, name, synch and "synchronously" or "asynchronously"))
 
-        l = Loader(target, name, function, self.resultQueue, self.loaderSemaphore, onLoad = onLoad, onCancel = onCancel)
+        l = Loader(target, name, function, self.resultQueue, onLoad = onLoad, onCancel = onCancel, priority = priority)
         if synch:
             l.load()
             return l.finish()
         else:
+            # The workers are started the first time they're needed.
+            while len(self.workers) < self.workerCount:
+                worker = LoaderWorker(self.loadQueue)
+                worker.start()
+                self.workers.append(worker)
             self.loaders.append(l)
-            l.start()
+            self.loadQueue.put((priority, self.loadOrder.next(), l))
             return l
 
+    def stopWorkers(self):
+        for worker in self.workers:
+            self.loadQueue.put((-1, -1, None))
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
+
     def run(self, ticks):
-        try:
-            loader = self.resultQueue.get_nowait()
-            loader.finish()
+        # Hand out as many finished loads as fit in the time budget, so lots
+        # of little ones don't trickle in at one a frame.
+        deadline = time.time() + self.deliveryBudget
+        while True:
+            try:
+                loader = self.resultQueue.get_nowait()
+            except Empty:
+                break
             self.loaders.remove(loader)
-        except Empty:
-            pass
+            loader.finish()
+            if time.time() >= deadline:
+                break
+
+    def finishLoads(self, loaders):
+        """
+        Wait for some loads and finish them now, in the calling (main) thread.
+        Other loads that are done by then are handed out as well.
+        """
+        for loader in loaders:
+            while loader in self.loaders:
+                loader.join()
+                self.run(0)
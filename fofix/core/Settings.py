@@ -876,6 +876,7 @@ class SettingsMenu(Menu.Menu):
            ConfigChoice(engine, engine.config, "audio",  "frequency"),
            ConfigChoice(engine, engine.config, "audio",  "bits"),
            ConfigChoice(engine, engine.config, "audio",  "buffersize"),
+           ConfigChoice(engine, engine.config, "audio",  "mic_passthrough_latency", autoApply = True),
            ConfigChoice(engine, engine.config, "game", "result_cheer_loop", autoApply = True), #MFH
            ConfigChoice(engine, engine.config, "game", "cheer_loop_delay", autoApply = True), #MFH
         ]
@@ -946,6 +947,8 @@ class SettingsMenu(Menu.Menu):
           ConfigChoice(engine, engine.config, "game", "HSMovement", autoApply = True), #racer
           ConfigChoice(engine, engine.config, "performance", "disable_libcount", autoApply = True, isQuickset = 1),
           ConfigChoice(engine, engine.config, "performance", "cache_song_metadata", autoApply = True, isQuickset = 1), #stump
+          ConfigChoice(engine, engine.config, "performance", "cache_compiled_charts", autoApply = True),
+          ConfigChoice(engine, engine.config, "performance", "song_scan_processes", autoApply = True),
           ConfigChoice(engine, engine.config, "songlist",  "nil_show_next_score", autoApply = True), #MFH
         ]
         self.listSettingsMenu = Menu.Menu(engine, self.listSettings, pos = (self.opt_text_x, self.opt_text_y), textColor = self.opt_text_color, selectedColor = self.opt_selected_color)
@@ -954,6 +957,10 @@ class SettingsMenu(Menu.Menu):
         advancedSettings = [
           ConfigChoice(engine, engine.config, "performance", "game_priority", autoApply = True, isQuickset = 1),
           ConfigChoice(engine, engine.config, "performance", "restrict_to_first_processor"),  #stump
+          ConfigChoice(engine, engine.config, "performance", "loader_threads"),
+          ActiveConfigChoice(engine, engine.config, "performance", "revalidate_file_cache", onChange = engine.resource.setFileCacheRevalidation),
+          ConfigChoice(engine, engine.config, "performance", "texture_cache_size"),
+          ConfigChoice(engine, engine.config, "performance", "texture_budget"),
           (_("Debug Settings"), self.debugSettingsMenu, _("Settings for coders to debug. Probably not worth changing.")),
           (_("Log Settings"),    self.logfileSettingsMenu, _("Adds junk information to the logfile. Probably not useful in bug reports.")),
         ]
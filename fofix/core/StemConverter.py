@@ -0,0 +1,171 @@
+#####################################################################
+# -*- coding: iso-8859-1 -*-                                        #
+#                                                                   #
+# Frets on Fire X (FoFiX)                                           #
+# Copyright (C) 2012 FoFiX Team                                     #
+#                                                                   #
+# This program is free software; you can redistribute it and/or     #
+# modify it under the terms of the GNU General Public License       #
+# as published by the Free Software Foundation; either version 2    #
+# of the License, or (at your option) any later version.            #
+#                                                                   #
+# This program is distributed in the hope that it will be useful,   #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of    #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the     #
+# GNU General Public License for more details.                      #
+#                                                                   #
+# You should have received a copy of the GNU General Public License #
+# along with this program; if not, write to the Free Software       #
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,        #
+# MA  02110-1301, USA.                                              #
+#####################################################################
+
+'''
+Offline conversion of a song's Ogg Vorbis stems to formats that are
+cheaper to play.
+
+Decoding five Vorbis stems at once is a real load on a slow CPU.  PCM WAV
+takes next to no work to play but about ten times the disk space; FLAC
+takes about half the space of WAV and still much less work than Vorbis.
+The game plays whichever of a stem's files is cheapest to decode (see
+L{Song.stemFileName}), so converted songs need nothing else done to them.
+
+Run it as::
+
+  python -m fofix.core.StemConverter [--flac] [--remove] FOLDER...
+
+Each folder is searched for songs (folders with a song.ini) to convert.
+'''
+
+import os
+import wave
+import subprocess
+import argparse
+
+import numpy as np
+
+from fofix.core import VFS
+
+# Frames to decode at a time.
+BLOCK_FRAMES = 65536
+
+def openReader(fileName):
+    '''
+    Open an audio file for decoding, with the game's own decoders.
+    @return:  Reader with samprate, channels and read(frames), which gives
+              interleaved float32 samples and '' at the end of the file
+    '''
+    from fofix.core.MixStream import AudioFileReader
+    return AudioFileReader(fileName)
+
+def writeWav(reader, fileName):
+    '''
+    Decode all of a reader into a 16-bit PCM WAV file.
+    @return:  Number of frames written
+    '''
+    out = wave.open(fileName, 'wb')
+    frames = 0
+    try:
+        out.setnchannels(reader.channels)
+        out.setsampwidth(2)
+        out.setframerate(reader.samprate)
+        while True:
+            data = reader.read(BLOCK_FRAMES)
+            if not data:
+                break
+            samples = np.frombuffer(data, dtype=np.float32)
+            out.writeframes((np.clip(samples, -1.0, 1.0) * 32767.0).round().astype('<i2').tostring())
+            frames += len(samples) // reader.channels
+    finally:
+        out.close()
+    return frames
+
+def encodeFlac(wavName, fileName):
+    '''Encode a WAV file as FLAC, with the flac command-line encoder.'''
+    subprocess.check_call(['flac', '--silent', '--force', '-o', fileName, wavName])
+
+class StemConverter(object):
+    def __init__(self, flac = False, removeOriginals = False, reader = openReader, flacEncoder = encodeFlac):
+        '''
+        @param flac:             Convert to FLAC instead of WAV
+        @param removeOriginals:  Delete each .ogg once it has been converted
+        @param reader:           Function opening an audio file for decoding,
+                                 as L{openReader}
+        @param flacEncoder:      Function encoding a WAV file as FLAC, as
+                                 L{encodeFlac}
+        '''
+        self.extension       = flac and '.flac' or '.wav'
+        self.removeOriginals = removeOriginals
+        self.reader          = reader
+        self.flacEncoder     = flacEncoder
+
+    def isUpToDate(self, source, dest):
+        return os.path.isfile(dest) and os.path.getmtime(dest) >= os.path.getmtime(source)
+
+    def convertFile(self, source, dest):
+        '''
+        Convert one audio file.  The result is written under a temporary name
+        first, so the game never sees a half-written stem.
+        '''
+        temp = dest + '.part'
+        wavName = temp
+        if self.extension == '.flac':
+            wavName = temp + '.wav'
+        try:
+            writeWav(self.reader(source), wavName)
+            if wavName != temp:
+                self.flacEncoder(wavName, temp)
+            if os.path.exists(dest):
+                os.remove(dest)
+            os.rename(temp, dest)
+        finally:
+            for name in (temp, wavName):
+                if os.path.exists(name):
+                    os.remove(name)
+            VFS.dirCache.invalidate(dest)
+
+    def convertSong(self, folder):
+        '''
+        Convert all of a song's .ogg files not converted yet.
+        @return:  List of the files written
+        '''
+        converted = []
+        for name in sorted(os.listdir(folder)):
+            base, extension = os.path.splitext(name)
+            if extension.lower() != '.ogg':
+                continue
+            source = os.path.join(folder, name)
+            dest = os.path.join(folder, base + self.extension)
+            if not self.isUpToDate(source, dest):
+                self.convertFile(source, dest)
+                converted.append(dest)
+            if self.removeOriginals:
+                os.remove(source)
+        return converted
+
+    def convertLibrary(self, root):
+        '''
+        Convert every song in a folder tree.
+        @return:  List of the files written
+        '''
+        converted = []
+        for folder, dirs, files in os.walk(root):
+            dirs.sort()
+            if 'song.ini' in files:
+                converted += self.convertSong(folder)
+        return converted
+
+def main(args = None):
+    parser = argparse.ArgumentParser(description = 'Convert the Ogg Vorbis stems of FoFiX songs to cheaper-to-play WAV or FLAC files.')
+    parser.add_argument('folders', nargs = '+', metavar = 'FOLDER', help = 'folder to search for songs')
+    parser.add_argument('--flac', action = 'store_true', help = 'convert to FLAC (needs the flac encoder) instead of WAV')
+    parser.add_argument('--remove', action = 'store_true', help = 'delete the .ogg files once converted')
+    args = parser.parse_args(args)
+
+    converter = StemConverter(flac = args.flac, removeOriginals = args.remove)
+    for folder in args.folders:
+        for fileName in converter.convertLibrary(folder):
+            print fileName
+
+if __name__ == '__main__':
+    main()
@@ -22,12 +22,19 @@
 
 from __future__ import division
 
+import os
+import weakref
+import threading
+
 import pygame
 from PIL import Image
 from OpenGL.GL import *
 from OpenGL.GLU import *
 
+from fofix.core.constants import *
 from fofix.core import Log
+from fofix.core import TextureData
+from fofix.core import VFS
 
 
 class TextureException(Exception):
@@ -39,57 +46,189 @@ class TextureException(Exception):
 # certain conditions due to a bug in Python.
 cleanupQueue = []
 
+# GL pixel formats for images with each number of components.
+textureFormats = {1: GL_LUMINANCE, 3: GL_RGB, 4: GL_RGBA}
+
+# Most dead textures deleted each frame.
+CLEANUP_BATCH = 16
+
+class TextureManager(object):
+    """
+    Keeps track of the live textures and the video memory they take, by
+    owner (see the OWNER_* constants).  Once a frame, L{update} deletes a
+    batch of dead textures and, if the total is over the budget, evicts the
+    least recently used textures of the evictable owners.  An evicted
+    texture frees its GL texture and is loaded from its file again the
+    next time it is bound: by a loader thread if there is a L{loader},
+    drawing as a blank placeholder until then.
+    """
+
+    def __init__(self, budget = 0, evictable = (OWNER_ALBUMART,), queue = cleanupQueue):
+        """
+        @param budget:     Video memory to keep textures to, in bytes, or 0
+                           for no limit
+        @param evictable:  Owners whose textures may be evicted
+        @param queue:      List of (function, args) to delete dead textures
+        """
+        self.budget = budget
+        self.evictable = set(evictable)
+        self.queue = queue
+        self.textures = weakref.WeakValueDictionary()
+        self.bytes = {}
+        # Textures may die (and be released) in any thread.
+        self.lock = threading.RLock()
+        self.serial = 0
+        self.frame = 0
+        self.evictions = 0
+        # function(function, onLoad) running function in a loader thread and
+        # calling onLoad with its result from the GL thread
+        self.loader = None
+        self.placeholderTexture = None
+
+    def placeholder(self):
+        """@return:  GL texture to draw while a texture is being reloaded: a transparent pixel"""
+        if self.placeholderTexture is None:
+            self.placeholderTexture = glGenTextures(1)
+            glBindTexture(GL_TEXTURE_2D, self.placeholderTexture)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, 1, 1, 0, GL_RGBA, GL_UNSIGNED_BYTE, "\x00" * 4)
+        return self.placeholderTexture
+
+    def register(self, texture):
+        with self.lock:
+            self.serial += 1
+            self.textures[self.serial] = texture
+
+    def setBytes(self, texture, size):
+        """Set the video memory a texture takes now"""
+        with self.lock:
+            self.bytes[texture.owner] = self.bytes.get(texture.owner, 0) - texture.bytes + size
+            texture.bytes = size
+
+    def release(self, texture, handle = None):
+        """Forget a dead texture, queueing its GL texture (if any) for deletion"""
+        self.setBytes(texture, 0)
+        if handle is not None:
+            self.queue.append((glDeleteTextures, [handle]))
+
+    def totalBytes(self):
+        return sum(self.bytes.values())
+
+    def cleanup(self, count = CLEANUP_BATCH):
+        """Delete up to count of the queued dead textures"""
+        for i in range(count):
+            try:
+                func, args = self.queue.pop(0)
+            except IndexError:
+                break
+            try:
+                func(*args)
+            except Exception, e:    #MFH - to catch "did you call glewInit?" crashes
+                Log.error("Texture.py texture deletion exception: %s" % e)
+
+    def evict(self):
+        """Evict textures, least recently used first, until the total is within the budget"""
+        total = self.totalBytes()
+        if not self.budget or total <= self.budget:
+            return
+        # Anything used this frame stays, even if that leaves us over.
+        candidates = [t for t in self.textures.values()
+                      if t.owner in self.evictable and t.bytes and t.isEvictable() and t.lastUsed < self.frame]
+        candidates.sort(key = lambda t: t.lastUsed)
+        for texture in candidates:
+            if total <= self.budget:
+                break
+            total -= texture.bytes
+            texture.evict()
+            self.evictions += 1
+
+    def update(self):
+        """Call once a frame, from the GL thread."""
+        self.cleanup()
+        self.evict()
+        self.frame += 1
+
+    def stats(self):
+        """
+        @return:  Dictionary of the number of live textures (textures), the
+                  bytes they take in all (bytes) and by owner (owners), the
+                  budget, the number of textures evicted so far (evictions)
+                  and the number of dead ones waiting to be deleted (pending)
+        """
+        with self.lock:
+            return {'textures': len(self.textures),
+                    'bytes': self.totalBytes(),
+                    'owners': dict([(o, b) for o, b in self.bytes.items() if b]),
+                    'budget': self.budget,
+                    'evictions': self.evictions,
+                    'pending': len(self.queue)}
+
+textureManager = TextureManager()
+
+_maxTextureSize = None
+def getMaxTextureSize():
+    """Largest texture the card takes; this must be called from the GL thread the first time"""
+    global _maxTextureSize
+    if _maxTextureSize is None:
+        _maxTextureSize = int(glGetIntegerv(GL_MAX_TEXTURE_SIZE))
+    return _maxTextureSize
+
 class Texture:
     """Represents an OpenGL texture, optionally loaded from disk in any format supported by PIL"""
 
-    def __init__(self, name = None, target = GL_TEXTURE_2D, useMipmaps = True):
-        # Delete all pending textures
-        try:
-            func, args = cleanupQueue[0]
-            del cleanupQueue[0]
-            func(*args)
-        except IndexError:
-            pass
-        except Exception, e:    #MFH - to catch "did you call glewInit?" crashes
-            Log.error("Texture.py texture deletion exception: %s" % e)
+    def __init__(self, name = None, target = GL_TEXTURE_2D, useMipmaps = True, owner = OWNER_OTHER, data = None):
+        """
+        @param name:  Image file to load, if any
+        @param data:  L{TextureData} already decoded from the file (maybe by
+                      another thread), so only its upload is done here
+        """
+        # Delete a pending texture; the rest go a batch a frame.
+        textureManager.cleanup(1)
 
         self.texture = glGenTextures(1)
         self.texEnv = GL_MODULATE
         self.glTarget = target
         self.framebuffer = None
         self.useMipmaps = useMipmaps
+        self.owner = owner
+        self.bytes = 0
+        self.lastUsed = textureManager.frame
+        self.reloadable = False
+        self.reloading = False
+        textureManager.register(self)
 
         self.setDefaults()
         self.name = name
 
-        if name:
+        if data is not None:
+            self.loadData(data)
+            self.reloadable = bool(name)
+        elif name:
             self.loadFile(name)
 
     def loadFile(self, name):
         """Load the texture from disk, using PIL to open the file"""
-        self.loadImage(Image.open(name))
+        self.loadData(TextureData.loadImageFile(name, self.useMipmaps, getMaxTextureSize()))
         self.name = name
+        self.reloadable = True
 
     def loadImage(self, image):
         """Load the texture from a PIL image"""
-        image = image.transpose(Image.FLIP_TOP_BOTTOM)
-        if image.mode == "RGBA":
-            string = image.tostring('raw', 'RGBA', 0, -1)
-            self.loadRaw(image.size, string, GL_RGBA, 4)
-        elif image.mode == "RGB":
-            string = image.tostring('raw', 'RGB', 0, -1)
-            self.loadRaw(image.size, string, GL_RGB, 3)
-        elif image.mode == "L":
-            string = image.tostring('raw', 'L', 0, -1)
-            self.loadRaw(image.size, string, GL_LUMINANCE, 1)
-        else:
-            try:
-                image = image.convert('RGB')
-                Log.warn("Unsupported image mode '%s' converted to 'RGB'. May have unexpected results." % image.mode)
-                string = image.tostring('raw', 'RGB', 0, -1)
-                self.loadRaw(image.size, string, GL_RGB, 3)
-            except:
-                raise TextureException("Unsupported image mode '%s'" % image.mode)
+        self.loadData(TextureData.decodeImage(image, self.useMipmaps, getMaxTextureSize()))
+
+    def loadData(self, data):
+        """Load the texture from a TextureData, uploading each of its mip levels"""
+        self.pixelSize = data.imageSize
+        self.size = (1.0, 1.0)
+        self.format = textureFormats[data.components]
+        self.components = data.components
+        self.reloadable = False
+        Texture.bind(self)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        for level, (w, h, string) in enumerate(data.levels):
+            glTexImage2D(self.glTarget, level, self.components, w, h, 0, self.format, GL_UNSIGNED_BYTE, string)
+        textureManager.setBytes(self, data.memoryUsage())
 
     def nextPowerOfTwo(self, n):
         m = 1
@@ -150,6 +289,7 @@ class Texture:
         self.size = (1.0, 1.0)
         self.format = format
         self.components = components
+        self.reloadable = False
         (w, h) = size
         Texture.bind(self)
         glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
@@ -158,6 +298,17 @@ class Texture:
         else:
             glTexImage2D(self.glTarget, 0, components, w, h, 0, format, GL_UNSIGNED_BYTE, string)
 
+        # components may be an internal format (GL_INTENSITY8) rather than a count.
+        if components > 4:
+            components = 1
+        if self.useMipmaps:
+            # gluBuild2DMipmaps scales to powers of two, and the levels below
+            # the first add up to a third of its size.
+            w, h = TextureData.nearestPowerOfTwo(w), TextureData.nearestPowerOfTwo(h)
+            textureManager.setBytes(self, w * h * components * 4 // 3)
+        else:
+            textureManager.setBytes(self, w * h * components)
+
     def loadSubRaw(self, size, position, string, format):
         Texture.bind(self)
         glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
@@ -167,9 +318,11 @@ class Texture:
         self.pixelSize = size
         self.size = (1.0, 1.0)
         self.format = format
+        self.reloadable = False
         Texture.bind(self)
         glTexImage2D(GL_TEXTURE_2D, 0, format, size[0], size[1], 0,
                      format, GL_UNSIGNED_BYTE, "\x00" * (size[0] * size[1] * 4))
+        textureManager.setBytes(self, size[0] * size[1] * 4)
 
     def setDefaults(self):
         """Set the default OpenGL options for this texture"""
@@ -181,6 +334,7 @@ class Texture:
         Texture.bind(self)
         glTexParameteri(self.glTarget, GL_TEXTURE_WRAP_S, u)
         glTexParameteri(self.glTarget, GL_TEXTURE_WRAP_T, v)
+        self.repeat = (u, v)
 
     def setFilter(self, min=None, mag=GL_LINEAR):
         Texture.bind(self)
@@ -191,17 +345,124 @@ class Texture:
                 min = GL_LINEAR
         glTexParameteri(self.glTarget, GL_TEXTURE_MIN_FILTER, min)
         glTexParameteri(self.glTarget, GL_TEXTURE_MAG_FILTER, mag)
+        self.filter = (min, mag)
 
     def __del__(self):
         # Queue this texture to be deleted later
         try:
-            cleanupQueue.append((glDeleteTextures, [self.texture]))
-        except NameError:
+            textureManager.release(self, self.texture)
+        except (NameError, AttributeError):
             pass
 
+    def memoryUsage(self):
+        """The video memory used by this texture (including mip levels), in bytes"""
+        return self.bytes
+
+    def isEvictable(self):
+        return self.reloadable and self.framebuffer is None and self.texture is not None
+
+    def evict(self):
+        """Free the GL texture; it is loaded from its file again when next bound"""
+        glDeleteTextures(self.texture)
+        self.texture = None
+        textureManager.setBytes(self, 0)
+
+    def reload(self):
+        """Load an evicted texture again, in a loader thread if the texture manager has one"""
+        if textureManager.loader is None:
+            self.reloaded(TextureData.loadImageFile(self.name, self.useMipmaps, getMaxTextureSize()))
+            return
+
+        self.reloading = True
+        name, useMipmaps, maxSize = self.name, self.useMipmaps, getMaxTextureSize()
+        def decode():
+            try:
+                return TextureData.loadImageFile(name, useMipmaps, maxSize)
+            except (IOError, OverflowError), e:
+                Log.warn("Unable to reload texture %s: %s" % (name, e))
+        # The load doesn't keep the texture alive.
+        ref = weakref.ref(self)
+        def decoded(data):
+            texture = ref()
+            if texture is not None and data is not None:
+                texture.reloaded(data)
+        textureManager.loader(decode, decoded)
+
+    def reloaded(self, data):
+        self.reloading = False
+        self.texture = glGenTextures(1)
+        self.setRepeat(*self.repeat)
+        self.setFilter(*self.filter)
+        self.loadData(data)
+        self.reloadable = True
+
     def bind(self, glTarget = None):
         """Bind this texture to self.glTarget in the current OpenGL context"""
+        if self.texture is None and not self.reloading:
+            self.reload()
+        self.lastUsed = textureManager.frame
         if not glTarget:
             glTarget = self.glTarget
-        glBindTexture(glTarget, self.texture)
+        if self.texture is None:
+            glBindTexture(glTarget, textureManager.placeholder())
+        else:
+            glBindTexture(glTarget, self.texture)
         glTexEnvf(GL_TEXTURE_ENV, GL_TEXTURE_ENV_MODE, self.texEnv)
+
+class TextureCache(object):
+    """
+    Shares textures loaded from files, so that an image wanted by several
+    parts of the game is decoded and uploaded once.  Entries are weak: a
+    texture goes away (and its GL texture is queued for deletion as usual)
+    once the last thing holding it lets go of it.
+
+    Files are only checked for changes when the VFS directory cache is set
+    to revalidate; a changed file is then loaded again.
+    """
+
+    def __init__(self, factory = Texture):
+        self.factory = factory
+        self.textures = weakref.WeakValueDictionary()
+        self.mtimes = weakref.WeakKeyDictionary()
+        self.hits = 0
+        self.misses = 0
+
+    def _mtime(self, fileName):
+        try:
+            return os.path.getmtime(fileName)
+        except OSError:
+            return None
+
+    def get(self, fileName, target = GL_TEXTURE_2D, useMipmaps = True, owner = OWNER_OTHER, data = None):
+        """
+        Get the texture for an image file, loading it if there isn't a live one.
+        @param data:  L{TextureData} already decoded from the file, used instead of reading it
+        """
+        fileName = os.path.abspath(fileName)
+        key = (fileName, target, useMipmaps, owner)
+        texture = self.textures.get(key)
+        if texture is not None and VFS.dirCache.revalidate and self._mtime(fileName) != self.mtimes.get(texture):
+            texture = None
+        if texture is None:
+            self.misses += 1
+            texture = self.factory(fileName, target, useMipmaps, owner, data)
+            self.textures[key] = texture
+            self.mtimes[texture] = self._mtime(fileName)
+        else:
+            self.hits += 1
+        return texture
+
+    def stats(self):
+        """
+        @return:  Dictionary of the number of live textures (textures), their
+                  estimated size in bytes (bytes), and the number of requests
+                  that found a live texture (hits) or had to load one (misses)
+        """
+        textures = self.textures.values()
+        return {'textures': len(textures),
+                'bytes': sum([t.memoryUsage() for t in textures]),
+                'hits': self.hits,
+                'misses': self.misses}
+
+# The cache used by ImgDrawing for image files.
+textureCache = TextureCache()
@@ -0,0 +1,264 @@
+#####################################################################
+# -*- coding: iso-8859-1 -*-                                        #
+#                                                                   #
+# Frets on Fire X (FoFiX)                                           #
+# Copyright (C) 2012 FoFiX Team                                     #
+#                                                                   #
+# This program is free software; you can redistribute it and/or     #
+# modify it under the terms of the GNU General Public License       #
+# as published by the Free Software Foundation; either version 2    #
+# of the License, or (at your option) any later version.            #
+#                                                                   #
+# This program is distributed in the hope that it will be useful,   #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of    #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the     #
+# GNU General Public License for more details.                      #
+#                                                                   #
+# You should have received a copy of the GNU General Public License #
+# along with this program; if not, write to the Free Software       #
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,        #
+# MA  02110-1301, USA.                                              #
+#####################################################################
+
+
+'''
+The CPU half of loading a texture from an image: decoding, converting to
+a format OpenGL takes, scaling to power-of-two dimensions and building
+the mipmaps.  None of it touches OpenGL, so it can run in any thread; the
+GL thread is left with only the glTexImage2D calls (L{Texture.loadData}).
+
+Decoded images can also be kept in a cache on disk (see L{setCacheDir}),
+as the raw mip chain ready for upload.  Reading that back is a lot
+cheaper than decoding a PNG and building mipmaps for it again.
+'''
+
+import os
+import struct
+import hashlib
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+from fofix.core import Log
+from fofix.core import VFS
+
+# Number of bytes a pixel takes in each of the modes textures are made from.
+COMPONENTS = {'L': 1, 'RGB': 3, 'RGBA': 4}
+MODES = dict([(c, m) for m, c in COMPONENTS.items()])
+
+class TextureData(object):
+    def __init__(self, imageSize, mode, levels):
+        '''
+        @param imageSize:  Size of the image, in pixels, before any scaling
+        @param mode:       'L', 'RGB' or 'RGBA'
+        @param levels:     List of (width, height, pixels) for each mip
+                           level, largest first; pixels is a string of the
+                           rows of the level, top row first
+        '''
+        self.imageSize  = imageSize
+        self.mode       = mode
+        self.components = COMPONENTS[mode]
+        self.levels     = levels
+
+    def memoryUsage(self):
+        return sum([w * h * self.components for w, h, pixels in self.levels])
+
+def nearestPowerOfTwo(n):
+    '''Round to a power of two the way gluBuild2DMipmaps does (3 * 2^k and up round up).'''
+    power = 1
+    while n > 1:
+        if n == 3:
+            return power * 4
+        n >>= 1
+        power <<= 1
+    return power
+
+def halve(pixels):
+    '''Box-filter an array of pixels (rows, columns, components) to half size.'''
+    h, w = pixels.shape[:2]
+    total = pixels.astype(np.uint16)
+    divisor = 1
+    if h > 1:
+        total = total[0::2] + total[1::2]
+        divisor *= 2
+    if w > 1:
+        total = total[:, 0::2] + total[:, 1::2]
+        divisor *= 2
+    return ((total + divisor // 2) // divisor).astype(np.uint8)
+
+def decodeImage(image, mipmaps = True, maxSize = None):
+    '''
+    Turn a PIL image into texture data.  With mipmaps, it is scaled to
+    power-of-two dimensions no bigger than maxSize and the whole mip chain
+    is built, as gluBuild2DMipmaps would; without, it is left as it is.
+    @return:  L{TextureData}
+    '''
+    if image.mode not in COMPONENTS:
+        if image.mode in ('LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info):
+            image = image.convert('RGBA')
+        else:
+            Log.warn("Unsupported image mode '%s' converted to 'RGB'. May have unexpected results." % image.mode)
+            image = image.convert('RGB')
+    imageSize = image.size
+
+    if mipmaps:
+        w, h = [nearestPowerOfTwo(n) for n in imageSize]
+        if maxSize:
+            while (w > maxSize or h > maxSize) and (w > 1 or h > 1):
+                w, h = max(w // 2, 1), max(h // 2, 1)
+        if (w, h) != imageSize:
+            image = image.resize((w, h), Image.ANTIALIAS)
+
+    pixels = np.asarray(image, dtype=np.uint8)
+    if pixels.ndim == 2:
+        pixels = pixels[:, :, np.newaxis]
+    levels = [(pixels.shape[1], pixels.shape[0], pixels.tostring())]
+    if mipmaps:
+        while pixels.shape[0] > 1 or pixels.shape[1] > 1:
+            pixels = halve(pixels)
+            levels.append((pixels.shape[1], pixels.shape[0], pixels.tostring()))
+    return TextureData(imageSize, image.mode, levels)
+
+class MipCache(object):
+    '''
+    Decoded images on disk.  There is one file per source image and set of
+    options; it records the source's mtime and size, and is rebuilt when
+    they change.
+    '''
+    MAGIC = 'FoFiXMip'
+    VERSION = 1
+    HEADER = struct.Struct('<8sIdQIIII')
+    LEVEL = struct.Struct('<II')
+
+    def __init__(self, dir, maxBytes = None):
+        '''
+        @param dir:       Folder to keep the cache in
+        @param maxBytes:  Size to trim the cache to, oldest files first
+        '''
+        self.dir = dir
+        if not os.path.isdir(dir):
+            os.makedirs(dir)
+            VFS.dirCache.invalidate(dir)
+        if maxBytes is not None:
+            self.trim(maxBytes)
+
+    def cacheFile(self, fileName, mipmaps, maxSize):
+        key = hashlib.sha1(repr((os.path.abspath(fileName), mipmaps, maxSize))).hexdigest()
+        return os.path.join(self.dir, key + '.mip')
+
+    def read(self, cacheFile, source):
+        '''@return:  L{TextureData} from a cache file, or None if it's missing or out of date'''
+        try:
+            data = open(cacheFile, 'rb').read()
+        except IOError:
+            return None
+        try:
+            magic, version, mtime, size, w, h, components, count = self.HEADER.unpack_from(data)
+            if magic != self.MAGIC or version != self.VERSION or (mtime, size) != source:
+                return None
+            levels = []
+            pos = self.HEADER.size
+            for i in range(count):
+                lw, lh = self.LEVEL.unpack_from(data, pos)
+                pos += self.LEVEL.size
+                end = pos + lw * lh * components
+                if end > len(data):
+                    return None
+                levels.append((lw, lh, data[pos:end]))
+                pos = end
+            return TextureData((w, h), MODES[components], levels)
+        except (struct.error, KeyError):
+            return None
+
+    def write(self, cacheFile, source, texData):
+        # Loaders in other threads may be writing the same file.
+        fd, temp = tempfile.mkstemp(suffix = '.part', dir = self.dir)
+        f = os.fdopen(fd, 'wb')
+        try:
+            f.write(self.HEADER.pack(self.MAGIC, self.VERSION, source[0], source[1],
+              texData.imageSize[0], texData.imageSize[1], texData.components, len(texData.levels)))
+            for w, h, pixels in texData.levels:
+                f.write(self.LEVEL.pack(w, h))
+                f.write(pixels)
+        finally:
+            f.close()
+        if os.path.exists(cacheFile):
+            os.remove(cacheFile)
+        os.rename(temp, cacheFile)
+        VFS.dirCache.invalidate(cacheFile)
+
+    def load(self, fileName, mipmaps = True, maxSize = None):
+        '''
+        Get the texture data for an image file, from the cache if it's there
+        and decoding it (and caching the result) if not.
+        @return:  L{TextureData}
+        '''
+        try:
+            st = os.stat(fileName)
+        except OSError, e:
+            # What opening the image would have raised.
+            raise IOError(e.errno, e.strerror, fileName)
+        source = (st.st_mtime, st.st_size)
+        cacheFile = self.cacheFile(fileName, mipmaps, maxSize)
+        texData = self.read(cacheFile, source)
+        if texData is not None:
+            # Keep recently used files from being trimmed.
+            try:
+                os.utime(cacheFile, None)
+            except OSError:
+                pass
+            return texData
+
+        texData = decodeImage(Image.open(fileName), mipmaps, maxSize)
+        try:
+            self.write(cacheFile, source, texData)
+        except (IOError, OSError), e:
+            Log.warn('Unable to cache texture for %s: %s' % (fileName, e))
+        return texData
+
+    def trim(self, maxBytes):
+        '''Delete the least recently used cache files until the cache fits in maxBytes.'''
+        files = []
+        for name in os.listdir(self.dir):
+            path = os.path.join(self.dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+        files.sort()
+        total = sum([f[1] for f in files])
+        for mtime, size, path in files:
+            if total <= maxBytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        VFS.dirCache.invalidate(self.dir)
+
+# The cache used by loadImageFile, if there is one.
+mipCache = None
+
+def setCacheDir(dir, maxBytes = None):
+    '''
+    Keep decoded images in a folder, or stop doing so.
+    @param dir:       Folder to use, or None for no cache
+    @param maxBytes:  Size to trim the cache to
+    '''
+    global mipCache
+    if dir is None:
+        mipCache = None
+    else:
+        mipCache = MipCache(dir, maxBytes)
+
+def loadImageFile(fileName, mipmaps = True, maxSize = None):
+    '''
+    Decode an image file into texture data, through the cache if there is one.
+    @return:  L{TextureData}
+    '''
+    if mipCache is not None:
+        return mipCache.load(fileName, mipmaps, maxSize)
+    return decodeImage(Image.open(fileName), mipmaps, maxSize)
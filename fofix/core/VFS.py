@@ -47,6 +47,7 @@ import sys
 import shutil
 import time
 import sqlite3
+import threading
 from stat import S_IFDIR, S_ISDIR, S_ISREG
 from fnmatch import fnmatch
 
@@ -54,6 +55,146 @@ from fofix.core import Version
 
 _mountTable = {}
 
+class DirCache(object):
+    '''
+    Cache of physical directory listings, so that looking a file up in
+    several candidate directories doesn't cost a C{stat()} per candidate.
+    Each directory is listed once, and later lookups in it are answered
+    from the listing.  This matters most on slow storage (network shares,
+    SD cards) with deep theme and song trees.
+
+    Writes made through the VFS invalidate the listings they affect.
+    Anything else changing the disk under the cache should call
+    L{invalidate}, or turn on C{revalidate} so that each listing is
+    checked against its directory's mtime when it is used.
+
+    The cache may be used from several threads at once.
+    '''
+
+    def __init__(self, revalidate=False):
+        # Map from normalized directory path to (mtime, names, kinds), where
+        # kinds maps each normcased name to True for a directory, False for
+        # anything else, or None if not yet known.  A directory that could
+        # not be listed maps to None.
+        self._listings = {}
+        self.revalidate = revalidate
+        self.hits = 0
+        self.misses = 0
+        # The disk is read without holding the lock; a listing read while
+        # the cache was being invalidated is used but not kept.
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def _listing(self, dir):
+        dir = os.path.normpath(dir)
+        with self._lock:
+            entry = self._listings.get(dir, False)
+            generation = self._generation
+        if entry is not False and self.revalidate and entry is not None:
+            try:
+                if os.stat(dir).st_mtime != entry[0]:
+                    entry = False
+            except OSError:
+                entry = False
+        if entry is not False:
+            with self._lock:
+                self.hits += 1
+            return entry
+
+        try:
+            mtime = os.stat(dir).st_mtime
+            names = os.listdir(dir)
+        except OSError:
+            entry = None
+        else:
+            entry = (mtime, names, dict((os.path.normcase(n), None) for n in names))
+        with self._lock:
+            self.misses += 1
+            if generation == self._generation:
+                self._listings[dir] = entry
+        return entry
+
+    def _kind(self, path):
+        '''
+        @return:  True for a directory, False for anything else,
+                  or None if there is nothing at the path
+        '''
+        path = os.path.normpath(path)
+        dir, name = os.path.split(path)
+        if not name:
+            return os.path.isdir(path) or None
+        entry = self._listing(dir)
+        if entry is None:
+            return None
+        kinds = entry[2]
+        key = os.path.normcase(name)
+        if key not in kinds:
+            return None
+        kind = kinds[key]
+        if kind is None:
+            kind = kinds[key] = os.path.isdir(path)
+        return kind
+
+    def exists(self, path):
+        return self._kind(path) is not None
+
+    def isfile(self, path):
+        return self._kind(path) is False
+
+    def isdir(self, path):
+        return self._kind(path) is True
+
+    def listdir(self, dir):
+        '''
+        @return:  Names in a physical directory
+        @raise OSError(ENOENT): if it can't be listed
+        '''
+        entry = self._listing(dir)
+        if entry is None:
+            raise OSError(errno.ENOENT, os.strerror(errno.ENOENT))
+        return list(entry[1])
+
+    def glob(self, pattern):
+        '''
+        Like C{glob.glob()}, but only the part after the last separator may be a pattern.
+        As there, names starting with a dot only match a pattern that does too.
+        '''
+        dir, basename = os.path.split(pattern)
+        entry = self._listing(dir or os.curdir)
+        if entry is None:
+            return []
+        hidden = basename.startswith('.')
+        return [os.path.join(dir, n) for n in entry[1] if fnmatch(n, basename) and (hidden or not n.startswith('.'))]
+
+    def invalidate(self, path=None):
+        '''
+        Forget what is known about a physical path: the listing of its
+        directory, its own listing and those of anything under it.
+        @param path:   Path that changed, or None to forget everything
+        '''
+        with self._lock:
+            self._generation += 1
+            if path is None:
+                self._listings.clear()
+                return
+            path = os.path.normpath(path)
+            prefix = path.rstrip(os.sep) + os.sep
+            for dir in self._listings.keys():
+                if dir == path or dir.startswith(prefix) or prefix.startswith(dir.rstrip(os.sep) + os.sep):
+                    del self._listings[dir]
+
+    def stats(self):
+        '''
+        @return:  Dictionary of the number of lookups answered from a cached
+                  listing (hits), the number that had to list a directory
+                  (misses) and the number of listings held (dirs)
+        '''
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'dirs': len(self._listings)}
+
+# The cache used by the VFS; Resource and Data look things up through it too.
+dirCache = DirCache()
+
 class Mount(object):
     '''Implementation of a mount point in the VFS root.'''
 
@@ -72,7 +213,7 @@ class Mount(object):
         '''
         for p in (self.writable + self.readOnly):
             candidate = os.path.join(p, path).rstrip(os.sep)
-            if os.path.exists(candidate):
+            if dirCache.exists(candidate):
                 return candidate
         raise OSError(errno.ENOENT, os.strerror(errno.ENOENT))
 
@@ -90,7 +231,7 @@ class Mount(object):
             raise OSError(errno.EROFS, os.strerror(errno.EROFS))
 
         wpath = os.path.join(self.writable[0], path).rstrip(os.sep)
-        if os.path.exists(wpath):
+        if dirCache.exists(wpath):
             return wpath
 
         try:
@@ -100,10 +241,11 @@ class Mount(object):
                 raise
             rpath = None
 
-        if not os.path.isdir(os.path.dirname(wpath)):
+        if not dirCache.isdir(os.path.dirname(wpath)):
             os.makedirs(os.path.dirname(wpath))
         if rpath is not None:
             shutil.copy2(rpath, wpath)
+        dirCache.invalidate(wpath)
         return wpath
 
     def listdir(self, path):
@@ -115,8 +257,8 @@ class Mount(object):
         contents = set()
         for p in (self.writable + self.readOnly):
             candidate = os.path.join(p, path)
-            if os.path.isdir(candidate):
-                contents.update(os.listdir(candidate))
+            if dirCache.isdir(candidate):
+                contents.update(dirCache.listdir(candidate))
         return list(contents)
 
 
@@ -283,7 +425,9 @@ def unlink(path):
     will instead appear to revert to the read-only version.
     @param path:   Path to delete
     '''
-    os.unlink(resolveWrite(path))
+    rpath = resolveWrite(path)
+    os.unlink(rpath)
+    dirCache.invalidate(rpath)
 
 
 def mkdir(path):
@@ -292,7 +436,9 @@ def mkdir(path):
     up to it that are missing (like C{os.makedirs()}).
     @param path:   Path at which to create a directory
     '''
-    os.makedirs(resolveWrite(path))
+    rpath = resolveWrite(path)
+    os.makedirs(rpath)
+    dirCache.invalidate(rpath)
 
 
 def rmdir(path):
@@ -300,7 +446,9 @@ def rmdir(path):
     Remove a virtual directory.  The directory must be empty.
     @param path:   Path to directory to remove
     '''
-    os.rmdir(resolveWrite(path))
+    rpath = resolveWrite(path)
+    os.rmdir(rpath)
+    dirCache.invalidate(rpath)
 
 
 def rename(src, dest):
@@ -309,7 +457,10 @@ def rename(src, dest):
     @param src:    Path to rename from
     @param dest:   Path to rename to
     '''
-    os.rename(resolveWrite(src), resolveWrite(dest))
+    rsrc, rdest = resolveWrite(src), resolveWrite(dest)
+    os.rename(rsrc, rdest)
+    dirCache.invalidate(rsrc)
+    dirCache.invalidate(rdest)
 
 
 def exists(path):
@@ -366,14 +517,19 @@ def open(path, mode='r'):
     if mode in ('r', 'rb'):
         return _realopen(resolveRead(path), mode)
     else:
-        return _realopen(resolveWrite(path), mode)
+        rpath = resolveWrite(path)
+        f = _realopen(rpath, mode)
+        dirCache.invalidate(rpath)
+        return f
 
 
-def openSqlite3(path):
+def openSqlite3(path, anyThread = False):
     '''
     Open a virtual file as a writable SQLite database.
-    @param path:  Path to open
-    @return:      C{sqlite3.Connection} object for the file
+    @param path:       Path to open
+    @param anyThread:  Allow the connection to be used from other threads
+                       than this one; the caller must then serialize access
+    @return:           C{sqlite3.Connection} object for the file
     '''
 
     # There is a bug in the sqlite3 module's handling of path names containing
@@ -382,8 +538,9 @@ def openSqlite3(path):
     oldcwd = os.getcwd()
     try:
         dbName = resolveWrite(path)
+        dirCache.invalidate(dbName)
         os.chdir(os.path.dirname(dbName))
-        return sqlite3.Connection(os.path.basename(dbName))
+        return sqlite3.Connection(os.path.basename(dbName), check_same_thread = not anyThread)
     finally:
         os.chdir(oldcwd)
 
@@ -32,29 +32,64 @@
 #include <errno.h>
 #include <stdio.h>
 
+/* How many converted frames the decoding thread may get ahead of playback. */
+#define FRAME_QUEUE_SIZE 3
+
+/* Falling this many frames behind makes the decoding thread skip ahead by
+ * keyframe instead of decoding its way there.
+ */
+#define SKIP_AHEAD_FRAMES 30
+
+typedef struct {
+  guchar* pixels;
+  ogg_int64_t frame;
+} VideoFrame;
+
 struct _VideoPlayer {
+  /* Only touched by the decoding thread once it has started. */
   FILE* file;
   ogg_sync_state osync;
   GHashTable* stream_table;
   ogg_page current_page;
   gboolean have_video;
+  gboolean headers_done;
   ogg_stream_state* vstream;
   th_info tinfo;
   th_comment tcomment;
   th_setup_info* tsetup;
   gboolean eof;
   th_dec_ctx* vdecoder;
+  struct SwsContext* sws_context;
+  ogg_int64_t decode_frame;  /* number of the last frame decoded, -1 for none */
+  gboolean picture_queued;   /* whether the decoder's current picture is in the queue */
+  ogg_packet* skipped_packets;
+  int skipped_count;
+  int skipped_capacity;
+
+  /* Only touched by the thread using the player. */
   gboolean playing;
   glong playback_position;  /* microseconds */
   GTimeVal playback_start_time;
   GLuint video_texture;
-  ogg_int64_t decode_granpos;
-  th_ycbcr_buffer frame_buffer;
-  struct SwsContext* sws_context;
+  ogg_int64_t shown_frame;
   int tex_width;
   int tex_height;
-  guchar* tex_buffer;
-  gboolean buffer_dirty;
+  double fps;
+
+  /* Shared, under the mutex. */
+  GThread* thread;
+  GMutex* mutex;
+  GCond* cond;
+  VideoFrame queue[FRAME_QUEUE_SIZE];
+  int queue_start;
+  int queue_length;
+  ogg_int64_t want_frame;
+  gboolean seek_pending;
+  ogg_int64_t seek_frame;
+  gboolean decode_done;
+  gboolean quit;
+  GError* error;
+  int dropped_frames;
 };
 
 static void destroy_stream(gpointer data)
@@ -88,7 +123,7 @@ static gboolean demux_next_page(VideoPlayer* player, GError** err)
   ostream = g_hash_table_lookup(player->stream_table, &serialno);
   if (ostream != NULL) {
     ogg_stream_pagein(ostream, &player->current_page);
-  } else if (ogg_page_bos(&player->current_page)) {
+  } else if (ogg_page_bos(&player->current_page) && !player->headers_done) {
     int* key = g_new(int, 1);
     *key = serialno;
     ostream = g_new(ogg_stream_state, 1);
@@ -111,16 +146,29 @@ static guint32 next_power_of_two(guint32 n)
   return n;
 }
 
-static void update_texture(VideoPlayer* player)
+/* Convert the decoder's current picture to RGBA. */
+static void convert_picture(VideoPlayer* player, guchar* pixels)
 {
   /* TODO: handle pic_[xy] correctly so the whole Theora testsuite works */
-  const uint8_t* const src[] = {player->frame_buffer[0].data, player->frame_buffer[1].data, player->frame_buffer[2].data};
-  int src_stride[] = {player->frame_buffer[0].stride, player->frame_buffer[1].stride, player->frame_buffer[2].stride};
-  uint8_t* dest[] = {player->tex_buffer};
+  th_ycbcr_buffer frame_buffer;
+  const uint8_t* src[3];
+  int src_stride[3];
+  uint8_t* dest[] = {pixels};
   int dest_stride[] = {player->tex_width * 4};
+  int i;
+
+  th_decode_ycbcr_out(player->vdecoder, frame_buffer);
+  for (i = 0; i < 3; i++) {
+    src[i] = frame_buffer[i].data;
+    src_stride[i] = frame_buffer[i].stride;
+  }
   sws_scale(player->sws_context, src, src_stride, 0, player->tinfo.pic_height, dest, dest_stride);
-  glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, player->tex_width, player->tex_height, 0, GL_RGBA, GL_UNSIGNED_BYTE, player->tex_buffer);
-  player->buffer_dirty = FALSE;
+}
+
+static void upload_frame(VideoPlayer* player, const guchar* pixels)
+{
+  glBindTexture(GL_TEXTURE_2D, player->video_texture);
+  glTexSubImage2D(GL_TEXTURE_2D, 0, 0, 0, player->tex_width, player->tex_height, GL_RGBA, GL_UNSIGNED_BYTE, pixels);
 }
 
 static gboolean demux_headers(VideoPlayer* player, GError** err)
@@ -168,6 +216,7 @@ static gboolean demux_headers(VideoPlayer* player, GError** err)
   return FALSE;
 
 got_all_headers:
+  player->headers_done = TRUE;
   if (!player->have_video) {
     g_set_error(err, VIDEO_PLAYER_ERROR, VIDEO_PLAYER_NO_VIDEO,
       "Failed to find a Theora stream in the video file.");
@@ -187,20 +236,24 @@ got_all_headers:
         /* We have everything we need to start decoding, and we have the first video packet. */
         int decode_status;
         int pix_format;
+        int i;
         player->vdecoder = th_decode_alloc(&player->tinfo, player->tsetup);
         player->playing = FALSE;
         player->playback_position = 0;
-        decode_status = th_decode_packetin(player->vdecoder, &pkt, &player->decode_granpos);
+        decode_status = th_decode_packetin(player->vdecoder, &pkt, NULL);
         if (decode_status != 0) {
           g_set_error(err, VIDEO_PLAYER_ERROR, VIDEO_PLAYER_BAD_DATA,
             "An error occurred decoding a Theora packet.");
           return FALSE;
         }
-        th_decode_ycbcr_out(player->vdecoder, player->frame_buffer);
+        player->decode_frame = 0;
+        player->shown_frame = 0;
+        player->fps = player->tinfo.fps_numerator / (double)player->tinfo.fps_denominator;
 
         player->tex_width = next_power_of_two(player->tinfo.pic_width);
         player->tex_height = next_power_of_two(player->tinfo.pic_height);
-        player->tex_buffer = g_malloc(player->tex_width * player->tex_height * 4);
+        for (i = 0; i < FRAME_QUEUE_SIZE; i++)
+          player->queue[i].pixels = g_malloc(player->tex_width * player->tex_height * 4);
         switch (player->tinfo.pixel_fmt) {
           case TH_PF_420:
             pix_format = PIX_FMT_YUV420P;
@@ -218,12 +271,16 @@ got_all_headers:
         }
         player->sws_context = sws_getContext(player->tinfo.pic_width, player->tinfo.pic_height, pix_format, player->tex_width, player->tex_height, PIX_FMT_RGBA, SWS_FAST_BILINEAR, NULL, NULL, NULL);
 
+        /* The texture is allocated once; frames are only ever copied into it. */
         glBindTexture(GL_TEXTURE_2D, player->video_texture);
         glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT);
         glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT);
         glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR);
         glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR);
-        update_texture(player);
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, player->tex_width, player->tex_height, 0, GL_RGBA, GL_UNSIGNED_BYTE, NULL);
+        convert_picture(player, player->queue[0].pixels);
+        upload_frame(player, player->queue[0].pixels);
+        player->picture_queued = TRUE;
         return TRUE;
       }
       /* Otherwise, there are still more header packets needed. */
@@ -237,10 +294,210 @@ got_all_headers:
   return FALSE;
 }
 
+
+/* The decoding thread's side. */
+
+/* Get the next video packet, past any header packets seen again after a
+ * rewind. Returns 1 if there is one, 0 at the end of the file, or -1 on error.
+ */
+static int next_packet(VideoPlayer* player, ogg_packet* pkt, GError** err)
+{
+  for (;;) {
+    if (ogg_stream_packetout(player->vstream, pkt) == 1) {
+      if (pkt->bytes > 0 && (pkt->packet[0] & 0x80))
+        continue;
+      return 1;
+    }
+    if (player->eof)
+      return 0;
+    if (!demux_next_page(player, err))
+      return -1;
+  }
+}
+
+static int decode_packet(VideoPlayer* player, ogg_packet* pkt, GError** err)
+{
+  int decode_status = th_decode_packetin(player->vdecoder, pkt, NULL);
+  if (decode_status != 0 && decode_status != TH_DUPFRAME) {
+    g_set_error(err, VIDEO_PLAYER_ERROR, VIDEO_PLAYER_BAD_DATA,
+      "An error occurred decoding a Theora packet.");
+    return -1;
+  }
+  if (decode_status == 0)
+    player->picture_queued = FALSE;
+  return 1;
+}
+
+/* Convert the decoder's current picture into the free slot at the end of
+ * the queue, which the decoding thread has made sure there is.
+ */
+static void queue_picture(VideoPlayer* player, ogg_int64_t frame)
+{
+  VideoFrame* slot;
+
+  g_mutex_lock(player->mutex);
+  slot = &player->queue[(player->queue_start + player->queue_length) % FRAME_QUEUE_SIZE];
+  g_mutex_unlock(player->mutex);
+
+  convert_picture(player, slot->pixels);
+  slot->frame = frame;
+
+  g_mutex_lock(player->mutex);
+  player->queue_length++;
+  g_mutex_unlock(player->mutex);
+  player->picture_queued = TRUE;
+}
+
+/* Decode the next frame, and queue its picture unless the frame after it is
+ * already due.
+ */
+static int decode_next_frame(VideoPlayer* player, ogg_int64_t want_frame, GError** err)
+{
+  ogg_packet pkt;
+  int status = next_packet(player, &pkt, err);
+  if (status <= 0)
+    return status;
+
+  player->decode_frame++;
+  if (decode_packet(player, &pkt, err) < 0)
+    return -1;
+
+  if (player->picture_queued)
+    return 1;  /* a repeat of a picture already queued */
+  if (player->decode_frame < want_frame) {
+    g_atomic_int_inc(&player->dropped_frames);
+    return 1;
+  }
+  queue_picture(player, player->decode_frame);
+  return 1;
+}
+
+static void rewind_video(VideoPlayer* player)
+{
+  fseek(player->file, 0, SEEK_SET);
+  ogg_sync_reset(&player->osync);
+  ogg_stream_reset(player->vstream);
+  player->eof = FALSE;
+  player->decode_frame = -1;
+}
+
+static void clear_skipped_packets(VideoPlayer* player)
+{
+  int i;
+  for (i = 0; i < player->skipped_count; i++)
+    g_free(player->skipped_packets[i].packet);
+  player->skipped_count = 0;
+}
+
+static void skip_packet(VideoPlayer* player, const ogg_packet* pkt)
+{
+  ogg_packet* copy;
+
+  if (player->skipped_count == player->skipped_capacity) {
+    player->skipped_capacity = MAX(2 * player->skipped_capacity, 64);
+    player->skipped_packets = g_renew(ogg_packet, player->skipped_packets, player->skipped_capacity);
+  }
+  copy = &player->skipped_packets[player->skipped_count++];
+  *copy = *pkt;
+  copy->packet = g_memdup(pkt->packet, pkt->bytes);
+}
+
+/* Get to the given frame, decoding only from the last keyframe before it.
+ * Packets are read without decoding them, keeping the ones since the last
+ * keyframe seen; once at the frame, just those are decoded.
+ */
+static int seek_to_frame(VideoPlayer* player, ogg_int64_t frame, GError** err)
+{
+  ogg_packet pkt;
+  int status = 1;
+  int i;
+
+  if (frame < player->decode_frame)
+    rewind_video(player);
+
+  while (player->decode_frame < frame) {
+    status = next_packet(player, &pkt, err);
+    if (status <= 0)
+      break;
+    player->decode_frame++;
+    if (th_packet_iskeyframe(&pkt) == 1)
+      clear_skipped_packets(player);
+    skip_packet(player, &pkt);
+  }
+
+  for (i = 0; i < player->skipped_count && status >= 0; i++)
+    if (decode_packet(player, &player->skipped_packets[i], err) < 0)
+      status = -1;
+  if (player->skipped_count > 0)
+    player->picture_queued = FALSE;
+  clear_skipped_packets(player);
+
+  if (status >= 0 && player->decode_frame >= 0)
+    queue_picture(player, player->decode_frame);
+  return status;
+}
+
+static gpointer video_player_decode_thread(gpointer data)
+{
+  VideoPlayer* player = data;
+  GError* err = NULL;
+  ogg_int64_t want_frame;
+  ogg_int64_t seek_frame;
+  gboolean seek;
+  int status;
+
+  for (;;) {
+    g_mutex_lock(player->mutex);
+    while (!player->quit && !player->seek_pending &&
+           (player->decode_done || player->queue_length == FRAME_QUEUE_SIZE))
+      g_cond_wait(player->cond, player->mutex);
+    if (player->quit) {
+      g_mutex_unlock(player->mutex);
+      break;
+    }
+    seek = player->seek_pending;
+    seek_frame = player->seek_frame;
+    if (seek) {
+      player->seek_pending = FALSE;
+      player->decode_done = FALSE;
+      player->queue_length = 0;
+    }
+    want_frame = player->want_frame;
+    g_mutex_unlock(player->mutex);
+
+    if (seek)
+      status = seek_to_frame(player, seek_frame, &err);
+    else if (want_frame - player->decode_frame > SKIP_AHEAD_FRAMES)
+      status = seek_to_frame(player, want_frame, &err);
+    else
+      status = decode_next_frame(player, want_frame, &err);
+
+    if (status <= 0) {
+      g_mutex_lock(player->mutex);
+      player->decode_done = TRUE;
+      if (status < 0 && player->error == NULL)
+        player->error = err;
+      else if (err != NULL)
+        g_error_free(err);
+      err = NULL;
+      g_mutex_unlock(player->mutex);
+    }
+  }
+
+  return NULL;
+}
+
+
+/* The player's side. */
+
 VideoPlayer* video_player_new(const char* filename, GError** err)
 {
-  VideoPlayer* player = g_new0(VideoPlayer, 1);
+  VideoPlayer* player;
 
+  if (!g_thread_supported())
+    g_thread_init(NULL);
+
+  player = g_new0(VideoPlayer, 1);
   player->file = fopen(filename, "rb");
   if (player->file == NULL) {
     g_set_error(err, G_FILE_ERROR, g_file_error_from_errno(errno),
@@ -253,29 +510,53 @@ VideoPlayer* video_player_new(const char* filename, GError** err)
   ogg_sync_init(&player->osync);
   th_info_init(&player->tinfo);
   th_comment_init(&player->tcomment);
+  player->mutex = g_mutex_new();
+  player->cond = g_cond_new();
   glGenTextures(1, &player->video_texture);
   if (!demux_headers(player, err)) {
     video_player_destroy(player);
     return NULL;
   }
+
+  player->thread = g_thread_create(video_player_decode_thread, player, TRUE, err);
+  if (player->thread == NULL) {
+    video_player_destroy(player);
+    return NULL;
+  }
   return player;
 }
 
 void video_player_destroy(VideoPlayer* player)
 {
+  int i;
+
+  if (player->thread != NULL) {
+    g_mutex_lock(player->mutex);
+    player->quit = TRUE;
+    g_cond_signal(player->cond);
+    g_mutex_unlock(player->mutex);
+    g_thread_join(player->thread);
+  }
+
   if (player->vdecoder != NULL)
     th_decode_free(player->vdecoder);
   if (player->tsetup != NULL)
     th_setup_free(player->tsetup);
   if (player->sws_context != NULL)
     sws_freeContext(player->sws_context);
-  if (player->tex_buffer != NULL)
-    g_free(player->tex_buffer);
+  for (i = 0; i < FRAME_QUEUE_SIZE; i++)
+    g_free(player->queue[i].pixels);
+  clear_skipped_packets(player);
+  g_free(player->skipped_packets);
+  if (player->error != NULL)
+    g_error_free(player->error);
   glDeleteTextures(1, &player->video_texture);
   th_comment_clear(&player->tcomment);
   th_info_clear(&player->tinfo);
   g_hash_table_destroy(player->stream_table);
   ogg_sync_clear(&player->osync);
+  g_cond_free(player->cond);
+  g_mutex_free(player->mutex);
   fclose(player->file);
   g_free(player);
 }
@@ -292,9 +573,31 @@ void video_player_pause(VideoPlayer* player)
   player->playing = FALSE;
 }
 
+static ogg_int64_t position_frame(const VideoPlayer* player)
+{
+  return (ogg_int64_t)(player->playback_position * 1e-6 * player->fps);
+}
+
+void video_player_seek(VideoPlayer* player, double newpos)
+{
+  player->playback_position = (glong)(1000000 * MAX(newpos, 0.0));
+  if (player->playing)
+    video_player_play(player);
+  player->shown_frame = -1;
+
+  g_mutex_lock(player->mutex);
+  player->seek_pending = TRUE;
+  player->seek_frame = position_frame(player);
+  player->want_frame = player->seek_frame;
+  g_cond_signal(player->cond);
+  g_mutex_unlock(player->mutex);
+}
+
 gboolean video_player_bind_frame(VideoPlayer* player, GError** err)
 {
-  glBindTexture(GL_TEXTURE_2D, player->video_texture);
+  ogg_int64_t frame;
+  VideoFrame* slot = NULL;
+  gboolean done = FALSE;
 
   /* Advance the playback position if we're playing. */
   if (player->playing) {
@@ -303,51 +606,74 @@ gboolean video_player_bind_frame(VideoPlayer* player, GError** err)
     if (!video_player_advance(player, (now.tv_sec - player->playback_start_time.tv_sec) + 1e-6 * (now.tv_usec - player->playback_start_time.tv_usec), err))
       return FALSE;
   }
+  frame = position_frame(player);
 
-  if (player->buffer_dirty)
-    update_texture(player);
+  /* Take the newest queued frame that is due, dropping any older ones. */
+  g_mutex_lock(player->mutex);
+  if (player->error != NULL) {
+    g_propagate_error(err, g_error_copy(player->error));
+    g_mutex_unlock(player->mutex);
+    return FALSE;
+  }
+  player->want_frame = frame;
+  if (!player->seek_pending) {
+    while (player->queue_length > 0 && player->queue[player->queue_start].frame <= frame) {
+      slot = &player->queue[player->queue_start];
+      if (player->queue_length == 1 || player->queue[(player->queue_start + 1) % FRAME_QUEUE_SIZE].frame > frame)
+        break;
+      slot = NULL;
+      player->queue_start = (player->queue_start + 1) % FRAME_QUEUE_SIZE;
+      player->queue_length--;
+      g_cond_signal(player->cond);
+    }
+    done = player->decode_done && player->queue_length == 0;
+  }
+  g_mutex_unlock(player->mutex);
+
+  /* The decoding thread leaves a queued frame alone, so it can be copied
+   * into the texture without holding the lock.
+   */
+  if (slot != NULL) {
+    upload_frame(player, slot->pixels);
+    player->shown_frame = slot->frame;
+    g_mutex_lock(player->mutex);
+    player->queue_start = (player->queue_start + 1) % FRAME_QUEUE_SIZE;
+    player->queue_length--;
+    g_cond_signal(player->cond);
+    g_mutex_unlock(player->mutex);
+  } else {
+    glBindTexture(GL_TEXTURE_2D, player->video_texture);
+  }
 
+  if (done)
+    video_player_pause(player);
   return TRUE;
 }
 
 gboolean video_player_advance(VideoPlayer* player, double newpos, GError** err)
 {
   player->playback_position = (glong)(1000000 * newpos);
-
-  while (th_granule_time(player->vdecoder, player->decode_granpos) * 1000000 < player->playback_position) {
-    ogg_packet pkt;
-    int decode_status;
-
-    /* Get the next packet. */
-    if (ogg_stream_packetout(player->vstream, &pkt) != 1) {
-      if (player->eof) {
-        video_player_pause(player);
-        break;
-      }
-      if (!demux_next_page(player, err))
-        return FALSE;
-      continue;
-    }
-
-    decode_status = th_decode_packetin(player->vdecoder, &pkt, &player->decode_granpos);
-    if (decode_status != 0 && decode_status != TH_DUPFRAME) {
-      g_set_error(err, VIDEO_PLAYER_ERROR, VIDEO_PLAYER_BAD_DATA,
-        "An error occurred decoding a Theora packet.");
-      return FALSE;
-    }
-
-    if (decode_status == 0) {
-      th_decode_ycbcr_out(player->vdecoder, player->frame_buffer);
-      player->buffer_dirty = TRUE;
-    }
+  if (position_frame(player) < player->shown_frame) {
+    /* Going backwards needs a seek; going forwards, the decoding thread
+     * catches up by itself.
+     */
+    video_player_seek(player, newpos);
   }
-
   return TRUE;
 }
 
 gboolean video_player_eof(const VideoPlayer* player)
 {
-  return player->eof;
+  gboolean eof;
+  g_mutex_lock(player->mutex);
+  eof = !player->seek_pending && player->decode_done && player->queue_length == 0;
+  g_mutex_unlock(player->mutex);
+  return eof;
+}
+
+int video_player_get_dropped_frames(VideoPlayer* player)
+{
+  return g_atomic_int_get(&player->dropped_frames);
 }
 
 double video_player_aspect_ratio(const VideoPlayer* player)
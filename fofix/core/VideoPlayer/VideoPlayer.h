@@ -28,21 +28,27 @@ typedef struct _VideoPlayer VideoPlayer;
 VideoPlayer* video_player_new(const char* filename, GError** err);
 void video_player_destroy(VideoPlayer* player);
 
+/* Frames are decoded and converted to RGBA by a thread of the player's own,
+   a few frames ahead of playback; frames that would be late are skipped
+   before they are converted.  The thread creating a player must have the GL
+   context current, and must be the one using the player from then on.
+ */
+
 /* Real-time playback - bind_frame automatically advances when appropriate */
 void video_player_play(VideoPlayer* player);
 void video_player_pause(VideoPlayer* player);
 
 /* Playback to external timing source - change which frame bind_frame will bind.
-
-   XXX: Only strictly increasing times will do the right thing (and large
-        increases will still work but be inefficient) since we haven't
-        implemented seeking yet!
+   Going backwards seeks; large jumps forwards skip ahead by keyframe.
  */
 gboolean video_player_advance(VideoPlayer* player, double newpos, GError** err);
+void video_player_seek(VideoPlayer* player, double newpos);
 
+/* Bind the texture, first copying in the frame now due, if it is ready. */
 gboolean video_player_bind_frame(VideoPlayer* player, GError** err);
 
 gboolean video_player_eof(const VideoPlayer* player);
+int video_player_get_dropped_frames(VideoPlayer* player);
 double video_player_aspect_ratio(const VideoPlayer* player);
 
 GQuark video_player_error_quark(void);
@@ -40,8 +40,10 @@ cdef extern from "VideoPlayer.h":
     void video_player_play(CVideoPlayer*)
     void video_player_pause(CVideoPlayer*)
     bint video_player_advance(CVideoPlayer*, double, GError**)
+    void video_player_seek(CVideoPlayer*, double)
     bint video_player_bind_frame(CVideoPlayer*, GError**)
     bint video_player_eof(CVideoPlayer*)
+    int video_player_get_dropped_frames(CVideoPlayer*)
     double video_player_aspect_ratio(CVideoPlayer*)
 
 class VideoPlayerError(Exception):
@@ -82,6 +84,9 @@ cdef class VideoPlayer(object):
         if not video_player_advance(self.player, newpos, &err):
             raise_from_gerror(err)
 
+    def seek(self, double newpos):
+        video_player_seek(self.player, newpos)
+
     def bind_frame(self):
         cdef GError* err = NULL
         if not video_player_bind_frame(self.player, &err):
@@ -90,6 +95,9 @@ cdef class VideoPlayer(object):
     def eof(self):
         return video_player_eof(self.player)
 
+    def get_dropped_frames(self):
+        return video_player_get_dropped_frames(self.player)
+
     def aspect_ratio(self):
         return video_player_aspect_ratio(self.player)
 
@@ -109,7 +117,7 @@ class VideoLayer(BackgroundLayer, KeyListener):
         self.engine = engine
         self.filename = filename
         self.mute = mute  # TODO: audio
-        self.loop = loop  # TODO: seeking
+        self.loop = loop
         self.cancellable = cancellable
 
         self.finished = False
@@ -137,9 +145,7 @@ class VideoLayer(BackgroundLayer, KeyListener):
         self.player.advance(newpos)
 
     def restart(self):
-        # XXX: do this less hackishly
-        del self.player
-        self.player = VideoPlayer(self.filename)
+        self.player.seek(0.0)
         self.player.play()
 
     def render(self, visibility, topMost):
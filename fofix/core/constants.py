@@ -38,6 +38,13 @@ KEEP_ASPECT = 4
 SCREEN_WIDTH = 640.0
 SCREEN_HEIGHT = 480.0
 
+# Texture owners, for keeping track of texture memory
+OWNER_OTHER    = "other"
+OWNER_FONT     = "font"
+OWNER_ALBUMART = "album art"
+OWNER_STAGE    = "stage"
+OWNER_NECK     = "neck"
+
 #set of values that define as true when loading string values from a file
 def isTrue(value):
     return value in ["1", "true", "yes", "on"]
@@ -0,0 +1,83 @@
+# -*- coding: ISO-8859-1 -*-
+
+from MidiOutStream import MidiOutStream
+
+
+class MidiFanOutStream(MidiOutStream):
+
+    """
+
+    Passes every event of a single parse on to several outstreams, so
+    a midi file only has to be read once no matter how many handlers
+    want to look at it.
+
+    A handler that has seen everything it needs can raise
+    MidiFanOutStream.Done from any event, after which it gets no more
+    events. When all of them are done, Done is raised to the parser to
+    stop reading the rest of the file.
+
+    Any other exception from a handler only drops that handler; it is
+    kept in errors, by outstream, and the others go on reading.
+
+    >>> from MidiInFile import MidiInFile
+    >>> fan_out = MidiFanOutStream([first_handler, second_handler])
+    >>> try:
+    ...     MidiInFile(fan_out, test_file).read()
+    ... except MidiFanOutStream.Done:
+    ...     pass
+
+    """
+
+    class Done(Exception):
+        pass
+
+
+    def __init__(self, outstreams):
+        MidiOutStream.__init__(self)
+        self.outstreams = list(outstreams)
+        self.errors = {}
+        # bound handlers of the outstreams, by event name
+        self._handlers = {}
+
+
+    def dispatch(self, name, args, kwargs):
+        "Calls the named event handler on each outstream that is not done yet"
+        handlers = self._handlers.get(name)
+        if handlers is None:
+            handlers = [(outstream, getattr(outstream, name)) for outstream in self.outstreams]
+            self._handlers[name] = handlers
+        done = []
+        for outstream, handler in handlers:
+            try:
+                handler(*args, **kwargs)
+            except MidiFanOutStream.Done:
+                done.append(outstream)
+            except Exception, e:
+                self.errors[outstream] = e
+                done.append(outstream)
+        if done:
+            for outstream in done:
+                self.outstreams.remove(outstream)
+            self._handlers = {}
+            if not self.outstreams:
+                raise MidiFanOutStream.Done
+
+
+
+def _fan_out(name):
+    own = getattr(MidiOutStream, name)
+    def handler(self, *args, **kwargs):
+        # keep the time / track bookkeeping here too, so the fan-out can
+        # be asked about it like any other outstream
+        own(self, *args, **kwargs)
+        self.dispatch(name, args, kwargs)
+    handler.__name__ = name
+    handler.__doc__ = own.__doc__
+    return handler
+
+# everything except the getters gets passed on
+for _name, _value in MidiOutStream.__dict__.items():
+    if callable(_value) and not _name.startswith('_') and \
+            _name not in ('rel_time', 'abs_time', 'get_run_stat', 'get_current_track'):
+        setattr(MidiFanOutStream, _name, _fan_out(_name))
+del _name, _value
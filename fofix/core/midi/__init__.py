@@ -5,3 +5,4 @@ from MidiOutFile import MidiOutFile
 from MidiInStream import MidiInStream
 from MidiInFile import MidiInFile
 from MidiToText import MidiToText
+from MidiFanOutStream import MidiFanOutStream
@@ -67,7 +67,9 @@ cdef class Analyzer:
             instr = instr.tostring()  # assume it was a numpy array
         return feedAnalyzer(self._this, instr)
     def process(self):
-        self._this.process()
+        # Analysis runs in the microphone's own thread; let the game run meanwhile.
+        with nogil:
+            self._this.process()
     def getPeak(self):
         return self._this.getPeak()
     def getFormants(self):
@@ -84,4 +86,7 @@ cdef class Analyzer:
                 formants.append(cur)
         return formants
     def findTone(self, double minfreq=65.0, double maxfreq=1000.0):
-        return PyTone_FromTone(self._this.findTone(minfreq, maxfreq))
+        cdef _Tone* t
+        with nogil:
+            t = self._this.findTone(minfreq, maxfreq)
+        return PyTone_FromTone(t)
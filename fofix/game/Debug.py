@@ -30,7 +30,9 @@ import threading
 from OpenGL.GL import glColor3f
 
 from fofix.core.View import Layer
+from fofix.core.Texture import textureCache, textureManager
 from fofix.core import Log
+from fofix.core import VFS
 
 
 
@@ -109,6 +111,16 @@ class DebugLayer(Layer):
             font.render("%d threads" % threading.activeCount(), (x + .1, y), scale = scale)
             y += h
             font.render("%.2f fps" % self.engine.fpsEstimate, (x + .1, y), scale = scale)
+            y += h
+            font.render("File cache: %(hits)d hits, %(misses)d misses, %(dirs)d dirs" % VFS.dirCache.stats(), (x + .1, y), scale = scale)
+            y += h
+            font.render("Texture cache: %(textures)d textures, %(bytes)d bytes, %(hits)d hits, %(misses)d misses" % textureCache.stats(), (x + .1, y), scale = scale)
+            stats = textureManager.stats()
+            y += h
+            font.render("Textures: %(textures)d, %(bytes)d bytes of %(budget)d, %(evictions)d evicted, %(pending)d to delete" % stats, (x + .1, y), scale = scale)
+            for owner, size in sorted(stats["owners"].items()):
+                y += h
+                font.render("%s: %d bytes" % (owner, size), (x + .2, y), scale = scale)
 
     def gcDump(self):
         before = len(gc.get_objects())
@@ -39,6 +39,7 @@ from fofix.core.Language import _
 from fofix.core.View import Layer
 from fofix.game import Dialogs
 from fofix.core import Player
+from fofix.core import VFS
 from fofix.game import Song
 
 
@@ -556,6 +557,7 @@ class CreateCharacter(Layer, KeyListener):
                             os.rename(self.engine.resource.fileName(os.path.join("users","players",self.oldName+".png")), os.path.join(self.engine.data.path,"users","players",self.choices[0]+".png"))
                         else:
                             os.remove(self.engine.resource.fileName(os.path.join("users","players",self.oldName+".png")))
+                VFS.dirCache.invalidate(os.path.join(self.engine.data.path,"users","players"))
                 self.engine.view.popLayer(self)
                 self.engine.input.removeKeyListener(self)
             else:
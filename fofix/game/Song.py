@@ -25,12 +25,17 @@
 import os
 import re
 import copy
+import bisect
 import time
 import random
 import urllib
 import cPickle  #stump: Cerealizer and sqlite3 don't seem to like each other that much...
 import hashlib
 import binascii
+import multiprocessing
+import threading
+
+import numpy as np
 
 from fofix.core.Theme import hexToColor, colorToHex
 from fofix.core.Unicode import utf8
@@ -43,6 +48,7 @@ from fofix.core import Config
 from fofix.core import Cerealizer
 from fofix.core import Version
 from fofix.core import VFS
+from fofix.core import Fingerprint
 
 DEFAULT_BPM = 120.0
 DEFAULT_LIBRARY         = "songs"
@@ -166,9 +172,63 @@ defaultSections = ["Start","1/4","1/2","3/4"]
 
 
 
+# The song.ini values kept in the song list table, so a setlist can be sorted and
+# shown without reading every song.ini: (column, song.ini key, type, default).
+_songListColumns = [
+  ('name',            'name',             str, ""),
+  ('artist',          'artist',           str, ""),
+  ('album',           'album',            str, ""),
+  ('genre',           'genre',            str, ""),
+  ('year',            'year',             str, ""),
+  ('icon',            'icon',             str, ""),
+  ('count',           'count',            str, ""),
+  ('diffSong',        'diff_band',        int, -1),
+  ('diffGuitar',      'diff_guitar',      int, -1),
+  ('diffBass',        'diff_bass',        int, -1),
+  ('diffDrums',       'diff_drums',       int, -1),
+  ('diffVocals',      'diff_vocals',      int, -1),
+  ('tutorial',        'tutorial',         int, 0),
+  ('unlockId',        'unlock_id',        str, ""),
+  ('unlockRequire',   'unlock_require',   str, ""),
+  ('unlockCompleted', 'unlock_completed', str, ""),
+]
+
+# The song list column for each sort order, and whether it sorts ascending
+# with sort_direction 0.  Order 7 is the difficulty of the song list instrument.
+_songListOrders = {
+  0: ('name', True),
+  1: ('artist', True),
+  2: ('playCount', False),
+  3: ('album', True),
+  4: ('genre', True),
+  5: ('year', True),
+  6: ('diffSong', True),
+  8: ('icon', True),
+}
+_songListInstrumentColumns = {0: 'diffGuitar', 1: 'diffGuitar', 2: 'diffBass', 3: 'diffGuitar', 4: 'diffDrums', 5: 'diffVocals'}
+_songListTextColumns = ('name', 'artist', 'album', 'genre', 'year', 'icon')
+
+def _createSongListTable():
+    #TEXT, not STRING: STRING has numeric affinity, so a year of 1976 or an album called 2112 would come back as an int
+    columns = ', '.join(['`%s` %s' % (column, type is int and 'INT' or 'TEXT') for column, key, type, default in _songListColumns])
+    _songDB.execute('CREATE TABLE `songlist` (`path` TEXT UNIQUE, `library` TEXT, `iniStamp` TEXT, `noteStamp` TEXT, `hash` TEXT, %s, `playCount` INT, `isFolder` INT, `sortGroup` TEXT)' % columns)
+    _songDB.execute('CREATE INDEX `songlist_name` ON `songlist` (`library`, `sortGroup`, `name` COLLATE NOCASE)')
+    for column in _songListTextColumns[1:]:
+        _songDB.execute('CREATE INDEX `songlist_%s` ON `songlist` (`library`, `%s` COLLATE NOCASE)' % (column, column))
+    for column in ('playCount', 'diffSong', 'diffGuitar', 'diffBass', 'diffDrums', 'diffVocals'):
+        _songDB.execute('CREATE INDEX `songlist_%s` ON `songlist` (`library`, `%s`)' % (column, column))
+
+def _createChartsTable():
+    #one compiled chart per note file and set of parts; see Song.saveCompiledChart()
+    _songDB.execute('CREATE TABLE `charts` (`key` TEXT UNIQUE, `path` TEXT, `hash` TEXT, `parts` TEXT, `chart` STRING)')
+    _songDB.execute('CREATE INDEX `charts_path` ON `charts` (`path`, `parts`)')
+    _songDB.execute('CREATE INDEX `charts_hash` ON `charts` (`hash`)')
+
 # Load the song database and check that it is completely initialized.
-_SCHEMA_VERSION = 7  #stump: current database format version number
-_songDB = VFS.openSqlite3('/userdata/SongCache.sqlite')
+_SCHEMA_VERSION = 11  #stump: current database format version number
+_songDB = VFS.openSqlite3('/userdata/SongCache.sqlite', anyThread = True)
+_songDB.text_factory = str  #song.ini values come back as the same byte strings SongInfo._get() gives
+_songDBLock = threading.RLock()  #songs are loaded by loader threads too; hold this while using _songDB once the game is up
 try:
     _dbversion = _songDB.execute("SELECT `value` FROM `config` WHERE `key` = 'version'").fetchone()[0]
     if int(_dbversion) == 6:
@@ -178,14 +238,43 @@ try:
         _songDB.execute("UPDATE `config` SET `value` = '7' WHERE `key` = 'version'")
         _songDB.commit()
         _dbversion = 7
+    if _dbversion == 7:
+        Log.debug('Upgrading song cache schema version 7 to 8.')
+        _songDB.execute('CREATE TABLE `charts` (`key` STRING UNIQUE, `chart` STRING)')
+        _songDB.execute("UPDATE `config` SET `value` = '8' WHERE `key` = 'version'")
+        _songDB.commit()
+        _dbversion = 8
+    if _dbversion == 8:
+        Log.debug('Upgrading song cache schema version 8 to 9.')
+        _createSongListTable()
+        _songDB.execute("UPDATE `config` SET `value` = '9' WHERE `key` = 'version'")
+        _songDB.commit()
+        _dbversion = 9
+    if _dbversion == 9:
+        #the song list rows are rebuilt from the song folders on the next scan
+        Log.debug('Upgrading song cache schema version 9 to 10.')
+        _songDB.execute('DROP TABLE `songlist`')
+        _createSongListTable()
+        _songDB.execute("UPDATE `config` SET `value` = '10' WHERE `key` = 'version'")
+        _songDB.commit()
+        _dbversion = 10
+    if _dbversion == 10:
+        #compiled charts are rebuilt as songs are played
+        Log.debug('Upgrading song cache schema version 10 to 11.')
+        _songDB.execute('DROP TABLE `charts`')
+        _createChartsTable()
+        _songDB.execute("UPDATE `config` SET `value` = '11' WHERE `key` = 'version'")
+        _songDB.commit()
+        _songDB.execute('VACUUM')
+        _dbversion = 11
     # (Insert future schema upgrades here - with ifs, not elifs, so we are
     #  able to upgrade starting at *any* schema version we support
     #  upgrading from, like so.)
-    #if _dbversion == 7:
-    #  Log.debug('Upgrading song cache schema version 7 to 8.')
+    #if _dbversion == 11:
+    #  Log.debug('Upgrading song cache schema version 11 to 12.')
     #  _songDB.execute(sql needed to do the update)
     #  _songDB.commit()
-    #  _dbversion = 8
+    #  _dbversion = 12
     if _dbversion == _SCHEMA_VERSION:
         _mustReinitialize = False
     else:
@@ -202,32 +291,49 @@ if _mustReinitialize:
     #stump: if you need to change the database schema, do it here, then bump the version number, a small bit above here.
     _songDB.execute('CREATE TABLE `config` (`key` STRING UNIQUE, `value` STRING)')
     _songDB.execute('CREATE TABLE `songinfo` (`hash` STRING UNIQUE, `info` STRING, `seen` INT)')
+    _createChartsTable()
+    _createSongListTable()
     _songDB.execute('INSERT INTO `config` (`key`, `value`) VALUES (?, ?)', ('version', _SCHEMA_VERSION))
     _songDB.commit()
 
+def findNoteFile(songPath):
+    if Config.get("debug", "use_unedited_midis") == 1:    #auto
+        noteFileName = os.path.join(songPath, "notes-unedited.mid")
+        if os.path.isfile(noteFileName):
+            return noteFileName
+    return os.path.join(songPath, "notes.mid")
+
 class SongInfo(object):
-    def __init__(self, infoFileName, songLibrary = DEFAULT_LIBRARY):
+    #what gets stored in the song cache for each song
+    _cacheKeys = ('_parts', '_partDifficulties', '_midiStyle', '_sections')
+
+    #with readNotes off, a song missing from the cache is left with needsScan set
+    #  rather than reading its MIDI right away, so a SongScanner can read a batch of them.
+    #listValues holds the song.ini values from the song list table; the song.ini itself
+    #  (and the song cache entry) is then only read once something else is asked for.
+    def __init__(self, infoFileName, songLibrary = DEFAULT_LIBRARY, useCache = True, readNotes = True, listValues = None):
         self.songName      = os.path.basename(os.path.dirname(infoFileName))
         self.fileName      = infoFileName
         self.libraryNam    = songLibrary[:]
-        self.info          = Config.MyConfigParser()
+        self._info         = None
         self._partDifficulties = {}
         self._parts        = None
         self._midiStyle    = None
-        self.highScores    = {}
+        self._highScores   = None
 
         self.locked = False
 
         #MFH - want to read valid sections from the MIDI in for practice mode selection here:
         self._sections = None
 
+        self.cacheHash = None
+        self.needsScan = False
+        self.cachePending = False
+        self.listValues = listValues
+        self._pendingValues = {}
 
-        self.name = _("NoName")
-
-        try:
-            self.info.read(infoFileName)
-        except:
-            pass
+        if listValues is None:
+            self.loadInfo()
 
         self.logClassInits = Config.get("game", "log_class_inits")
         if self.logClassInits == 1:
@@ -237,47 +343,27 @@ class SongInfo(object):
 
         self.logUneditedMidis = Config.get("log",   "log_unedited_midis")
 
-        self.useUneditedMidis = Config.get("debug",   "use_unedited_midis")
-        if self.useUneditedMidis == 1:    #auto
-            if os.path.isfile(os.path.join(os.path.dirname(self.fileName), "notes-unedited.mid")):
-                notefile = "notes-unedited.mid"
-                if self.logUneditedMidis == 1:
-                    Log.debug("notes-unedited.mid found, using instead of notes.mid! - " + self.name)
+        self.noteFileName = findNoteFile(os.path.dirname(self.fileName))
+        if self.logUneditedMidis == 1:
+            if os.path.basename(self.noteFileName) == "notes-unedited.mid":
+                Log.debug("notes-unedited.mid found, using instead of notes.mid! - " + self.name)
             else:
-                notefile = "notes.mid"
-                if self.logUneditedMidis == 1:
-                    Log.debug("notes-unedited.mid not found, using notes.mid - " + self.name)
-        else:
-            notefile = "notes.mid"
-            if self.logUneditedMidis == 1:
                 Log.debug("notes-unedited.mid not found, using notes.mid - " + self.name)
-        self.noteFileName = os.path.join(os.path.dirname(self.fileName), notefile)
 
-        for part in parts.values():
-            self.getScores(part)
+        if listValues is not None:
+            self.cacheHash = listValues['hash']
+            self.cachePending = True
+            return
 
         #stump: metadata caching
-        if Config.get("performance", "cache_song_metadata"):
-            songhash = hashlib.sha1(open(self.noteFileName, 'rb').read()).hexdigest()
-            try:    #MFH - it crashes here on previews!
-                result = _songDB.execute('SELECT `info` FROM `songinfo` WHERE `hash` = ?', [songhash]).fetchone()
-                if result is None:
-                    Log.debug('Song %s was not found in the cache.' % infoFileName)
-            except Exception:
-                Log.error('Cache retrieval failed for %s: ' % infoFileName)
-                result = None
+        if useCache and Config.get("performance", "cache_song_metadata"):
+            self.cacheHash = Fingerprint.fingerprint(self.noteFileName)
+            if self.loadCacheInfo():
+                return
 
-            if result is not None:
-                try:
-                    self.__dict__.update(cPickle.loads(str(result[0])))
-                    _songDB.execute('UPDATE `songinfo` SET `seen` = 1 WHERE `hash` = ?', [songhash])
-                    Log.debug('Song %s successfully loaded from cache.' % infoFileName)
-                    return
-                except:
-                    # The entry is there but could not be loaded.
-                    # Nuke it and let it be rebuilt.
-                    Log.error('Song %s has invalid cache data (will rebuild): ' % infoFileName)
-                    _songDB.execute('DELETE FROM `songinfo` WHERE `hash` = ?', [songhash])
+            if not readNotes:
+                self.needsScan = True
+                return
 
             #stump: preload this stuff...
             self.getParts()
@@ -285,10 +371,98 @@ class SongInfo(object):
 
             #stump: Write this song's info into the cache.
             Log.debug('Writing out cache for song %s.' % self.fileName)
-            pdict = {}
-            for key in ('_parts', '_partDifficulties', '_midiStyle', '_sections'):
-                pdict[key] = getattr(self, key)
-            _songDB.execute('INSERT OR REPLACE INTO `songinfo` (`hash`, `info`, `seen`) VALUES (?, ?, 1)', [songhash, cPickle.dumps(pdict)])
+            with _songDBLock:
+                _songDB.execute('INSERT OR REPLACE INTO `songinfo` (`hash`, `info`, `seen`) VALUES (?, ?, 1)', self.getCacheRow())
+
+    def loadInfo(self):
+        #read the song.ini, and the high scores kept in it
+        self._info = Config.MyConfigParser()
+        self._highScores = {}
+
+        self.name = _("NoName")
+
+        try:
+            self._info.read(self.fileName)
+        except:
+            pass
+
+        #values set before the song.ini was read
+        for attr, value in self._pendingValues.items():
+            self._set(attr, value)
+        self._pendingValues = {}
+
+        for part in parts.values():
+            self.getScores(part)
+
+    def getInfo(self):
+        if self._info is None:
+            self.loadInfo()
+        return self._info
+
+    def getHighScores(self):
+        if self._highScores is None:
+            self.loadInfo()
+        return self._highScores
+
+    info          = property(getInfo)
+    highScores    = property(getHighScores)
+
+    def loadCacheInfo(self):
+        #fill in the parts and sections from the song cache; False if the song isn't in there
+        try:    #MFH - it crashes here on previews!
+            with _songDBLock:
+                result = _songDB.execute('SELECT `info` FROM `songinfo` WHERE `hash` = ?', [self.cacheHash]).fetchone()
+            if result is None:
+                Log.debug('Song %s was not found in the cache.' % self.fileName)
+        except Exception:
+            Log.error('Cache retrieval failed for %s: ' % self.fileName)
+            result = None
+
+        if result is not None:
+            try:
+                self.__dict__.update(cPickle.loads(str(result[0])))
+                with _songDBLock:
+                    _songDB.execute('UPDATE `songinfo` SET `seen` = 1 WHERE `hash` = ?', [self.cacheHash])
+                Log.debug('Song %s successfully loaded from cache.' % self.fileName)
+                return True
+            except:
+                # The entry is there but could not be loaded.
+                # Nuke it and let it be rebuilt.
+                Log.error('Song %s has invalid cache data (will rebuild): ' % self.fileName)
+                with _songDBLock:
+                    _songDB.execute('DELETE FROM `songinfo` WHERE `hash` = ?', [self.cacheHash])
+        return False
+
+    def checkCache(self):
+        #a song from the song list only looks in the song cache once its parts or sections are wanted
+        if self.cachePending:
+            self.cachePending = False
+            self.loadCacheInfo()
+
+    def getListRow(self, library, iniStamp, noteStamp):
+        row = [self.fileName, library, iniStamp, noteStamp, self.cacheHash]
+        for column, key, type, default in _songListColumns:
+            try:
+                row.append(self._get(key, type, default))
+            except ValueError:
+                row.append(default)
+        try:
+            playCount = int(self.count or 0)
+        except ValueError:
+            playCount = 0
+        row.append(playCount)
+        row.append(self.artist == '=FOLDER=')
+        row.append(nameSortGroup(self.name))
+        return row
+
+    def getCacheInfo(self):
+        pdict = {}
+        for key in self._cacheKeys:
+            pdict[key] = getattr(self, key)
+        return pdict
+
+    def getCacheRow(self):
+        return [self.cacheHash, cPickle.dumps(self.getCacheInfo())]
 
     def addHighscore(self, difficulty, score, stars, name, part = parts[GUITAR_PART], scoreExt = (0, 0, 0, "RF-mod", 0, "None", 0)):
         highScores = self.highScores[str(part)]
@@ -352,6 +526,10 @@ class SongInfo(object):
                     Log.warn("Weak hack attempt detected. Better luck next time.")
 
     def _set(self, attr, value):
+        if self._info is None and self.listValues is not None and attr in self.listValues:
+            self.listValues[attr] = value
+            self._pendingValues[attr] = value
+            return
         if not self.info.has_section("song"):
             self.info.add_section("song")
         self.info.set("song", attr, utf8(value))
@@ -396,10 +574,13 @@ class SongInfo(object):
             f.close()
 
     def _get(self, attr, type = None, default = ""):
-        try:
-            v = self.info.get("song", attr)
-        except:
-            v = default
+        if self._info is None and self.listValues is not None and attr in self.listValues:
+            v = self.listValues[attr]
+        else:
+            try:
+                v = self.info.get("song", attr)
+            except:
+                v = default
         if v == "": #key found, but empty - need to catch as int("") will burn.
             v = default
         if v is not None and type:
@@ -407,6 +588,7 @@ class SongInfo(object):
         return v
 
     def getPartDifficulties(self):
+        self.checkCache()
         if len(self._partDifficulties) != 0:
             return self._partDifficulties
         self.getParts()
@@ -415,6 +597,7 @@ class SongInfo(object):
     partDifficulties = property(getPartDifficulties)
 
     def getMidiStyle(self):
+        self.checkCache()
         if self._midiStyle is not None:
             return self._midiStyle
         self.getParts()
@@ -422,23 +605,50 @@ class SongInfo(object):
 
     midiStyle = property(getMidiStyle)
 
+    def readNoteFile(self):
+        #read the parts, difficulties, MIDI style and practice sections in a single pass over the MIDI.
+        #  the forced-guitar parts reader is only used if the normal one finds no named tracks.
+        #  a reader that fails only loses its own results; a bad file fails every reader
+        #  that hadn't finished yet.
+        noteFileName = self.noteFileName
+        Log.debug("Retrieving parts and sections from: " + noteFileName)
+        partsInfo = MidiPartsDiffReader()
+        forcedPartsInfo = MidiPartsDiffReader(forceGuitar = True)
+        sectionInfo = MidiSectionReader()
+        fanOut = midi.MidiFanOutStream([partsInfo, forcedPartsInfo, sectionInfo])
+        try:
+            midiIn = midi.MidiInFile(fanOut, noteFileName)
+            try:
+                midiIn.read()
+            except midi.MidiFanOutStream.Done:
+                pass
+        except Exception, e:
+            for reader in fanOut.outstreams:
+                fanOut.errors[reader] = e
+        errors = fanOut.errors
+        if self._parts is None:
+            self.setPartsFrom(partsInfo, forcedPartsInfo, errors.get(partsInfo), errors.get(forcedPartsInfo))
+        if self._sections is None:
+            self.setSectionsFrom(sectionInfo, errors.get(sectionInfo))
+
     def getParts(self):
-        if self._parts is not None:
-            return self._parts
+        self.checkCache()
+        if self._parts is None:
+            self.readNoteFile()
+        return self._parts
 
+    def setPartsFrom(self, info, forcedInfo, error, forcedError):
         # See which parts are available
         try:
-            noteFileName = self.noteFileName
-            Log.debug("Retrieving parts from: " + noteFileName)
-            info = MidiPartsDiffReader()
-
-            midiIn = midi.MidiInFile(info, noteFileName)
-            midiIn.read()
+            if error is not None:
+                raise error
             if info.parts == []:
                 Log.debug("Improperly named tracks. Attempting to force first track guitar.")
-                info = MidiPartsDiffReader(forceGuitar = True)
-                midiIn = midi.MidiInFile(info, noteFileName)
-                midiIn.read()
+                if forcedError is not None:
+                    raise forcedError
+                info = forcedInfo
+                if info.multipleTracks:
+                    Log.notice("This song has multiple tracks, none properly named. Behavior may be erratic.")
             if info.parts == []:
                 Log.warn("No tracks found!")
                 raise Exception
@@ -456,7 +666,6 @@ class SongInfo(object):
             self._parts = parts.values()
             for part in self._parts:
                 self._partDifficulties[part.id] = difficulties.values()
-        return self._parts
 
     def getName(self):
         return self._get("name")
@@ -612,18 +821,16 @@ class SongInfo(object):
 
 
     def getSections(self):    #MFH
-        if self._sections is not None:
-            return self._sections
+        self.checkCache()
+        if self._sections is None:
+            self.readNoteFile()
+        return self._sections
+
+    def setSectionsFrom(self, info, error):
         # See which sections are available
         try:
-            noteFileName = self.noteFileName
-            Log.debug("Retrieving sections from: " + noteFileName)
-            info = MidiSectionReader()
-            midiIn = midi.MidiInFile(info, noteFileName)
-            try:
-                midiIn.read()
-            except MidiSectionReader.Done:
-                pass
+            if error is not None:
+                raise error
             self._sections = info.sections
             if len(self._sections) <= 1:
                 self._sections = info.noteCountSections
@@ -644,7 +851,6 @@ class SongInfo(object):
         except Exception, e:
             Log.warn("Song.py: Unable to retrieve section names for practice mode selection: %s" % e)
             self._sections = None
-        return self._sections
 
 
         #coolguy567's unlock system
@@ -871,7 +1077,7 @@ class SortTitleInfo(object):
         return self.name
 
 
-class Event:
+class Event(object):
     def __init__(self, length):
         self.length = length
 
@@ -887,17 +1093,118 @@ class MarkerNote(Event): #MFH
         return "<#%d>" % self.number
 
 
+#per-play state bits of a note, see NoteStore.state
+NOTE_PLAYED  = 1
+NOTE_HOPOD   = 2
+NOTE_SKIPPED = 4
+
+class NoteStore(object):
+    #column storage for the notes of a NoteTrack, one row per note.  Note objects
+    #  added to the track become views onto their row.  Per-note reads go through
+    #  plain list copies of the columns (made with one tolist() after the track
+    #  changes) so the render and scoring loops never build NumPy scalars.
+    columns = [("time",       np.float64),
+               ("length",     np.float64),
+               ("number",     np.int16),
+               ("tappable",   np.int8),
+               ("star",       np.bool_),
+               ("finalStar",  np.bool_),
+               ("state",      np.uint8),
+               ("flameCount", np.int32)]
+
+    lists = None
+
+    def __init__(self, capacity = 64):
+        self.count = 0
+        for name, dtype in self.columns:
+            setattr(self, name, np.zeros(capacity, dtype = dtype))
+
+    def __len__(self):
+        return self.count
+
+    def __getstate__(self):
+        #don't write out the unused capacity or the list copies
+        state = self.__dict__.copy()
+        for name, dtype in self.columns:
+            state[name] = state[name][:self.count].copy()
+        state.pop("lists", None)
+        return state
+
+    def getLists(self):
+        if self.lists is None:
+            self.lists = dict((name, getattr(self, name)[:self.count].tolist()) for name, dtype in self.columns)
+        return self.lists
+
+    def setValue(self, name, index, value):
+        getattr(self, name)[index] = value
+        if self.lists is not None:
+            self.lists[name][index] = getattr(self, name)[index].item()
+
+    def append(self, time, values):
+        if self.count == len(self.time):
+            capacity = max(64, self.count * 2)
+            for name, dtype in self.columns:
+                column = np.zeros(capacity, dtype = dtype)
+                column[:self.count] = getattr(self, name)[:self.count]
+                setattr(self, name, column)
+        index = self.count
+        self.time[index] = time
+        for name, value in values.iteritems():
+            getattr(self, name)[index] = value
+        self.count += 1
+        self.lists = None
+        return index
+
+    def reset(self):
+        self.state[:self.count] = 0
+        self.flameCount[:self.count] = 0
+        if self.lists is not None:
+            self.lists["state"] = [0] * self.count
+            self.lists["flameCount"] = [0] * self.count
+
+def _noteColumn(name):
+    def get(self):
+        if self.store is None:
+            return self.values[name]
+        return self.store.getLists()[name][self.index]
+    def set(self, value):
+        if self.store is None:
+            self.values[name] = value
+        else:
+            self.store.setValue(name, self.index, value)
+    return property(get, set)
+
+def _noteFlag(flag):
+    def get(self):
+        if self.store is None:
+            return bool(self.values["state"] & flag)
+        return bool(self.store.getLists()["state"][self.index] & flag)
+    def set(self, value):
+        if self.store is None:
+            state = self.values["state"]
+        else:
+            state = self.store.getLists()["state"][self.index]
+        if value:
+            state |= flag
+        else:
+            state &= ~flag
+        if self.store is None:
+            self.values["state"] = state
+        else:
+            self.store.setValue("state", self.index, state)
+    return property(get, set)
+
 class Note(Event):
     def __init__(self, number, length, special = False, tappable = 0, star = False, finalStar = False):
+        #until the note is added to a NoteTrack, its column values live here
+        self.store    = None
+        self.index    = None
+        self.values   = {"state": 0, "flameCount": 0}
         Event.__init__(self, length)
         self.number   = number      #keeps track of fret number
-        self.played   = False
         self.special  = special
         self.tappable = tappable
         #RF-mod
-        self.hopod   = False
-        self.skipped = False
-        self.flameCount = 0
         self.HCount2 = 0
         self.star = star
         self.finalStar = finalStar
@@ -905,6 +1212,38 @@ class Note(Event):
         #pro-mode
         self.lane = 0               #named lane to be vague so then it can be used in guitar and drums
 
+    length     = _noteColumn("length")
+    number     = _noteColumn("number")
+    tappable   = _noteColumn("tappable")
+    star       = _noteColumn("star")
+    finalStar  = _noteColumn("finalStar")
+    flameCount = _noteColumn("flameCount")
+    played     = _noteFlag(NOTE_PLAYED)
+    hopod      = _noteFlag(NOTE_HOPOD)
+    skipped    = _noteFlag(NOTE_SKIPPED)
+
+    def bind(self, store, time):
+        if self.store is not None:
+            return
+        self.index = store.append(time, self.values)
+        self.store = store
+        self.values = None
+
+    def __copy__(self):
+        #copies never share the original's row
+        note = Note(self.number, self.length, self.special, self.tappable, self.star, self.finalStar)
+        note.played     = self.played
+        note.hopod      = self.hopod
+        note.skipped    = self.skipped
+        note.flameCount = self.flameCount
+        note.HCount2    = self.HCount2
+        note.noteBpm    = self.noteBpm
+        note.lane       = self.lane
+        return note
+
+    def __deepcopy__(self, memo):
+        return self.__copy__()
+
     def __repr__(self):
         return "<#%d>" % self.number
 
@@ -956,10 +1295,18 @@ class Track:    #MFH - Changing Track class to a base class.  NoteTrack and Temp
     granularity = 50
 
     def __init__(self, engine):
-        self.events = []
         self.allEvents = []
         self.marked = False
 
+        #time-sorted index over allEvents, rebuilt lazily after any change.
+        #  startTimes and maxEndTimes are parallel to indexEvents; maxEndTimes
+        #  holds the running maximum of time + length so the first event that
+        #  can still overlap a window is found by bisection as well.
+        self.startTimes = []
+        self.maxEndTimes = []
+        self.indexEvents = []
+        self.indexDirty = False
+
         self.currentIndex = None   #MFH
         self.maxIndex = None   #MFH
 
@@ -974,6 +1321,15 @@ class Track:    #MFH - Changing Track class to a base class.  NoteTrack and Temp
     def __len__(self):
         return len(self.allEvents)
 
+    def __getstate__(self):
+        #the index is cheap to rebuild, so leave it out of the chart cache
+        state = self.__dict__.copy()
+        state['startTimes'] = []
+        state['maxEndTimes'] = []
+        state['indexEvents'] = []
+        state['indexDirty'] = True
+        return state
+
     @property
     def length(self):
         lastTime = 0
@@ -985,13 +1341,8 @@ class Track:    #MFH - Changing Track class to a base class.  NoteTrack and Temp
         return round((lastTime+1000.0) / 1000.0) * 1000.0
 
     def addEvent(self, time, event):
-        for t in range(int(time / self.granularity), int((time + event.length) / self.granularity) + 1):
-            if len(self.events) < t + 1:
-                n = t + 1 - len(self.events)
-                n *= 8
-                self.events = self.events + [[] for n in range(n)]
-            self.events[t].append((time - (t * self.granularity), event))
         self.allEvents.append((time, event))
+        self.indexDirty = True
 
         if self.maxIndex == None:   #MFH - tracking track size
             self.maxIndex = 0
@@ -1000,12 +1351,9 @@ class Track:    #MFH - Changing Track class to a base class.  NoteTrack and Temp
             self.maxIndex += 1
 
     def removeEvent(self, time, event):
-        for t in range(int(time / self.granularity), int((time + event.length) / self.granularity) + 1):
-            e = (time - (t * self.granularity), event)
-            if t < len(self.events) and e in self.events[t]:
-                self.events[t].remove(e)
         if (time, event) in self.allEvents:
             self.allEvents.remove((time, event))
+            self.indexDirty = True
 
             #MFH - tracking track size
             if self.maxIndex != None:
@@ -1028,18 +1376,36 @@ class Track:    #MFH - Changing Track class to a base class.  NoteTrack and Temp
                 return self.allEvents[self.currentIndex - 1 - lookBehind]
         return None
 
+    def buildIndex(self):
+        #sort is stable, so events sharing a start time keep their insertion order
+        self.indexEvents = sorted(self.allEvents, key = lambda e: e[0])
+        self.startTimes = [time for time, event in self.indexEvents]
+        self.maxEndTimes = []
+        maxEnd = None
+        for time, event in self.indexEvents:
+            end = time + event.length
+            if maxEnd is None or end > maxEnd:
+                maxEnd = end
+            self.maxEndTimes.append(maxEnd)
+        self.indexDirty = False
+
     def getEvents(self, startTime, endTime):
+        #the window is still quantized to granularity-sized steps so callers see
+        #  the same events they did with the old bucketed storage.
         t1, t2 = [int(x) for x in [startTime / self.granularity, endTime / self.granularity]]
         if t1 > t2:
             t1, t2 = t2, t1
+        windowStart = max(t1, 0) * self.granularity
+        windowEnd   = t2 * self.granularity
+        if windowStart >= windowEnd:
+            return []
+
+        if self.indexDirty:
+            self.buildIndex()
 
-        events = []
-        for t in range(max(t1, 0), min(len(self.events), t2)):
-            for diff, event in self.events[t]:
-                time = (self.granularity * t) + diff
-                if not (time, event) in events:
-                    events.append((time, event))
-        return events
+        first = bisect.bisect_left(self.maxEndTimes, windowStart)
+        last  = bisect.bisect_left(self.startTimes, windowEnd)
+        return [(time, event) for time, event in self.indexEvents[first:last] if time + event.length >= windowStart]
 
     def getAllEvents(self):
         return self.allEvents
@@ -1047,15 +1413,14 @@ class Track:    #MFH - Changing Track class to a base class.  NoteTrack and Temp
     def reset(self):
         if self.maxIndex:
             self.currentIndex = 0
-        for eventList in self.events:
-            for time, event in eventList:
-                if isinstance(event, Note):
-                    event.played = False
-                    event.hopod = False
-                    event.skipped = False
-                    event.flameCount = 0
-                if isinstance(event, MarkerNote):
-                    event.happened = False
+        for time, event in self.allEvents:
+            if isinstance(event, Note):
+                event.played = False
+                event.hopod = False
+                event.skipped = False
+                event.flameCount = 0
+            if isinstance(event, MarkerNote):
+                event.happened = False
 
 class VocalTrack(Track):
     def __init__(self, engine):
@@ -1080,6 +1445,7 @@ class VocalTrack(Track):
         for time, event in self.allEvents:
             if isinstance(event, Tempo):
                 self.allEvents.remove((time, event))
+                self.indexDirty = True
                 if self.logTempoEvents == 1:
                     Log.debug("Tempo event removed from VocalTrack during cleanup: " + str(event.bpm) + "bpm")
 
@@ -1140,15 +1506,18 @@ class VocalTrack(Track):
     def reset(self):
         if self.maxIndex:
             self.currentIndex = 0
-        for eventList in self.events:
-            for time, event in eventList:
-                if isinstance(event, VocalPhrase):
-                    for time, note in event.allEvents:
-                        note.played = False
-                        note.stopped = False
-                        note.accuracy = 0.0
+        for time, event in self.allEvents:
+            if isinstance(event, VocalPhrase):
+                for time, note in event.allEvents:
+                    note.played = False
+                    note.stopped = False
+                    note.accuracy = 0.0
 
 class VocalPhrase(VocalTrack, Event):
+    #a phrase's length is its own, as an Event, not the one Track.length works out from its notes.
+    #  Event being a new-style class would otherwise leave Track's read-only property in the way.
+    length = 0
+
     def __init__(self, length, star = False):
         Event.__init__(self, length)
         VocalTrack.__init__(self, engine = None)
@@ -1166,11 +1535,72 @@ class VocalPhrase(VocalTrack, Event):
         for time in times:
             newEvents.append(eventDict[time])
         self.allEvents = newEvents
+        self.indexDirty = True
+
+#tempo markers of a MIDI file, with the time in milliseconds at which each one starts.
+#  lookups during a sequential parse reuse the previous segment; anything else bisects.
+class TempoMap:
+    def __init__(self, ticksPerBeat = 480, bpm = DEFAULT_BPM):
+        self.ticksPerBeat = ticksPerBeat
+        self.initialBpm = bpm     #used before the first marker
+        self.ticks = []
+        self.times = []
+        self.bpms = []
+        self.segment = -1
+
+    def __len__(self):
+        return len(self.ticks)
+
+    def setTicksPerBeat(self, ticksPerBeat):
+        self.ticksPerBeat = ticksPerBeat
+        self.updateTimes(0)
+
+    def ticksToMs(self, ticks, bpm):
+        return (60000.0 * ticks) / (bpm * self.ticksPerBeat)
+
+    def addMarker(self, tick, bpm):
+        if not self.ticks or tick >= self.ticks[-1]:
+            i = len(self.ticks)
+        else:
+            i = bisect.bisect_right(self.ticks, tick)
+        self.ticks.insert(i, tick)
+        self.bpms.insert(i, bpm)
+        self.times.insert(i, 0.0)
+        self.updateTimes(i)
+
+    def updateTimes(self, start):
+        for i in range(start, len(self.ticks)):
+            if i == 0:
+                self.times[i] = self.ticksToMs(self.ticks[i], self.initialBpm)
+            else:
+                self.times[i] = self.times[i-1] + self.ticksToMs(self.ticks[i] - self.ticks[i-1], self.bpms[i-1])
+        self.segment = -1
+
+    def findSegment(self, tick):
+        i = self.segment
+        if i >= 0 and self.ticks[i] <= tick and (i + 1 == len(self.ticks) or tick < self.ticks[i+1]):
+            return i
+        i = bisect.bisect_right(self.ticks, tick) - 1
+        self.segment = i
+        return i
+
+    def getTime(self, tick):
+        i = self.findSegment(tick)
+        if i < 0:
+            return self.ticksToMs(tick, self.initialBpm)
+        return self.times[i] + self.ticksToMs(tick - self.ticks[i], self.bpms[i])
+
+    def getBpm(self, time):     #time in milliseconds, not ticks
+        if not self.times:
+            return self.initialBpm
+        i = bisect.bisect_right(self.times, time) - 1
+        return self.bpms[max(i, 0)]
 
 class TempoTrack(Track):    #MFH - special Track type for tempo events
     def __init__(self, engine):
         Track.__init__(self, engine)
         self.currentBpm = DEFAULT_BPM
+        self.tempoMap = TempoMap()
 
     def reset(self):
         self.currentBpm = DEFAULT_BPM
@@ -1191,38 +1621,36 @@ class TempoTrack(Track):    #MFH - special Track type for tempo events
             return self.getNextEvent()
         return None
 
-    def searchCurrentTempo(self, pos):    #MFH - will hunt through all tempo events to find it - intended for use during initializations only!
-        foundBpm = None
-        foundTime = None
-        for time, event in self.allEvents:
-            if not foundBpm or not foundTime:
-                foundBpm = event.bpm
-                foundTime = time
-            else:
-                #MFH - want to discard if the foundTime is before pos, but this event is after pos.
-                # -- also want to take newer BPM if time > foundTime >= pos
-                if time <= pos:   #MFH - first required condition.
-                    if time > foundTime:    #MFH - second required condition for sorting.
-                        foundBpm = event.bpm
-                        foundTime = time
-        if foundBpm:
-            return foundBpm
-        else:   #MFH - return default BPM if no events
-            return DEFAULT_BPM
+    def searchCurrentTempo(self, pos):    #MFH - looks the tempo up in the tempo map, so it is safe to use at any time
+        return self.tempoMap.getBpm(pos)
 
 class NoteTrack(Track):   #MFH - special Track type for note events, with marking functions
     def __init__(self, engine):
         Track.__init__(self, engine)
         self.chordFudge = 1
+        self.barsMarked = False
+
+        self.noteStore = NoteStore()
 
         self.hopoTick = engine.config.get("coffee", "hopo_frequency")
         self.songHopoFreq = engine.config.get("game", "song_hopo_freq")
         self.logTempoEvents = engine.config.get("log",   "log_tempo_events")
 
+    def addEvent(self, time, event):
+        if isinstance(event, Note):
+            event.bind(self.noteStore, time)
+        Track.addEvent(self, time, event)
+
+    def reset(self):
+        if self.maxIndex:
+            self.currentIndex = 0
+        self.noteStore.reset()
+
     def removeTempoEvents(self):
         for time, event in self.allEvents:
             if isinstance(event, Tempo):
                 self.allEvents.remove((time, event))
+                self.indexDirty = True
                 if self.logTempoEvents == 1:
                     Log.debug("Tempo event removed from NoteTrack during cleanup: " + str(event.bpm) + "bpm")
 
@@ -1937,6 +2365,10 @@ class NoteTrack(Track):   #MFH - special Track type for note events, with markin
         tempoTime = []
         tempoBpm = []
 
+        #If already processed abort
+        if self.barsMarked:
+            return
+
         #get all the bpm changes and their times
 
         #MFH - TODO - count tempo events.  If 0, realize and log that this is a song with no tempo events - and go mark all 120BPM bars.
@@ -2007,17 +2439,20 @@ class NoteTrack(Track):   #MFH - special Track type for note events, with markin
             elif (passes % (THnote / 8.0) == 0.0): #256/8
                 event = Bars(0) #half-beat
                 self.addEvent(time, event)
+        self.barsMarked = True
 
 
 class Song(object):
-    def __init__(self, engine, infoFileName, songTrackName, guitarTrackName, rhythmTrackName, noteFileName, scriptFileName = None, partlist = [parts[GUITAR_PART]], drumTrackName = None, crowdTrackName = None):
+    def __init__(self, engine, infoFileName, songTrackName, guitarTrackName, rhythmTrackName, noteFileName, scriptFileName = None, partlist = [parts[GUITAR_PART]], drumTrackName = None, crowdTrackName = None, difficultylist = None, info = None):
         self.engine        = engine
 
         self.logClassInits = self.engine.config.get("game", "log_class_inits")
         if self.logClassInits == 1:
             Log.debug("Song class init (song.py)...")
 
-        self.info         = SongInfo(infoFileName)
+        if info is None:
+            info = SongInfo(infoFileName)
+        self.info         = info
         self.tracks = []
         for i in partlist:
             if i == parts[VOCAL_PART]:
@@ -2026,6 +2461,18 @@ class Song(object):
                 self.tracks.append([NoteTrack(self.engine) for t in range(len(difficulties))])
 
         self.difficulty   = [difficulties[EXP_DIF] for i in partlist]
+
+        #which difficulties of each part have been read from the MIDI; None means all of them.
+        #  the others are read the first time they are asked for.
+        self.loadedDifficulties = []
+        for i, part in enumerate(partlist):
+            if difficultylist is None or difficultylist[i] is None or part == parts[VOCAL_PART]:
+                self.loadedDifficulties.append(None)
+            else:
+                self.loadedDifficulties.append(set([diff.id for diff in difficultylist[i]]))
+        self.drumsFlipped = [False for i in partlist]
+        self.tracksMarked = False
+
         self._playing     = False
         self.start        = 0.0
         self.noteFileName = noteFileName
@@ -2086,36 +2533,52 @@ class Song(object):
         #akedrou
         self.crowdTrack = None
 
-        try:
-            if songTrackName:
-                self.songTrack = Audio.StreamingSound(self.engine.audio.getChannel(0), songTrackName)
-        except Exception, e:
-            Log.warn("Unable to load song track: %s" % e)
+        #decode and mix all the song's tracks together when there are several,
+        #  so they share a time-stretch and a channel and can't drift apart.
+        trackNames = [songTrackName, guitarTrackName, rhythmTrackName, drumTrackName, crowdTrackName]
+        stemNames = [name for name in trackNames if name]
+        self.stemMix = None
+        if len(stemNames) > 1:
+            try:
+                self.stemMix = Audio.MultiStemSound(self.engine.audio.getChannel(0), stemNames)
+            except Exception, e:
+                Log.warn("Unable to mix song tracks together, playing them separately: %s" % e)
+
+        if self.stemMix:
+            stems = iter(self.stemMix.stems)
+            tracks = [name and stems.next() or None for name in trackNames]
+            self.songTrack, self.guitarTrack, self.rhythmTrack, self.drumTrack, self.crowdTrack = tracks
+        else:
+            try:
+                if songTrackName:
+                    self.songTrack = Audio.StreamingSound(self.engine.audio.getChannel(0), songTrackName)
+            except Exception, e:
+                Log.warn("Unable to load song track: %s" % e)
 
-        try:
-            if guitarTrackName:
-                self.guitarTrack = Audio.StreamingSound(self.engine.audio.getChannel(1), guitarTrackName)
-        except Exception, e:
-            Log.warn("Unable to load guitar track: %s" % e)
+            try:
+                if guitarTrackName:
+                    self.guitarTrack = Audio.StreamingSound(self.engine.audio.getChannel(1), guitarTrackName)
+            except Exception, e:
+                Log.warn("Unable to load guitar track: %s" % e)
 
-        try:
-            if rhythmTrackName:
-                self.rhythmTrack = Audio.StreamingSound(self.engine.audio.getChannel(2), rhythmTrackName)
-        except Exception, e:
-            Log.warn("Unable to load rhythm track: %s" % e)
+            try:
+                if rhythmTrackName:
+                    self.rhythmTrack = Audio.StreamingSound(self.engine.audio.getChannel(2), rhythmTrackName)
+            except Exception, e:
+                Log.warn("Unable to load rhythm track: %s" % e)
 
 
-        try:
-            if drumTrackName:
-                self.drumTrack = Audio.StreamingSound(self.engine.audio.getChannel(3), drumTrackName)
-        except Exception, e:
-            Log.warn("Unable to load drum track: %s" % e)
+            try:
+                if drumTrackName:
+                    self.drumTrack = Audio.StreamingSound(self.engine.audio.getChannel(3), drumTrackName)
+            except Exception, e:
+                Log.warn("Unable to load drum track: %s" % e)
 
-        try:
-            if crowdTrackName:
-                self.crowdTrack = Audio.StreamingSound(self.engine.audio.getChannel(4), crowdTrackName)
-        except Exception, e:
-            Log.warn("Unable to load crowd track: %s" % e)
+            try:
+                if crowdTrackName:
+                    self.crowdTrack = Audio.StreamingSound(self.engine.audio.getChannel(4), crowdTrackName)
+            except Exception, e:
+                Log.warn("Unable to load crowd track: %s" % e)
 
         #MFH - single audio track song detection
         self.singleTrackSong = False
@@ -2128,9 +2591,14 @@ class Song(object):
 
         # load the notes
         if noteFileName:
-            Log.debug("Retrieving notes from: " + noteFileName)
-            midiIn = midi.MidiInFile(MidiReader(self), noteFileName)
-            midiIn.read()
+            useChartCache = self.engine.config.get("performance", "cache_compiled_charts")
+            if not (useChartCache and self.loadCompiledChart()):
+                Log.debug("Retrieving notes from: " + noteFileName)
+                midiIn = midi.MidiInFile(MidiReader(self, self.loadedDifficulties), noteFileName)
+                midiIn.read()
+                if useChartCache:
+                    self.markTracks()
+                    self.saveCompiledChart()
 
         # load the script
         if scriptFileName and os.path.isfile(scriptFileName):
@@ -2169,16 +2637,124 @@ class Song(object):
     def getCurrentTempo(self, pos):  #MFH
         return self.tempoEventTrack.getCurrentTempo(pos)
 
+    #everything the MIDI reader fills in; script.txt events are read on every load and are not part of this.
+    _compiledChartAttrs = ('tracks', 'midiEventTracks', 'eventTracks', 'vocalEventTrack', 'tempoEventTrack', 'loadedDifficulties', 'tracksMarked',
+                           'bpm', 'period', 'hasMidiLyrics', 'hasStarpowerPaths', 'hasFreestyleMarkings', 'breMarkerTime')
+
+    def getCompiledChartKey(self):
+        #the chart is only valid for the same notes and the same settings that change how notes get marked.
+        settings = [self.engine.config.get("game", "hopo_system"),
+                    self.engine.config.get("game", "gh2_sloppy"),
+                    self.engine.config.get("game", "hopo_after_chord"),
+                    self.engine.config.get("game", "song_hopo_freq"),
+                    self.engine.config.get("coffee", "hopo_frequency"),
+                    self.info.hopo, self.info.eighthNoteHopo, self.info.hopofreq]
+        partIds = []
+        for part, loaded in zip(self.parts, self.loadedDifficulties):
+            if loaded is None:
+                partIds.append(str(part.id))
+            else:
+                partIds.append("%d/%s" % (part.id, "".join([str(id) for id in sorted(loaded)])))
+        return "%s:%s:%s" % (self.getHash(), ",".join(partIds), ",".join([str(value) for value in settings]))
+
+    def loadCompiledChart(self):
+        try:
+            key = self.getCompiledChartKey()
+            with _songDBLock:
+                result = _songDB.execute('SELECT `chart` FROM `charts` WHERE `key` = ?', [key]).fetchone()
+        except Exception:
+            Log.error('Compiled chart retrieval failed for %s: ' % self.noteFileName)
+            return False
+        if result is None:
+            Log.debug('Compiled chart for %s was not found in the cache.' % self.noteFileName)
+            return False
+
+        try:
+            self.__dict__.update(cPickle.loads(str(result[0])))
+            Log.debug('Compiled chart for %s successfully loaded from cache.' % self.noteFileName)
+            return True
+        except:
+            # The entry is there but could not be loaded.
+            # Nuke it and let it be rebuilt.
+            Log.error('Compiled chart for %s is invalid (will rebuild): ' % self.noteFileName)
+            with _songDBLock:
+                _songDB.execute('DELETE FROM `charts` WHERE `key` = ?', [key])
+                _songDB.commit()
+            return False
+
+    def saveCompiledChart(self):
+        Log.debug('Writing out compiled chart for %s.' % self.noteFileName)
+        pdict = {}
+        for key in self._compiledChartAttrs:
+            pdict[key] = getattr(self, key)
+        try:
+            key = self.getCompiledChartKey()
+            hash, partIds, settings = key.split(':', 2)
+            path = os.path.abspath(self.noteFileName)
+            #a chart compiled from older notes or under other settings is replaced, so edits and settings changes don't pile up
+            chart = cPickle.dumps(pdict, cPickle.HIGHEST_PROTOCOL)
+            with _songDBLock:
+                _songDB.execute('DELETE FROM `charts` WHERE `path` = ? AND `parts` = ? AND `key` != ?', [path, partIds, key])
+                _songDB.execute('INSERT OR REPLACE INTO `charts` (`key`, `path`, `hash`, `parts`, `chart`) VALUES (?, ?, ?, ?, ?)',
+                                [key, path, hash, partIds, chart])
+                _songDB.commit()
+        except Exception:
+            Log.error('Compiled chart could not be written for %s: ' % self.noteFileName)
+
+    #marks bars and HO/POs on every difficulty the same way GuitarScene would for the chosen one,
+    #  so the result can be cached.  GuitarScene's own marking calls then do nothing.
+    def markTracks(self):
+        for i, part in enumerate(self.parts):
+            if part == parts[VOCAL_PART]:
+                continue
+            for diff in range(len(self.tracks[i])):
+                if self.loadedDifficulties[i] is None or diff in self.loadedDifficulties[i]:
+                    self.markTrack(i, diff)
+        self.tracksMarked = True
+
+    def markTrack(self, i, diff):
+        hopoStyle = self.engine.config.get("game", "hopo_system")
+        if self.engine.config.get("game", "gh2_sloppy") == 1:
+            hopoStyle = 4
+        hopoAfterChord = self.engine.config.get("game", "hopo_after_chord")
+
+        part  = self.parts[i]
+        track = self.tracks[i][diff]
+        track.markBars()
+        if part == parts[DRUM_PART] or part == parts[PRO_DRUM_PART]:
+            return
+        if hopoStyle > 0 or self.info.hopo == "on":
+            if hopoStyle == 2 or hopoStyle == 3 or hopoStyle == 4:  #GH2 style HOPO system
+                track.markHopoGH2(self.info.eighthNoteHopo, hopoAfterChord, self.info.hopofreq)
+            elif hopoStyle == 1:   #RF-Mod style HOPO system
+                track.markHopoRF(self.info.eighthNoteHopo, self.info.hopofreq)
+
+    def loadDifficulty(self, i, diff):
+        #reads one difficulty of one part that was skipped when the song was loaded
+        loaded = self.loadedDifficulties[i]
+        if loaded is None or diff in loaded:
+            return
+        Log.debug("Reading %s difficulty %s from: %s" % (self.parts[i], difficulties[diff], self.noteFileName))
+        wanted = [set() for part in self.parts]
+        wanted[i].add(diff)
+        midiIn = midi.MidiInFile(MidiReader(self, wanted, notesOnly = True), self.noteFileName)
+        midiIn.read()
+        loaded.add(diff)
+
+        if self.drumsFlipped[i]:
+            self.tracks[i][diff].flipDrums()
+        if self.tracksMarked:
+            self.markTrack(i, diff)
+
+    def flipDrums(self, i):
+        for diff, track in enumerate(self.tracks[i]):
+            if self.loadedDifficulties[i] is None or diff in self.loadedDifficulties[i]:
+                track.flipDrums()
+        self.drumsFlipped[i] = True
+
 
     def getHash(self):
-        h = hashlib.sha1()
-        f = open(self.noteFileName, "rb")
-        bs = 1024
-        while 1:
-            data = f.read(bs)
-            if not data: break
-            h.update(data)
-        return h.hexdigest()
+        return Fingerprint.fingerprint(self.noteFileName)
 
     def setBpm(self, bpm):
         self.bpm    = bpm
@@ -2187,31 +2763,32 @@ class Song(object):
     def save(self):
         self.info.save()
 
+    def getSounds(self):
+        #what gets played, stopped and sped up: the mixed stems as a whole, or each track on its own.
+        #  the stems of a mix only have their own volume and pitch.
+        if self.stemMix:
+            return [self.stemMix]
+        return [track for track in (self.songTrack, self.guitarTrack, self.rhythmTrack, self.drumTrack, self.crowdTrack) if track]
+
+    def getClockSound(self):
+        #the sound the playback position comes from
+        return self.stemMix or self.songTrack
+
     def play(self, start = 0.0):
         self.start = start
 
         #RF-mod No longer needed?
 
-        self.songTrack.setPosition(start / 1000.0)
-        self.songTrack.play()
+        clockSound = self.getClockSound()
+        clockSound.setPosition(start / 1000.0)
+        for sound in self.getSounds():
+            if sound is not clockSound:
+                assert start == 0.0
+            sound.play()
         if self.singleTrackSong:
             self.songTrack.setVolume(self.activeVolume)
         else:
             self.songTrack.setVolume(self.backVolume)
-
-        if self.guitarTrack:
-            assert start == 0.0
-            self.guitarTrack.play()
-        if self.rhythmTrack:
-            assert start == 0.0
-            self.rhythmTrack.play()
-        #myfingershurt
-        if self.drumTrack:
-            assert start == 0.0
-            self.drumTrack.play()
-        if self.crowdTrack:
-            assert start == 0.0
-            self.crowdTrack.play()
         self._playing = True
 
     def pause(self):
@@ -2324,59 +2901,35 @@ class Song(object):
                     track.reset()
 
 
-        if self.songTrack:
-            self.songTrack.stop()
-        if self.guitarTrack:
-            self.guitarTrack.stop()
-        if self.rhythmTrack:
-            self.rhythmTrack.stop()
-        if self.drumTrack:
-            self.drumTrack.stop()
-        if self.crowdTrack:
-            self.crowdTrack.stop()
+        for sound in self.getSounds():
+            sound.stop()
         self._playing = False
 
     def setSpeed(self, speed):
-        if self.songTrack:
-            self.songTrack.setSpeed(speed)
-        if self.guitarTrack:
-            self.guitarTrack.setSpeed(speed)
-        if self.rhythmTrack:
-            self.rhythmTrack.setSpeed(speed)
-        if self.drumTrack:
-            self.drumTrack.setSpeed(speed)
-        if self.crowdTrack:
-            self.crowdTrack.setSpeed(speed)
+        for sound in self.getSounds():
+            sound.setSpeed(speed)
 
     def fadeout(self, time):
         for tracks in self.tracks:
             for track in tracks:
                 track.reset()
 
-        if self.songTrack:
-            self.songTrack.fadeout(time)
-        if self.guitarTrack:
-            self.guitarTrack.fadeout(time)
-        if self.rhythmTrack:
-            self.rhythmTrack.fadeout(time)
-        if self.drumTrack:
-            self.drumTrack.fadeout(time)
-        if self.crowdTrack:
-            self.crowdTrack.fadeout(time)
+        for sound in self.getSounds():
+            sound.fadeout(time)
         self._playing = False
 
     def getPosition(self):
         if not self._playing:
             pos = 0.0
         else:
-            pos = self.songTrack.getPosition() * 1000.0
+            pos = self.getClockSound().getPosition() * 1000.0
 
         if pos < 0.0:
             pos = 0.0
         return pos - self.delay
 
     def isPlaying(self):
-        return self._playing and self.songTrack.isPlaying()
+        return self._playing and self.getClockSound().isPlaying()
 
     def getBeat(self):
         return self.getPosition() / self.period
@@ -2385,6 +2938,9 @@ class Song(object):
         pass
 
     def getTrack(self):
+        for i, loaded in enumerate(self.loadedDifficulties):
+            if loaded is not None and self.difficulty[i].id not in loaded:
+                self.loadDifficulty(i, self.difficulty[i].id)
         return [self.tracks[i][self.difficulty[i].id] for i in range(len(self.difficulty))]
 
     def getIsSingleAudioTrack(self):
@@ -2394,6 +2950,9 @@ class Song(object):
     isSingleAudioTrack = property(getIsSingleAudioTrack)
 
     def getMidiEventTrack(self):   #MFH - for new special MIDI marker note track
+        for i, loaded in enumerate(self.loadedDifficulties):
+            if loaded is not None and self.difficulty[i].id not in loaded:
+                self.loadDifficulty(i, self.difficulty[i].id)
         return [self.midiEventTracks[i][self.difficulty[i].id] for i in range(len(self.difficulty))]
     midiEventTrack = property(getMidiEventTrack)
 
@@ -2489,13 +3048,20 @@ class ScriptReader:
             self.song.eventTracks[TK_SCRIPT].addEvent(time, event)  #MFH - add an event to the script.txt track
 
 class MidiReader(midi.MidiOutStream):
-    def __init__(self, song):
+    #difficulties holds a set of difficulty ids to read for each of the song's parts (None for all of them).
+    #  with notesOnly, only those note and marker tracks are filled in, for reading more difficulties later.
+    def __init__(self, song, difficulties = None, notesOnly = False):
         midi.MidiOutStream.__init__(self)
         self.song = song
+        self.difficulties = difficulties
+        self.notesOnly = notesOnly
         self.heldNotes = {}
         self.velocity  = {}
-        self.ticksPerBeat = 480
-        self.tempoMarkers = []
+        if notesOnly:
+            self.tempoMap = TempoMap(bpm = song.bpm)
+        else:
+            self.tempoMap = song.tempoEventTrack.tempoMap
+            self.tempoMap.initialBpm = song.bpm
         self.partTrack = 0
         self.partnumber = -1
 
@@ -2517,6 +3083,18 @@ class MidiReader(midi.MidiOutStream):
         self.guitarSoloActive = False
         self.guitarSoloSectionMarkers = False
 
+    def wantsTrack(self, i, diff):
+        return self.difficulties is None or self.difficulties[i] is None or diff in self.difficulties[i]
+
+    def wantsDifficulty(self, diff):
+        #whether any part matching the current MIDI track wants notes of this difficulty
+        if self.partnumber == -1:
+            return True
+        for i, part in enumerate(self.song.parts):
+            if self.partnumber == part and self.wantsTrack(i, diff):
+                return True
+        return False
+
     def addEvent(self, track, event, time = None):
         if self.partnumber == -1:
             #Looks like notes have started appearing before any part information. Lets assume its part0
@@ -2530,17 +3108,24 @@ class MidiReader(midi.MidiOutStream):
         assert time >= 0
 
         if track is None:
-            for t in self.song.tracks:
-                for s in t:
-                    s.addEvent(time, event)
+            for i, t in enumerate(self.song.tracks):
+                for d, s in enumerate(t):
+                    if self.wantsTrack(i, d):
+                        s.addEvent(time, event)
         else:
 
-            tracklist = [i for i,j in enumerate(self.song.parts) if self.partnumber == j]
-            for i in tracklist:
-                #Each track needs it's own copy of the event, otherwise they'll interfere
-                eventcopy = copy.deepcopy(event)
+            tracklist = [i for i,j in enumerate(self.song.parts) if self.partnumber == j and self.wantsTrack(i, track)]
+            for n, i in enumerate(tracklist):
                 if track < len(self.song.tracks[i]):
-                    self.song.tracks[i][track].addEvent(time, eventcopy)
+                    self.song.tracks[i][track].addEvent(time, self.trackEvent(event, n))
+
+    def trackEvent(self, event, n):
+        #the event to add to the n-th track of the parts it belongs to.
+        #  each further track needs its own copy, otherwise they'll interfere; Note copies
+        #  only carry the chart values, as play state lives in each track's NoteStore.
+        if n > 0:
+            return copy.copy(event)
+        return event
 
     def addVocalEvent(self, event, time = None):
         if time is None:
@@ -2611,49 +3196,36 @@ class MidiReader(midi.MidiOutStream):
         assert time >= 0
 
         if track is None:
-            for t in self.song.midiEventTracks:
-                for s in t:
-                    s.addEvent(time, event)
+            for i, t in enumerate(self.song.midiEventTracks):
+                for d, s in enumerate(t):
+                    if self.wantsTrack(i, d):
+                        s.addEvent(time, event)
         else:
 
-            tracklist = [i for i,j in enumerate(self.song.parts) if self.partnumber == j]
-            for i in tracklist:
-                #Each track needs it's own copy of the event, otherwise they'll interfere
-                eventcopy = copy.deepcopy(event)
+            tracklist = [i for i,j in enumerate(self.song.parts) if self.partnumber == j and self.wantsTrack(i, track)]
+            for n, i in enumerate(tracklist):
                 if track < len(self.song.midiEventTracks[i]):
-                    self.song.midiEventTracks[i][track].addEvent(time, eventcopy)
+                    self.song.midiEventTracks[i][track].addEvent(time, self.trackEvent(event, n))
 
 
     def abs_time(self):
-        def ticksToBeats(ticks, bpm):
-            return (60000.0 * ticks) / (bpm * self.ticksPerBeat)
-
         if self.song.bpm:
-            currentTime = midi.MidiOutStream.abs_time(self)
-
-            scaledTime      = 0.0
-            tempoMarkerTime = 0.0
-            currentBpm      = self.song.bpm
-            for i, marker in enumerate(self.tempoMarkers):
-                time, bpm = marker
-                if time > currentTime:
-                    break
-                scaledTime += ticksToBeats(time - tempoMarkerTime, currentBpm)
-                tempoMarkerTime, currentBpm = time, bpm
-            return scaledTime + ticksToBeats(currentTime - tempoMarkerTime, currentBpm)
+            return self.tempoMap.getTime(midi.MidiOutStream.abs_time(self))
         return 0.0
 
     def header(self, format, nTracks, division):
-        self.ticksPerBeat = division
+        self.tempoMap.setTicksPerBeat(division)
         if nTracks == 2:
             self.partTrack = 1
 
     def tempo(self, value):
         bpm = 60.0 * 10.0**6 / value
-        self.tempoMarkers.append((midi.MidiOutStream.abs_time(self), bpm))
+        self.tempoMap.addMarker(midi.MidiOutStream.abs_time(self), bpm)
+        self.addEvent(None, Tempo(bpm))
+        if self.notesOnly:
+            return
         if not self.song.bpm:
             self.song.setBpm(bpm)
-        self.addEvent(None, Tempo(bpm))
         self.addTempoEvent(Tempo(bpm))  #MFH
 
     def sequence_name(self, text):
@@ -2666,7 +3238,7 @@ class MidiReader(midi.MidiOutStream):
             if text in part.trackName:
                 if (part.id == VOCAL_PART):
                     self.vocalTrack = True
-                    self.useVocalTrack = True
+                    self.useVocalTrack = not self.notesOnly
                 self.partnumber = part
                 if self.logSections == 1:
                     tempText2 = text.replace(" ", "_")
@@ -2709,7 +3281,8 @@ class MidiReader(midi.MidiOutStream):
                 return
             if note in noteMap:
                 track, number = noteMap[note]
-                self.addEvent(track, Note(number, endTime - startTime, special = self.velocity[note] == 127), time = startTime)
+                if self.wantsDifficulty(track):
+                    self.addEvent(track, Note(number, endTime - startTime, special = self.velocity[note] == 127), time = startTime)
 
             #MFH: use self.midiEventTracks to store all the special MIDI marker notes, keep the clutter out of the main notes lists
             #  also -- to make use of marker notes in real-time, must add a new attribute to MarkerNote class "endMarker"
@@ -2759,6 +3332,8 @@ class MidiReader(midi.MidiOutStream):
     #and then write an iteration routine to go through whatever track / difficulty is being played in GuitarScene
     #to find these markers and count the notes and add a new text event containing each solo's note count
     def text(self, text):
+        if self.notesOnly:
+            return
         if text.find("GNMIDI") < 0:   #to filter out the midi class illegal usage / trial timeout messages
             #MFH - if sequence name is PART VOCALS then look for text event lyrics
             if self.vocalTrack:
@@ -2856,6 +3431,8 @@ class MidiReader(midi.MidiOutStream):
 
     #myfingershurt: adding MIDI lyric event access
     def lyric(self, text):
+        if self.notesOnly:
+            return
         if text.find("GNMIDI") < 0:   #to filter out the midi class illegal usage / trial timeout messages
             event = TextEvent(text, 400.0)
             self.addVocalLyric(text)
@@ -2864,7 +3441,7 @@ class MidiReader(midi.MidiOutStream):
 
 class MidiSectionReader(midi.MidiOutStream):
     # We exit via this exception so that we don't need to read the whole file in
-    class Done: pass
+    Done = midi.MidiFanOutStream.Done
 
     def __init__(self):
         midi.MidiOutStream.__init__(self)
@@ -2877,9 +3454,8 @@ class MidiSectionReader(midi.MidiOutStream):
         self.logSections = Config.get("game", "log_sections")
 
         #MFH: practice section support:
-        self.ticksPerBeat = 480
         self.sections = []
-        self.tempoMarkers = []
+        self.tempoMap = TempoMap(bpm = None)
         self.guitarSoloSectionMarkers = False
         self.bpm = None
 
@@ -2888,30 +3464,21 @@ class MidiSectionReader(midi.MidiOutStream):
 
 
     def header(self, format=0, nTracks=1, division=96):
-        self.ticksPerBeat = division
+        self.tempoMap.setTicksPerBeat(division)
 
-    def abs_time(self):
-        def ticksToBeats(ticks, bpm):
-            return (60000.0 * ticks) / (bpm * self.ticksPerBeat)
+    def eof(self):
+        raise MidiSectionReader.Done
 
+    def abs_time(self):
         if self.bpm:
-            currentTime = midi.MidiOutStream.abs_time(self)
-
-            scaledTime      = 0.0
-            tempoMarkerTime = 0.0
-            currentBpm      = self.bpm
-            for i, marker in enumerate(self.tempoMarkers):
-                time, bpm = marker
-                if time > currentTime:
-                    break
-                scaledTime += ticksToBeats(time - tempoMarkerTime, currentBpm)
-                tempoMarkerTime, currentBpm = time, bpm
-            return scaledTime + ticksToBeats(currentTime - tempoMarkerTime, currentBpm)
+            return self.tempoMap.getTime(midi.MidiOutStream.abs_time(self))
         return 0.0
 
     def tempo(self, value):
         self.bpm = 60.0 * 10.0**6 / value
-        self.tempoMarkers.append((midi.MidiOutStream.abs_time(self), self.bpm))
+        if self.tempoMap.initialBpm is None:
+            self.tempoMap.initialBpm = self.bpm
+        self.tempoMap.addMarker(midi.MidiOutStream.abs_time(self), self.bpm)
 
     def note_on(self, channel, note, velocity):
         pos = float(midi.MidiOutStream.abs_time(self))
@@ -3091,6 +3658,7 @@ class MidiPartsDiffReader(midi.MidiOutStream):
         self.nextPart    = 0
         self.forceGuitar = forceGuitar
         self.firstTrack   = False
+        self.multipleTracks = False
         self.notesFound   = [0, 0, 0, 0]
         self._drumFound   = False
         self._ODNoteFound = False
@@ -3114,6 +3682,9 @@ class MidiPartsDiffReader(midi.MidiOutStream):
             return MIDI_TYPE_GH
     midiStyle = property(getMidiStyle)
 
+    def eof(self):
+        raise midi.MidiFanOutStream.Done
+
     def start_of_track(self, n_track=0):
         if self.forceGuitar:
             if not self.firstTrack:
@@ -3130,7 +3701,7 @@ class MidiPartsDiffReader(midi.MidiOutStream):
                         Log.debug(tempText + tempText2)
                 self.firstTrack = True
             else:
-                Log.notice("This song has multiple tracks, none properly named. Behavior may be erratic.")
+                self.multipleTracks = True
 
     def sequence_name(self, text):
 
@@ -3187,16 +3758,36 @@ class MidiPartsDiffReader(midi.MidiOutStream):
         except KeyError:
             pass
 
-def loadSong(engine, name, library = DEFAULT_LIBRARY, seekable = False, playbackOnly = False, notesOnly = False, part = [parts[GUITAR_PART]], practiceMode = False, practiceSpeed = .5):
-
+# Audio file extensions a song's stems can have, cheapest to decode first;
+# when a stem is there in more than one (e.g. after running StemConverter
+# on a song), the cheapest one is played.
+stemExtensions = [".wav", ".flac", ".ogg"]
+
+def stemFileName(engine, library, name, stem):
+    '''
+    Find the audio file of a stem of a song.
+    @param stem:  Name of the stem without an extension, e.g. "guitar"
+    @return:      Full path of the file; the .ogg's if there is none
+    '''
+    for extension in stemExtensions:
+        fileName = engine.resource.fileName(library, name, stem + extension)
+        if os.path.isfile(fileName):
+            return fileName
+    return engine.resource.fileName(library, name, stem + ".ogg")
+
+def loadSong(engine, name, library = DEFAULT_LIBRARY, seekable = False, playbackOnly = False, notesOnly = False, part = [parts[GUITAR_PART]], practiceMode = False, practiceSpeed = .5, difficulty = None):
     Log.debug("loadSong function call (song.py)...")
+    return Song(*prepareSong(engine, name, library, seekable, playbackOnly, notesOnly, part, practiceMode, practiceSpeed, difficulty))
+
+def prepareSong(engine, name, library = DEFAULT_LIBRARY, seekable = False, playbackOnly = False, notesOnly = False, part = [parts[GUITAR_PART]], practiceMode = False, practiceSpeed = .5, difficulty = None):
+    #pick the files of a song and read its info: the arguments to make its Song with.
     crowdsEnabled = engine.config.get("audio", "enable_crowd_tracks")
 
     #RF-mod (not needed?)
-    guitarFile = engine.resource.fileName(library, name, "guitar.ogg")
-    songFile   = engine.resource.fileName(library, name, "song.ogg")
-    rhythmFile = engine.resource.fileName(library, name, "rhythm.ogg")
-    crowdFile  = engine.resource.fileName(library, name, "crowd.ogg")
+    guitarFile = stemFileName(engine, library, name, "guitar")
+    songFile   = stemFileName(engine, library, name, "song")
+    rhythmFile = stemFileName(engine, library, name, "rhythm")
+    crowdFile  = stemFileName(engine, library, name, "crowd")
 
     logUneditedMidis = engine.config.get("log",   "log_unedited_midis")
 
@@ -3217,9 +3808,9 @@ def loadSong(engine, name, library = DEFAULT_LIBRARY, seekable = False, playback
 
     infoFile   = engine.resource.fileName(library, name, "song.ini", writable = True)
     scriptFile = engine.resource.fileName(library, name, "script.txt")
-    previewFile = engine.resource.fileName(library, name, "preview.ogg")
+    previewFile = stemFileName(engine, library, name, "preview")
     #myfingershurt:
-    drumFile = engine.resource.fileName(library, name, "drums.ogg")
+    drumFile = stemFileName(engine, library, name, "drums")
 
 
     if seekable:
@@ -3247,8 +3838,9 @@ def loadSong(engine, name, library = DEFAULT_LIBRARY, seekable = False, playback
 
     if songFile != None and guitarFile != None:
         #check for the same file
-        if hashlib.sha1(open(songFile, 'rb').read()).hexdigest() == hashlib.sha1(open(guitarFile, 'rb').read()).hexdigest():
+        if Fingerprint.sameContents(songFile, guitarFile):
             guitarFile = None
+        Fingerprint.commit()
 
 
 
@@ -3286,8 +3878,7 @@ def loadSong(engine, name, library = DEFAULT_LIBRARY, seekable = False, playback
         previewFile = None
         drumFile = None
 
-    song       = Song(engine, infoFile, songFile, guitarFile, rhythmFile, noteFile, scriptFile, part, drumFile, crowdFile)
-    return song
+    return (engine, infoFile, songFile, guitarFile, rhythmFile, noteFile, scriptFile, part, drumFile, crowdFile, difficulty, SongInfo(infoFile))
 
 def loadSongInfo(engine, name, library = DEFAULT_LIBRARY):
     #RF-mod (not needed?)
@@ -3337,7 +3928,7 @@ def getAvailableLibraries(engine, library = DEFAULT_LIBRARY):
 
     return libraries
 
-def getAvailableSongs(engine, library = DEFAULT_LIBRARY, includeTutorials = False, progressCallback = lambda p: None):
+def getAvailableSongs(engine, library = DEFAULT_LIBRARY, includeTutorials = False, progressCallback = lambda p: None, scanner = None):
     order = engine.config.get("game", "sort_order")
     tut = engine.config.get("game", "tut")
     direction = engine.config.get("game", "sort_direction")
@@ -3366,15 +3957,19 @@ def getAvailableSongs(engine, library = DEFAULT_LIBRARY, includeTutorials = Fals
                 continue
             if not name in names:
                 names.append(name)
-    songs = []
-    for name in names:
-        progressCallback(len(songs)/float(len(names)))
-        songs.append(SongInfo(engine.resource.fileName(library, name, "song.ini", writable = True), library))
+    instrument = engine.config.get("game", "songlist_instrument")
     if Config.get("performance", "cache_song_metadata"):
-        _songDB.commit()
-    if not includeTutorials:
-        songs = [song for song in songs if not song.tutorial]
-    songs = [song for song in songs if not song.artist == '=FOLDER=']
+        #the song list table is sorted and filtered by the database; only changed songs get their song.ini read
+        updateSongList(engine, library, names, progressCallback, scanner)
+        songs = getSongList(library, includeTutorials, order, direction, instrument)
+    else:
+        songs = []
+        for name in names:
+            progressCallback(len(songs)/float(len(names)))
+            songs.append(SongInfo(engine.resource.fileName(library, name, "song.ini", writable = True), library))
+        if not includeTutorials:
+            songs = [song for song in songs if not song.tutorial]
+        songs = [song for song in songs if not song.artist == '=FOLDER=']
         #coolguy567's unlock system
     if careerMode:
         for song in songs:
@@ -3385,7 +3980,8 @@ def getAvailableSongs(engine, library = DEFAULT_LIBRARY, includeTutorials = Fals
                         song.setLocked(True)
             else:
                 song.setLocked(False)
-    instrument = engine.config.get("game", "songlist_instrument")
+    if Config.get("performance", "cache_song_metadata"):
+        return songs
     theInstrumentDiff = instrumentDiff[instrument]
     if direction == 0:
         if order == 1:
@@ -3427,6 +4023,91 @@ def getAvailableSongs(engine, library = DEFAULT_LIBRARY, includeTutorials = Fals
             songs.sort(lambda a, b: cmp(b.icon.lower(), a.icon.lower()))
     return songs
 
+def _fileStamp(path):
+    return "%d:%d:%d" % Fingerprint.statKey(path)
+
+def updateSongList(engine, library, names, progressCallback = lambda p: None, scanner = None):
+    #bring the song list rows of a library up to date with its song folders.
+    #  a song whose song.ini and notes file haven't changed since its row was written is left alone.
+    listed = {}
+    with _songDBLock:
+        rows = _songDB.execute('SELECT `path`, `iniStamp`, `noteStamp` FROM `songlist` WHERE `library` = ?', [library]).fetchall()
+    for path, iniStamp, noteStamp in rows:
+        listed[path] = (iniStamp, noteStamp)
+
+    paths = set()
+    changed = []
+    misses = []
+    for i, name in enumerate(names):
+        progressCallback((i - len(changed))/float(len(names)))
+        infoFileName = engine.resource.fileName(library, name, "song.ini", writable = True)
+        paths.add(infoFileName)
+        try:
+            stamps = (_fileStamp(infoFileName), _fileStamp(findNoteFile(os.path.dirname(infoFileName))))
+        except OSError:
+            continue
+        if listed.get(infoFileName) == stamps:
+            continue
+        song = SongInfo(infoFileName, library, readNotes = False)
+        changed.append((song, stamps))
+        if song.needsScan:
+            misses.append(song)
+
+    #songs missing from the cache have their notes read all at once, in several processes if there are enough of them
+    if misses:
+        done = len(names) - len(misses)
+        scanProgress = lambda p: progressCallback((done + p*len(misses))/float(len(names)))
+        if scanner is None:
+            scanner = SongScanner(engine)
+        scanner.scan(misses, scanProgress)
+
+    if changed:
+        Log.debug('Updating %d song list entries in %s.' % (len(changed), library))
+        columns = ['path', 'library', 'iniStamp', 'noteStamp', 'hash'] + [column for column, key, type, default in _songListColumns] + ['playCount', 'isFolder', 'sortGroup']
+        rows = [song.getListRow(library, iniStamp, noteStamp) for song, (iniStamp, noteStamp) in changed]
+        with _songDBLock:
+            _songDB.executemany('INSERT OR REPLACE INTO `songlist` (%s) VALUES (%s)' % (', '.join(['`%s`' % column for column in columns]), ', '.join(['?'] * len(columns))), rows)
+    gone = [[path] for path in listed if path not in paths]
+    with _songDBLock:
+        if gone:
+            _songDB.executemany('DELETE FROM `songlist` WHERE `path` = ?', gone)
+        #the cache entries of unchanged songs are still in use
+        _songDB.execute('UPDATE `songinfo` SET `seen` = 1 WHERE `hash` IN (SELECT `hash` FROM `songlist` WHERE `library` = ?)', [library])
+        _songDB.commit()
+    Fingerprint.commit()
+
+def getSongList(library, includeTutorials = False, order = 0, direction = 0, instrument = 0):
+    #SongInfos for the songs in a library's song list, sorted by the database
+    if order == 7:
+        column, ascending = _songListInstrumentColumns[instrument], True
+    else:
+        column, ascending = _songListOrders.get(order, ('path', True))
+    if column in _songListTextColumns:
+        columns = ['`%s` COLLATE NOCASE' % column]
+    else:
+        columns = ['`%s`' % column]
+    if order == 0:
+        #names sort within the setlist's letter headings, as getSortingTitles() makes them
+        columns.insert(0, '`sortGroup`')
+    if direction != 0:
+        ascending = not ascending
+    where = '`library` = ? AND `isFolder` = 0'
+    if not includeTutorials:
+        where += ' AND `tutorial` != 1'
+
+    keys = [key for column_, key, type, default in _songListColumns]
+    query = 'SELECT `path`, `hash`, %s FROM `songlist` WHERE %s ORDER BY %s, `path`' % \
+            (', '.join(['`%s`' % column_ for column_, key, type, default in _songListColumns]), where,
+             ', '.join(['%s %s' % (column, ascending and 'ASC' or 'DESC') for column in columns]))
+    songs = []
+    with _songDBLock:
+        rows = _songDB.execute(query, [library]).fetchall()
+    for row in rows:
+        listValues = dict(zip(keys, row[2:]))
+        listValues['hash'] = row[1]
+        songs.append(SongInfo(row[0], library, listValues = listValues))
+    return songs
+
     #coolguy567's unlock system
 def getSortingTitles(engine, songList = []):
     sortOrder = engine.config.get("game","sort_order")
@@ -3444,13 +4125,7 @@ def getSortingTitles(engine, songList = []):
                 titles.append(songItem.artist.lower())
                 sortTitles.append(SortTitleInfo(songItem.artist))
         elif sortOrder == 0:
-            name = removeSongOrderPrefixFromName(songItem.name)
-            if name[0].isdigit():
-                sortName = "123"
-            elif not name[0].isalnum():
-                sortName = "!@#"
-            else:
-                sortName = name[0].lower()
+            sortName = nameSortGroup(songItem.name)
             try:
                 titles.index(sortName)
             except ValueError:
@@ -3506,6 +4181,46 @@ def getSortingTitles(engine, songList = []):
     return sortTitles
 
 
+def _sortingTitle(order, theInstrumentDiff, song):
+    #the heading a song is listed under for a sort order, and the text shown for it
+    if order == 0:
+        group = nameSortGroup(song.name)
+        return group, group.upper()
+    elif order == 1:
+        return song.artist.lower(), song.artist
+    elif order == 2:
+        try:
+            return int(song.count or 0), song.count or "0"
+        except ValueError:
+            return 0, "0"
+    elif order == 3:
+        return song.album.lower(), song.album
+    elif order == 4:
+        return song.genre.lower(), song.genre
+    elif order == 5:
+        return song.year.lower(), song.year
+    elif order == 6:
+        return song.diffSong, str(song.diffSong)
+    elif order == 7:
+        return theInstrumentDiff(song), str(theInstrumentDiff(song))
+    elif order == 8:
+        return song.icon.lower(), song.icon
+    return None, None
+
+def insertSortingTitles(engine, songs):
+    #put a heading before each run of songs listed under it, keeping the songs in the order they come in
+    order = engine.config.get("game", "sort_order")
+    theInstrumentDiff = instrumentDiff[engine.config.get("game", "songlist_instrument")]
+    items = []
+    lastKey = None
+    for song in songs:
+        key, title = _sortingTitle(order, theInstrumentDiff, song)
+        if title is not None and (not items or key != lastKey):
+            items.append(SortTitleInfo(title))
+        lastKey = key
+        items.append(song)
+    return items
+
 def getAvailableTitles(engine, library = DEFAULT_LIBRARY):
     gameMode1p = engine.world.gameMode
     if library == None:
@@ -3548,13 +4263,16 @@ def getAvailableSongsAndTitles(engine, library = DEFAULT_LIBRARY, includeTutoria
     items = getAvailableSongs(engine, library, includeTutorials, progressCallback=progressCallback)
     if quickPlayCareerTiers == 1 or careerMode:
         titles = getAvailableTitles(engine, library)
-    if titles == []:
-        titles = getSortingTitles(engine, items)
-    else:
+    if titles != []:
         career = True
-    items = items + titles
-
-    items.sort(lambda a, b: compareSongsAndTitles(engine, a, b, career))
+        items = items + titles
+        items.sort(lambda a, b: compareSongsAndTitles(engine, a, b, career))
+    elif Config.get("performance", "cache_song_metadata"):
+        #the song list table has already sorted the songs; only the headings need to go in
+        items = insertSortingTitles(engine, items)
+    else:
+        items = items + getSortingTitles(engine, items)
+        items.sort(lambda a, b: compareSongsAndTitles(engine, a, b, career))
 
 
     if (not careerMode) and len(items) != 0:
@@ -3593,11 +4311,7 @@ def compareSongsAndTitles(engine, a, b, career):
         Bval = ""
         if isinstance(a, SongInfo):
             if order == 0:
-                Aval = removeSongOrderPrefixFromName(a.name)[0].lower()
-                if Aval.isdigit():
-                    Aval = "123"
-                if not Aval.isalnum():
-                    Aval = "!@#"
+                Aval = nameSortGroup(a.name)
             elif order == 1:
                 Aval = a.artist.lower()
             elif order == 2:
@@ -3626,11 +4340,7 @@ def compareSongsAndTitles(engine, a, b, career):
 
         if isinstance(b, SongInfo):
             if order == 0:
-                Bval = removeSongOrderPrefixFromName(b.name)[0].lower()
-                if Bval.isdigit():
-                    Bval = "123"
-                if not Bval.isalnum():
-                    Bval = "!@#"
+                Bval = nameSortGroup(b.name)
             elif order == 1:
                 Bval = b.artist.lower()
             elif order == 2:
@@ -3736,11 +4446,125 @@ def compareSongsAndTitles(engine, a, b, career):
 def removeSongOrderPrefixFromName(name):
     return re.sub(r'^[0-9]+\. *', '', name)
 
+def nameSortGroup(name):
+    #the setlist heading a song name is listed under when sorting by title
+    name = removeSongOrderPrefixFromName(name)[:1].lower()
+    if name.isdigit():
+        return "123"
+    elif not name.isalnum():
+        return "!@#"
+    return name
+
+#the fewest cache misses worth handing to scan processes, how many scanned songs go into each cache transaction,
+#  and how many seconds to wait on the scan processes for a song before giving up on them
+SCAN_PROCESS_MINIMUM = 8
+SCAN_BATCH_SIZE = 50
+SCAN_TIMEOUT = 30
+
+#the song scan processes, shared by every SongScanner.  They have to be forked before
+#  SDL, OpenGL and the audio and video threads are started, so this is done once at launch.
+_scanPool = None
+
+def startScanPool(config):
+    '''
+    Start the song scan processes, unless they are already running or turned off.
+    Must be called before the GameEngine is created.
+    '''
+    global _scanPool
+    if _scanPool is not None:
+        return
+    processes = config.get("performance", "song_scan_processes")
+    if processes == 0:
+        try:
+            processes = multiprocessing.cpu_count()
+        except NotImplementedError:
+            processes = 1
+    if processes > 1:
+        try:
+            _scanPool = multiprocessing.Pool(processes, _initScanProcess, (config.fileName,))
+        except Exception:
+            Log.error('Could not start song scan processes, songs will be scanned one at a time: ')
+
+def stopScanPool(terminate = False):
+    global _scanPool
+    if _scanPool is not None:
+        if terminate:
+            _scanPool.terminate()
+        else:
+            _scanPool.close()
+        _scanPool.join()
+        _scanPool = None
+
+def _initScanProcess(configFileName):
+    #a scan process started from scratch (as on Windows) has no config loaded yet
+    from fofix.core import ConfigDefs
+    Config.load(configFileName, setAsDefault = True)
+
+def _scanSongInfo(job):
+    #runs in a scan process: reads one song's notes.mid and sends back what SongInfo caches
+    index, infoFileName, library = job
+    try:
+        info = SongInfo(infoFileName, library, useCache = False)
+        info.readNoteFile()
+        return index, info.getCacheInfo()
+    except Exception:
+        Log.error('Scanning song %s failed: ' % infoFileName)
+        return index, None
+
+class SongScanner(object):
+    '''Reads the notes of songs missing from the song cache and writes them into it.'''
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def scan(self, songs, progressCallback = lambda p: None):
+        pending = set(range(len(songs)))
+        batch = []
+        if _scanPool is not None and len(songs) >= SCAN_PROCESS_MINIMUM:
+            try:
+                jobs = [(i, song.fileName, song.libraryNam) for i, song in enumerate(songs)]
+                results = _scanPool.imap_unordered(_scanSongInfo, jobs)
+                while pending:
+                    i, info = results.next(SCAN_TIMEOUT)
+                    pending.discard(i)
+                    self.addSong(songs[i], info, batch)
+                    progressCallback((len(songs) - len(pending))/float(len(songs)))
+            except Exception:
+                #a stuck or dead scan process; don't wait on any of them again
+                Log.error('Song scan processes stopped answering, scanning the rest one at a time: ')
+                stopScanPool(terminate = True)
+
+        for i in sorted(pending):
+            self.addSong(songs[i], None, batch)
+            pending.discard(i)
+            progressCallback((len(songs) - len(pending))/float(len(songs)))
+        self.writeBatch(batch)
+
+    def addSong(self, song, info, batch):
+        if info is None:
+            song.getParts()
+            song.getSections()
+        else:
+            song.__dict__.update(info)
+        song.needsScan = False
+        batch.append(song.getCacheRow())
+        if len(batch) >= SCAN_BATCH_SIZE:
+            self.writeBatch(batch)
+
+    def writeBatch(self, batch):
+        if batch:
+            Log.debug('Writing out cache for %d songs.' % len(batch))
+            with _songDBLock:
+                _songDB.executemany('INSERT OR REPLACE INTO `songinfo` (`hash`, `info`, `seen`) VALUES (?, ?, 1)', batch)
+                _songDB.commit()
+            del batch[:]
+
 #stump
 def updateSongDatabase(engine):
     from fofix.game import Dialogs  # putting it at the top causes circular-import-related problems...
     Log.debug('Updating song cache.')
-    _songDB.execute('UPDATE `songinfo` SET `seen` = 0')
+    with _songDBLock:
+        _songDB.execute('UPDATE `songinfo` SET `seen` = 0')
     lastScreenUpdateTime = [time.time()]  # one-element list to avoid having to throw this into the global namespace for updatePhase's sake
     loadingScreen = Dialogs.showLoadingSplashScreen(engine, _('Checking song database...'))
     def updatePhase(text):
@@ -3755,12 +4579,16 @@ def updateSongDatabase(engine):
         updatePhase(_('Enumerating song folders... (%d so far)') % len(folders))
         folders.extend(getAvailableLibraries(engine, folders[i].libraryName))
         i += 1
+    scanner = SongScanner(engine)
     for i, folder in enumerate(folders):
-        getAvailableSongs(engine, folder.libraryName, progressCallback=lambda p: updatePhase('%s \n %s \n %s' % (_('Caching song data...'), folder.libraryName, (_('(folder %d of %d; %d%% of this folder)') % (i+1, len(folders), (p*100))))))
+        getAvailableSongs(engine, folder.libraryName, progressCallback=lambda p: updatePhase('%s \n %s \n %s' % (_('Caching song data...'), folder.libraryName, (_('(folder %d of %d; %d%% of this folder)') % (i+1, len(folders), (p*100))))), scanner=scanner)
     updatePhase(_('Pruning leftover entries...'))
-    prunecount = _songDB.execute('DELETE FROM `songinfo` WHERE `seen` = 0').rowcount
-    if prunecount != 0:
-        _songDB.execute('VACUUM')
-        Log.debug('Pruned %d cache entries.' % prunecount)
-    _songDB.commit()
+    with _songDBLock:
+        prunecount = _songDB.execute('DELETE FROM `songinfo` WHERE `seen` = 0').rowcount
+        _songDB.execute('DELETE FROM `songlist` WHERE `hash` NOT IN (SELECT `hash` FROM `songinfo`)')
+        prunecount += _songDB.execute('DELETE FROM `charts` WHERE `hash` NOT IN (SELECT `hash` FROM `songinfo`)').rowcount
+        if prunecount != 0:
+            _songDB.execute('VACUUM')
+            Log.debug('Pruned %d cache entries.' % prunecount)
+        _songDB.commit()
     Dialogs.hideLoadingSplashScreen(engine, loadingScreen)
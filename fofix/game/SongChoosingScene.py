@@ -31,7 +31,7 @@ import pygame
 from fofix.core.Scene import Scene
 
 from fofix.core.Settings import ConfigChoice, ActiveConfigChoice
-from fofix.core.Texture import Texture
+from fofix.core.Texture import Texture, getMaxTextureSize
 from fofix.core.Image import drawImage
 from fofix.core.Camera import Camera
 from fofix.core.Mesh import Mesh
@@ -39,10 +39,13 @@ from fofix.core.Language import _
 from fofix.core import Player
 from fofix.game import Dialogs
 from fofix.game import Song
+from fofix.game.SongSearch import SongSearchIndex
 from fofix.core import Config
 from fofix.core import Version
 from fofix.game.Menu import Menu
 from fofix.core import Log
+from fofix.core import Resource
+from fofix.core import TextureData
 from fofix.core.constants import *
 
 PRACTICE = 1
@@ -123,6 +126,7 @@ class SongChoosingScene(Scene):
                 self.library = self.engine.resource.fileName(os.path.join(self.engine.config.get("setlist", "base_library"), Song.DEFAULT_LIBRARY))
 
         self.searchText = ""
+        self.searchIndex = None
 
         #user configurables and input management
         self.listingMode       = 0     #with libraries or List All
@@ -291,7 +295,7 @@ class SongChoosingScene(Scene):
 
     def prepareSetlist(self, songs):
         if self.songLoader:
-            self.songLoader.stop()
+            self.songLoader.cancel()
         msg = self.engine.setlistMsg
         self.engine.setlistMsg = None
         self.selectedIndex = 0
@@ -303,6 +307,7 @@ class SongChoosingScene(Scene):
         self.itemLabels       = [None] * len(self.items)
         self.searching        = False
         self.searchText       = ""
+        self.searchIndex      = None
 
         shownItems = []
         for item in self.items: #remove things we don't want to see. Some redundancy, but that's okay.
@@ -388,6 +393,9 @@ class SongChoosingScene(Scene):
             elif not self.tiersPresent and (isinstance(item, Song.TitleInfo) or isinstance(item, Song.SortTitleInfo)):
                 self.tiersPresent = True
 
+        #the search index is built when a search is started; most visits to the setlist never search
+        self.searchIndex = None
+
         while isinstance(self.items[self.selectedIndex], Song.BlankSpaceInfo) or ((isinstance(self.items[self.selectedIndex], Song.TitleInfo) or isinstance(self.items[self.selectedIndex], Song.SortTitleInfo)) and not self.selectTiers):
             self.selectedIndex += 1
             if self.selectedIndex >= len(self.items):
@@ -397,10 +405,12 @@ class SongChoosingScene(Scene):
         self.itemLabels       = [None] * len(self.items)
 
         if self.preloadSongLabels:
+            loaders = []
             for i in range(len(self.items)):
                 self.loadStartTime = time.time()
                 Dialogs.changeLoadingSplashScreenText(self.engine, self.splash, _("Loading Album Artwork..."))
-                self.loadItemLabel(i, preload = True)
+                loaders.append(self.loadItemLabel(i, preload = True))
+            self.engine.resource.finishLoads([loader for loader in loaders if loader])
 
         self.updateSelection()
         Dialogs.hideLoadingSplashScreen(self.engine, self.splash)
@@ -471,8 +481,10 @@ class SongChoosingScene(Scene):
         return True
 
     def loadItemLabel(self, i, preload = False):
-        # Load the item label if it isn't yet loaded
+        # Load the item label if it isn't yet loaded.  Its image is decoded by a
+        # loader thread; until it is ready the item shows the empty label.
         item = self.items[i]
+        loader = None
         if self.itemLabels[i] is None:
             if isinstance(item, Song.SongInfo):
                 if self.labelType == 1: #CD covers
@@ -480,23 +492,15 @@ class SongChoosingScene(Scene):
                 else:
                     f = "album.png"
                 if self.texturedLabels:
-                    label = self.engine.resource.fileName(item.libraryNam, item.songName, f)
-                    if os.path.exists(label):
-                        self.itemLabels[i] = Texture(label)
-                    else:
-                        self.itemLabels[i] = False
+                    loader = self.loadLabelTexture(i, self.engine.resource.fileName(item.libraryNam, item.songName, f))
                 else:
-                    self.itemLabels[i] = self.engine.loadImgDrawing(None, "label", os.path.join(item.libraryNam, item.songName, f))
+                    loader = self.loadLabelDrawing(i, os.path.join(item.libraryNam, item.songName, f))
 
             elif isinstance(item, Song.LibraryInfo):
                 if self.texturedLabels:
-                    label = self.engine.resource.fileName(item.libraryName, "label.png")
-                    if os.path.exists(label):
-                        self.itemLabels[i] = Texture(label)
-                    else:
-                        self.itemLabels[i] = False
+                    loader = self.loadLabelTexture(i, self.engine.resource.fileName(item.libraryName, "label.png"))
                 else:
-                    self.itemLabels[i] = self.engine.loadImgDrawing(None, "label", os.path.join(item.libraryName, "label.png"))
+                    loader = self.loadLabelDrawing(i, os.path.join(item.libraryName, "label.png"))
             elif isinstance(item, Song.RandomSongInfo):
                 self.itemLabels[i] = "Random"
             else:
@@ -506,6 +510,33 @@ class SongChoosingScene(Scene):
                     self.loadStartTime = time.time()
                     percent = (i*100)/len(self.items)
                     Dialogs.changeLoadingSplashScreenText(self.engine, self.splash, _("Loading Album Artwork...") + " %d%%" % percent)
+        return loader
+
+    def loadLabelDrawing(self, i, fileName):
+        self.itemLabels[i] = False
+        labels = self.itemLabels
+        return self.engine.data.loadImgDrawingAsync(None, None, fileName, owner = OWNER_ALBUMART, onLoad = lambda drawing: self.labelLoaded(labels, i, drawing))
+
+    def loadLabelTexture(self, i, fileName):
+        self.itemLabels[i] = False
+        if not os.path.exists(fileName):
+            return None
+        labels = self.itemLabels
+        maxSize = getMaxTextureSize()
+        def decode():
+            try:
+                return TextureData.loadImageFile(fileName, True, maxSize)
+            except (IOError, OverflowError):
+                Log.warn("Unable to load image file: %s" % fileName)
+        def decoded(data):
+            if data is not None and labels is self.itemLabels:
+                labels[i] = Texture(fileName, owner = OWNER_ALBUMART, data = data)
+        return self.engine.resource.load(None, None, decode, onLoad = decoded)
+
+    def labelLoaded(self, labels, i, label):
+        #the item list may have been rebuilt since the label was asked for
+        if labels is self.itemLabels:
+            labels[i] = label or False
 
     def addToQueue(self, selectedSong): #FIXME: Queue system
         self.engine.songQueue.addSong(selectedSong, library)
@@ -677,7 +708,7 @@ class SongChoosingScene(Scene):
             self.song = None
         self.selectedItem = None
         if self.songLoader:
-            self.songLoader.stop()
+            self.songLoader.cancel()
             self.songLoader = None
 
     def updateSelection(self):
@@ -719,20 +750,28 @@ class SongChoosingScene(Scene):
                 self.song.fadeout(1000)
             return
         if self.songLoader:
-            try:
-                self.songLoader.stop()
-            except:
-                self.songLoader = None
-
-        self.songLoader = self.engine.resource.load(self, None, lambda: Song.loadSong(self.engine, song, playbackOnly = True, library = self.library), synch = True, onLoad = self.songLoaded, onCancel = self.songCanceled)
-
-    def songCanceled(self):
+            self.songLoader.cancel()
+
+        library = self.library
+        loader = self.engine.resource.load(self, None, lambda: Song.loadSong(self.engine, song, playbackOnly = True, library = library), priority = Resource.PRIORITY_HIGH)
+        #loads finish in the main loop, so the callbacks can be set after it is queued.
+        #  each is bound to its loader: an older preview can finish after a newer one has started.
+        loader.onLoad = lambda song, loader = loader: self.songLoaded(song, loader)
+        loader.onCancel = lambda loader = loader: self.songCanceled(loader)
+        self.songLoader = loader
+
+    def songCanceled(self, loader):
+        if loader is not self.songLoader:
+            return
         self.songLoader = None
         if self.song:
             self.song.stop()
         self.song = None
 
-    def songLoaded(self, song):
+    def songLoaded(self, song, loader):
+        if loader is not self.songLoader:
+            song.stop()
+            return
         self.songLoader = None
 
         if self.song:
@@ -748,17 +787,40 @@ class SongChoosingScene(Scene):
         self.freeResources()
         self.engine.world.resetWorld()
 
+    def buildSearchIndex(self):
+        itemFields = []
+        for item in self.items:
+            if isinstance(item, Song.SongInfo):
+                itemFields.append((item.name, item.artist, item.album, item.genre))
+            elif isinstance(item, Song.LibraryInfo):
+                itemFields.append((item.name,))
+            else:
+                itemFields.append(())
+        self.searchIndex = SongSearchIndex(itemFields)
+
+    def searchSelect(self):
+        #jump to the first item matching the search text, as it is typed
+        if self.searchIndex is None or len(self.searchIndex) != len(self.items):
+            self.buildSearchIndex()
+        found = self.searchIndex.search(self.searchText)
+        if found and found[0] != self.selectedIndex:
+            self.selectedIndex = found[0]
+            self.updateSelection()
+
     def keyPressed(self, key, unicode):
         self.lastTime = self.time
         c = self.engine.input.controls.getMapping(key)
         if key == pygame.K_SLASH and not self.searching:
             self.searching = True
+            if self.searchIndex is None:
+                self.buildSearchIndex()
         elif (key in range(30,123) or key == pygame.K_BACKSPACE) and not self.moreInfo:
             if self.searching:
                 if key == pygame.K_BACKSPACE:
                     self.searchText = self.searchText[:-1]
                 else:
                     self.searchText += unicode
+                self.searchSelect()
                 return
             else:
                 if unicode:
@@ -796,7 +858,7 @@ class SongChoosingScene(Scene):
                     self.moreInfoTime = 500
                 return
             if self.songLoader:
-                self.songLoader.stop()
+                self.songLoader.cancel()
                 self.songLoader = None
                 return
             if self.song:
@@ -814,13 +876,6 @@ class SongChoosingScene(Scene):
         elif (c in Player.menuYes and not c in Player.starts) or key == pygame.K_RETURN:
             if self.searching:
                 self.searching = False
-                text = self.searchText.lower()
-                for i, item in enumerate(self.items):
-                    sort = item.name.lower()
-                    if sort.startswith(text):
-                        self.selectedIndex = i
-                        self.updateSelection()
-                        break
                 self.searchText = ""
                 return
             self.engine.data.acceptSound.play()
@@ -0,0 +1,157 @@
+#####################################################################
+# -*- coding: iso-8859-1 -*-                                        #
+#                                                                   #
+# Frets on Fire X (FoFiX)                                           #
+# Copyright (C) 2009 Team FoFiX                                     #
+#                                                                   #
+# This program is free software; you can redistribute it and/or     #
+# modify it under the terms of the GNU General Public License       #
+# as published by the Free Software Foundation; either version 2    #
+# of the License, or (at your option) any later version.            #
+#                                                                   #
+# This program is distributed in the hope that it will be useful,   #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of    #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the     #
+# GNU General Public License for more details.                      #
+#                                                                   #
+# You should have received a copy of the GNU General Public License #
+# along with this program; if not, write to the Free Software       #
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,        #
+# MA  02110-1301, USA.                                              #
+#####################################################################
+
+
+'''
+Search index for the setlist's type-to-search.
+
+Item texts are folded (lowercased, accents and other combining marks
+stripped, whitespace collapsed) so that "beyonce" finds "Beyoncé".  A query
+of three or more characters matches anywhere in an item's fields and is
+looked up through a trigram index; shorter queries only match the start of
+a word and use an index of one- and two-letter word prefixes.  Each
+keystroke that extends the query narrows the previous results instead of
+starting over, and the results for the shorter queries are kept so
+backspacing is free.
+'''
+
+import unicodedata
+from array import array
+
+def foldText(text):
+    '''
+    Fold text for searching.
+    @param text:  Byte string (UTF-8, or Latin-1 failing that) or unicode
+    @return:      Lowercase unicode without combining marks or repeated spaces
+    '''
+    if isinstance(text, str):
+        try:
+            text = text.decode('ascii')
+        except UnicodeDecodeError:
+            try:
+                text = text.decode('utf-8')
+            except UnicodeDecodeError:
+                text = text.decode('latin-1')
+    try:
+        text.encode('ascii')
+    except UnicodeEncodeError:
+        text = unicodedata.normalize('NFKD', text)
+        text = u''.join([c for c in text if not unicodedata.combining(c)])
+    return u' '.join(text.lower().split())
+
+class SongSearchIndex(object):
+    def __init__(self, itemFields):
+        '''
+        @param itemFields:  For each setlist item, the texts to search it by
+                            (an empty sequence for items that can't be found)
+        '''
+        # Folded fields of each item, each one starting with a newline so
+        # word starts are always after a space or a newline, and so no
+        # match can run from one field into the next.
+        self.texts    = []
+        self.trigrams = {}
+        self.prefixes = {}
+        # matching item numbers of the query being typed, and of its prefixes
+        self.results  = {}
+
+        for i, fields in enumerate(itemFields):
+            fields = [foldText(field) for field in fields if field]
+            self.texts.append(u''.join([u'\n' + field for field in fields]))
+            grams = set()
+            heads = set()
+            for field in fields:
+                grams.update([field[n:n+3] for n in range(len(field) - 2)])
+                for word in field.split():
+                    heads.add(word[:1])
+                    heads.add(word[:2])
+            self._post(self.trigrams, grams, i)
+            self._post(self.prefixes, heads, i)
+
+    def _post(self, index, keys, i):
+        for key in keys:
+            postings = index.get(key)
+            if postings is None:
+                postings = index[key] = array('i')
+            postings.append(i)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def matches(self, i, query):
+        text = self.texts[i]
+        if len(query) >= 3:
+            return query in text
+        return (u' ' + query) in text or (u'\n' + query) in text
+
+    def lookup(self, query):
+        '''Get the candidates for a query from the index, without narrowing anything.'''
+        if len(query) < 3:
+            return self.prefixes.get(query, [])
+        candidates = None
+        for n in range(len(query) - 2):
+            postings = self.trigrams.get(query[n:n+3])
+            if postings is None:
+                return []
+            if candidates is None or len(postings) < len(candidates):
+                candidates = postings
+        return candidates
+
+    def search(self, query):
+        '''
+        Find the items matching a query.
+        @param query:  Search text, as typed
+        @return:       Matching item numbers, in setlist order
+        '''
+        query = foldText(query)
+        if not query:
+            return []
+        if query in self.results:
+            return self.results[query]
+
+        # A word prefix or a single trigram is its own exact answer, and
+        # cheaper to look up than narrowing down anything.  Otherwise narrow
+        # down the results for the longest already searched prefix of this
+        # query - unless that was a word-start search, since those don't
+        # contain every substring match.
+        if len(query) <= 3:
+            found = list(self.lookup(query))
+            self.forget(query)
+            self.results[query] = found
+            return found
+        candidates = None
+        for n in range(len(query) - 1, 2, -1):
+            if query[:n] in self.results:
+                candidates = self.results[query[:n]]
+                break
+        if candidates is None:
+            candidates = self.lookup(query)
+        found = [i for i in candidates if self.matches(i, query)]
+
+        self.forget(query)
+        self.results[query] = found
+        return found
+
+    def forget(self, query):
+        '''Drop the results of earlier searches that are not prefixes of this query.'''
+        for searched in self.results.keys():
+            if not query.startswith(searched):
+                del self.results[searched]
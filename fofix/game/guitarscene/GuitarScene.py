@@ -830,7 +830,18 @@ class GuitarScene(Scene):
 
         #MFH - this is where song loading originally took place, and the loading screen was spawned.
 
-        self.engine.resource.load(self, "song", lambda: loadSong(self.engine, songName, library = libraryName, part = [player.part for player in self.playerList], practiceMode = self.playerList[0].practiceMode, practiceSpeed = self.playerList[0].practiceSpeed), synch = True, onLoad = self.songLoaded)
+        #only read the difficulties being played; battle mode can drop a player to the next harder one
+        loadDifficulties = []
+        for player in self.playerList:
+            if player.part.id == Song.VOCAL_PART:
+                loadDifficulties.append(None)
+                continue
+            wanted = [player.difficulty]
+            if self.battleGH and player.difficulty.id > 0:
+                wanted.append(Song.difficulties[player.difficulty.id - 1])
+            loadDifficulties.append(wanted)
+
+        self.engine.resource.load(self, "song", lambda: loadSong(self.engine, songName, library = libraryName, part = [player.part for player in self.playerList], practiceMode = self.playerList[0].practiceMode, practiceSpeed = self.playerList[0].practiceSpeed, difficulty = loadDifficulties), synch = True, onLoad = self.songLoaded)
 
         Dialogs.changeLoadingSplashScreenText(self.engine, splash, phrase + " \n " + _("Preparing Note Phrases..."))
 
@@ -855,8 +866,7 @@ class GuitarScene(Scene):
             if not drum.isDrum:
                 continue
             if drum.drumFlip:
-                for d in range(len(Song.difficulties)):
-                    self.song.tracks[i][d].flipDrums()
+                self.song.flipDrums(i)
 
         for scoreCard in self.scoring:
             scoreCard.bassGrooveEnabled = self.bassGrooveEnabled
@@ -3315,10 +3325,12 @@ class GuitarScene(Scene):
 
             for i,instrument in enumerate(self.instruments):
                 if instrument.isVocal:
+                    #score the mic input sung since the last frame before moving on to the notes due now
+                    instrument.scoreFrames(pos, self.song)
                     instrument.requiredNote = instrument.getRequiredNote(pos, self.song)
                     instrument.run(ticks, pos)
                     scoreBack = instrument.getScoreChange()
-                    if scoreBack is not None:
+                    while scoreBack is not None:
                         points, scoreThresh, taps = scoreBack
                         self.scoring[i].score += points * instrument.scoreMultiplier * self.multi[i]
                         self.scoring[i].percNotesHit += taps
@@ -3334,6 +3346,7 @@ class GuitarScene(Scene):
                             self.scoring[i].streak = 0
                         self.scoring[i].updateAvMult()
                         self.scoring[i].getStarScores()
+                        scoreBack = instrument.getScoreChange()
                     if instrument.starPowerGained:
                         if instrument.starPower >= 50 and not instrument.starPowerActive:
                             self.engine.data.starReadySound.play()
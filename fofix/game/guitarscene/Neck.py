@@ -30,6 +30,7 @@ import numpy as np
 from fofix.core.Shader import shaders, mixColors
 from fofix.game.Song import Bars
 from fofix.game import Song
+from fofix.core.constants import *
 from fofix.core import cmgl
 from fofix.core import Log
 
@@ -265,7 +266,7 @@ class Neck:
                 themeNeck.append(str(i))
             if len(themeNeck) > 0:
                 i = random.randint(0,len(themeNeck)-1)
-                if engine.loadImgDrawing(self, "neckDrawing", os.path.join("themes", themename, "necks", themeNeck[i]), textureSize = (256, 256)):
+                if engine.loadImgDrawing(self, "neckDrawing", os.path.join("themes", themename, "necks", themeNeck[i]), textureSize = (256, 256), owner = OWNER_NECK):
                     neckFind = False
                     Log.debug("Random theme neck chosen: " + themeNeck[i])
                 else:
@@ -288,17 +289,17 @@ class Neck:
                         self.neck.append(str(i)[:-4]) # evilynux - filename w/o extension
 
                 i = random.randint(0,len(self.neck)-1)
-                if engine.loadImgDrawing(self, "neckDrawing", os.path.join("necks",self.neck[i]+".png"),  textureSize = (256, 256)):
+                if engine.loadImgDrawing(self, "neckDrawing", os.path.join("necks",self.neck[i]+".png"),  textureSize = (256, 256), owner = OWNER_NECK):
                     Log.debug("Random neck chosen: " + self.neck[i])
                 else:
                     Log.error("Unable to load neck: " + self.neck[i])
                     self.neck = "defaultneck"
-                    engine.loadImgDrawing(self, "neckDrawing", os.path.join("necks",self.neck+".png"),  textureSize = (256, 256))
+                    engine.loadImgDrawing(self, "neckDrawing", os.path.join("necks",self.neck+".png"),  textureSize = (256, 256), owner = OWNER_NECK)
             else:
                 # evilynux - first assume the self.neck contains the full filename
-                if not engine.loadImgDrawing(self, "neckDrawing", os.path.join("necks",self.neck+".png"),  textureSize = (256, 256)):
-                    if not engine.loadImgDrawing(self, "neckDrawing", os.path.join("necks","Neck_"+self.neck+".png"),  textureSize = (256, 256)):
-                        engine.loadImgDrawing(self, "neckDrawing", os.path.join("necks","defaultneck.png"),  textureSize = (256, 256))
+                if not engine.loadImgDrawing(self, "neckDrawing", os.path.join("necks",self.neck+".png"),  textureSize = (256, 256), owner = OWNER_NECK):
+                    if not engine.loadImgDrawing(self, "neckDrawing", os.path.join("necks","Neck_"+self.neck+".png"),  textureSize = (256, 256), owner = OWNER_NECK):
+                        engine.loadImgDrawing(self, "neckDrawing", os.path.join("necks","defaultneck.png"),  textureSize = (256, 256), owner = OWNER_NECK)
 
         #blazingamer:
         #this helps me clean up the code a bit
@@ -317,10 +318,10 @@ class Neck:
 
         def loadImage(name, file):
             if self.extension:
-                if not engine.loadImgDrawing(self, name, os.path.join(themepath, self.extension, file)):
-                    engine.loadImgDrawing(self, name, os.path.join(themepath, file))
+                if not engine.loadImgDrawing(self, name, os.path.join(themepath, self.extension, file), owner = OWNER_NECK):
+                    engine.loadImgDrawing(self, name, os.path.join(themepath, file), owner = OWNER_NECK)
             else:
-                engine.loadImgDrawing(self, name, os.path.join(themepath, file))
+                engine.loadImgDrawing(self, name, os.path.join(themepath, file), owner = OWNER_NECK)
 
         loadImage("sideBars",       "side_bars.png")
         loadImage("oSideBars",      "overdrive_side_bars.png")
@@ -337,7 +338,7 @@ class Neck:
         loadImage("failNeck",       "failneck.png")
 
         if not self.failNeck:
-            engine.loadImgDrawing(self, "failNeck", os.path.join("failneck.png"))
+            engine.loadImgDrawing(self, "failNeck", os.path.join("failneck.png"), owner = OWNER_NECK)
 
         if self.ovrneckoverlay:
             loadImage("oNeckovr", "overdriveneckovr.png")
@@ -347,25 +348,25 @@ class Neck:
 
         if self.isBassGuitar and self.bassGrooveNeckMode > 0:
             if self.bassGrooveNeckMode == 2:  #overlay neck
-                engine.loadImgDrawing(self, "bassGrooveNeck", os.path.join(themepath, "bass", "bassgrooveneckovr.png"))
+                engine.loadImgDrawing(self, "bassGrooveNeck", os.path.join(themepath, "bass", "bassgrooveneckovr.png"), owner = OWNER_NECK)
             if self.bassGrooveNeckMode == 1 or not self.bassGrooveNeck:  #replace neck
-                engine.loadImgDrawing(self, "bassGrooveNeck", os.path.join(themepath, "bass", "bassgrooveneck.png"))
+                engine.loadImgDrawing(self, "bassGrooveNeck", os.path.join(themepath, "bass", "bassgrooveneck.png"), owner = OWNER_NECK)
 
         #myfingershurt: Guitar Solo neck:
         self.soloNeck = None
         if not self.isVocal:
             if self.guitarSoloNeckMode > 0:
-                if self.guitarSoloNeckMode == 1 or not engine.loadImgDrawing(self, "soloNeck", os.path.join(themepath, "soloneckovr.png")):  #replace neck
+                if self.guitarSoloNeckMode == 1 or not engine.loadImgDrawing(self, "soloNeck", os.path.join(themepath, "soloneckovr.png"), owner = OWNER_NECK):  #replace neck
                     loadImage("soloNeck", "soloneck.png")
-                elif self.guitarSoloNeckMode == 2 or not engine.loadImgDrawing(self, "soloNeck", os.path.join(themepath, "soloneck.png")):  #overlay neck
+                elif self.guitarSoloNeckMode == 2 or not engine.loadImgDrawing(self, "soloNeck", os.path.join(themepath, "soloneck.png"), owner = OWNER_NECK):  #overlay neck
                     loadImage("soloNeck", "soloneckovr.png")
 
         self.fourMultiNeck = None
         if not self.isBassGuitar and self.fourxNeckMode > 0:
             if self.fourxNeckMode == 1:  #replace neck
-                engine.loadImgDrawing(self, "fourMultiNeck", os.path.join(themepath, "fourmultineck.png"))
+                engine.loadImgDrawing(self, "fourMultiNeck", os.path.join(themepath, "fourmultineck.png"), owner = OWNER_NECK)
             if self.fourxNeckMode == 2:  #overlay neck
-                engine.loadImgDrawing(self, "fourMultiNeck", os.path.join(themepath, "fourmultineckovr.png"))
+                engine.loadImgDrawing(self, "fourMultiNeck", os.path.join(themepath, "fourmultineckovr.png"), owner = OWNER_NECK)
 
         self.isFailing             = False
         self.canGuitarSolo         = self.instrument.canGuitarSolo
@@ -313,7 +313,7 @@ class Stage(object):
                 try:
                     drawing = self.textures[texture]
                 except KeyError:
-                    drawing = self.engine.loadImgDrawing(self, None, os.path.join(path, texture), textureSize = (xres, yres))
+                    drawing = self.engine.loadImgDrawing(self, None, os.path.join(path, texture), textureSize = (xres, yres), owner = OWNER_STAGE)
                     self.textures[texture] = drawing
 
                 layer = Layer(self, drawing)
@@ -421,15 +421,15 @@ class Stage(object):
                 background = "practicebass"
             else:
                 background = "practice"
-            if not self.engine.loadImgDrawing(self, "background", os.path.join("themes",self.themename,"backgrounds",background)):
+            if not self.engine.loadImgDrawing(self, "background", os.path.join("themes",self.themename,"backgrounds",background), owner = OWNER_STAGE):
                 #MFH - must first fall back on the old practice.png before forcing blank stage mode!
-                if not self.engine.loadImgDrawing(self, "background", os.path.join("themes",self.themename,"backgrounds","practice")):
+                if not self.engine.loadImgDrawing(self, "background", os.path.join("themes",self.themename,"backgrounds","practice"), owner = OWNER_STAGE):
                     Log.warn("No practice stage, falling back on a forced Blank stage mode") # evilynux
                     self.mode = 2    #if no practice stage, just fall back on a forced Blank stage mode
 
         elif self.songStage == 1:    #check for song-specific background
             test = True
-            if not self.engine.loadImgDrawing(self, "background", os.path.join(libraryName, songName, "background")):
+            if not self.engine.loadImgDrawing(self, "background", os.path.join(libraryName, songName, "background"), owner = OWNER_STAGE):
                 Log.notice("No song-specific stage found") # evilynux
                 test = False
             if test:  #does a song-specific background exist?
@@ -444,7 +444,7 @@ class Stage(object):
         if self.mode != 2 and self.mode != 3 and self.songStage == 0 and not practiceMode: #still need to load stage(s)
             #myfingershurt: assign this first
             if self.mode == 1:   #just use Default.png
-                if not self.engine.loadImgDrawing(self, "background", os.path.join(self.path, "default")):
+                if not self.engine.loadImgDrawing(self, "background", os.path.join(self.path, "default"), owner = OWNER_STAGE):
                     Log.warn("No default stage; falling back on a forced Blank stage mode") # evilynux
                     self.mode = 2    #if no practice stage, just fall back on a forced Blank stage mode
 
@@ -469,7 +469,7 @@ class Stage(object):
                     i = random.randint(0,len(files)-1)
                     filename = files[i]
             ##End check number of Stage-backgrounds
-                    if not self.engine.loadImgDrawing(self, "background", os.path.join(self.path, filename)):
+                    if not self.engine.loadImgDrawing(self, "background", os.path.join(self.path, filename), owner = OWNER_STAGE):
                         self.mode = 2;
 
             elif self.rotationMode > 0 and self.mode != 2:
@@ -506,7 +506,7 @@ class Stage(object):
             if self.rotationMode > 0 and self.mode != 2:   #alarian: blank stage option is not selected
             #myfingershurt: just populate the image array in order, they are pulled in whatever order requested:
                 for j in range(len(files)):
-                    self.engine.loadImgDrawing(self, "backgroundA", os.path.join(self.path, files[j]))
+                    self.engine.loadImgDrawing(self, "backgroundA", os.path.join(self.path, files[j]), owner = OWNER_STAGE)
                     self.imgArr.append(getattr(self, "backgroundA", os.path.join(self.path, files[j])))
 
         if self.rotationMode > 0 and len(self.imgArr) == 0:
@@ -29,6 +29,8 @@ from OpenGL.GL import *
 import numpy as np
 
 from fofix.core.Microphone import Microphone
+from fofix.core.MicAnalysis import getDeviation
+from fofix.core.timer import timeFunc
 from fofix.core.Image import ImgDrawing
 from fofix.game.Song import VocalNote
 from fofix.core.constants import *
@@ -118,7 +120,7 @@ class Vocalist:
         self.scoreBox  = (0,1)
         self.scorePhrases = [_("Amazing!"), _("Great!"), _("Decent"), _("Average"), _("Meh"), _("Bad"), _("Terrible...")]
         self.textScore = -1
-        self.lastScore = None
+        self.scoreChanges = []
         self.coOpRB = False
 
         self.phraseIndex = 0
@@ -306,11 +308,11 @@ class Vocalist:
             multDict = {1: (0,1), 2: (4,5), 3: (5,6), 4: (6,7)}
             return multDict[self.scoreMultiplier]
 
+    # The (points, threshold, taps) of the oldest phrase scored and not
+    # yet asked for, or None; more than one phrase can end in one update.
     def getScoreChange(self):
-        if self.lastScore is not None:
-            score = self.lastScore
-            self.lastScore = None
-            return score
+        if self.scoreChanges:
+            return self.scoreChanges.pop(0)
         else:
             return None
 
@@ -341,12 +343,46 @@ class Vocalist:
                     self.tapNoteHits[self.currentTapPhrase] += 1
                     self.phraseTapsHit += 1
                     self.currentNoteItem.played = True
+            self.mic.getFrames()
             self.lastPos = pos
             self.currentNote = self.tap
             return
-        if not self.jurgenEnabled:
-            self.peak = self.mic.getPeak()
-            self.formants = self.mic.getFormants()
+        if self.jurgenEnabled:
+            self.mic.getFrames()
+            self.scorePitchFrame(pos, None, self.requiredNote, self.currentNoteItem)
+            return
+        self.scoreFrames(pos)
+
+    # Score every window the mic thread analyzed since the last call, at the
+    # song position it was sung at, so the rendering frame rate doesn't matter.
+    # Given the song, each window is scored against the note due when it was
+    # sung instead of the one due now, and phrases ending in between are
+    # finished in order.
+    def scoreFrames(self, pos, song = None):
+        if not self.mic.mic_started or self.paused or self.jurgenEnabled:
+            return
+        now = timeFunc()
+        for frame in self.mic.getFrames():
+            framePos = min(max(pos - (now - frame.time) * 1000.0, self.lastPos), pos)
+            requiredNote, noteItem = self.requiredNote, self.currentNoteItem
+            if song is not None:
+                requiredNote = noteItem = None
+                if not self.doneLastPhrase:
+                    self.advancePhrase(framePos, song)
+                    phrase, oldPhrase = self.findActivePhrase(framePos, song.track[self.player])
+                    if phrase:
+                        noteTime, noteItem, requiredNote, awardEnd = self.findNote(framePos, phrase)
+            if self.tapPhraseActive:
+                self.lastPos = framePos
+            else:
+                self.scorePitchFrame(framePos, frame, requiredNote, noteItem)
+
+    # Score one analyzed window of mic input (a MicAnalysis.PitchFrame, or None
+    # for jurgen) sung at the given song position, against the given note.
+    def scorePitchFrame(self, pos, frame, requiredNote, noteItem):
+        if frame is not None:
+            self.peak = frame.peak
+            self.formants = frame.formants
         else:
             self.peak = -10
             self.formants = [100, 600]
@@ -356,28 +392,31 @@ class Vocalist:
         if self.peak < -15:
             self.starPowerCountdown = False
             self.starPowerTimer = 200
-        elif self.requiredNote is not None:
-            if self.jurgenEnabled:
+        elif requiredNote is not None:
+            if frame is None:
                 self.currentNote = 0.0
             else:
-                self.currentNote = self.mic.getDeviation(self.requiredNote)
+                self.currentNote = getDeviation(frame.pitch, requiredNote)
             mult = 1
             if self.currentNote is not None:
-                if self.currentNoteItem.speak or self.currentNoteItem.extra:
+                if noteItem.speak or noteItem.extra:
                     self.currentNote = 0
                 if abs(self.currentNote) < self.allowedDeviation and self.formants[1] is not None:
                     duration = pos - self.lastPos
-                    self.currentNoteItem.accuracy += duration*mult*self.getJurgenPct()
+                    noteItem.accuracy += duration*mult*self.getJurgenPct()
                     self.phraseInTune += duration*self.difficultyModifier*mult*self.getJurgenPct()
                     self.pitchFudge = 70.0
                 elif abs(self.oldNote) < self.allowedDeviation and self.pitchFudge > 0:
                     duration = pos - self.lastPos
-                    self.currentNoteItem.accuracy += duration * (self.pitchFudge/100.0)
+                    noteItem.accuracy += duration * (self.pitchFudge/100.0)
                     self.phraseInTune += duration*self.difficultyModifier
         else:
             if self.starPowerEnable:
                 self.starPowerCountdown = True
-            self.currentNote = self.mic.getDeviation(6)
+            if frame is None:
+                self.currentNote = self.mic.getDeviation(6)
+            else:
+                self.currentNote = getDeviation(frame.pitch, 6)
         self.lastPos = pos
 
     #stump: draw a vocal note lane, vaguely RB2-style
@@ -849,41 +888,45 @@ class Vocalist:
     def resetMult(self):
         self.scoreMultiplier = 1
 
-    def getRequiredNote(self, pos, song, lyric = False):
+    # Score the phrase that just ended, and queue its score for getScoreChange.
+    def finishPhrase(self):
+        self.phraseNoteTime = max(self.phraseNoteTime, 1)
+        if self.phrase[1].tapPhrase:
+            score = float(self.phraseTapsHit)/float(self.phraseTaps)
+            scorePt = self.phraseTapsHit * self.baseScore
+            taps = self.phraseTapsHit
+        else:
+            score = (self.phraseInTune/self.phraseNoteTime)
+            scorePt = int(score * self.vocalBaseScore)
+            taps = 0
+        if not self.coOpRestart and not self.coOpFailed:
+            for i, thresh in enumerate(self.scoreThresholds):
+                if score >= thresh:
+                    if i < 2:
+                        if self.phrase[1].star:
+                            self.starPower += 25
+                            self.starPowerGained = True
+                            if self.starPower > 100:
+                                self.starPower = 100
+                        self.addMult()
+                    if i >= 2:
+                        self.resetMult()
+                    self.scoreChanges.append((scorePt, i, taps))
+                    self.textScore = i
+                    self.scoredPhrases[i] += 1
+                    self.showText = 1000
+                    self.scoreBox = (i/6.0, float(i+1)/6.0)
+                    break
+
+    # Move on to the next phrase once pos is past the end of the current one,
+    # finishing the current one. Each phrase is only finished once.
+    def advancePhrase(self, pos, song):
         track = song.track[self.player]
-        if self.doneLastPhrase:
-            return
         if pos > self.currentPhraseTime + self.currentPhraseLength - 20:
             if self.phraseIndex < len(track):
                 if self.phraseIndex > 0:
                     self.lastPhrase = track.allEvents[self.phraseIndex-1]
-                    self.phraseNoteTime = max(self.phraseNoteTime, 1)
-                    if self.activePhrase.tapPhrase:
-                        score = float(self.phraseTapsHit)/float(self.phraseTaps)
-                        scorePt = self.phraseTapsHit * self.baseScore
-                        taps = self.phraseTapsHit
-                    else:
-                        score = (self.phraseInTune/self.phraseNoteTime)
-                        scorePt = int(score * self.vocalBaseScore)
-                        taps = 0
-                    if not self.coOpRestart and not self.coOpFailed:
-                        for i, thresh in enumerate(self.scoreThresholds):
-                            if score >= thresh:
-                                if i < 2:
-                                    if self.phrase[1].star:
-                                        self.starPower += 25
-                                        self.starPowerGained = True
-                                        if self.starPower > 100:
-                                            self.starPower = 100
-                                    self.addMult()
-                                if i >= 2:
-                                    self.resetMult()
-                                self.lastScore = (scorePt, i, taps)
-                                self.textScore = i
-                                self.scoredPhrases[i] += 1
-                                self.showText = 1000
-                                self.scoreBox = (i/6.0, float(i+1)/6.0)
-                                break
+                    self.finishPhrase()
                 else:
                     self.minPitch = track.minPitch
                     self.maxPitch = track.maxPitch
@@ -912,33 +955,7 @@ class Vocalist:
                 else:
                     self.nextPhrase = None
             elif self.phraseIndex == len(track):
-                self.phraseNoteTime = max(self.phraseNoteTime, 1)
-                if self.activePhrase.tapPhrase:
-                    score = float(self.phraseTapsHit)/float(self.phraseTaps)
-                    scorePt = self.phraseTapsHit * self.baseScore
-                    taps = self.phraseTapsHit
-                else:
-                    score = (self.phraseInTune/self.phraseNoteTime)
-                    scorePt = int(score * self.vocalBaseScore)
-                    taps = 0
-                if not self.coOpFailed and not self.coOpRestart:
-                    for i, thresh in enumerate(self.scoreThresholds):
-                        if score >= thresh:
-                            if i < 2:
-                                if self.phrase[1].star:
-                                    self.starPower += 25
-                                    self.starPowerGained = True
-                                    if self.starPower > 100:
-                                        self.starPower = 100
-                                self.addMult()
-                            if i >= 2:
-                                self.resetMult()
-                            self.lastScore = (scorePt, i, taps)
-                            self.textScore = i
-                            self.scoredPhrases[i] += 1
-                            self.showText = 1000
-                            self.scoreBox = (i/6.0, float(i+1)/6.0)
-                            break
+                self.finishPhrase()
                 self.phraseInTune = 0
                 self.phraseNoteTime = 0
                 self.phraseTaps = 0
@@ -950,60 +967,70 @@ class Vocalist:
                 self.coOpRestart = False
             self.currentPhraseTime = self.phrase[0]
             self.currentPhraseLength = self.phrase[1].length
-        self.useOld = False
+
+    # The phrase whose notes are due at pos, and the (time, phrase) event of
+    # the last phrase if that is the one still showing. Changes nothing.
+    def findActivePhrase(self, pos, track):
         if self.lyricMode == 1 or self.lyricMode == 2:
             if pos >= self.currentPhraseTime and pos < self.currentPhraseTime + self.currentPhraseLength:
-                self.activePhrase = self.phrase[1]
-            else:
-                oldPhraseNum = self.phraseIndex - 2
-                if oldPhraseNum >= 0:
-                    oldPhrase = track.allEvents[oldPhraseNum]
-                    if pos < oldPhrase[0] + oldPhrase[1].length + (self.currentPeriod/2):
-                        self.activePhrase = oldPhrase[1]
-                        self.oldTime = oldPhrase[0]
-                        self.oldLength = oldPhrase[1].length
-                        self.useOld = True
-                    else:
-                        self.activePhrase = None
-                else:
-                    self.activePhrase = None
+                return self.phrase[1], None
+            oldPhraseNum = self.phraseIndex - 2
+            if oldPhraseNum >= 0:
+                oldPhrase = track.allEvents[oldPhraseNum]
+                if pos < oldPhrase[0] + oldPhrase[1].length + (self.currentPeriod/2):
+                    return oldPhrase[1], oldPhrase
+            return None, None
         elif self.lyricMode == 0:
             if self.phrase:
-                self.activePhrase = self.phrase[1]
-            else:
-                self.activePhrase = None
+                return self.phrase[1], None
+            return None, None
+        return self.activePhrase, None
 
-        if self.activePhrase:
-            lateMargin = 0
-            if self.activePhrase.tapPhrase:
-                lateMargin = self.lateMargin
-            notes = [(time, event) for time, event in self.activePhrase.getAllEvents() if isinstance(event, VocalNote)]
-            retval = None
-            for note in notes:
-                if retval is not None: #this checks if the note is a held note - if it is, do not award points based on cutting off.
-                    if note[1].heldNote:
-                        self.awardEnd = False
-                    else:
-                        self.awardEnd = True
-                    break
-                if note[0] <= pos and note[0] + note[1].length + lateMargin > pos:
-                    self.currentNoteTime = note[0]
-                    self.currentNoteItem = note[1]
-                    if not note[1].heldNote:
-                        self.currentLyric = note[1].lyric
-                    if note[1].tap:
-                        retval = 1
-                    elif note[1].speak or note[1].extra: # with # or ^ markers
-                        retval = 0
-                    else:
-                        retval = note[1].note
+    # The time, VocalNote and required note of the note of phrase due at pos
+    # (all None if there isn't one), and whether cutting it off still scores,
+    # which it doesn't if the next note holds it on. Changes nothing.
+    def findNote(self, pos, phrase):
+        lateMargin = 0
+        if phrase.tapPhrase:
+            lateMargin = self.lateMargin
+        found = None
+        for time, event in phrase.getAllEvents():
+            if not isinstance(event, VocalNote):
+                continue
+            if found is not None:
+                return found + (not event.heldNote,)
+            if time <= pos and time + event.length + lateMargin > pos:
+                if event.tap:
+                    required = 1
+                elif event.speak or event.extra: # with # or ^ markers
+                    required = 0
                 else:
-                    self.currentNoteItem = None
+                    required = event.note
+                found = (time, event, required)
+        if found is None:
+            return None, None, None, True
+        return found + (True,)
+
+    def getRequiredNote(self, pos, song, lyric = False):
+        if self.doneLastPhrase:
+            return
+        self.advancePhrase(pos, song)
+        self.useOld = False
+        self.activePhrase, oldPhrase = self.findActivePhrase(pos, song.track[self.player])
+        if oldPhrase is not None:
+            self.oldTime = oldPhrase[0]
+            self.oldLength = oldPhrase[1].length
+            self.useOld = True
+
+        if self.activePhrase:
+            noteTime, noteItem, retval, self.awardEnd = self.findNote(pos, self.activePhrase)
+            self.currentNoteItem = noteItem
+            if noteItem is not None:
+                self.currentNoteTime = noteTime
+                if not noteItem.heldNote:
+                    self.currentLyric = noteItem.lyric
             else:
-                self.awardEnd = True
-                if retval is None:
-                    self.currentLyric = None
-                    self.currentNoteItem = None
+                self.currentLyric = None
             return retval
         else:
             self.awardEnd = True
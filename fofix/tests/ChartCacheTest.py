@@ -0,0 +1,93 @@
+#####################################################################
+# -*- coding: iso-8859-1 -*-                                        #
+#                                                                   #
+# Frets on Fire X (FoFiX)                                           #
+# Copyright (C) 2012 FoFiX Team                                     #
+#                                                                   #
+# This program is free software; you can redistribute it and/or     #
+# modify it under the terms of the GNU General Public License       #
+# as published by the Free Software Foundation; either version 2    #
+# of the License, or (at your option) any later version.            #
+#                                                                   #
+# This program is distributed in the hope that it will be useful,   #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of    #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the     #
+# GNU General Public License for more details.                      #
+#                                                                   #
+# You should have received a copy of the GNU General Public License #
+# along with this program; if not, write to the Free Software       #
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,        #
+# MA  02110-1301, USA.                                              #
+#####################################################################
+
+
+import unittest
+import sqlite3
+import tempfile
+import shutil
+import os
+
+from fofix.core import Config
+from fofix.core import ConfigDefs
+from fofix.core import Fingerprint
+from fofix.game import Song
+
+class FakeEngine(object):
+    # just the parts of GameEngine that Song touches when no audio is loaded
+    def __init__(self, config):
+        self.config = config
+        self.audioSpeedFactor = 1.0
+
+class ChartCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        # a throwaway config and song cache, so the user's own are left alone
+        configFile = os.path.join(self.tmp, "test.ini")
+        open(configFile, "w").close()
+        self.config = Config.load(configFile, setAsDefault = True)
+        self.engine = FakeEngine(self.config)
+        self.songDB, self.fingerprints = Song._songDB, Fingerprint._cache
+        Song._songDB = sqlite3.connect(":memory:")
+        Song._songDB.text_factory = str
+        Song._songDB.execute('CREATE TABLE `songinfo` (`hash` STRING UNIQUE, `info` STRING, `seen` INT)')
+        Song._createChartsTable()
+        Fingerprint._cache = Fingerprint.FingerprintCache(sqlite3.connect(":memory:"))
+
+        self.infoFile = os.path.join(self.tmp, "song.ini")
+        self.noteFile = os.path.join(self.tmp, "notes.mid")
+        open(self.infoFile, "w").write("[song]\nname = Charts\n")
+        shutil.copy(os.path.join(os.path.dirname(__file__), "..", "..", "data", "tutorials", "drumtest", "notes.mid"), self.noteFile)
+
+    def tearDown(self):
+        Song._songDB, Fingerprint._cache = self.songDB, self.fingerprints
+        shutil.rmtree(self.tmp)
+
+    def load(self, partlist = [Song.parts[Song.GUITAR_PART]]):
+        return Song.Song(self.engine, self.infoFile, None, None, None, self.noteFile, partlist = partlist)
+
+    def charts(self):
+        return Song._songDB.execute('SELECT `parts`, `hash` FROM `charts`').fetchall()
+
+    def testOneChartPerSong(self):
+        self.load()
+        charts = self.charts()
+        self.assertEqual(len(charts), 1)
+        self.assertTrue(self.load().loadCompiledChart())
+
+        # other settings replace the chart...
+        self.config.set("game", "hopo_system", 0)
+        self.load()
+        self.assertEqual(len(self.charts()), 1)
+        # ...and so do edited notes
+        open(self.noteFile, "ab").write("\0")
+        os.utime(self.noteFile, (1000000000, 1000000000))
+        self.load()
+        self.assertEqual(len(self.charts()), 1)
+        self.assertNotEqual(self.charts()[0][1], charts[0][1])
+
+        # but a chart for other parts is kept alongside
+        self.load([Song.parts[Song.DRUM_PART]])
+        self.assertEqual(len(self.charts()), 2)
+
+if __name__ == "__main__":
+    unittest.main()
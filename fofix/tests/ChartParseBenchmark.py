@@ -0,0 +1,158 @@
+#####################################################################
+# -*- coding: iso-8859-1 -*-                                        #
+#                                                                   #
+# FoFiX                                                             #
+# Copyright (C) 2012 FoFiX Team                                     #
+#                                                                   #
+# This program is free software; you can redistribute it and/or     #
+# modify it under the terms of the GNU General Public License       #
+# as published by the Free Software Foundation; either version 2    #
+# of the License, or (at your option) any later version.            #
+#                                                                   #
+# This program is distributed in the hope that it will be useful,   #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of    #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the     #
+# GNU General Public License for more details.                      #
+#                                                                   #
+# You should have received a copy of the GNU General Public License #
+# along with this program; if not, write to the Free Software       #
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,        #
+# MA  02110-1301, USA.                                              #
+#####################################################################
+
+# Times how long it takes to read a large, generated RB-style notes.mid
+# into a Song for a few different player setups, next to the old reader
+# that deep-copied every event for every matching part:
+#
+#   python -m fofix.tests.ChartParseBenchmark [measures]
+
+import os
+import sys
+import copy
+import time
+import shutil
+import tempfile
+
+from fofix.core import Config
+from fofix.core import midi
+from fofix.game import Song
+from fofix.core import ConfigDefs
+
+# note numbers of the lowest gem on each difficulty (see Song.noteMap)
+GEM_BASES = [0x60, 0x54, 0x48, 0x3c]
+
+def writeChart(fileName, measures = 400, tracks = ("PART GUITAR", "PART BASS", "PART DRUMS", "PART REAL GUITAR")):
+    division = 480
+    out = midi.MidiOutFile(fileName)
+    out.header(format = 1, nTracks = len(tracks) + 1, division = division)
+
+    # tempo track, with a tempo change every other measure like a live chart
+    out.start_of_track(0)
+    out.update_time(0)
+    out.sequence_name("tempo")
+    for measure in range(0, measures, 2):
+        out.update_time(measure and division * 8)
+        out.tempo(int(60000000 / (110 + (measure % 40))))
+    out.update_time(division * 8)
+    out.end_of_track()
+
+    for n, name in enumerate(tracks):
+        out.start_of_track(n + 1)
+        out.update_time(0)
+        out.sequence_name(name)
+        delta = 0
+        for measure in range(measures):
+            # an overdrive phrase every eight measures
+            if measure % 8 == 0:
+                out.update_time(delta)
+                out.note_on(0, Song.overDriveMarkingNote, 100)
+                delta = 0
+            # eighth notes on every difficulty, with a chord on each beat
+            for step in range(8):
+                fret = (measure + step) % 5
+                notes = []
+                for base in GEM_BASES:
+                    notes.append(base + fret)
+                    if step % 2 == 0:
+                        notes.append(base + (fret + 2) % 5)
+                for note in notes:
+                    out.update_time(delta)
+                    out.note_on(0, note, 100)
+                    delta = 0
+                delta = division / 4
+                for note in notes:
+                    out.update_time(delta)
+                    out.note_off(0, note, 0)
+                    delta = 0
+                delta = division / 4
+            if measure % 8 == 7:
+                out.update_time(delta)
+                out.note_off(0, Song.overDriveMarkingNote, 0)
+                delta = 0
+        out.update_time(delta)
+        out.end_of_track()
+
+    out.eof()
+    out.write()
+
+class DeepCopyReader(Song.MidiReader):
+    # The reader as it was: every matching track got a deep copy of each
+    # event's attributes.  (Note.__deepcopy__ is now a cheap chart-values
+    # copy, so the attributes are copied directly.)
+    def trackEvent(self, event, n):
+        clone = object.__new__(event.__class__)
+        clone.__dict__.update(copy.deepcopy(event.__dict__))
+        return clone
+
+def timeSong(engine, infoFile, noteFile, partlist, reader):
+    midiReader = Song.MidiReader
+    Song.MidiReader = reader
+    try:
+        start = time.time()
+        song = Song.Song(engine, infoFile, None, None, None, noteFile, partlist = partlist)
+        return time.time() - start, song
+    finally:
+        Song.MidiReader = midiReader
+
+class BenchmarkEngine(object):
+    # just the parts of GameEngine that Song touches when no audio is loaded
+    def __init__(self, config):
+        self.config = config
+        self.audioSpeedFactor = 1.0
+
+def main():
+    measures = 400
+    if len(sys.argv) > 1:
+        measures = int(sys.argv[1])
+
+    setups = [
+      ("guitar",                         [Song.parts[Song.GUITAR_PART]]),
+      ("guitar, bass, drums, pro guitar", [Song.parts[Song.GUITAR_PART], Song.parts[Song.BASS_PART], Song.parts[Song.DRUM_PART], Song.parts[Song.PRO_GUITAR_PART]]),
+      ("4 guitars",                      [Song.parts[Song.GUITAR_PART]] * 4),
+    ]
+
+    tmp = tempfile.mkdtemp()
+    try:
+        # a throwaway config, so the user's own settings are left alone
+        configFile = os.path.join(tmp, "benchmark.ini")
+        open(configFile, "w").close()
+        config = Config.load(configFile, setAsDefault = True)
+        config.set("performance", "cache_compiled_charts", False)
+        engine = BenchmarkEngine(config)
+
+        noteFile = os.path.join(tmp, "notes.mid")
+        infoFile = os.path.join(tmp, "song.ini")
+        open(infoFile, "w").write("[song]\nname = Benchmark\n")
+        writeChart(noteFile, measures)
+
+        print "%-32s %10s %10s %8s" % ("", "deep copy", "current", "speedup")
+        for label, partlist in setups:
+            before, song = timeSong(engine, infoFile, noteFile, partlist, DeepCopyReader)
+            after, song = timeSong(engine, infoFile, noteFile, partlist, Song.MidiReader)
+            notes = sum([len(track) for tracks in song.tracks for track in tracks])
+            print "%-32s %8.3f s %8.3f s %7.2fx  (%d events)" % (label, before, after, before / after, notes)
+    finally:
+        shutil.rmtree(tmp)
+
+if __name__ == "__main__":
+    main()
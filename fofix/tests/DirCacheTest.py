@@ -0,0 +1,124 @@
+#####################################################################
+# -*- coding: iso-8859-1 -*-                                        #
+#                                                                   #
+# Frets on Fire X (FoFiX)                                           #
+# Copyright (C) 2012 FoFiX Team                                     #
+#                                                                   #
+# This program is free software; you can redistribute it and/or     #
+# modify it under the terms of the GNU General Public License       #
+# as published by the Free Software Foundation; either version 2    #
+# of the License, or (at your option) any later version.            #
+#                                                                   #
+# This program is distributed in the hope that it will be useful,   #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of    #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the     #
+# GNU General Public License for more details.                      #
+#                                                                   #
+# You should have received a copy of the GNU General Public License #
+# along with this program; if not, write to the Free Software       #
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,        #
+# MA  02110-1301, USA.                                              #
+#####################################################################
+
+
+import unittest
+import tempfile
+import shutil
+import os
+
+from fofix.core import VFS
+from fofix.core.VFS import DirCache
+
+class DirCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.tmp, "themes"))
+        for name in ("neck.png", "key.png", "key.svg"):
+            open(os.path.join(self.tmp, "themes", name), "w").close()
+        self.cache = DirCache()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def path(self, *name):
+        return os.path.join(self.tmp, *name)
+
+    def testLookups(self):
+        self.assertTrue(self.cache.isdir(self.path("themes")))
+        self.assertFalse(self.cache.isfile(self.path("themes")))
+        self.assertTrue(self.cache.isfile(self.path("themes", "neck.png")))
+        self.assertFalse(self.cache.exists(self.path("themes", "fret.png")))
+        self.assertFalse(self.cache.exists(self.path("missing", "fret.png")))
+        self.assertEqual(sorted(self.cache.listdir(self.path("themes"))), ["key.png", "key.svg", "neck.png"])
+        self.assertEqual(sorted(self.cache.glob(self.path("themes", "key.*"))), [self.path("themes", "key.png"), self.path("themes", "key.svg")])
+        self.assertRaises(OSError, self.cache.listdir, self.path("missing"))
+
+    def testDotFiles(self):
+        open(self.path("themes", ".key.png"), "w").close()
+        self.assertEqual(sorted(self.cache.glob(self.path("themes", "*.png"))), [self.path("themes", "key.png"), self.path("themes", "neck.png")])
+        self.assertEqual(self.cache.glob(self.path("themes", ".*")), [self.path("themes", ".key.png")])
+        self.assertTrue(self.cache.isfile(self.path("themes", ".key.png")))
+
+    def testCounters(self):
+        for i in range(10):
+            self.cache.exists(self.path("themes", "neck.png"))
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["dirs"]), (9, 1, 1))
+
+    def testInvalidate(self):
+        self.assertFalse(self.cache.exists(self.path("themes", "fret.png")))
+        open(self.path("themes", "fret.png"), "w").close()
+        self.assertFalse(self.cache.exists(self.path("themes", "fret.png")))
+        self.cache.invalidate(self.path("themes", "fret.png"))
+        self.assertTrue(self.cache.exists(self.path("themes", "fret.png")))
+
+        self.assertFalse(self.cache.exists(self.path("stages", "a", "b.png")))
+        os.makedirs(self.path("stages", "a"))
+        open(self.path("stages", "a", "b.png"), "w").close()
+        self.cache.invalidate(self.path("stages", "a", "b.png"))
+        self.assertTrue(self.cache.isdir(self.path("stages")))
+        self.assertTrue(self.cache.exists(self.path("stages", "a", "b.png")))
+
+        shutil.rmtree(self.path("stages"))
+        self.cache.invalidate()
+        self.assertFalse(self.cache.exists(self.path("stages", "a", "b.png")))
+
+    def testInvalidateWhileListing(self):
+        # Another thread invalidates the folder while it is being listed.
+        listdir = os.listdir
+        def invalidatingListdir(path):
+            names = listdir(path)
+            self.cache.invalidate(path)
+            return names
+        os.listdir = invalidatingListdir
+        try:
+            self.assertTrue(self.cache.isfile(self.path("themes", "neck.png")))
+        finally:
+            os.listdir = listdir
+        self.assertEqual(self.cache.stats()["dirs"], 0)
+        self.assertTrue(self.cache.isfile(self.path("themes", "neck.png")))
+        self.assertEqual(self.cache.stats()["dirs"], 1)
+
+    def testRevalidate(self):
+        self.cache.revalidate = True
+        self.assertFalse(self.cache.exists(self.path("themes", "fret.png")))
+        open(self.path("themes", "fret.png"), "w").close()
+        # Make sure the mtime moves, however coarse the filesystem's clock.
+        mtime = os.stat(self.path("themes")).st_mtime
+        os.utime(self.path("themes"), (mtime + 10, mtime + 10))
+        self.assertTrue(self.cache.exists(self.path("themes", "fret.png")))
+
+    def testVFSWrites(self):
+        VFS.mountWritable(self.tmp, "dircachetest")
+        self.assertFalse(VFS.exists("/dircachetest/themes/fret.png"))
+        VFS.open("/dircachetest/themes/fret.png", "w").close()
+        self.assertTrue(VFS.isfile("/dircachetest/themes/fret.png"))
+        VFS.mkdir("/dircachetest/stages/a")
+        self.assertTrue(VFS.isdir("/dircachetest/stages/a"))
+        VFS.rename("/dircachetest/stages/a", "/dircachetest/stages/b")
+        self.assertEqual(VFS.listdir("/dircachetest/stages"), ["b"])
+        VFS.unlink("/dircachetest/themes/fret.png")
+        self.assertFalse(VFS.exists("/dircachetest/themes/fret.png"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+#####################################################################
+# -*- coding: iso-8859-1 -*-                                        #
+#                                                                   #
+# Frets on Fire X (FoFiX)                                           #
+# Copyright (C) 2012 FoFiX Team                                     #
+#                                                                   #
+# This program is free software; you can redistribute it and/or     #
+# modify it under the terms of the GNU General Public License       #
+# as published by the Free Software Foundation; either version 2    #
+# of the License, or (at your option) any later version.            #
+#                                                                   #
+# This program is distributed in the hope that it will be useful,   #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of    #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the     #
+# GNU General Public License for more details.                      #
+#                                                                   #
+# You should have received a copy of the GNU General Public License #
+# along with this program; if not, write to the Free Software       #
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,        #
+# MA  02110-1301, USA.                                              #
+#####################################################################
+
+import unittest
+import hashlib
+import sqlite3
+import tempfile
+import shutil
+import os
+
+from fofix.core.Fingerprint import FingerprintCache
+
+class FingerprintTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cache = FingerprintCache(sqlite3.connect(":memory:"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, name, data, mtime = 1000000000):
+        path = os.path.join(self.tmp, name)
+        open(path, "wb").write(data)
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def testUnchangedFileIsNotRehashed(self):
+        path = self.write("notes.mid", "MThd" * 1000)
+        digest = self.cache.fingerprint(path)
+        self.assertEqual(digest, hashlib.sha1("MThd" * 1000).hexdigest())
+        self.assertEqual(self.cache.fingerprint(path), digest)
+        self.assertEqual(self.cache.hashed, 1)
+
+    def testChangedFileIsRehashed(self):
+        path = self.write("notes.mid", "MThd")
+        self.cache.fingerprint(path)
+        self.write("notes.mid", "MTrk", mtime = 1000000001)
+        self.assertEqual(self.cache.fingerprint(path), hashlib.sha1("MTrk").hexdigest())
+        self.assertEqual(self.cache.hashed, 2)
+
+    def testSameContents(self):
+        song = self.write("song.ogg", "OggS" * 100)
+        guitar = self.write("guitar.ogg", "OggS" * 100)
+        rhythm = self.write("rhythm.ogg", "OggS" * 101)
+        self.assertTrue(self.cache.sameContents(song, guitar))
+        self.assertFalse(self.cache.sameContents(song, rhythm))
+        # files of different sizes never get read
+        self.assertEqual(self.cache.hashed, 2)
+
+if __name__ == "__main__":
+    unittest.main()
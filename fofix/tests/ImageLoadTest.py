@@ -0,0 +1,113 @@
+#####################################################################
+# -*- coding: iso-8859-1 -*-                                        #
+#                                                                   #
+# Frets on Fire X (FoFiX)                                           #
+# Copyright (C) 2012 FoFiX Team                                     #
+#                                                                   #
+# This program is free software; you can redistribute it and/or     #
+# modify it under the terms of the GNU General Public License       #
+# as published by the Free Software Foundation; either version 2    #
+# of the License, or (at your option) any later version.            #
+#                                                                   #
+# This program is distributed in the hope that it will be useful,   #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of    #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the     #
+# GNU General Public License for more details.                      #
+#                                                                   #
+# You should have received a copy of the GNU General Public License #
+# along with this program; if not, write to the Free Software       #
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,        #
+# MA  02110-1301, USA.                                              #
+#####################################################################
+
+
+import unittest
+import tempfile
+import shutil
+import threading
+import os
+
+import numpy as np
+from PIL import Image
+
+from fofix.core import Config
+from fofix.core import ConfigDefs
+from fofix.core import Data
+from fofix.core import Texture
+from fofix.core import TextureData
+from fofix.core import VFS
+from fofix.core.Resource import Resource
+
+class FakeImgDrawing(object):
+    # Stands in for ImgDrawing, which needs a GL context.
+    def __init__(self, context, fileName, owner, data = None):
+        self.fileName = fileName
+        self.data = data
+        self.thread = threading.currentThread()
+
+class ImageLoadTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        configFile = os.path.join(self.tmp, "test.ini")
+        open(configFile, "w").close()
+        Config.load(configFile, setAsDefault = True)
+        os.makedirs(os.path.join(self.tmp, "themes", "setlist"))
+        for name in ("background.png", "label.png", ".hidden.png"):
+            pixels = np.zeros((4, 8, 3), dtype = np.uint8)
+            Image.fromarray(pixels, "RGB").save(os.path.join(self.tmp, "themes", "setlist", name))
+        open(os.path.join(self.tmp, "themes", "setlist", "broken.png"), "w").write("not a png")
+        VFS.dirCache.invalidate()
+
+        self.resource = Resource(self.tmp, workers = 2)
+        self.data = Data.Data.__new__(Data.Data)
+        self.data.resource = self.resource
+        self.data.svg = None
+        self.data.path = self.tmp
+        self.data.logLoadings = 0
+        self.data.logImageNotFound = 0
+
+        # Decoding is watched through the thread it happens in.
+        self.decodes = []
+        self.loadImageFile = TextureData.loadImageFile
+        def loadImageFile(fileName, mipmaps = True, maxSize = None):
+            self.decodes.append(threading.currentThread())
+            return self.loadImageFile(fileName, mipmaps, maxSize)
+        TextureData.loadImageFile = loadImageFile
+        self.imgDrawing, Data.ImgDrawing = Data.ImgDrawing, FakeImgDrawing
+        self.maxTextureSize, Texture._maxTextureSize = Texture._maxTextureSize, 1024
+
+    def tearDown(self):
+        TextureData.loadImageFile = self.loadImageFile
+        Data.ImgDrawing = self.imgDrawing
+        Texture._maxTextureSize = self.maxTextureSize
+        self.resource.stopWorkers()
+        shutil.rmtree(self.tmp)
+
+    def testAsync(self):
+        loaded = []
+        loader = self.data.loadImgDrawingAsync(self, "background", os.path.join("themes", "setlist", "background"), onLoad = loaded.append)
+        self.assertEqual(self.background, None)
+        self.resource.finishLoads([loader])
+        self.assertTrue(loaded[0] is self.background)
+        self.assertEqual(self.background.fileName, os.path.join(self.tmp, "themes", "setlist", "background.png"))
+        self.assertEqual(self.background.data.imageSize, (8, 4))
+        self.assertTrue(self.background.thread is threading.currentThread())
+        self.assertFalse(self.decodes[0] is threading.currentThread())
+
+    def testNotFound(self):
+        loaded = []
+        for name in ("missing", "broken"):
+            loader = self.data.loadImgDrawingAsync(self, name, os.path.join("themes", "setlist", name), onLoad = loaded.append)
+            self.resource.finishLoads([loader])
+            self.assertEqual(getattr(self, name), None)
+        self.assertEqual(loaded, [None, None])
+
+    def testLoadAllImages(self):
+        images = self.data.loadAllImages(None, os.path.join("themes", "setlist"), prefix = "")
+        self.assertEqual(sorted(images.keys()), ["background", "label"])
+        self.assertEqual(len(self.decodes), 3)
+        self.assertFalse(threading.currentThread() in self.decodes)
+        self.assertEqual(self.resource.loaders, [])
+
+if __name__ == "__main__":
+    unittest.main()
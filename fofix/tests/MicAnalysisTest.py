@@ -0,0 +1,115 @@
+#####################################################################
+# -*- coding: iso-8859-1 -*-                                        #
+#                                                                   #
+# Frets on Fire X (FoFiX)                                           #
+# Copyright (C) 2012 FoFiX Team                                     #
+#                                                                   #
+# This program is free software; you can redistribute it and/or     #
+# modify it under the terms of the GNU General Public License       #
+# as published by the Free Software Foundation; either version 2    #
+# of the License, or (at your option) any later version.            #
+#                                                                   #
+# This program is distributed in the hope that it will be useful,   #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of    #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the     #
+# GNU General Public License for more details.                      #
+#                                                                   #
+# You should have received a copy of the GNU General Public License #
+# along with this program; if not, write to the Free Software       #
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,        #
+# MA  02110-1301, USA.                                              #
+#####################################################################
+
+
+import unittest
+import tempfile
+import shutil
+import wave
+import os
+
+import numpy as np
+
+from fofix.core.MicAnalysis import MicAnalyzer, WavSource, getDeviation
+from fofix.core import pypitch
+
+SAMPRATE = 44100
+
+def writeTone(fileName, parts):
+    # parts: list of (frequency, seconds, amplitude); frequency None for silence.
+    # Each note gets a few harmonics, like a voice; pure sines fool the analyzer.
+    samples = []
+    for freq, seconds, amplitude in parts:
+        t = np.arange(int(seconds * SAMPRATE)) / float(SAMPRATE)
+        if freq is None:
+            samples.append(np.zeros(len(t)))
+        else:
+            samples.append(amplitude * sum(np.sin(2 * np.pi * freq * k * t) / k for k in range(1, 6)) / 2.3)
+    out = wave.open(fileName, 'wb')
+    out.setnchannels(1)
+    out.setsampwidth(2)
+    out.setframerate(SAMPRATE)
+    out.writeframes((np.concatenate(samples) * 32767.0).round().astype('<i2').tostring())
+    out.close()
+
+class MicAnalysisTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.wavName = os.path.join(self.tmp, 'mic.wav')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def analyze(self, parts, clock = lambda: 100.0, tapThreshold = 0.0):
+        writeTone(self.wavName, parts)
+        source = WavSource(self.wavName)
+        chunks = []
+        analysis = MicAnalyzer(source.read, pypitch.Analyzer(SAMPRATE), source.samprate, onChunk = chunks.append, clock = clock)
+        analysis.tapThreshold = tapThreshold
+        analysis.start()
+        analysis.thread.join(10.0)
+        self.assertFalse(analysis.isRunning())
+        source.close()
+        self.assertEqual(sum(len(c) for c in chunks) // 4, sum(int(p[1] * SAMPRATE) for p in parts))
+        return analysis
+
+    def testPitch(self):
+        analysis = self.analyze([(330.0, 2.0, 0.5)])
+        frames = analysis.getFrames()
+        self.assertEqual(len(frames), 87)
+        self.assertEqual(analysis.getFrames(), [])
+        # Give the analyzer a few windows to settle on the note.
+        for frame in frames[10:]:
+            self.assertTrue(frame.pitch is not None)
+            self.assertAlmostEqual(frame.pitch, 330.0, delta = 5.0)
+            self.assertTrue(frame.peak > -10.0)
+            # E above middle C
+            self.assertAlmostEqual(getDeviation(frame.pitch, 64), 0.0, delta = 0.2)
+        self.assertTrue(analysis.latest is frames[-1])
+
+    def testTimestamps(self):
+        frames = self.analyze([(330.0, 1.0, 0.5)]).getFrames()
+        # The source is read far faster than real time; the times come from
+        # the sample count, not from when each chunk came in.
+        self.assertEqual(frames[0].time, 100.0)
+        for i, frame in enumerate(frames[:-1]):
+            self.assertAlmostEqual(frame.time, 100.0 + i * 1024.0 / SAMPRATE)
+
+    def testResync(self):
+        # Input lost for a second: frames after the gap are timed by the clock.
+        times = iter([100.0] * 20 + [101.5] * 100)
+        frames = self.analyze([(330.0, 1.0, 0.5)], clock = lambda: times.next()).getFrames()
+        self.assertAlmostEqual(frames[19].time, 100.0 + 19 * 1024.0 / SAMPRATE)
+        self.assertEqual(frames[20].time, 101.5)
+        self.assertAlmostEqual(frames[21].time, 101.5 + 1024.0 / SAMPRATE)
+
+    def testSilence(self):
+        frames = self.analyze([(None, 0.5, 0.0)]).getFrames()
+        self.assertEqual([f.pitch for f in frames], [None] * len(frames))
+
+    def testTap(self):
+        analysis = self.analyze([(None, 0.5, 0.0), (330.0, 0.2, 0.8)], tapThreshold = -20.0)
+        self.assertTrue(analysis.getTap())
+        self.assertFalse(analysis.getTap())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+#####################################################################
+# -*- coding: iso-8859-1 -*-                                        #
+#                                                                   #
+# Frets on Fire X (FoFiX)                                           #
+# Copyright (C) 2012 FoFiX Team                                     #
+#                                                                   #
+# This program is free software; you can redistribute it and/or     #
+# modify it under the terms of the GNU General Public License       #
+# as published by the Free Software Foundation; either version 2    #
+# of the License, or (at your option) any later version.            #
+#                                                                   #
+# This program is distributed in the hope that it will be useful,   #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of    #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the     #
+# GNU General Public License for more details.                      #
+#                                                                   #
+# You should have received a copy of the GNU General Public License #
+# along with this program; if not, write to the Free Software       #
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,        #
+# MA  02110-1301, USA.                                              #
+#####################################################################
+
+
+import unittest
+import tempfile
+import shutil
+import os
+
+from fofix.core import Config
+from fofix.core import ConfigDefs
+from fofix.core import midi
+from fofix.game import Song
+
+noteFile = os.path.join(os.path.dirname(__file__), "..", "..", "data", "tutorials", "drumtest", "notes.mid")
+
+class NoteCounter(midi.MidiOutStream):
+    def __init__(self, failAt = None):
+        midi.MidiOutStream.__init__(self)
+        self.notes = 0
+        self.failAt = failAt
+
+    def note_on(self, channel, note, velocity):
+        self.notes += 1
+        if self.notes == self.failAt:
+            raise ValueError("bad note")
+
+class MidiFanOutStreamTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        configFile = os.path.join(self.tmp, "test.ini")
+        open(configFile, "w").close()
+        Config.load(configFile, setAsDefault = True)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def read(self, outstreams):
+        fanOut = midi.MidiFanOutStream(outstreams)
+        try:
+            midi.MidiInFile(fanOut, noteFile).read()
+        except midi.MidiFanOutStream.Done:
+            pass
+        return fanOut
+
+    def testFailingConsumer(self):
+        good, bad = NoteCounter(), NoteCounter(failAt = 3)
+        fanOut = self.read([bad, good])
+
+        # the failing consumer is dropped and its error kept; the other one reads on
+        assert bad.notes == 3
+        assert isinstance(fanOut.errors[bad], ValueError)
+        assert good not in fanOut.errors
+        assert good.notes > 3
+        assert fanOut.outstreams == [good]
+
+    def testReadersFinish(self):
+        partsInfo = Song.MidiPartsDiffReader()
+        sectionInfo = Song.MidiSectionReader()
+        fanOut = self.read([partsInfo, sectionInfo])
+
+        # both readers say they are done at the end of the file
+        assert fanOut.outstreams == []
+        assert fanOut.errors == {}
+        assert partsInfo.parts
+
+    def testReadNoteFile(self):
+        shutil.copy(noteFile, os.path.join(self.tmp, "notes.mid"))
+        open(os.path.join(self.tmp, "song.ini"), "w").write("[song]\nname = Fan Out\n")
+        info = Song.SongInfo(os.path.join(self.tmp, "song.ini"), useCache = False)
+
+        # a section reader that breaks doesn't take the parts down with it
+        def broken(self, channel, note, velocity):
+            raise ValueError("bad section")
+        note_on, Song.MidiSectionReader.note_on = Song.MidiSectionReader.note_on, broken
+        try:
+            info.readNoteFile()
+        finally:
+            Song.MidiSectionReader.note_on = note_on
+        assert info._sections is None
+        assert Song.parts[Song.DRUM_PART] in info._parts
+        assert len(info._parts) < len(Song.parts)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+#####################################################################
+# -*- coding: iso-8859-1 -*-                                        #
+#                                                                   #
+# Frets on Fire X (FoFiX)                                           #
+# Copyright (C) 2012 FoFiX Team                                     #
+#                                                                   #
+# This program is free software; you can redistribute it and/or     #
+# modify it under the terms of the GNU General Public License       #
+# as published by the Free Software Foundation; either version 2    #
+# of the License, or (at your option) any later version.            #
+#                                                                   #
+# This program is distributed in the hope that it will be useful,   #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of    #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the     #
+# GNU General Public License for more details.                      #
+#                                                                   #
+# You should have received a copy of the GNU General Public License #
+# along with this program; if not, write to the Free Software       #
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,        #
+# MA  02110-1301, USA.                                              #
+#####################################################################
+
+
+import unittest
+import os
+
+import numpy as np
+import pygame
+
+# No sound card needed: the test reads what the mixer would play itself.
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+from fofix.core.MixStream import PassthroughStream
+
+RATE = 44100
+
+def sine(start, frames, rate = RATE, freq = 440.0):
+    t = np.arange(start, start + frames) / float(rate)
+    return (0.5 * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+
+class PassthroughStreamTest(unittest.TestCase):
+    def setUp(self):
+        pygame.mixer.init(RATE, -16, 2, 1024)
+
+    def tearDown(self):
+        pygame.mixer.quit()
+
+    def render(self, stream, frames):
+        return np.frombuffer(stream.render(frames), dtype=np.float32)
+
+    def testLoopback(self):
+        stream = PassthroughStream(RATE, 0.03)
+        stream.set_gain(0.5)
+        self.assertAlmostEqual(stream.get_latency(), 0.03, places = 4)
+
+        # Silence until the target latency's worth of input is in.
+        self.assertEqual(stream.write(sine(0, 1024).tostring()), 1024)
+        self.assertFalse(self.render(stream, 512).any())
+        stream.write(sine(1024, 1024).tostring())
+
+        # Then the input comes out sample for sample, at half volume.
+        written = 2048
+        played = 0
+        for i in range(100):
+            for j in range(2):
+                out = self.render(stream, 512)
+                np.testing.assert_allclose(out, 0.5 * sine(played, 512), atol = 1e-6)
+                played += 512
+            stream.write(sine(written, 1024).tostring())
+            written += 1024
+        self.assertEqual(stream.get_underruns(), 0)
+        self.assertEqual(stream.get_overruns(), 0)
+        self.assertAlmostEqual(stream.get_buffered(), (written - played) / float(RATE))
+
+    def testUnderrun(self):
+        stream = PassthroughStream(RATE, 0.02)
+        stream.write(sine(0, 2048).tostring())
+        for i in range(8):
+            out = self.render(stream, 512)
+        self.assertFalse(out.any())
+        self.assertEqual(stream.get_underruns(), 1)
+
+    def testLatencyHeldDown(self):
+        stream = PassthroughStream(RATE, 0.03)
+        for i in range(20):
+            stream.write(sine(i * 1024, 1024).tostring())
+        self.render(stream, 512)
+        self.assertTrue(stream.get_buffered() <= 0.031)
+        self.assertEqual(stream.get_overruns(), 1)
+
+    def testResample(self):
+        # 22050 Hz input comes out at the mixer's rate, at the same pitch.
+        stream = PassthroughStream(22050, 0.02)
+        out = []
+        for i in range(100):
+            stream.write(sine(i * 256, 256, 22050).tostring())
+            out.append(self.render(stream, 512))
+        out = np.concatenate(out)[2048:]
+        crossings = np.count_nonzero(np.diff(np.signbit(out).astype(int)))
+        self.assertAlmostEqual(crossings / 2.0 / (len(out) / float(RATE)), 440.0, delta = 5.0)
+        self.assertEqual(stream.get_underruns(), 0)
+        self.assertEqual(stream.get_overruns(), 0)
+
+    def testPlay(self):
+        stream = PassthroughStream(RATE)
+        self.assertNotEqual(stream.play(), -1)
+        self.assertTrue(stream.is_playing())
+        self.assertRaises(Exception, stream.render, 512)
+        stream.stop()
+        self.assertFalse(stream.is_playing())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,233 @@
+#####################################################################
+# -*- coding: iso-8859-1 -*-                                        #
+#                                                                   #
+# FoFiX                                                             #
+# Copyright (C) 2012 FoFiX Team                                     #
+#                                                                   #
+# This program is free software; you can redistribute it and/or     #
+# modify it under the terms of the GNU General Public License       #
+# as published by the Free Software Foundation; either version 2    #
+# of the License, or (at your option) any later version.            #
+#                                                                   #
+# This program is distributed in the hope that it will be useful,   #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of    #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the     #
+# GNU General Public License for more details.                      #
+#                                                                   #
+# You should have received a copy of the GNU General Public License #
+# along with this program; if not, write to the Free Software       #
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,        #
+# MA  02110-1301, USA.                                              #
+#####################################################################
+
+# Runs the pypitch analyzer over generated signals (sine, sawtooth and a
+# vowel-like voice, at notes across the singing range) at several sample
+# rates and chunk sizes, the way the microphone thread feeds it.  Reports
+# the time taken per chunk and how far the pitch, peak level and formants
+# found are from what was generated; --json writes every result as JSON.
+#
+#   python -m fofix.tests.PitchBenchmark [--rates 22050,44100,48000]
+#       [--chunks 256,512,1024,2048] [--json FILE] [--corpus DIR]
+
+import os
+import sys
+import json
+import math
+import wave
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+from fofix.core import pypitch
+from fofix.core.MicAnalysis import WavSource
+from fofix.core.timer import timeFunc
+
+NOTES = [110.0, 196.0, 330.0, 523.25, 880.0]
+SIGNALS = ["sine", "sawtooth", "vocal"]
+AMPLITUDE = 0.5
+SECONDS = 2.0
+# The analyzer takes a while to settle on a note; skip this much (in seconds).
+WARMUP = 0.1
+# Formants of the vowel in "father", and how wide they are (in Hz).
+VOWEL_FORMANTS = [(730.0, 90.0), (1090.0, 110.0), (2440.0, 170.0)]
+# The voice's vibrato: rate (in Hz) and depth (in semitones).
+VIBRATO = (5.0, 0.2)
+# Samples the analyzer's FFT looks at (FFT_N in pitch.hpp); the pitch it
+# finds is that of the middle of the last window.
+FFT_SAMPLES = 1024
+
+def frequencyAt(signal, note, t):
+    '''The pitch of a generated signal at time t (an array), in Hz.'''
+    if signal == "vocal":
+        return note * 2.0 ** (VIBRATO[1] * np.sin(2 * np.pi * VIBRATO[0] * t) / 12.0)
+    return note * np.ones(len(t))
+
+def generate(signal, note, rate):
+    '''One of the test signals, as float samples at most AMPLITUDE.'''
+    t = np.arange(int(SECONDS * rate)) / float(rate)
+    phase = 2 * np.pi * np.cumsum(frequencyAt(signal, note, t)) / rate
+    if signal == "sine":
+        samples = np.sin(phase)
+    else:
+        # Band-limited, so there's nothing above Nyquist to alias.
+        harmonics = int(rate / 2.0 / note)
+        samples = np.zeros(len(t))
+        for k in range(1, harmonics + 1):
+            gain = 1.0 / k
+            if signal == "vocal":
+                gain *= 0.1 + sum(math.exp(-((k * note - f) / width) ** 2) for f, width in VOWEL_FORMANTS)
+            samples += gain * np.sin(k * phase)
+        if signal == "vocal":
+            samples += np.random.RandomState(int(note)).normal(0, 0.01, len(t)) * np.abs(samples).max()
+    return AMPLITUDE * samples / np.abs(samples).max()
+
+def writeWav(fileName, samples, rate):
+    out = wave.open(fileName, "wb")
+    out.setnchannels(1)
+    out.setsampwidth(2)
+    out.setframerate(rate)
+    out.writeframes((samples * 32767.0).round().astype("<i2").tostring())
+    out.close()
+
+def makeCorpus(folder, rates):
+    '''Write the test signals to WAV files: a list of (fileName, signal, note, rate).'''
+    corpus = []
+    for rate in rates:
+        for signal in SIGNALS:
+            for note in NOTES:
+                fileName = os.path.join(folder, "%s-%g-%d.wav" % (signal, note, rate))
+                writeWav(fileName, generate(signal, note, rate), rate)
+                corpus.append((fileName, signal, note, rate))
+    return corpus
+
+def cents(found, expected):
+    return 1200.0 * math.log(found / expected, 2)
+
+def percentile(values, q):
+    if not values:
+        return None
+    return float(np.percentile(values, q))
+
+def analyzeFile(fileName, signal, note, rate, chunkSize):
+    '''Feed a file to a fresh analyzer a chunk at a time, as MicAnalyzer does.'''
+    source = WavSource(fileName)
+    analyzer = pypitch.Analyzer(rate)
+    times = []
+    pitchErrors = []
+    octaveErrors = 0
+    wrongNotes = 0
+    peakErrors = []
+    formantErrors = [[] for f in VOWEL_FORMANTS]
+    chunks = 0
+    position = 0
+    while True:
+        chunk = source.read(chunkSize)
+        if not chunk:
+            break
+        position += len(chunk) // 4
+
+        start = timeFunc()
+        analyzer.input(chunk)
+        analyzer.process()
+        peak = analyzer.getPeak()
+        tone = analyzer.findTone()
+        formants = analyzer.getFormants()
+        times.append(timeFunc() - start)
+
+        if position < WARMUP * rate:
+            continue
+        chunks += 1
+        expected = frequencyAt(signal, note, np.array([(position - FFT_SAMPLES / 2) / float(rate)]))[0]
+        if tone is not None:
+            error = cents(tone.freq, expected)
+            # Singing is scored without regard to octave.
+            folded = abs((error + 600.0) % 1200.0 - 600.0)
+            if folded > 50.0:
+                wrongNotes += 1
+            elif abs(error) > 50.0:
+                octaveErrors += 1
+            pitchErrors.append(folded)
+        peakErrors.append(abs(peak - 20.0 * math.log10(AMPLITUDE)))
+        if signal == "vocal":
+            for i, (target, width) in enumerate(VOWEL_FORMANTS):
+                if formants[i] is not None:
+                    formantErrors[i].append(abs(formants[i] - target))
+    source.close()
+
+    result = {
+        "signal": signal, "note": note, "rate": rate, "chunk": chunkSize,
+        "chunks": chunks,
+        "usPerChunk": 1e6 * sum(times) / len(times),
+        "usPerChunkP95": 1e6 * percentile(times, 95),
+        "usPerSecond": 1e6 * sum(times) / SECONDS,
+        "detected": len(pitchErrors) / float(chunks),
+        "octaveErrors": octaveErrors / float(max(len(pitchErrors), 1)),
+        "wrongNotes": wrongNotes / float(max(len(pitchErrors), 1)),
+        "centsMedian": percentile(pitchErrors, 50),
+        "centsP95": percentile(pitchErrors, 95),
+        "peakErrorDb": percentile(peakErrors, 50),
+    }
+    if signal == "vocal":
+        result["formantsFound"] = [len(e) / float(chunks) for e in formantErrors]
+        result["formantErrorHz"] = [percentile(e, 50) for e in formantErrors]
+    return result
+
+def formatValue(value, format):
+    if value is None:
+        return "-"
+    return format % value
+
+def main(args = None):
+    parser = argparse.ArgumentParser(description = "Benchmark pypitch's speed and accuracy on generated signals.")
+    parser.add_argument("--rates", default = "22050,44100,48000", help = "comma-separated sample rates")
+    parser.add_argument("--chunks", default = "256,512,1024,2048", help = "comma-separated chunk sizes, in frames")
+    parser.add_argument("--json", metavar = "FILE", help = "write all the results to FILE as JSON ('-' for stdout)")
+    parser.add_argument("--corpus", metavar = "DIR", help = "keep the generated WAV files in DIR")
+    args = parser.parse_args(args)
+    rates = [int(r) for r in args.rates.split(",")]
+    chunkSizes = [int(c) for c in args.chunks.split(",")]
+
+    folder = args.corpus or tempfile.mkdtemp()
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    try:
+        corpus = makeCorpus(folder, rates)
+        results = [analyzeFile(fileName, signal, note, rate, chunkSize)
+                   for chunkSize in chunkSizes for fileName, signal, note, rate in corpus]
+    finally:
+        if not args.corpus:
+            shutil.rmtree(folder)
+
+    out = sys.stdout
+    if args.json == "-":
+        out = sys.stderr
+    print >>out, "%-8s %6s %5s  %9s %9s %6s %6s %6s %8s %8s %7s  %s" % ("signal", "rate", "chunk", "us/chunk", "us/s", "found", "octave",
+                                                                     "wrong", "cents", "cents95", "peak dB", "F1/F2 Hz off")
+    for r in results:
+        formants = ""
+        if "formantErrorHz" in r:
+            formants = "/".join([formatValue(e, "%.0f") for e in r["formantErrorHz"][:2]])
+        print >>out, "%-8s %6d %5d  %9.1f %9.0f %5.0f%% %5.0f%% %5.0f%% %8s %8s %7.2f  %s  (%g Hz)" % (
+          r["signal"], r["rate"], r["chunk"], r["usPerChunk"], r["usPerSecond"], 100 * r["detected"], 100 * r["octaveErrors"],
+          100 * r["wrongNotes"], formatValue(r["centsMedian"], "%.1f"), formatValue(r["centsP95"], "%.1f"), r["peakErrorDb"],
+          formants, r["note"])
+
+    # Everything at one rate and chunk size together, for picking a chunk size.
+    print >>out
+    print >>out, "%6s %5s  %9s %9s %9s %6s %6s" % ("rate", "chunk", "latency", "us/chunk", "us/s", "found", "wrong")
+    for rate in rates:
+        for chunkSize in chunkSizes:
+            group = [r for r in results if r["rate"] == rate and r["chunk"] == chunkSize]
+            print >>out, "%6d %5d  %7.1fms %9.1f %9.0f %5.0f%% %5.0f%%" % (rate, chunkSize, 1000.0 * chunkSize / rate,
+              np.mean([r["usPerChunk"] for r in group]), np.mean([r["usPerSecond"] for r in group]),
+              100 * np.mean([r["detected"] for r in group]), 100 * np.mean([r["wrongNotes"] for r in group]))
+
+    if args.json == "-":
+        json.dump(results, sys.stdout, indent = 1)
+    elif args.json:
+        json.dump(results, open(args.json, "w"), indent = 1)
+
+if __name__ == "__main__":
+    main()
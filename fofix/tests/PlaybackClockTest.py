@@ -0,0 +1,120 @@
+#####################################################################
+# -*- coding: iso-8859-1 -*-                                        #
+#                                                                   #
+# Frets on Fire X (FoFiX)                                           #
+# Copyright (C) 2012 FoFiX Team                                     #
+#                                                                   #
+# This program is free software; you can redistribute it and/or     #
+# modify it under the terms of the GNU General Public License       #
+# as published by the Free Software Foundation; either version 2    #
+# of the License, or (at your option) any later version.            #
+#                                                                   #
+# This program is distributed in the hope that it will be useful,   #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of    #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the     #
+# GNU General Public License for more details.                      #
+#                                                                   #
+# You should have received a copy of the GNU General Public License #
+# along with this program; if not, write to the Free Software       #
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,        #
+# MA  02110-1301, USA.                                              #
+#####################################################################
+
+import unittest
+import random
+
+from fofix.core.PlaybackClock import PlaybackClock
+
+class NullAudioDevice(object):
+    # Stands in for the sound card and mixer: plays a stream chunk by chunk
+    # at its own, possibly slightly off, sample rate, and starts each chunk a
+    # little late, like the channel-finished callback does.  Gives the same
+    # readings as MixStream.get_clock().
+    def __init__(self, rate = 44100, drift = 0.0, chunkFrames = 1024, lateness = 0.002, seed = 0):
+        self.rate        = float(rate)
+        self.actualRate  = rate * (1.0 + drift)
+        self.chunkFrames = chunkFrames
+        self.lateness    = lateness
+        self.random      = random.Random(seed)
+        self.starts      = []
+        self.stoppedAt   = None
+
+    def chunkStart(self, n):
+        while len(self.starts) <= n:
+            k = len(self.starts)
+            self.starts.append(k * self.chunkFrames / self.actualRate + self.random.uniform(0.0, self.lateness))
+        return self.starts[n]
+
+    def truePosition(self, now):
+        if self.stoppedAt is not None:
+            now = min(now, self.stoppedAt)
+        return now * self.actualRate / self.rate
+
+    def getClock(self, now):
+        played = now
+        if self.stoppedAt is not None:
+            played = min(now, self.stoppedAt)
+        n = int(played * self.actualRate / self.chunkFrames)
+        while n > 0 and self.chunkStart(n) > played:
+            n -= 1
+        chunkTime = self.chunkFrames / self.rate
+        return n * chunkTime, (n + 1) * chunkTime, 1.0, self.chunkStart(n), now
+
+def run(clock, device, seconds, fps = 60.0, seed = 1):
+    # Read the clock once a frame, like GuitarScene does, with uneven frame times.
+    frames = random.Random(seed)
+    now = 0.0
+    readings = []
+    while now < seconds:
+        now += frames.uniform(0.8, 1.2) / fps
+        readings.append((now, clock.update(*device.getClock(now))))
+    return readings
+
+class PlaybackClockTest(unittest.TestCase):
+    def testMonotonic(self):
+        readings = run(PlaybackClock(), NullAudioDevice(lateness = 0.005), 60.0)
+        for (t1, p1), (t2, p2) in zip(readings, readings[1:]):
+            self.assertTrue(p2 >= p1)
+
+    def testAccurate(self):
+        device = NullAudioDevice()
+        readings = run(PlaybackClock(), device, 60.0)
+        for now, position in readings:
+            if now > 1.0:
+                self.assertTrue(abs(position - device.truePosition(now)) < 0.003)
+
+    def testSmootherThanRawReadings(self):
+        device = NullAudioDevice(lateness = 0.005)
+        clock = PlaybackClock()
+        readings = run(clock, device, 30.0)
+        raw = [min(a + s * (now - started), end) for a, end, s, started, now in [device.getClock(t) for t, p in readings]]
+        def worstStepError(times, positions):
+            return max([abs((p2 - p1) - (t2 - t1)) for t1, t2, p1, p2 in zip(times, times[1:], positions, positions[1:])][60:])
+        times = [t for t, p in readings]
+        smooth = worstStepError(times, [p for t, p in readings])
+        self.assertTrue(smooth < 0.001)
+        self.assertTrue(smooth < worstStepError(times, raw) / 4)
+
+    def testDriftCorrected(self):
+        # A sound card running 0.1% fast is 0.6 s ahead after ten minutes.
+        device = NullAudioDevice(drift = 0.001)
+        readings = run(PlaybackClock(), device, 600.0)
+        now, position = readings[-1]
+        self.assertTrue(abs(position - device.truePosition(now)) < 0.003)
+
+    def testStopsWithPlayback(self):
+        device = NullAudioDevice()
+        device.stoppedAt = 10.0
+        readings = run(PlaybackClock(), device, 11.0)
+        now, position = readings[-1]
+        self.assertTrue(position <= device.truePosition(10.0) + 2 * device.chunkFrames / device.rate)
+
+    def testSnapsAfterSeek(self):
+        clock = PlaybackClock()
+        device = NullAudioDevice()
+        run(clock, device, 5.0)
+        anchor, end, speed, started, now = device.getClock(5.0)
+        self.assertEqual(clock.update(anchor + 60.0, end + 60.0, speed, started, now), anchor + 60.0 + (now - started))
+
+if __name__ == "__main__":
+    unittest.main()
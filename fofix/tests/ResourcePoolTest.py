@@ -0,0 +1,235 @@
+#####################################################################
+# -*- coding: iso-8859-1 -*-                                        #
+#                                                                   #
+# Frets on Fire X (FoFiX)                                           #
+# Copyright (C) 2012 FoFiX Team                                     #
+#                                                                   #
+# This program is free software; you can redistribute it and/or     #
+# modify it under the terms of the GNU General Public License       #
+# as published by the Free Software Foundation; either version 2    #
+# of the License, or (at your option) any later version.            #
+#                                                                   #
+# This program is distributed in the hope that it will be useful,   #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of    #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the     #
+# GNU General Public License for more details.                      #
+#                                                                   #
+# You should have received a copy of the GNU General Public License #
+# along with this program; if not, write to the Free Software       #
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,        #
+# MA  02110-1301, USA.                                              #
+#####################################################################
+
+
+import unittest
+import tempfile
+import shutil
+import sqlite3
+import os
+from threading import Event
+
+from fofix.core import Config
+from fofix.core import ConfigDefs
+from fofix.core import Fingerprint
+from fofix.core.Resource import Resource, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+from fofix.game import Song
+
+class FakeEngine(object):
+    def __init__(self, resource, config):
+        self.resource = resource
+        self.config = config
+
+class ResourcePoolTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        # a throwaway config, so the user's own settings are left alone
+        configFile = os.path.join(self.tmp, "test.ini")
+        open(configFile, "w").close()
+        self.config = Config.load(configFile, setAsDefault = True)
+        self.resource = Resource(self.tmp, workers = 1)
+        self.started = []
+
+    def tearDown(self):
+        self.resource.stopWorkers()
+        shutil.rmtree(self.tmp)
+
+    def blocker(self):
+        # Holds the only worker until released, so loads queue up behind it.
+        release = Event()
+        running = Event()
+        def block():
+            running.set()
+            release.wait()
+        loader = self.resource.load(self, "blocked", block)
+        running.wait(5.0)
+        return release, loader
+
+    def fakeLoad(self, name):
+        def load():
+            self.started.append(name)
+            return name
+        return load
+
+    def finishAll(self, loaders):
+        for loader in loaders:
+            loader.join(5.0)
+            self.assertFalse(loader.isAlive())
+        while self.resource.loaders:
+            self.resource.run(0)
+
+    def testLoad(self):
+        loader = self.resource.load(self, "result", lambda: 0xdada)
+        self.assertEqual(loader(), 0xdada)
+        self.resource.run(0)
+        self.assertEqual(self.result, 0xdada)
+        self.assertEqual(self.resource.loaders, [])
+
+    def testSynchLoad(self):
+        self.assertEqual(self.resource.load(self, "result", lambda: 0xdada, synch = True), 0xdada)
+        self.assertEqual(self.result, 0xdada)
+
+    def testPriorities(self):
+        release, blocked = self.blocker()
+        loaders = [
+          self.resource.load(self, "low", self.fakeLoad("low"), priority = PRIORITY_LOW),
+          self.resource.load(self, "normal1", self.fakeLoad("normal1")),
+          self.resource.load(self, "high", self.fakeLoad("high"), priority = PRIORITY_HIGH),
+          self.resource.load(self, "normal2", self.fakeLoad("normal2"), priority = PRIORITY_NORMAL),
+        ]
+        release.set()
+        self.finishAll([blocked] + loaders)
+        self.assertEqual(self.started, ["high", "normal1", "normal2", "low"])
+        self.assertEqual(self.low, "low")
+
+    def testCancel(self):
+        canceled = []
+        loaded = []
+        release, blocked = self.blocker()
+        loader = self.resource.load(self, "canceled", self.fakeLoad("canceled"), onLoad = loaded.append, onCancel = lambda: canceled.append(True))
+        loader.cancel()
+        release.set()
+        self.finishAll([blocked, loader])
+        self.assertEqual(self.started, [])
+        self.assertEqual(canceled, [True])
+        self.assertEqual(loaded, [])
+        self.assertEqual(self.canceled, None)
+
+    def testException(self):
+        def fail():
+            raise IOError("missing")
+        loader = self.resource.load(self, "failed", fail)
+        loader.join(5.0)
+        self.assertRaises(IOError, self.resource.run, 0)
+        self.assertEqual(self.resource.loaders, [])
+
+    def testDeliveryBudget(self):
+        loaders = [self.resource.load(self, "result%d" % i, self.fakeLoad(i)) for i in range(5)]
+        for loader in loaders:
+            loader.join(5.0)
+
+        # With no time to spare, one load is handed out a tick...
+        self.resource.deliveryBudget = 0.0
+        self.resource.run(0)
+        self.assertEqual(len(self.resource.loaders), 4)
+
+        # ...and with plenty, all of them.
+        self.resource.deliveryBudget = 10.0
+        self.resource.run(0)
+        self.assertEqual(self.resource.loaders, [])
+        self.assertEqual([getattr(self, "result%d" % i) for i in range(5)], range(5))
+
+    def testSongPreview(self):
+        # The game's song and fingerprint caches are opened for use by the
+        # loader threads too.
+        songDB, fingerprints = Song._songDB, Fingerprint._cache
+        try:
+            Song._songDB = sqlite3.connect(":memory:", check_same_thread = False)
+            Song._songDB.text_factory = str
+            Song._songDB.execute('CREATE TABLE `songinfo` (`hash` STRING UNIQUE, `info` STRING, `seen` INT)')
+            Fingerprint._cache = Fingerprint.FingerprintCache(sqlite3.connect(":memory:", check_same_thread = False))
+
+            songDir = os.path.join(self.tmp, "songs", "preview")
+            os.makedirs(songDir)
+            open(os.path.join(songDir, "song.ini"), "w").write("[song]\nname = Preview\ndelay = 25\n")
+            shutil.copy(os.path.join(os.path.dirname(__file__), "..", "..", "data", "tutorials", "drumtest", "notes.mid"), songDir)
+            engine = FakeEngine(self.resource, self.config)
+
+            loader = self.resource.load(self, "songArgs", lambda: Song.prepareSong(engine, "preview", library = "songs", playbackOnly = True))
+            self.finishAll([loader])
+            self.assertEqual(self.songArgs[-1].name, "Preview")
+
+            loader = self.resource.load(self, "song", lambda: Song.loadSong(engine, "preview", library = "songs", playbackOnly = True), priority = PRIORITY_HIGH)
+            self.finishAll([loader])
+            self.assertEqual(self.song.info.name, "Preview")
+            self.assertEqual(self.song.info.delay, 25)
+            self.assertTrue(self.song.info.parts)
+        finally:
+            Song._songDB, Fingerprint._cache = songDB, fingerprints
+
+    def testPreviewsOutOfOrder(self):
+        # Two previews loading side by side: the first is canceled by the
+        # second, but only gets to the main loop after the second has loaded.
+        from fofix.game.SongChoosingScene import SongChoosingScene
+        self.resource.workerCount = 2
+        releases = {"first": Event(), "second": Event()}
+        started = Event()
+        songs = []
+        def loadSong(engine, name, **kwargs):
+            if name == "first":
+                started.set()
+            releases[name].wait()
+            song = FakeSong(name)
+            songs.append(song)
+            return song
+
+        scene = SongChoosingScene.__new__(SongChoosingScene)
+        scene.engine = FakeEngine(self.resource, self.config)
+        scene.library = "songs"
+        scene.careerMode = False
+        scene.songLoader = None
+        scene.song = None
+        realLoadSong = Song.loadSong
+        try:
+            Song.loadSong = loadSong
+            scene.selectedItem = Song.SongInfo(os.path.join(self.tmp, "first", "song.ini"), "songs", useCache = False)
+            scene.selectedItem.songName = "first"
+            scene.previewSong()
+            first = scene.songLoader
+            started.wait(5.0)
+            scene.selectedItem.songName = "second"
+            scene.previewSong()
+            second = scene.songLoader
+
+            releases["second"].set()
+            second.join(5.0)
+            while second in self.resource.loaders:
+                self.resource.run(0)
+            self.assertEqual(scene.song.name, "second")
+            self.assertEqual(scene.songLoader, None)
+
+            releases["first"].set()
+            self.finishAll([first])
+        finally:
+            Song.loadSong = realLoadSong
+
+        self.assertEqual(scene.song.name, "second")
+        self.assertTrue(scene.song.playing)
+        self.assertEqual(scene.songLoader, None)
+        self.assertEqual([song.name for song in songs], ["second", "first"])
+
+class FakeSong(object):
+    def __init__(self, name):
+        self.name = name
+        self.playing = False
+
+    def setAllTrackVolumes(self, volume):
+        pass
+
+    def play(self):
+        self.playing = True
+
+    def stop(self):
+        self.playing = False
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+#####################################################################
+# -*- coding: iso-8859-1 -*-                                        #
+#                                                                   #
+# Frets on Fire X (FoFiX)                                           #
+# Copyright (C) 2012 FoFiX Team                                     #
+#                                                                   #
+# This program is free software; you can redistribute it and/or     #
+# modify it under the terms of the GNU General Public License       #
+# as published by the Free Software Foundation; either version 2    #
+# of the License, or (at your option) any later version.            #
+#                                                                   #
+# This program is distributed in the hope that it will be useful,   #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of    #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the     #
+# GNU General Public License for more details.                      #
+#                                                                   #
+# You should have received a copy of the GNU General Public License #
+# along with this program; if not, write to the Free Software       #
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,        #
+# MA  02110-1301, USA.                                              #
+#####################################################################
+
+
+import unittest
+import sqlite3
+import tempfile
+import shutil
+import os
+
+from fofix.core import Config
+from fofix.core import ConfigDefs
+from fofix.core import Fingerprint
+from fofix.game import Song
+
+class FakeResource(object):
+    def __init__(self, root):
+        self.root = root
+
+    def fileName(self, *name, **args):
+        return os.path.join(self.root, *name[1:])
+
+class FakeEngine(object):
+    def __init__(self, root, config):
+        self.resource = FakeResource(root)
+        self.config = config
+
+class FakeScanner(object):
+    # leaves the songs' notes unread; the song list doesn't need them
+    def scan(self, songs, progressCallback = lambda p: None):
+        pass
+
+class SongListTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        # a throwaway config and song cache, so the user's own are left alone
+        configFile = os.path.join(self.tmp, "test.ini")
+        open(configFile, "w").close()
+        self.config = Config.load(configFile, setAsDefault = True)
+        self.engine = FakeEngine(self.tmp, self.config)
+        self.songDB, self.fingerprints = Song._songDB, Fingerprint._cache
+        Song._songDB = sqlite3.connect(":memory:")
+        Song._songDB.text_factory = str
+        Song._songDB.execute('CREATE TABLE `songinfo` (`hash` STRING UNIQUE, `info` STRING, `seen` INT)')
+        Song._createSongListTable()
+        Fingerprint._cache = Fingerprint.FingerprintCache(sqlite3.connect(":memory:"))
+        self.names = []
+
+    def tearDown(self):
+        Song._songDB, Fingerprint._cache = self.songDB, self.fingerprints
+        shutil.rmtree(self.tmp)
+
+    def addSong(self, folder, **values):
+        os.mkdir(os.path.join(self.tmp, folder))
+        f = open(os.path.join(self.tmp, folder, "song.ini"), "w")
+        f.write("[song]\n")
+        for key, value in values.items():
+            f.write("%s = %s\n" % (key, value))
+        f.close()
+        open(os.path.join(self.tmp, folder, "notes.mid"), "wb").write("MThd" + folder)
+        self.names.append(folder)
+
+    def getSongs(self, order, direction = 0):
+        self.config.set("game", "sort_order", order)
+        self.config.set("game", "sort_direction", direction)
+        Song.updateSongList(self.engine, "songs", self.names, scanner = FakeScanner())
+        return Song.getSongList("songs", order = order, direction = direction)
+
+    def titled(self, order, direction = 0):
+        items = Song.insertSortingTitles(self.engine, self.getSongs(order, direction))
+        return [(isinstance(item, Song.SortTitleInfo) and "#" or "") + item.name for item in items]
+
+    def testNumbersStayText(self):
+        self.addSong("a", name = "2112", artist = "Rush", album = "1984", year = "1976", count = "5")
+        song, = self.getSongs(0)
+        self.assertEqual((song.name, song.album, song.year, song.count), ("2112", "1984", "1976", "5"))
+        for order in range(9):
+            self.config.set("game", "sort_order", order)
+            Song.getSortingTitles(self.engine, [song])
+            Song.compareSongsAndTitles(self.engine, song, Song.SortTitleInfo("1976"), False)
+
+    def testTitleHeadings(self):
+        self.addSong("a", name = "b song")
+        self.addSong("b", name = "1. alpha")
+        self.addSong("c", name = "Apple")
+        self.addSong("d", name = "#hash")
+        self.addSong("e", name = "9 lives")
+        self.assertEqual(self.titled(0), ["#!@#", "#hash", "#123", "9 lives", "#A", "1. alpha", "Apple", "#B", "b song"])
+        self.assertEqual(self.titled(0, 1), ["#B", "b song", "#A", "Apple", "1. alpha", "#123", "9 lives", "#!@#", "#hash"])
+
+    def testOtherHeadings(self):
+        self.addSong("a", name = "One", year = "1976", count = "2")
+        self.addSong("b", name = "Two", year = "1980", count = "10")
+        self.addSong("c", name = "Three", year = "1976")
+        self.assertEqual(self.titled(5), ["#1976", "One", "Three", "#1980", "Two"])
+        self.assertEqual(self.titled(2), ["#10", "Two", "#2", "One", "#0", "Three"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+#####################################################################
+# -*- coding: iso-8859-1 -*-                                        #
+#                                                                   #
+# Frets on Fire X (FoFiX)                                           #
+# Copyright (C) 2012 FoFiX Team                                     #
+#                                                                   #
+# This program is free software; you can redistribute it and/or     #
+# modify it under the terms of the GNU General Public License       #
+# as published by the Free Software Foundation; either version 2    #
+# of the License, or (at your option) any later version.            #
+#                                                                   #
+# This program is distributed in the hope that it will be useful,   #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of    #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the     #
+# GNU General Public License for more details.                      #
+#                                                                   #
+# You should have received a copy of the GNU General Public License #
+# along with this program; if not, write to the Free Software       #
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,        #
+# MA  02110-1301, USA.                                              #
+#####################################################################
+
+
+import unittest
+import multiprocessing
+import sqlite3
+
+from fofix.game import Song
+
+class FakeSong(object):
+    # what SongScanner needs of a SongInfo
+    def __init__(self, index):
+        self.fileName = "song%d/song.ini" % index
+        self.libraryNam = "songs"
+        self.hash = "hash%d" % index
+        self.needsScan = True
+        self.readHere = False
+
+    def getParts(self):
+        self.readHere = True
+
+    def getSections(self):
+        pass
+
+    def getCacheRow(self):
+        return [self.hash, "info"]
+
+class StuckResults(object):
+    # hands out some results, then stops answering like a hung scan process
+    def __init__(self, jobs, answered):
+        self.jobs = iter(jobs[:answered])
+
+    def next(self, timeout = None):
+        for index, fileName, library in self.jobs:
+            return index, {"_parts": []}
+        raise multiprocessing.TimeoutError
+
+class FakePool(object):
+    def __init__(self, answered):
+        self.answered = answered
+        self.terminated = False
+
+    def imap_unordered(self, func, jobs):
+        return StuckResults(jobs, self.answered)
+
+    def terminate(self):
+        self.terminated = True
+
+    def join(self):
+        pass
+
+class SongScannerTest(unittest.TestCase):
+    def setUp(self):
+        self.songDB, self.scanPool = Song._songDB, Song._scanPool
+        Song._songDB = sqlite3.connect(":memory:")
+        Song._songDB.execute('CREATE TABLE `songinfo` (`hash` STRING UNIQUE, `info` STRING, `seen` INT)')
+
+    def tearDown(self):
+        Song._songDB, Song._scanPool = self.songDB, self.scanPool
+
+    def testStuckPool(self):
+        pool = FakePool(answered = 3)
+        Song._scanPool = pool
+        songs = [FakeSong(i) for i in range(Song.SCAN_PROCESS_MINIMUM)]
+        progress = []
+        Song.SongScanner(None).scan(songs, progress.append)
+
+        # the songs the pool never answered for are read here instead
+        assert [song.readHere for song in songs] == [False] * 3 + [True] * (len(songs) - 3)
+        assert not [song for song in songs if song.needsScan]
+        assert Song._songDB.execute('SELECT COUNT(*) FROM `songinfo`').fetchone()[0] == len(songs)
+        assert progress[-1] == 1.0
+
+        # and the pool isn't used again
+        assert pool.terminated
+        assert Song._scanPool is None
+
+    def testNoPool(self):
+        Song._scanPool = None
+        songs = [FakeSong(i) for i in range(Song.SCAN_PROCESS_MINIMUM)]
+        Song.SongScanner(None).scan(songs)
+        assert all([song.readHere for song in songs])
+
+if __name__ == "__main__":
+    unittest.main()
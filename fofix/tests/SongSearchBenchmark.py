@@ -0,0 +1,77 @@
+#####################################################################
+# -*- coding: iso-8859-1 -*-                                        #
+#                                                                   #
+# FoFiX                                                             #
+# Copyright (C) 2012 FoFiX Team                                     #
+#                                                                   #
+# This program is free software; you can redistribute it and/or     #
+# modify it under the terms of the GNU General Public License       #
+# as published by the Free Software Foundation; either version 2    #
+# of the License, or (at your option) any later version.            #
+#                                                                   #
+# This program is distributed in the hope that it will be useful,   #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of    #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the     #
+# GNU General Public License for more details.                      #
+#                                                                   #
+# You should have received a copy of the GNU General Public License #
+# along with this program; if not, write to the Free Software       #
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,        #
+# MA  02110-1301, USA.                                              #
+#####################################################################
+
+
+# Times the setlist type-to-search on a generated library: building the
+# index, then typing a few queries one key at a time, against folding and
+# scanning every song on each keystroke.
+#
+#   python -m fofix.tests.SongSearchBenchmark [songs]
+
+import sys
+import time
+import random
+
+from fofix.game.SongSearch import SongSearchIndex, foldText
+
+WORDS = ["love", "night", "fire", "heart", "road", "dream", "black", "rock", "city",
+         "electric", "blue", "summer", "storm", "highway", "Mot\xc3\xb6rhead", "Beyonc\xc3\xa9",
+         "caf\xe9", "queen", "zeppelin", "sabbath", "metal", "punk", "soul", "jazz"]
+GENRES = ["Rock", "Metal", "Pop", "Punk", "Alternative", "Blues", "Jazz", "Prog"]
+QUERIES = ["motorhead", "fire night", "beyonce", "zz", "electric blue", "xyzzy"]
+
+def makeLibrary(count):
+    random.seed(count)
+    def title(words):
+        return " ".join([random.choice(WORDS) for i in range(words)]).title()
+    return [(title(random.randint(1, 5)), title(random.randint(1, 3)), title(random.randint(1, 4)), random.choice(GENRES))
+            for i in range(count)]
+
+def linearSearch(library, query):
+    query = foldText(query)
+    return [i for i, fields in enumerate(library) if query in u"\n".join([foldText(field) for field in fields])]
+
+def main():
+    count = 20000
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+    library = makeLibrary(count)
+
+    start = time.time()
+    index = SongSearchIndex(library)
+    print "%-24s %8.3f s" % ("build index (%d songs)" % count, time.time() - start)
+
+    for label, search in (("indexed", index.search), ("linear scan", lambda query: linearSearch(library, query))):
+        keys = 0
+        worst = 0.0
+        start = time.time()
+        for query in QUERIES:
+            for n in range(1, len(query) + 1):
+                keyStart = time.time()
+                search(query[:n])
+                worst = max(worst, time.time() - keyStart)
+                keys += 1
+        elapsed = time.time() - start
+        print "%-24s %8.3f ms per key, %8.3f ms worst" % (label, elapsed * 1000 / keys, worst * 1000)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#####################################################################
+# -*- coding: iso-8859-1 -*-                                        #
+#                                                                   #
+# Frets on Fire X (FoFiX)                                           #
+# Copyright (C) 2012 FoFiX Team                                     #
+#                                                                   #
+# This program is free software; you can redistribute it and/or     #
+# modify it under the terms of the GNU General Public License       #
+# as published by the Free Software Foundation; either version 2    #
+# of the License, or (at your option) any later version.            #
+#                                                                   #
+# This program is distributed in the hope that it will be useful,   #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of    #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the     #
+# GNU General Public License for more details.                      #
+#                                                                   #
+# You should have received a copy of the GNU General Public License #
+# along with this program; if not, write to the Free Software       #
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,        #
+# MA  02110-1301, USA.                                              #
+#####################################################################
+
+
+import unittest
+
+from fofix.game.SongSearch import SongSearchIndex, foldText
+
+ITEMS = [
+  ("Ace of Spades", "Mot\xc3\xb6rhead", "Ace of Spades", "Metal"),
+  (),
+  ("Crazy in Love", "Beyonc\xc3\xa9", "Dangerously in Love", "Pop"),
+  ("Caf\xe9 Racer", "Some  Band", "", "Rock"),
+  ("Spade Work", "Acer", "", ""),
+  ("Blues",),
+]
+
+class SongSearchTest(unittest.TestCase):
+    def setUp(self):
+        self.index = SongSearchIndex(ITEMS)
+
+    def testFold(self):
+        self.assertEqual(foldText("Mot\xc3\xb6rhead"), u"motorhead")
+        self.assertEqual(foldText("Caf\xe9"), u"cafe")
+        self.assertEqual(foldText(u"  Beyonc\xe9\tIN  Love "), u"beyonce in love")
+        self.assertEqual(foldText("ABC"), u"abc")
+
+    def testSubstring(self):
+        # three or more letters match anywhere, accents and case aside
+        self.assertEqual(self.index.search("motorhead"), [0])
+        self.assertEqual(self.index.search("ONCE"), [2])
+        self.assertEqual(self.index.search("cafe racer"), [3])
+        self.assertEqual(self.index.search("some band"), [3])
+        self.assertEqual(self.index.search("pade"), [0, 4])
+        self.assertEqual(self.index.search("xyz"), [])
+
+    def testWordStart(self):
+        # one or two letters only match the start of a word
+        self.assertEqual(self.index.search("a"), [0, 4])
+        self.assertEqual(self.index.search("ro"), [3])
+        self.assertEqual(self.index.search("lo"), [2])
+        self.assertEqual(self.index.search("ce"), [])
+
+    def testFieldsDoNotRunTogether(self):
+        # "spades" ends the title and "mot" starts the artist
+        self.assertEqual(self.index.search("spades mot"), [])
+        self.assertEqual(self.index.search("metalx"), [])
+
+    def testTyping(self):
+        # typing narrows the results; backspacing gets the earlier ones back
+        results = [self.index.search(query) for query in ("c", "ca", "caf", "cafe", "caf", "ca")]
+        self.assertEqual(results, [[2, 3], [3], [3], [3], [3], [3]])
+        self.assertEqual(self.index.search("blu"), [5])
+        self.assertEqual(self.index.search(""), [])
+        self.assertEqual(len(self.index), len(ITEMS))
+
+if __name__ == "__main__":
+    unittest.main()
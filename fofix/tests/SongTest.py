@@ -24,7 +24,7 @@ import unittest, pygame
 import shutil, os, sys
 
 from fofix.core.engine import GameEngine
-from Song import Song, Note
+from Song import Song, Note, Track, TempoMap, NoteStore, VocalPhrase, VocalNote
 from configuration import Config
 import Version
 
@@ -84,6 +84,84 @@ class SongTest(unittest.TestCase):
             pygame.mixer.music.load(e.resource.fileName("tutorials", "bangbang", "guitar.ogg"))
             shutil.rmtree(tmp)
 
+    def testEventWindow(self):
+        track = Track(None)
+        short = Note(0, 0)
+        held  = Note(1, 2000)
+        late  = Note(2, 100)
+        track.addEvent(1000, short)
+        track.addEvent(400, held)
+        track.addEvent(5000, late)
+
+        # sustains overlapping the window are returned along with notes inside it
+        assert [event for time, event in track.getEvents(900, 1200)] == [held, short]
+        assert [event for time, event in track.getEvents(2500, 4000)] == []
+        assert [event for time, event in track.getEvents(4900, 6000)] == [late]
+
+        track.removeEvent(400, held)
+        assert [event for time, event in track.getEvents(900, 1200)] == [short]
+        assert len(track.getAllEvents()) == 2
+
+    def testTempoMap(self):
+        tempoMap = TempoMap(ticksPerBeat = 480)
+        tempoMap.addMarker(0, 120.0)
+        tempoMap.addMarker(960, 60.0)
+
+        # two beats at 120bpm, then one beat at 60bpm
+        assert tempoMap.getTime(960) == 1000.0
+        assert tempoMap.getTime(1440) == 2000.0
+        assert tempoMap.getTime(480) == 500.0
+        assert tempoMap.getBpm(999.0) == 120.0
+        assert tempoMap.getBpm(1000.0) == 60.0
+
+    def testNoteStore(self):
+        store = NoteStore(capacity = 1)
+        notes = [Note(i, 100) for i in range(3)]
+        notes[0].played = True
+        for i, note in enumerate(notes):
+            note.bind(store, i * 500.0)
+
+        # values set before binding move into the columns
+        assert notes[0].played
+        notes[1].skipped = True
+        notes[2].flameCount += 1
+        assert list(store.number[:len(store)]) == [0, 1, 2]
+
+        store.reset()
+        assert not notes[0].played and not notes[1].skipped
+        assert notes[2].flameCount == 0
+
+    def testNoteStoreReads(self):
+        store = NoteStore()
+        notes = [Note(i, 100, tappable = 1) for i in range(3)]
+        for i, note in enumerate(notes):
+            note.bind(store, i * 500.0)
+
+        # reads come back as plain Python values, not NumPy scalars
+        assert type(notes[1].number) is int
+        assert type(notes[1].length) is float
+        assert type(notes[1].star) is bool
+
+        # writes reach both the columns and the values read back
+        notes[1].number = 4
+        notes[1].hopod = True
+        assert notes[1].number == 4 and store.number[1] == 4
+        assert notes[1].hopod and store.state[1]
+
+        # appending after a read doesn't leave stale values behind
+        note = Note(2, 50)
+        note.bind(store, 1500.0)
+        assert note.number == 2 and note.length == 50.0
+
+        store.reset()
+        assert not notes[1].hopod
+
+    def testVocalPhrase(self):
+        phrase = VocalPhrase(1500)
+        phrase.addEvent(0, VocalNote(60, 500))
+        assert phrase.length == 1500
+        assert len(phrase) == 1
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,130 @@
+#####################################################################
+# -*- coding: iso-8859-1 -*-                                        #
+#                                                                   #
+# Frets on Fire X (FoFiX)                                           #
+# Copyright (C) 2012 FoFiX Team                                     #
+#                                                                   #
+# This program is free software; you can redistribute it and/or     #
+# modify it under the terms of the GNU General Public License       #
+# as published by the Free Software Foundation; either version 2    #
+# of the License, or (at your option) any later version.            #
+#                                                                   #
+# This program is distributed in the hope that it will be useful,   #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of    #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the     #
+# GNU General Public License for more details.                      #
+#                                                                   #
+# You should have received a copy of the GNU General Public License #
+# along with this program; if not, write to the Free Software       #
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,        #
+# MA  02110-1301, USA.                                              #
+#####################################################################
+
+import unittest
+import tempfile
+import shutil
+import struct
+import wave
+import os
+
+import numpy as np
+
+from fofix.core import VFS
+from fofix.core.StemConverter import StemConverter
+
+class RampReader(object):
+    # Stands in for the Vorbis decoder: every "file" decodes to a ramp
+    # from -1.0 up to 1.0, with the right channel the negative of the left.
+    def __init__(self, fileName, frames = 100000, samprate = 44100):
+        self.samprate = samprate
+        self.channels = 2
+        left = np.linspace(-1.0, 1.0, frames).astype(np.float32)
+        self.samples = np.column_stack((left, -left)).ravel().tostring()
+        self.position = 0
+
+    def read(self, frames):
+        size = frames * self.channels * 4
+        data = self.samples[self.position:self.position + size]
+        self.position += len(data)
+        return data
+
+class StemConverterTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.opened = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def reader(self, fileName):
+        self.opened.append(os.path.basename(fileName))
+        return RampReader(fileName)
+
+    def makeSong(self, name, files = ("song.ini", "notes.mid", "song.ogg", "guitar.ogg")):
+        folder = os.path.join(self.tmp, name)
+        os.makedirs(folder)
+        for fileName in files:
+            open(os.path.join(folder, fileName), "wb").write("OggS")
+        return folder
+
+    def testWavContents(self):
+        folder = self.makeSong("song")
+        StemConverter(reader = self.reader).convertSong(folder)
+        wav = wave.open(os.path.join(folder, "guitar.wav"), "rb")
+        self.assertEqual((wav.getnchannels(), wav.getsampwidth(), wav.getframerate(), wav.getnframes()), (2, 2, 44100, 100000))
+        samples = struct.unpack("<%dh" % (2 * 100000), wav.readframes(100000))
+        wav.close()
+        self.assertEqual(samples[:2], (-32767, 32767))
+        self.assertEqual(samples[-2:], (32767, -32767))
+
+    def testStemsAreSeen(self):
+        # The game looks songs' files up through the directory cache.
+        folder = self.makeSong("song")
+        self.assertFalse(VFS.dirCache.exists(os.path.join(folder, "guitar.wav")))
+        StemConverter(reader = self.reader).convertSong(folder)
+        self.assertTrue(VFS.dirCache.exists(os.path.join(folder, "guitar.wav")))
+
+    def testConvertsLibrary(self):
+        self.makeSong(os.path.join("Band", "first"))
+        self.makeSong("second", ("song.ini", "song.ogg", "drums.ogg", "preview.ogg"))
+        self.makeSong("notasong", ("menu.ogg",))
+        converted = StemConverter(reader = self.reader).convertLibrary(self.tmp)
+        self.assertEqual(sorted(os.path.relpath(f, self.tmp) for f in converted),
+          [os.path.join("Band", "first", "guitar.wav"), os.path.join("Band", "first", "song.wav"),
+           os.path.join("second", "drums.wav"), os.path.join("second", "preview.wav"), os.path.join("second", "song.wav")])
+        self.assertFalse(os.path.exists(os.path.join(self.tmp, "notasong", "menu.wav")))
+        self.assertEqual([f for f in os.listdir(os.path.join(self.tmp, "second")) if f.endswith(".part")], [])
+
+    def testSkipsConvertedStems(self):
+        folder = self.makeSong("song")
+        converter = StemConverter(reader = self.reader)
+        converter.convertSong(folder)
+        self.assertEqual(converter.convertSong(folder), [])
+        self.assertEqual(sorted(self.opened), ["guitar.ogg", "song.ogg"])
+
+    def testRemoveOriginals(self):
+        folder = self.makeSong("song")
+        StemConverter(reader = self.reader, removeOriginals = True).convertSong(folder)
+        self.assertEqual(sorted(os.listdir(folder)), ["guitar.wav", "notes.mid", "song.ini", "song.wav"])
+
+    def testFlac(self):
+        encoded = []
+        def flacEncoder(wavName, fileName):
+            self.assertTrue(wave.open(wavName, "rb").getnframes() == 100000)
+            encoded.append(fileName)
+            open(fileName, "wb").write("fLaC")
+        folder = self.makeSong("song", ("song.ini", "song.ogg"))
+        converted = StemConverter(flac = True, reader = self.reader, flacEncoder = flacEncoder).convertSong(folder)
+        self.assertEqual(converted, [os.path.join(folder, "song.flac")])
+        self.assertEqual(open(converted[0], "rb").read(), "fLaC")
+        self.assertEqual(sorted(os.listdir(folder)), ["song.flac", "song.ini", "song.ogg"])
+
+    def testFailedConversionLeavesNothingBehind(self):
+        def badReader(fileName):
+            raise IOError("Failed to initialize decoder")
+        folder = self.makeSong("song", ("song.ini", "song.ogg"))
+        self.assertRaises(IOError, StemConverter(reader = badReader, removeOriginals = True).convertSong, folder)
+        self.assertEqual(sorted(os.listdir(folder)), ["song.ini", "song.ogg"])
+
+if __name__ == "__main__":
+    unittest.main()
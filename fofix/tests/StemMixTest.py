@@ -0,0 +1,78 @@
+#####################################################################
+# -*- coding: iso-8859-1 -*-                                        #
+#                                                                   #
+# Frets on Fire X (FoFiX)                                           #
+# Copyright (C) 2012 FoFiX Team                                     #
+#                                                                   #
+# This program is free software; you can redistribute it and/or     #
+# modify it under the terms of the GNU General Public License       #
+# as published by the Free Software Foundation; either version 2    #
+# of the License, or (at your option) any later version.            #
+#                                                                   #
+# This program is distributed in the hope that it will be useful,   #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of    #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the     #
+# GNU General Public License for more details.                      #
+#                                                                   #
+# You should have received a copy of the GNU General Public License #
+# along with this program; if not, write to the Free Software       #
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,        #
+# MA  02110-1301, USA.                                              #
+#####################################################################
+
+
+import unittest
+
+from fofix.core import Audio
+from fofix.game import Song
+
+class FakeMixStream(object):
+    def __init__(self):
+        self.volumes = {}
+
+    def set_stem_volume(self, stem, volume):
+        self.volumes[stem] = volume
+
+class FakeMix(object):
+    # a MultiStemSound that counts what is done to it
+    def __init__(self, stems):
+        self._mixstream = FakeMixStream()
+        self.stems = [Audio.StemSound(self, i) for i in range(stems)]
+        self.calls = []
+
+    def __getattr__(self, name):
+        def call(*args):
+            self.calls.append(name)
+            if name == "getPosition":
+                return 1.5
+            return True
+        return call
+
+class StemMixTest(unittest.TestCase):
+    def setUp(self):
+        # just the parts of a loaded Song that playback touches
+        self.song = Song.Song.__new__(Song.Song)
+        self.mix = FakeMix(3)
+        self.song.stemMix = self.mix
+        self.song.songTrack, self.song.guitarTrack, self.song.rhythmTrack = self.mix.stems
+        self.song.drumTrack = self.song.crowdTrack = None
+        self.song.tracks = []
+        self.song.midiEventTracks = []
+        self.song.singleTrackSong = False
+        self.song.backVolume = 0.5
+        self.song.delay = 0.0
+        self.song._playing = False
+
+    def testMixDrivenOnce(self):
+        self.song.play(2000.0)
+        self.song.setSpeed(0.5)
+        assert self.song.isPlaying()
+        assert self.song.getPosition() == 1500.0
+        self.song.stop()
+
+        # the whole mix is handled once, not once for each stem
+        assert self.mix.calls == ["setPosition", "play", "setSpeed", "isPlaying", "getPosition", "stop"]
+        assert self.mix._mixstream.volumes == {0: 0.5}
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+#####################################################################
+# -*- coding: iso-8859-1 -*-                                        #
+#                                                                   #
+# Frets on Fire X (FoFiX)                                           #
+# Copyright (C) 2012 FoFiX Team                                     #
+#                                                                   #
+# This program is free software; you can redistribute it and/or     #
+# modify it under the terms of the GNU General Public License       #
+# as published by the Free Software Foundation; either version 2    #
+# of the License, or (at your option) any later version.            #
+#                                                                   #
+# This program is distributed in the hope that it will be useful,   #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of    #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the     #
+# GNU General Public License for more details.                      #
+#                                                                   #
+# You should have received a copy of the GNU General Public License #
+# along with this program; if not, write to the Free Software       #
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,        #
+# MA  02110-1301, USA.                                              #
+#####################################################################
+
+
+import unittest
+import tempfile
+import shutil
+import gc
+import os
+
+from fofix.core import VFS
+from fofix.core.Texture import TextureCache
+from fofix.core.constants import OWNER_ALBUMART
+
+class FakeTexture(object):
+    # Stands in for Texture, which needs a GL context.
+    def __init__(self, name, target, useMipmaps, owner, data):
+        self.name = name
+        self.data = data
+        self.useMipmaps = useMipmaps
+        self.owner = owner
+
+    def memoryUsage(self):
+        return self.useMipmaps and 1024 or 768
+
+class TextureCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.tmp, "neck.png")
+        open(self.fileName, "w").close()
+        self.cache = TextureCache(factory = FakeTexture)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def testShared(self):
+        first = self.cache.get(self.fileName)
+        second = self.cache.get(os.path.join(self.tmp, ".", "neck.png"))
+        self.assertTrue(first is second)
+        unmipped = self.cache.get(self.fileName, useMipmaps = False)
+        self.assertFalse(unmipped is first)
+        stats = self.cache.stats()
+        self.assertEqual((stats["textures"], stats["bytes"], stats["hits"], stats["misses"]), (2, 1792, 1, 2))
+
+    def testOwners(self):
+        other = self.cache.get(self.fileName)
+        albumArt = self.cache.get(self.fileName, owner = OWNER_ALBUMART)
+        self.assertFalse(albumArt is other)
+        self.assertEqual(albumArt.owner, OWNER_ALBUMART)
+        self.assertTrue(self.cache.get(self.fileName, owner = OWNER_ALBUMART) is albumArt)
+
+    def testReleased(self):
+        texture = self.cache.get(self.fileName)
+        del texture
+        gc.collect()
+        self.assertEqual(self.cache.stats()["textures"], 0)
+        self.cache.get(self.fileName)
+        self.assertEqual(self.cache.misses, 2)
+
+    def testChangedFile(self):
+        first = self.cache.get(self.fileName)
+        mtime = os.path.getmtime(self.fileName)
+        os.utime(self.fileName, (mtime + 10, mtime + 10))
+        # Files are only checked when the game is set to look for changes.
+        self.assertTrue(self.cache.get(self.fileName) is first)
+        revalidate = VFS.dirCache.revalidate
+        VFS.dirCache.revalidate = True
+        try:
+            second = self.cache.get(self.fileName)
+            self.assertFalse(second is first)
+            self.assertTrue(self.cache.get(self.fileName) is second)
+        finally:
+            VFS.dirCache.revalidate = revalidate
+
+    def testNoStatOnHit(self):
+        texture = self.cache.get(self.fileName)
+        getmtime = os.path.getmtime
+        def failingGetmtime(path):
+            raise AssertionError("stat on a cache hit")
+        os.path.getmtime = failingGetmtime
+        try:
+            self.assertTrue(self.cache.get(self.fileName) is texture)
+        finally:
+            os.path.getmtime = getmtime
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+#####################################################################
+# -*- coding: iso-8859-1 -*-                                        #
+#                                                                   #
+# Frets on Fire X (FoFiX)                                           #
+# Copyright (C) 2012 FoFiX Team                                     #
+#                                                                   #
+# This program is free software; you can redistribute it and/or     #
+# modify it under the terms of the GNU General Public License       #
+# as published by the Free Software Foundation; either version 2    #
+# of the License, or (at your option) any later version.            #
+#                                                                   #
+# This program is distributed in the hope that it will be useful,   #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of    #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the     #
+# GNU General Public License for more details.                      #
+#                                                                   #
+# You should have received a copy of the GNU General Public License #
+# along with this program; if not, write to the Free Software       #
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,        #
+# MA  02110-1301, USA.                                              #
+#####################################################################
+
+
+import unittest
+import tempfile
+import shutil
+import os
+
+import numpy as np
+from PIL import Image
+
+from fofix.core.TextureData import decodeImage, nearestPowerOfTwo, MipCache
+
+class TextureDataTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def image(self, w, h, mode = "RGBA"):
+        pixels = np.arange(w * h * 4, dtype=np.uint32).reshape(h, w, 4) % 256
+        return Image.fromarray(pixels.astype(np.uint8), "RGBA").convert(mode)
+
+    def testNearestPowerOfTwo(self):
+        self.assertEqual([nearestPowerOfTwo(n) for n in (1, 2, 3, 5, 6, 100, 383, 384, 512)],
+                         [1, 2, 4, 4, 8, 128, 256, 512, 512])
+
+    def testMipChain(self):
+        data = decodeImage(self.image(8, 2))
+        self.assertEqual(data.imageSize, (8, 2))
+        self.assertEqual([(w, h, len(s)) for w, h, s in data.levels], [(8, 2, 64), (4, 1, 16), (2, 1, 8), (1, 1, 4)])
+        self.assertEqual(data.memoryUsage(), 92)
+
+    def testBoxFilter(self):
+        image = Image.fromarray(np.array([[0, 100], [50, 255]], dtype=np.uint8), "L")
+        data = decodeImage(image)
+        self.assertEqual(data.mode, "L")
+        self.assertEqual(data.levels[0][2], "\x00\x64\x32\xff")
+        self.assertEqual(data.levels[1][2], chr((0 + 100 + 50 + 255 + 2) // 4))
+
+    def testTopRowFirst(self):
+        pixels = np.zeros((4, 4, 3), dtype=np.uint8)
+        pixels[0] = 255
+        data = decodeImage(Image.fromarray(pixels, "RGB"), mipmaps = False)
+        self.assertEqual(data.levels[0][2][:12], "\xff" * 12)
+        self.assertEqual(len(data.levels), 1)
+
+    def testScaling(self):
+        data = decodeImage(self.image(300, 100, "RGB"), maxSize = 128)
+        self.assertEqual(data.imageSize, (300, 100))
+        self.assertEqual(data.levels[0][:2], (128, 64))
+        # Left alone without mipmaps.
+        data = decodeImage(self.image(300, 100, "RGB"), mipmaps = False, maxSize = 128)
+        self.assertEqual(data.levels[0][:2], (300, 100))
+
+    def testPaletteWithTransparency(self):
+        image = self.image(4, 4, "RGB").convert("P")
+        image.info["transparency"] = 0
+        self.assertEqual(decodeImage(image).mode, "RGBA")
+
+    def testCache(self):
+        fileName = os.path.join(self.tmp, "neck.png")
+        self.image(16, 16).save(fileName)
+        cache = MipCache(os.path.join(self.tmp, "cache"))
+        first = cache.load(fileName)
+        cached = cache.load(fileName)
+        self.assertEqual((cached.imageSize, cached.mode, cached.levels), (first.imageSize, first.mode, first.levels))
+
+        # A changed image is decoded again.
+        self.image(8, 8).save(fileName)
+        mtime = os.path.getmtime(fileName)
+        os.utime(fileName, (mtime + 10, mtime + 10))
+        self.assertEqual(cache.load(fileName).imageSize, (8, 8))
+        self.assertEqual(len(os.listdir(cache.dir)), 1)
+
+        self.assertRaises(IOError, cache.load, os.path.join(self.tmp, "missing.png"))
+
+    def testTrim(self):
+        cache = MipCache(os.path.join(self.tmp, "cache"))
+        for i in range(4):
+            fileName = os.path.join(self.tmp, "%d.png" % i)
+            self.image(16, 16).save(fileName)
+            cache.load(fileName)
+            cacheFile = cache.cacheFile(fileName, True, None)
+            os.utime(cacheFile, (1000 + i, 1000 + i))
+        size = os.path.getsize(cacheFile)
+        cache.trim(size * 2)
+        self.assertEqual(sorted(os.listdir(cache.dir)),
+                         sorted(os.path.basename(cache.cacheFile(os.path.join(self.tmp, "%d.png" % i), True, None)) for i in (2, 3)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,182 @@
+#####################################################################
+# -*- coding: iso-8859-1 -*-                                        #
+#                                                                   #
+# Frets on Fire X (FoFiX)                                           #
+# Copyright (C) 2012 FoFiX Team                                     #
+#                                                                   #
+# This program is free software; you can redistribute it and/or     #
+# modify it under the terms of the GNU General Public License       #
+# as published by the Free Software Foundation; either version 2    #
+# of the License, or (at your option) any later version.            #
+#                                                                   #
+# This program is distributed in the hope that it will be useful,   #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of    #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the     #
+# GNU General Public License for more details.                      #
+#                                                                   #
+# You should have received a copy of the GNU General Public License #
+# along with this program; if not, write to the Free Software       #
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,        #
+# MA  02110-1301, USA.                                              #
+#####################################################################
+
+
+import unittest
+import tempfile
+import shutil
+import os
+
+import numpy as np
+from PIL import Image
+
+from fofix.core import Texture
+from fofix.core.Texture import TextureManager
+from fofix.core.constants import *
+
+class FakeTexture(object):
+    # Stands in for Texture, which needs a GL context.
+    def __init__(self, manager, owner, size, reloadable = True):
+        self.manager = manager
+        self.owner = owner
+        self.bytes = 0
+        self.lastUsed = manager.frame
+        self.reloadable = reloadable
+        self.evicted = False
+        manager.register(self)
+        manager.setBytes(self, size)
+
+    def isEvictable(self):
+        return self.reloadable and not self.evicted
+
+    def evict(self):
+        self.evicted = True
+        self.manager.setBytes(self, 0)
+
+    def bind(self):
+        self.lastUsed = self.manager.frame
+
+class TextureManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.queue = []
+        self.manager = TextureManager(queue = self.queue)
+
+    def testAccounting(self):
+        font = FakeTexture(self.manager, OWNER_FONT, 1000)
+        art = [FakeTexture(self.manager, OWNER_ALBUMART, 300) for i in range(3)]
+        self.manager.release(art.pop())
+        stats = self.manager.stats()
+        self.assertEqual(stats["bytes"], 1600)
+        self.assertEqual(stats["owners"], {OWNER_FONT: 1000, OWNER_ALBUMART: 600})
+        self.assertEqual(stats["textures"], 3)
+        del art
+        self.assertEqual(self.manager.stats()["textures"], 1)
+
+    def testCleanupBatches(self):
+        deleted = []
+        for i in range(40):
+            self.queue.append((deleted.append, [i]))
+        self.manager.update()
+        self.assertEqual(deleted, range(16))
+        self.manager.cleanup(100)
+        self.assertEqual(deleted, range(40))
+        self.assertEqual(self.manager.stats()["pending"], 0)
+
+    def testLeastRecentlyUsedEvicted(self):
+        font = FakeTexture(self.manager, OWNER_FONT, 1000)
+        art = [FakeTexture(self.manager, OWNER_ALBUMART, 300) for i in range(4)]
+        # Used a frame apart, in the order 2, 0, 3, 1.
+        for i in (2, 0, 3, 1):
+            art[i].bind()
+            self.manager.update()
+        self.manager.budget = 1600
+        font.bind()
+        self.manager.update()
+        self.assertEqual([a.evicted for a in art], [True, False, True, False])
+        self.assertFalse(font.evicted)
+        self.assertEqual(self.manager.totalBytes(), 1600)
+        self.assertEqual(self.manager.evictions, 2)
+
+    def testKeepsWhatIsInUse(self):
+        self.manager.budget = 100
+        art = FakeTexture(self.manager, OWNER_ALBUMART, 300)
+        stage = FakeTexture(self.manager, OWNER_STAGE, 300)
+        art.bind()
+        self.manager.update()
+        self.assertFalse(art.evicted)
+        self.manager.update()
+        self.assertTrue(art.evicted)
+        self.assertFalse(stage.evicted)
+
+    def testNoBudget(self):
+        art = [FakeTexture(self.manager, OWNER_ALBUMART, 300) for i in range(4)]
+        self.manager.update()
+        self.manager.update()
+        self.assertFalse([a for a in art if a.evicted])
+
+class FakeGL(object):
+    # Records the GL calls Texture makes, so it can be used without a GL context.
+    def __init__(self):
+        self.handles = 0
+        self.bound = None
+
+    def glGenTextures(self, count):
+        self.handles += 1
+        return self.handles
+
+    def glBindTexture(self, target, handle):
+        self.bound = handle
+
+    def ignore(self, *args):
+        pass
+
+class TextureReloadTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.tmp, "label.png")
+        Image.fromarray(np.zeros((4, 8, 4), dtype = np.uint8), "RGBA").save(self.fileName)
+
+        self.gl = FakeGL()
+        self.realGL = dict([(name, value) for name, value in vars(Texture).items() if name.startswith("gl") and callable(value)])
+        for name in self.realGL:
+            setattr(Texture, name, getattr(self.gl, name, self.gl.ignore))
+        self.manager = Texture.textureManager
+        Texture.textureManager = TextureManager(queue = [])
+        self.maxTextureSize, Texture._maxTextureSize = Texture._maxTextureSize, 1024
+
+    def tearDown(self):
+        for name, value in self.realGL.items():
+            setattr(Texture, name, value)
+        Texture.textureManager = self.manager
+        Texture._maxTextureSize = self.maxTextureSize
+        shutil.rmtree(self.tmp)
+
+    def testReloadInBackground(self):
+        loads = []
+        Texture.textureManager.loader = lambda function, onLoad: loads.append((function, onLoad))
+        texture = Texture.Texture(self.fileName, owner = OWNER_ALBUMART)
+        size = texture.memoryUsage()
+        texture.evict()
+
+        # Bound while evicted, it draws as the placeholder until reloaded.
+        texture.bind()
+        texture.bind()
+        self.assertEqual(len(loads), 1)
+        self.assertEqual(texture.texture, None)
+        self.assertEqual(self.gl.bound, Texture.textureManager.placeholder())
+
+        function, onLoad = loads[0]
+        onLoad(function())
+        texture.bind()
+        self.assertEqual(self.gl.bound, texture.texture)
+        self.assertEqual(texture.memoryUsage(), size)
+        self.assertTrue(texture.isEvictable())
+
+    def testReloadInPlace(self):
+        texture = Texture.Texture(self.fileName, owner = OWNER_ALBUMART)
+        texture.evict()
+        texture.bind()
+        self.assertEqual(self.gl.bound, texture.texture)
+        self.assertTrue(texture.memoryUsage())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,170 @@
+#####################################################################
+# -*- coding: iso-8859-1 -*-                                        #
+#                                                                   #
+# Frets on Fire X (FoFiX)                                           #
+# Copyright (C) 2012 FoFiX Team                                     #
+#                                                                   #
+# This program is free software; you can redistribute it and/or     #
+# modify it under the terms of the GNU General Public License       #
+# as published by the Free Software Foundation; either version 2    #
+# of the License, or (at your option) any later version.            #
+#                                                                   #
+# This program is distributed in the hope that it will be useful,   #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of    #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the     #
+# GNU General Public License for more details.                      #
+#                                                                   #
+# You should have received a copy of the GNU General Public License #
+# along with this program; if not, write to the Free Software       #
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston,        #
+# MA  02110-1301, USA.                                              #
+#####################################################################
+
+
+import unittest
+import importlib
+import tempfile
+import shutil
+import os
+
+from fofix.core import Config
+from fofix.core import ConfigDefs
+from fofix.core.MicAnalysis import PitchFrame
+from fofix.game.Song import VocalTrack, VocalPhrase, VocalNote
+# the module, not the class the instruments package puts in its place
+Vocalist = importlib.import_module("fofix.game.guitarscene.instruments.Vocalist")
+
+NOW = 100.0
+
+class FakeMic(object):
+    def __init__(self, engine, controller):
+        self.mic_started = True
+        self.frames = []
+
+    def getFrames(self):
+        frames, self.frames = self.frames, []
+        return frames
+
+    def getTap(self):
+        return False
+
+class FakeImage(object):
+    def width1(self):
+        return 64
+
+    def height1(self):
+        return 64
+
+class FakeTheme(object):
+    def __getattr__(self, name):
+        if "Color" in name:
+            return (1.0, 1.0, 1.0, 1.0)
+        return 1.0
+
+class FakeEngine(object):
+    def __init__(self, config):
+        self.config = config
+        self.theme = FakeTheme()
+        self.audioSpeedFactor = 1.0
+
+    def loadImgDrawing(self, target, name, fileName):
+        # none of the optional lyric sheet images are there
+        setattr(target, name, FakeImage())
+        return False
+
+class FakeData(object):
+    theme = 0
+    vocalPath = "vocals"
+
+class FakePlayer(object):
+    controller = 0
+
+    def getDifficultyInt(self):
+        return 0
+
+class FakeSong(object):
+    def __init__(self, track):
+        self.track = [track]
+
+class VocalistTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        # a throwaway config, so the user's own settings are left alone
+        configFile = os.path.join(self.tmp, "test.ini")
+        open(configFile, "w").close()
+        engine = FakeEngine(Config.load(configFile, setAsDefault = True))
+        engine.data = FakeData()
+        self.microphone, self.timeFunc = Vocalist.Microphone, Vocalist.timeFunc
+        Vocalist.Microphone = FakeMic
+        Vocalist.timeFunc = lambda: NOW
+        self.vocalist = Vocalist.Vocalist(engine, FakePlayer())
+
+    def tearDown(self):
+        Vocalist.Microphone, Vocalist.timeFunc = self.microphone, self.timeFunc
+        shutil.rmtree(self.tmp)
+
+    def sing(self, pos, note):
+        # a window of mic input sung at a song position, as seen from pos 1500
+        frequency = 440.0 * 2 ** ((note - 69) / 12.0)
+        self.vocalist.mic.frames.append(PitchFrame(NOW - (1500 - pos) / 1000.0, frequency, -5.0, [500, 1500]))
+
+    def testNoteBoundary(self):
+        phrase = VocalPhrase(2000)
+        first, second = VocalNote(60, 1000), VocalNote(64, 1000)
+        phrase.addEvent(0, first)
+        phrase.addEvent(1000, second)
+        track = VocalTrack(None)
+        track.addEvent(0, phrase)
+        song = FakeSong(track)
+        vocalist = self.vocalist
+
+        vocalist.requiredNote = vocalist.getRequiredNote(500, song)
+        vocalist.lastPos = 500
+        self.assertEqual(vocalist.requiredNote, 60)
+
+        # A whole second between two frames, sung across the note boundary:
+        # each window counts for the note due when it was sung.
+        for pos in range(525, 1500, 50):
+            self.sing(pos, pos < 1000 and 60 or 64)
+        vocalist.scoreFrames(1500, song)
+        self.assertEqual(vocalist.mic.frames, [])
+        self.assertAlmostEqual(first.accuracy, 475, places = 6)
+        self.assertAlmostEqual(second.accuracy, 500, places = 6)
+        self.assertAlmostEqual(vocalist.lastPos, 1475, places = 6)
+
+        vocalist.requiredNote = vocalist.getRequiredNote(1500, song)
+        self.assertEqual(vocalist.requiredNote, 64)
+
+    def testPhrasesInOneUpdate(self):
+        track = VocalTrack(None)
+        for time, note, length in [(0, 60, 400), (500, 64, 400), (1000, 67, 1000)]:
+            phrase = VocalPhrase(length)
+            phrase.addEvent(time, VocalNote(note, length))
+            track.addEvent(time, phrase)
+        song = FakeSong(track)
+        vocalist = self.vocalist
+
+        vocalist.requiredNote = vocalist.getRequiredNote(100, song)
+        vocalist.lastPos = 100
+        assert vocalist.getScoreChange() is None
+
+        # Two phrases end between two frames: both are scored, once each, in order.
+        for pos in range(125, 1500, 25):
+            self.sing(pos, pos < 500 and 60 or pos < 1000 and 64 or 67)
+        vocalist.scoreFrames(1500, song)
+        vocalist.requiredNote = vocalist.getRequiredNote(1500, song)
+        first, second = vocalist.getScoreChange(), vocalist.getScoreChange()
+        # both sung in tune all the way through
+        self.assertEqual((first[1], second[1]), (0, 0))
+        assert vocalist.getScoreChange() is None
+        self.assertEqual(sum(vocalist.scoredPhrases), 2)
+        self.assertEqual(vocalist.phraseIndex, 3)
+
+        # looking a note up doesn't change anything
+        phraseIndex, item = vocalist.phraseIndex, vocalist.currentNoteItem
+        time, note, required, awardEnd = vocalist.findNote(1100, track.allEvents[2][1])
+        self.assertEqual(required, 67)
+        self.assertEqual((vocalist.phraseIndex, vocalist.currentNoteItem), (phraseIndex, item))
+
+if __name__ == "__main__":
+    unittest.main()
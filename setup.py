@@ -304,6 +304,7 @@ def pc_info(pkg, altnames=[]):
 
 ogg_info = pc_info('ogg')
 vorbisfile_info = pc_info('vorbisfile')
+flac_info = pc_info('flac')
 sdl_info = pc_info('sdl')
 sdl_mixer_info = pc_info('SDL_mixer')
 theoradec_info = pc_info('theoradec')
@@ -439,12 +440,15 @@ setup_args.update({
                        'fofix/core/pypitch/AnalyzerInput.cpp']),
     Extension('fofix.lib._VideoPlayer',
               ['fofix/core/VideoPlayer/_VideoPlayer.pyx', 'fofix/core/VideoPlayer/VideoPlayer.c'],
-              **combine_info(gl_info, ogg_info, theoradec_info, glib_info, swscale_info,
+              **combine_info(gl_info, ogg_info, theoradec_info, glib_info, gthread_info, swscale_info,
               {'include_dirs': ['.']})),
     Extension('fofix.lib._MixStream',
               ['fofix/core/MixStream/_MixStream.pyx', 'fofix/core/MixStream/MixStream.c',
-               'fofix/core/MixStream/vorbis.c'] + extra_soundtouch_src,
-              **combine_info(vorbisfile_info, soundtouch_info, glib_info, gthread_info, sdl_info, sdl_mixer_info)),
+               'fofix/core/MixStream/decoders.c', 'fofix/core/MixStream/vorbis.c',
+               'fofix/core/MixStream/wav.c', 'fofix/core/MixStream/flac.c',
+               'fofix/core/MixStream/MultiStemStream.c', 'fofix/core/MixStream/PassthroughStream.c',
+               'fofix/core/MixStream/stretch.c'] + extra_soundtouch_src,
+              **combine_info(vorbisfile_info, flac_info, soundtouch_info, glib_info, gthread_info, sdl_info, sdl_mixer_info)),
   ],
   'cmdclass': {'build_ext': build_ext, 'install': install, 'msgfmt': msgfmt, 'xgettext': xgettext},
 })